@@ -8,7 +8,7 @@ import { Button } from "@/components/ui/button"
 import { Input } from "@/components/ui/input"
 import { Avatar, AvatarFallback } from "@/components/ui/avatar"
 import { Send, Bot, User, Sparkles, Lightbulb, Zap, ThumbsUp, ThumbsDown, RefreshCcw } from "lucide-react"
-import { API_BASE_URL, queryAI, submitFeedback } from "@/lib/api"
+import { API_BASE_URL, queryAI, submitFeedback, warmSession } from "@/lib/api"
 import { MarkdownMessage } from "@/components/markdown-message"
 import { useSession } from "@/hooks/useSession"
 
@@ -20,6 +20,11 @@ interface Message {
   model?: string
   feedback?: "up" | "down"
   feedbackId?: string
+  // Set for general answers the backend can cache; sent back with feedback
+  cacheVersion?: string
+  answerId?: string
+  queryText?: string
+  rawContent?: string
 }
 
 const MAX_CONTEXT_MESSAGES = 15
@@ -150,6 +155,16 @@ export default function Chat() {
     setIsHydrated(true)
   }, [userEmail, state.status, userFirstName])
 
+  useEffect(() => {
+    if (!userEmail || !isHydrated) {
+      return
+    }
+    // Let the backend load this user's claims while they type the first question
+    warmSession({ user_email: userEmail, thread_id: threadId || undefined }).catch((error) => {
+      console.warn("Session warm-up failed:", error)
+    })
+  }, [userEmail, isHydrated])
+
   useEffect(() => {
     if (!userEmail || !isHydrated) {
       return
@@ -258,6 +273,14 @@ export default function Chat() {
         metadata: {
           source: "web_chat",
           message_timestamp: message.timestamp.toISOString(),
+          ...(message.cacheVersion
+            ? {
+                cache_version: message.cacheVersion,
+                answer_id: message.answerId,
+                query_text: message.queryText,
+                answer_text: message.rawContent,
+              }
+            : {}),
         },
       })
 
@@ -306,6 +329,7 @@ export default function Chat() {
         user_email: userEmail,
         query_text: input,
         thread_id: threadId,
+        message_id: userMessage.id,
         context_messages: contextMessages,
       })
 
@@ -321,6 +345,10 @@ export default function Chat() {
         content: personalizedContent,
         timestamp: new Date(),
         model: response.model,
+        cacheVersion: response.cache_version ?? undefined,
+        answerId: response.answer_id ?? undefined,
+        queryText: input,
+        rawContent: response.response,
       }
 
       setMessages((prev) => [...prev, assistantMessage])
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Process-wide registry of embedding models.
+
+Every knowledge base store asks the registry for its embeddings instead of
+constructing HuggingFaceEmbeddings itself, so a process holds one copy of
+each model's weights. Under the pre-fork server (config/gunicorn.conf.py) the
+models are loaded in the master before workers fork and are shared
+copy-on-write.
+"""
+import threading
+from typing import Dict, List, Tuple
+
+from langchain_community.embeddings import HuggingFaceEmbeddings
+
+_lock = threading.Lock()
+_models: Dict[Tuple[str, str, bool], HuggingFaceEmbeddings] = {}
+
+
+def get_embeddings(
+    model_name: str = "all-MiniLM-L6-v2",
+    device: str = "cpu",
+    normalize: bool = True,
+) -> HuggingFaceEmbeddings:
+    """
+    Return the shared embeddings for a model, loading it on first use.
+
+    Args:
+        model_name: HuggingFace sentence-transformers model
+        device: Torch device
+        normalize: Whether vectors are L2-normalised
+
+    Raises:
+        Whatever HuggingFaceEmbeddings raises when the model cannot be loaded
+        (nothing is cached in that case, so a later call retries).
+    """
+    key = (model_name, device, normalize)
+    embeddings = _models.get(key)
+    if embeddings is not None:
+        return embeddings
+
+    with _lock:
+        embeddings = _models.get(key)
+        if embeddings is None:
+            print(f"[EMBEDDINGS] Loading {model_name} ({device})")
+            embeddings = HuggingFaceEmbeddings(
+                model_name=model_name,
+                model_kwargs={"device": device},
+                encode_kwargs={"normalize_embeddings": normalize},
+            )
+            _models[key] = embeddings
+    return embeddings
+
+
+def loaded_models() -> List[str]:
+    """Names of the models currently held by this process."""
+    return [model_name for model_name, _, _ in _models]
@@ -9,17 +9,43 @@ Example:
         --collection knowledge_base \
         --table knowledge_chunks_malaysia \
         --output knowledge_base/exports/knowledge_chunks_malaysia.sql
+
+Formats (--format):
+    insert       INSERT statements, --rows-per-statement rows each (default)
+    copy         psql script using COPY ... FROM STDIN (text format)
+    copy-binary  Postgres binary COPY file; load with
+                 \\copy <table> (content, metadata, embedding[, country]) FROM '<file>' WITH (FORMAT binary)
+    parquet      Parquet file of content/metadata/embedding (requires pyarrow)
+    npz          NumPy archive with a float32 embedding matrix for in-process backends
+
+Pages are streamed from Chroma (--page-size) so the SQL/COPY exports never hold
+the whole collection in memory. Pass --compare to write every format into the
+output directory and print a size / write-time table.
 """
 from __future__ import annotations
 
 import argparse
 import json
+import struct
+import time
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import List
+from typing import Any, Dict, Iterator, List
 
 import chromadb
 
+FORMAT_SUFFIXES = {
+    "insert": ".sql",
+    "copy": ".copy.sql",
+    "copy-binary": ".bin",
+    "parquet": ".parquet",
+    "npz": ".npz",
+}
+
+# Postgres binary COPY framing: signature, flags, header extension length.
+PGCOPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack("!ii", 0, 0)
+PGCOPY_TRAILER = struct.pack("!h", -1)
+
 
 def format_sql_literal(value: str) -> str:
     """Escape single quotes for SQL literal usage."""
@@ -36,83 +62,355 @@ def format_embedding(values: List[float]) -> str:
     return f"'[{numbers}]'::vector"
 
 
-def export_to_sql(
+def format_copy_text(value: str) -> str:
+    """Escape a value for COPY text format (backslash, tab, newline, carriage return)."""
+    return (
+        value.replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def iter_rows(
     chroma_path: str,
     collection_name: str,
-    table: str,
-    output: Path,
-    country: str | None = None,
-) -> None:
+    page_size: int,
+) -> Iterator[tuple]:
+    """Yield (id, document, metadata, embedding) one Chroma page at a time."""
     client = chromadb.PersistentClient(path=chroma_path)
     collection = client.get_collection(name=collection_name)
-    count = collection.count()
+    total = collection.count()
 
-    if count == 0:
+    if total == 0:
         raise SystemExit(f"[ERROR] Collection '{collection_name}' at '{chroma_path}' is empty.")
 
-    data = collection.get(include=["documents", "metadatas", "embeddings"])
-    rows = list(
-        zip(data["documents"], data["metadatas"], data["embeddings"])
-    )
+    offset = 0
+    while offset < total:
+        page = collection.get(
+            include=["documents", "metadatas", "embeddings"],
+            limit=page_size,
+            offset=offset,
+        )
+        fetched = len(page["ids"])
+        if fetched == 0:
+            break
+        for row in zip(page["ids"], page["documents"], page["metadatas"], page["embeddings"]):
+            if row[1] is not None:
+                yield row
+        offset += fetched
 
-    output.parent.mkdir(parents=True, exist_ok=True)
+
+def _columns(country: str | None) -> List[str]:
+    columns = ["content", "metadata", "embedding"]
+    if country:
+        columns.append("country")
+    return columns
+
+
+def _write_header(fh, collection_name: str, chroma_path: str) -> None:
     timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S %Z")
+    fh.write(f"-- Auto-generated on {timestamp}\n")
+    fh.write(f"-- Source collection: {collection_name} (from {chroma_path})\n\n")
 
+
+def write_inserts(
+    rows: Iterator[tuple],
+    output: Path,
+    table: str,
+    country: str | None,
+    rows_per_statement: int,
+    source: Dict[str, str],
+) -> int:
+    """Write multi-row INSERT statements; rows_per_statement=1 matches the legacy layout."""
+    columns_sql = ", ".join(_columns(country))
+    written = 0
+    pending: List[str] = []
+
+    def flush(fh) -> None:
+        if pending:
+            fh.write(f"INSERT INTO {table} ({columns_sql})\nVALUES\n" + ",\n".join(pending) + ";\n\n")
+            pending.clear()
+
+    with output.open("w", encoding="utf-8") as fh:
+        _write_header(fh, source["collection"], source["chroma_path"])
+        fh.write("BEGIN;\n\n")
+        for _, doc, metadata, embedding in rows:
+            values = [format_sql_literal(doc), format_metadata(metadata), format_embedding(embedding)]
+            if country:
+                values.append(format_sql_literal(country.lower()))
+            pending.append("(\n  " + ",\n  ".join(values) + "\n)")
+            written += 1
+            if len(pending) >= rows_per_statement:
+                flush(fh)
+        flush(fh)
+        fh.write("COMMIT;\n")
+    return written
+
+
+def write_copy_text(
+    rows: Iterator[tuple],
+    output: Path,
+    table: str,
+    country: str | None,
+    source: Dict[str, str],
+) -> int:
+    """Write a psql script that loads rows with a single COPY ... FROM STDIN."""
+    written = 0
     with output.open("w", encoding="utf-8") as fh:
-        fh.write(f"-- Auto-generated on {timestamp}\n")
-        fh.write(f"-- Source collection: {collection_name} (from {chroma_path})\n")
-        fh.write(f"-- Total chunks: {len(rows)}\n\n")
+        _write_header(fh, source["collection"], source["chroma_path"])
         fh.write("BEGIN;\n\n")
+        fh.write(f"COPY {table} ({', '.join(_columns(country))}) FROM STDIN;\n")
+        for _, doc, metadata, embedding in rows:
+            fields = [
+                format_copy_text(doc),
+                format_copy_text(json.dumps(metadata or {}, ensure_ascii=False)),
+                "[" + ",".join(f"{float(v):.6f}" for v in embedding) + "]",
+            ]
+            if country:
+                fields.append(format_copy_text(country.lower()))
+            fh.write("\t".join(fields) + "\n")
+            written += 1
+        fh.write("\\.\n\nCOMMIT;\n")
+    return written
 
-        for idx, (doc, metadata, embedding) in enumerate(rows, start=1):
-            if doc is None:
-                continue
 
-            content_sql = format_sql_literal(doc)
-            metadata_sql = format_metadata(metadata)
-            embedding_sql = format_embedding(embedding)
+def _binary_field(payload: bytes) -> bytes:
+    return struct.pack("!i", len(payload)) + payload
 
-            columns = ["content", "metadata", "embedding"]
-            values = [content_sql, metadata_sql, embedding_sql]
 
-            if country:
-                columns.append("country")
-                values.append(format_sql_literal(country.lower()))
+def write_copy_binary(rows: Iterator[tuple], output: Path, country: str | None) -> int:
+    """Write a binary COPY file (text, jsonb, pgvector[, text]) with full float4 precision."""
+    field_count = len(_columns(country))
+    country_field = _binary_field(country.lower().encode("utf-8")) if country else b""
+    written = 0
+    with output.open("wb") as fh:
+        fh.write(PGCOPY_HEADER)
+        for _, doc, metadata, embedding in rows:
+            values = [float(v) for v in embedding]
+            # pgvector binary layout: int16 dimensions, int16 unused, float4 values.
+            vector = struct.pack(f"!hh{len(values)}f", len(values), 0, *values)
+            # jsonb binary layout: version byte (1) followed by the JSON text.
+            jsonb = b"\x01" + json.dumps(metadata or {}, ensure_ascii=False).encode("utf-8")
+            fh.write(struct.pack("!h", field_count))
+            fh.write(_binary_field(doc.encode("utf-8")))
+            fh.write(_binary_field(jsonb))
+            fh.write(_binary_field(vector))
+            fh.write(country_field)
+            written += 1
+        fh.write(PGCOPY_TRAILER)
+    return written
 
-            columns_sql = ", ".join(columns)
-            values_sql = ",\n  ".join(values)
 
-            fh.write(
-                f"INSERT INTO {table} ({columns_sql})\n"
-                f"VALUES (\n  {values_sql}\n);\n\n"
-            )
+def write_parquet(rows: Iterator[tuple], output: Path, page_size: int) -> int:
+    """Write a Parquet file, one row group per page."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as exc:
+        raise SystemExit("[ERROR] Parquet export requires pyarrow (pip install pyarrow).") from exc
 
-        fh.write("COMMIT;\n")
+    schema = pa.schema(
+        [
+            ("id", pa.string()),
+            ("content", pa.string()),
+            ("metadata", pa.string()),
+            ("embedding", pa.list_(pa.float32())),
+        ]
+    )
+    written = 0
+    batch: Dict[str, List[Any]] = {name: [] for name in schema.names}
 
-    print(f"[SUCCESS] Wrote {len(rows)} INSERT statements to {output}")
+    with pq.ParquetWriter(str(output), schema, compression="zstd") as writer:
+        for chroma_id, doc, metadata, embedding in rows:
+            batch["id"].append(chroma_id)
+            batch["content"].append(doc)
+            batch["metadata"].append(json.dumps(metadata or {}, ensure_ascii=False))
+            batch["embedding"].append([float(v) for v in embedding])
+            written += 1
+            if len(batch["id"]) >= page_size:
+                writer.write_table(pa.Table.from_pydict(batch, schema=schema))
+                batch = {name: [] for name in schema.names}
+        if batch["id"]:
+            writer.write_table(pa.Table.from_pydict(batch, schema=schema))
+    return written
+
+
+def write_npz(rows: Iterator[tuple], output: Path) -> int:
+    """Write ids/documents/metadata plus an (n, dim) float32 embedding matrix."""
+    import numpy as np
+
+    ids: List[str] = []
+    documents: List[str] = []
+    metadatas: List[str] = []
+    vectors: List[Any] = []
+    for chroma_id, doc, metadata, embedding in rows:
+        ids.append(chroma_id)
+        documents.append(doc)
+        metadatas.append(json.dumps(metadata or {}, ensure_ascii=False))
+        vectors.append(np.asarray(embedding, dtype=np.float32))
+
+    np.savez_compressed(
+        output,
+        ids=np.array(ids, dtype=str),
+        documents=np.array(documents, dtype=str),
+        metadatas=np.array(metadatas, dtype=str),
+        embeddings=np.vstack(vectors) if vectors else np.zeros((0, 0), dtype=np.float32),
+    )
+    return len(ids)
+
+
+def export_collection(
+    chroma_path: str,
+    collection_name: str,
+    table: str,
+    output: Path,
+    *,
+    export_format: str = "insert",
+    country: str | None = None,
+    page_size: int = 500,
+    rows_per_statement: int = 1,
+) -> Dict[str, Any]:
+    """Export the collection in one format and return size/timing stats."""
+    output.parent.mkdir(parents=True, exist_ok=True)
+    rows = iter_rows(chroma_path, collection_name, page_size)
+    source = {"collection": collection_name, "chroma_path": chroma_path}
+
+    started = time.perf_counter()
+    if export_format == "insert":
+        written = write_inserts(rows, output, table, country, max(rows_per_statement, 1), source)
+    elif export_format == "copy":
+        written = write_copy_text(rows, output, table, country, source)
+    elif export_format == "copy-binary":
+        written = write_copy_binary(rows, output, country)
+    elif export_format == "parquet":
+        written = write_parquet(rows, output, page_size)
+    elif export_format == "npz":
+        written = write_npz(rows, output)
+    else:
+        raise SystemExit(f"[ERROR] Unknown export format: {export_format}")
+    elapsed = time.perf_counter() - started
+
+    return {
+        "format": export_format,
+        "output": output,
+        "rows": written,
+        "bytes": output.stat().st_size,
+        "seconds": elapsed,
+    }
+
+
+def export_to_sql(
+    chroma_path: str,
+    collection_name: str,
+    table: str,
+    output: Path,
+    country: str | None = None,
+) -> None:
+    """Legacy entry point: one INSERT statement per chunk."""
+    stats = export_collection(chroma_path, collection_name, table, output, country=country)
+    print(f"[SUCCESS] Wrote {stats['rows']} INSERT statements to {output}")
+
+
+def print_comparison(results: List[Dict[str, Any]], table: str, country: str | None = None) -> None:
+    """Print sizes/write times and the psql commands for timing each load."""
+    baseline = next((r for r in results if r["format"] == "insert"), results[0])
+    print("=" * 70)
+    print(f"{'format':<14}{'rows':>8}{'size':>14}{'vs insert':>12}{'write s':>10}")
+    print("-" * 70)
+    for result in results:
+        ratio = result["bytes"] / baseline["bytes"] if baseline["bytes"] else 0.0
+        print(
+            f"{result['format']:<14}{result['rows']:>8}{result['bytes'] / 1024:>11.1f} KB"
+            f"{ratio:>11.2f}x{result['seconds']:>10.2f}"
+        )
+    print("=" * 70)
+    # Load times depend on the target database, so they are measured by hand with \timing.
+    print("Load into Postgres and compare with \\timing in psql:")
+    for result in results:
+        if result["format"] in {"insert", "copy"}:
+            print(f"  psql \"$DATABASE_URL\" -f {result['output']}")
+        elif result["format"] == "copy-binary":
+            print(
+                f"  psql \"$DATABASE_URL\" -c \"\\copy {table} ({', '.join(_columns(country))}) "
+                f"FROM '{result['output']}' WITH (FORMAT binary)\""
+            )
 
 
 def parse_args() -> argparse.Namespace:
-    parser = argparse.ArgumentParser(description="Export Chroma collection to SQL inserts.")
+    parser = argparse.ArgumentParser(description="Export Chroma collection to SQL / COPY / Parquet / NumPy.")
     parser.add_argument("--chroma-path", default="knowledge_base/chroma_db", help="Path to Chroma DB directory")
     parser.add_argument("--collection", default="knowledge_base", help="Chroma collection name")
     parser.add_argument("--table", default="knowledge_chunks_malaysia", help="Target Supabase table name")
     parser.add_argument(
         "--output",
         default="knowledge_base/exports/knowledge_chunks_malaysia.sql",
-        help="Path to write the SQL file",
+        help="Path to write the export (with --compare, files are written next to it)",
     )
     parser.add_argument(
         "--country",
         default=None,
-        help="Optional country literal to include in each INSERT (stored lowercase)",
+        help="Optional country literal to include in each row (stored lowercase)",
+    )
+    parser.add_argument(
+        "--format",
+        default="insert",
+        choices=sorted(FORMAT_SUFFIXES),
+        help="Export format (default: insert)",
+    )
+    parser.add_argument(
+        "--rows-per-statement",
+        type=int,
+        default=1,
+        help="Rows per INSERT statement for --format insert",
+    )
+    parser.add_argument("--page-size", type=int, default=500, help="Rows fetched from Chroma per page")
+    parser.add_argument(
+        "--compare",
+        action="store_true",
+        help="Write every available format and print a size / write-time comparison",
     )
     return parser.parse_args()
 
 
 def main():
     args = parse_args()
-    export_to_sql(args.chroma_path, args.collection, args.table, Path(args.output), args.country)
+    output = Path(args.output)
+
+    if not args.compare:
+        stats = export_collection(
+            args.chroma_path,
+            args.collection,
+            args.table,
+            output,
+            export_format=args.format,
+            country=args.country,
+            page_size=args.page_size,
+            rows_per_statement=args.rows_per_statement,
+        )
+        print(f"[SUCCESS] Wrote {stats['rows']} rows ({args.format}) to {output}")
+        return
+
+    stem = output.with_suffix("")
+    results = []
+    for export_format, suffix in FORMAT_SUFFIXES.items():
+        target = stem.with_name(stem.name + suffix)
+        try:
+            results.append(
+                export_collection(
+                    args.chroma_path,
+                    args.collection,
+                    args.table,
+                    target,
+                    export_format=export_format,
+                    country=args.country,
+                    page_size=args.page_size,
+                    rows_per_statement=args.rows_per_statement,
+                )
+            )
+        except SystemExit as exc:
+            print(f"[WARN] Skipping {export_format}: {exc}")
+    print_comparison(results, args.table, args.country)
 
 
 if __name__ == "__main__":
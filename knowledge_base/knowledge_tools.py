@@ -6,6 +6,7 @@ These tools allow the AI agent to search PDF documents.
 import json
 import os
 import sys
+from contextvars import ContextVar
 from pathlib import Path
 
 from langchain.tools import tool
@@ -15,6 +16,11 @@ sys.path.insert(0, str(Path(__file__).parent))
 
 _BOOL_TRUE = {"1", "true", "yes", "on"}
 
+
+def _to_json(payload) -> str:
+    """Compact JSON for tool output; it is fed back to the LLM, so whitespace costs tokens."""
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False)
+
 raw_disable = os.getenv("DISABLE_KNOWLEDGE_BASE", "")
 resolved_source = (os.getenv("KNOWLEDGE_BASE_SOURCE") or "disabled").strip().lower()
 
@@ -66,6 +72,85 @@ else:
     if kb_store is None:
         print("[KNOWLEDGE_TOOLS] ⚠️  Knowledge base unavailable; tools will return friendly errors.")
 
+# Local Chroma copy used while the Supabase knowledge base is failing
+# (KNOWLEDGE_BASE_FALLBACK=local; needs a populated chroma_db directory)
+fallback_store = None
+FALLBACK_NOTE = (
+    "The live knowledge base is temporarily unavailable; these results come from an "
+    "offline copy and may not include the latest policy updates."
+)
+
+if (
+    type(kb_store).__name__ == "SupabaseKnowledgeStore"
+    and (os.getenv("KNOWLEDGE_BASE_FALLBACK") or "").strip().lower() == "local"
+):
+    chroma_path = Path("chroma_db")
+    if chroma_path.exists() and any(chroma_path.iterdir()):
+        fallback_store = _init_local_store()
+    else:
+        print("[KNOWLEDGE_TOOLS] ⚠️  KNOWLEDGE_BASE_FALLBACK=local but chroma_db is empty; no fallback")
+
+# Re-rank with maximal marginal relevance so the top results are not near-copies
+USE_MMR = (os.getenv("KNOWLEDGE_BASE_MMR", "1").strip().lower() in _BOOL_TRUE)
+MMR_FETCH_K = int(os.getenv("KNOWLEDGE_BASE_MMR_FETCH_K", "12"))
+MMR_LAMBDA = float(os.getenv("KNOWLEDGE_BASE_MMR_LAMBDA", "0.5"))
+
+
+def knowledge_base_version() -> str:
+    """
+    Version of the knowledge base content, for caches built on top of it.
+    KNOWLEDGE_BASE_VERSION overrides it (bump after editing chunks in place).
+    """
+    explicit = os.getenv("KNOWLEDGE_BASE_VERSION")
+    if explicit:
+        return explicit
+    if not kb_store:
+        return "disabled"
+    try:
+        return kb_store.content_version()
+    except Exception as exc:
+        print(f"[KNOWLEDGE_TOOLS] ⚠️  Could not read knowledge base version: {exc}")
+        return "unknown"
+
+
+def _search_store(store, query: str, k: int, filter_dict: dict = None):
+    """Search one store, diversifying results when the backend supports MMR."""
+    if USE_MMR and hasattr(store, "search_mmr"):
+        return store.search_mmr(
+            query,
+            k=k,
+            fetch_k=MMR_FETCH_K,
+            lambda_mult=MMR_LAMBDA,
+            filter_dict=filter_dict,
+        )
+    return store.search(query, k=k, filter_dict=filter_dict)
+
+
+# Set when a search in the current context was served by fallback_store
+_used_fallback: ContextVar[bool] = ContextVar("kb_used_fallback", default=False)
+
+
+def _search(query: str, k: int = 3, filter_dict: dict = None):
+    """Search the active store, falling back to the local copy if it fails."""
+    try:
+        return _search_store(kb_store, query, k, filter_dict)
+    except Exception as exc:
+        if fallback_store is None:
+            raise
+        print(f"[KNOWLEDGE_TOOLS] ⚠️  Primary knowledge base failed ({exc}); using local fallback")
+        results = _search_store(fallback_store, query, k, filter_dict)
+        # Only flag results the fallback actually served
+        _used_fallback.set(True)
+        return results
+
+
+def _with_freshness(payload: dict) -> dict:
+    """Flag results served by the fallback store (and reset the flag for the next call)."""
+    if _used_fallback.get():
+        _used_fallback.set(False)
+        payload["data_freshness"] = FALLBACK_NOTE
+    return payload
+
 
 @tool
 def search_knowledge_base(query: str) -> str:
@@ -84,14 +169,14 @@ def search_knowledge_base(query: str) -> str:
         JSON string with search results from knowledge base documents
     """
     if not kb_store:
-        return json.dumps({"error": "Knowledge base not initialized"})
+        return _to_json({"error": "Knowledge base not initialized"})
     
     try:
         # Search for relevant documents
-        results = kb_store.search(query, k=3)
+        results = _search(query, k=3)
         
         if not results:
-            return json.dumps({
+            return _to_json({
                 "message": "I couldn't find specific information about that in our resources. For detailed information, please contact AIA at 1300 8888 60/70 or reach out to my-hrops@deriv.com.",
                 "results": []
             })
@@ -99,20 +184,26 @@ def search_knowledge_base(query: str) -> str:
         # Format results
         formatted_results = []
         for doc in results:
-            formatted_results.append({
+            result = {
                 "source": doc.metadata.get("source_file", "unknown"),
                 "category": doc.metadata.get("category", "unknown"),
+                "section": doc.metadata.get("section_path", ""),
                 "content": doc.page_content[:500]  # Limit content length
-            })
+            }
+            # PDF chunks carry their page range so answers can cite it
+            if doc.metadata.get("page_start"):
+                start, end = doc.metadata["page_start"], doc.metadata.get("page_end")
+                result["pages"] = f"{start}-{end}" if end and end != start else str(start)
+            formatted_results.append(result)
         
-        return json.dumps({
+        return _to_json(_with_freshness({
             "query": query,
             "total_results": len(results),
             "results": formatted_results
-        }, indent=2)
+        }))
         
     except Exception as e:
-        return json.dumps({"error": str(e)})
+        return _to_json({"error": str(e)})
 
 
 @tool
@@ -128,11 +219,11 @@ def get_claim_submission_guide() -> str:
         JSON string with claim submission procedures from knowledge base
     """
     if not kb_store:
-        return json.dumps({"error": "Knowledge base not initialized"})
+        return _to_json({"error": "Knowledge base not initialized"})
     
     try:
         # Search specifically for claim submission information
-        results = kb_store.search(
+        results = _search(
             "claim submission procedure requirements form",
             k=3,
             filter_dict={"category": "claim_forms"}
@@ -140,10 +231,10 @@ def get_claim_submission_guide() -> str:
         
         if not results:
             # Fallback to general search
-            results = kb_store.search("how to submit claim", k=3)
+            results = _search("how to submit claim", k=3)
         
         if not results:
-            return json.dumps({
+            return _to_json({
                 "message": "I couldn't find specific claim submission details in our resources. Please contact my-hrops@deriv.com for assistance with claim submissions.",
                 "results": []
             })
@@ -153,17 +244,18 @@ def get_claim_submission_guide() -> str:
         for doc in results:
             formatted_results.append({
                 "source": doc.metadata.get("source_file", "unknown"),
+                "section": doc.metadata.get("section_path", ""),
                 "content": doc.page_content
             })
         
-        return json.dumps({
+        return _to_json(_with_freshness({
             "guide_type": "claim_submission",
             "total_sections": len(results),
             "results": formatted_results
-        }, indent=2)
+        }))
         
     except Exception as e:
-        return json.dumps({"error": str(e)})
+        return _to_json({"error": str(e)})
 
 
 @tool
@@ -183,13 +275,13 @@ def get_benefits_information(benefit_type: str = "all") -> str:
         JSON string with general benefits information from knowledge base
     """
     if not kb_store:
-        return json.dumps({"error": "Knowledge base not initialized"})
+        return _to_json({"error": "Knowledge base not initialized"})
     
     try:
         # Search for benefits information
         query = f"{benefit_type} benefits coverage eligibility" if benefit_type != "all" else "health benefits coverage"
         
-        results = kb_store.search(
+        results = _search(
             query,
             k=3,
             filter_dict={"category": "benefits_guide"}
@@ -197,10 +289,10 @@ def get_benefits_information(benefit_type: str = "all") -> str:
         
         if not results:
             # Fallback to general search
-            results = kb_store.search(query, k=3)
+            results = _search(query, k=3)
         
         if not results:
-            return json.dumps({
+            return _to_json({
                 "message": f"I couldn't find specific information about {benefit_type} benefits in our resources. For detailed information, please contact AIA at 1300 8888 60/70 or my-hrops@deriv.com.",
                 "results": []
             })
@@ -210,17 +302,18 @@ def get_benefits_information(benefit_type: str = "all") -> str:
         for doc in results:
             formatted_results.append({
                 "source": doc.metadata.get("source_file", "unknown"),
+                "section": doc.metadata.get("section_path", ""),
                 "content": doc.page_content
             })
         
-        return json.dumps({
+        return _to_json(_with_freshness({
             "benefit_type": benefit_type,
             "total_sections": len(results),
             "results": formatted_results
-        }, indent=2)
+        }))
         
     except Exception as e:
-        return json.dumps({"error": str(e)})
+        return _to_json({"error": str(e)})
 
 
 # Export all tools
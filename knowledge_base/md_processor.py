@@ -2,29 +2,48 @@
 """
 Markdown text extraction and chunking for knowledge base.
 Converts MD documents into chunks suitable for vector embeddings.
+
+Chunks follow the heading tree: each section (heading + body) becomes a chunk,
+small sibling sections are packed together, tables/lists/code blocks are never
+split mid-block, and the heading path is stored in the chunk metadata. Only
+sections larger than chunk_size fall back to character splitting.
 """
+import re
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Optional
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
 
+HEADING_PATTERN = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+FENCE_PATTERN = re.compile(r"^\s*(```|~~~)")
+LIST_ITEM_PATTERN = re.compile(r"^\s*([-*+]|\d+[.)])\s+")
+SECTION_SEPARATOR = " > "
+
 class MarkdownProcessor:
     """Process Markdown files into chunks for embedding."""
     
     def __init__(
         self,
         chunk_size: int = 1000,
-        chunk_overlap: int = 200
+        chunk_overlap: int = 200,
+        structure_aware: bool = True,
+        merge_depth: int = 2
     ):
         """
         Initialize Markdown processor.
         
         Args:
             chunk_size: Characters per chunk
-            chunk_overlap: Overlap between chunks for context continuity
+            chunk_overlap: Overlap used only when an oversized block is character-split
+            structure_aware: Split on the heading tree (False restores plain character splitting)
+            merge_depth: Small consecutive sections are packed together only while they
+                share the same first `merge_depth` headings (2 = same "##" section);
+                fragments under chunk_size // 4 may join a neighbouring branch
         """
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
+        self.structure_aware = structure_aware
+        self.merge_depth = merge_depth
         
         self.splitter = RecursiveCharacterTextSplitter(
             chunk_size=chunk_size,
@@ -54,8 +73,8 @@ class MarkdownProcessor:
         with open(path, 'r', encoding='utf-8') as f:
             text = f.read()
         
-        # Count sections (lines starting with #)
-        sections = [line for line in text.split('\n') if line.strip().startswith('#')]
+        # Count sections (heading lines outside code fences)
+        sections = [section for section in self.split_sections(text) if section["title"]]
         
         print(f"[MD_PROCESSOR] Extracted {len(sections)} sections, {len(text)} characters")
         
@@ -66,6 +85,169 @@ class MarkdownProcessor:
             "full_text": text
         }
     
+    def split_sections(self, text: str) -> List[Dict]:
+        """
+        Split Markdown into sections along the heading tree.
+        
+        Args:
+            text: Full Markdown text
+            
+        Returns:
+            List of dicts with heading path, title, level and section text
+            (the heading line included), in document order
+        """
+        sections: List[Dict] = []
+        stack: List[tuple] = []
+        current = {"path": [], "title": "", "level": 0, "lines": []}
+        in_fence = False
+        
+        for line in text.split('\n'):
+            if FENCE_PATTERN.match(line):
+                in_fence = not in_fence
+            match = None if in_fence else HEADING_PATTERN.match(line)
+            
+            if match:
+                if "".join(current["lines"]).strip():
+                    sections.append(current)
+                level = len(match.group(1))
+                title = match.group(2).strip()
+                while stack and stack[-1][0] >= level:
+                    stack.pop()
+                stack.append((level, title))
+                current = {
+                    "path": [t for _, t in stack],
+                    "title": title,
+                    "level": level,
+                    "lines": [],
+                }
+            current["lines"].append(line)
+        
+        if "".join(current["lines"]).strip():
+            sections.append(current)
+        
+        for section in sections:
+            section["text"] = "\n".join(section.pop("lines")).strip()
+        return sections
+    
+    @staticmethod
+    def split_blocks(text: str) -> List[str]:
+        """
+        Split section text into blank-line separated blocks.
+        Code fences stay whole even when they contain blank lines, and list items
+        separated by blank lines are kept in the same block.
+        """
+        blocks: List[str] = []
+        current: List[str] = []
+        in_fence = False
+        
+        for line in text.split('\n'):
+            if FENCE_PATTERN.match(line):
+                in_fence = not in_fence
+            if not line.strip() and not in_fence:
+                if current:
+                    blocks.append("\n".join(current))
+                    current = []
+                continue
+            if (
+                not current
+                and blocks
+                and LIST_ITEM_PATTERN.match(line)
+                and LIST_ITEM_PATTERN.match(blocks[-1].split('\n')[-1])
+            ):
+                # Continue a loose list instead of starting a new block
+                current = blocks.pop().split('\n') + [""]
+            current.append(line)
+        
+        if current:
+            blocks.append("\n".join(current))
+        return blocks
+    
+    @staticmethod
+    def _is_structured_block(block: str) -> bool:
+        """Tables, lists and code fences should not be cut mid-block."""
+        first = block.lstrip().split('\n', 1)[0]
+        return first.startswith('|') or bool(LIST_ITEM_PATTERN.match(first)) or bool(FENCE_PATTERN.match(first))
+    
+    def _split_oversized(self, section: Dict) -> List[str]:
+        """Pack an oversized section's blocks into chunk_size pieces."""
+        heading = f"{'#' * section['level']} {section['title']} (continued)" if section["title"] else ""
+        # Leave room for the continuation heading so pieces stay within chunk_size
+        budget = self.chunk_size - len(heading) - 2 if heading else self.chunk_size
+        budget = max(budget, self.chunk_size // 2)
+        splitter = self.splitter if budget == self.chunk_size else RecursiveCharacterTextSplitter(
+            chunk_size=budget,
+            chunk_overlap=min(self.chunk_overlap, budget // 2),
+            length_function=len,
+            separators=["\n\n", "\n", " ", ""]
+        )
+        blocks = self.split_blocks(section["text"])
+        # The section's own heading line is never a piece on its own
+        title_block = blocks[0] if section["title"] and blocks else None
+        pieces: List[str] = []
+        current = ""
+        
+        for block in blocks:
+            if len(block) > budget and not (
+                self._is_structured_block(block) and len(block) <= 2 * self.chunk_size
+            ):
+                # Character fallback for prose (or structures too large to keep whole)
+                parts = splitter.split_text(block)
+            else:
+                parts = [block]
+            
+            for index, part in enumerate(parts):
+                candidate = f"{current}\n\n{part}" if current else part
+                # Split parts overlap the one before them: packed together they would repeat text
+                if current and current != title_block and (len(candidate) > self.chunk_size or index > 0):
+                    pieces.append(current)
+                    current = f"{heading}\n\n{part}" if heading else part
+                else:
+                    current = candidate
+        
+        if current:
+            pieces.append(current)
+        return pieces
+    
+    def _chunk_by_structure(self, text: str) -> List[Dict]:
+        """Turn the heading tree into chunk payloads with section metadata."""
+        payloads: List[Dict] = []
+        pending: Optional[Dict] = None
+        
+        def flush():
+            if pending:
+                payloads.append(pending)
+        
+        for section in self.split_sections(text):
+            if len(section["text"]) > self.chunk_size:
+                flush()
+                pending = None
+                for piece in self._split_oversized(section):
+                    payloads.append({"text": piece, "path": section["path"], "level": section["level"]})
+                continue
+            
+            if pending is not None:
+                same_branch = pending["path"][:self.merge_depth] == section["path"][:self.merge_depth]
+                # Fragments (title blocks, one-line sections) join a neighbour even across branches
+                fragment = min(len(pending["text"]), len(section["text"])) < self.chunk_size // 4
+                combined = f"{pending['text']}\n\n{section['text']}"
+                if (same_branch or fragment) and len(combined) <= self.chunk_size:
+                    common = []
+                    for left, right in zip(pending["path"], section["path"]):
+                        if left != right:
+                            break
+                        common.append(left)
+                    pending = {
+                        "text": combined,
+                        "path": common,
+                        "level": min(pending["level"], section["level"]),
+                    }
+                    continue
+                flush()
+            pending = {"text": section["text"], "path": section["path"], "level": section["level"]}
+        
+        flush()
+        return payloads
+    
     def chunk_text(
         self,
         text: str,
@@ -83,11 +265,18 @@ class MarkdownProcessor:
         """
         print(f"[MD_PROCESSOR] Chunking text: {len(text)} characters")
         
-        # Create initial document
-        doc = Document(page_content=text, metadata=metadata)
-        
-        # Split into chunks
-        chunks = self.splitter.split_documents([doc])
+        if self.structure_aware:
+            chunks = []
+            for payload in self._chunk_by_structure(text):
+                chunk_metadata = dict(metadata)
+                chunk_metadata["section_path"] = SECTION_SEPARATOR.join(payload["path"])
+                chunk_metadata["section_title"] = payload["path"][-1] if payload["path"] else ""
+                chunk_metadata["heading_level"] = payload["level"]
+                chunks.append(Document(page_content=payload["text"], metadata=chunk_metadata))
+        else:
+            # Create initial document and split into overlapping character chunks
+            doc = Document(page_content=text, metadata=metadata)
+            chunks = self.splitter.split_documents([doc])
         
         # Add chunk index to metadata
         for i, chunk in enumerate(chunks):
@@ -8,18 +8,30 @@ Example:
         --chroma-path chroma_db \\
         --collection knowledge_base \\
         --table knowledge_chunks_malaysia \\
-        --country Malaysia
+        --country Malaysia \\
+        --workers 4 \\
+        --checkpoint knowledge_base/exports/migration.checkpoint.jsonl
+
+Rows are streamed page by page from Chroma through a bounded queue to a pool of
+uploader threads, so memory stays flat regardless of collection size. Re-running
+with the same --checkpoint (and the same batch sizes) skips batches that were
+already inserted.
 """
 from __future__ import annotations
 
 import argparse
+import json
 import os
+import queue
 import sys
+import threading
+import time
 from pathlib import Path
-from typing import Dict, Iterable, List
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
 import chromadb
 import requests
+from requests.adapters import HTTPAdapter
 try:
     from dotenv import load_dotenv
 except ImportError:  # pragma: no cover
@@ -42,12 +54,6 @@ def get_env_var(name: str) -> str:
     return value
 
 
-def batched(sequence: List[Dict], size: int) -> Iterable[List[Dict]]:
-    """Yield fixed-size batches from a list."""
-    for idx in range(0, len(sequence), size):
-        yield sequence[idx : idx + size]
-
-
 def normalize_country(value: str | None, default_country: str) -> str:
     """Lowercase and sanitize the country value for consistent filtering."""
     if value:
@@ -67,21 +73,23 @@ def normalize_metadata(meta: Dict | None, chroma_id: str, country: str) -> Dict:
     return meta
 
 
-def load_from_chroma(path: str, collection_name: str, batch_size: int) -> Dict[str, List]:
-    """Stream all entries from the Chroma collection."""
+def iter_chroma_pages(
+    path: str,
+    collection_name: str,
+    batch_size: int,
+) -> Iterator[Tuple[int, Dict[str, List]]]:
+    """Yield (offset, page) tuples from the Chroma collection one page at a time."""
     client = chromadb.PersistentClient(path=path)
     collection = client.get_collection(name=collection_name)
     total = collection.count()
 
     if total == 0:
         print(f"[WARN] Collection '{collection_name}' at '{path}' has no documents.")
-        return {"ids": [], "documents": [], "metadatas": [], "embeddings": []}
+        return
 
     print(f"[INFO] Found {total} documents in '{collection_name}' (path: {path}).")
 
-    aggregated = {"ids": [], "documents": [], "metadatas": [], "embeddings": []}
     offset = 0
-
     while offset < total:
         chunk = collection.get(
             include=["documents", "metadatas", "embeddings"],
@@ -92,82 +100,271 @@ def load_from_chroma(path: str, collection_name: str, batch_size: int) -> Dict[s
         if fetched == 0:
             break
 
-        aggregated["ids"].extend(chunk["ids"])
-        aggregated["documents"].extend(chunk["documents"])
-        aggregated["metadatas"].extend(chunk["metadatas"])
-        aggregated["embeddings"].extend(chunk["embeddings"])
+        yield offset, chunk
 
         offset += fetched
         print(f"[INFO] Pulled {offset}/{total} records from Chroma...")
 
-    return aggregated
-
 
-def supabase_credentials() -> Dict[str, str]:
-    """Load Supabase URL and service key from env vars."""
-    return {
-        "url": get_env_var("SUPABASE_URL").rstrip("/"),
-        "service_key": get_env_var("SUPABASE_SERVICE_ROLE_KEY"),
-    }
+def to_float_list(embedding: Any) -> List[float]:
+    """Convert a Chroma embedding (NumPy array or list) into a JSON-friendly list."""
+    if hasattr(embedding, "tolist"):
+        return embedding.tolist()
+    return [float(x) for x in embedding]
 
 
-def prepare_rows(
-    dataset: Dict[str, List],
-    default_country: str,
-) -> List[Dict]:
-    """Convert Chroma payload into Supabase-ready rows."""
-    rows: List[Dict] = []
+def prepare_rows(page: Dict[str, List], default_country: str) -> Iterator[Dict]:
+    """Convert one Chroma page into Supabase-ready rows."""
     for chroma_id, doc, meta, embedding in zip(
-        dataset["ids"],
-        dataset["documents"],
-        dataset["metadatas"],
-        dataset["embeddings"],
+        page["ids"],
+        page["documents"],
+        page["metadatas"],
+        page["embeddings"],
     ):
-        normalized_meta = normalize_metadata(meta, chroma_id, default_country)
-
         if doc is None:
             continue
 
-        row = {
+        yield {
             "content": doc,
-            "metadata": normalized_meta,
-            "embedding": [float(x) for x in embedding],
+            "metadata": normalize_metadata(meta, chroma_id, default_country),
+            "embedding": to_float_list(embedding),
         }
-        rows.append(row)
-    return rows
-
-
-def insert_rows(creds: Dict[str, str], table: str, rows: List[Dict], batch_size: int) -> None:
-    """Insert rows into Supabase in batches."""
-    total = len(rows)
-    if total == 0:
-        print("[WARN] Nothing to insert. Exiting.")
-        return
-
-    rest_url = f"{creds['url']}/rest/v1/{table}"
-    headers = {
-        "apikey": creds["service_key"],
-        "Authorization": f"Bearer {creds['service_key']}",
-        "Content-Type": "application/json",
-        "Prefer": "return=minimal",
-    }
 
-    print(f"[INFO] Inserting {total} rows into '{table}' via {rest_url} ...")
-    inserted = 0
 
-    for batch in batched(rows, batch_size):
-        response = requests.post(rest_url, headers=headers, json=batch, timeout=60)
-        if response.status_code >= 400:
+def iter_batches(
+    pages: Iterable[Tuple[int, Dict[str, List]]],
+    default_country: str,
+    batch_size: int,
+    completed: Set[int],
+) -> Iterator[Tuple[int, List[Dict]]]:
+    """
+    Slice Chroma pages into insert batches keyed by their source offset.
+
+    The key is the offset of the batch's first record in the collection, so a
+    checkpoint written during one run identifies the same batch on the next.
+    """
+    for page_offset, page in pages:
+        size = len(page["ids"])
+        for start in range(0, size, batch_size):
+            batch_offset = page_offset + start
+            if batch_offset in completed:
+                continue
+            window = {
+                key: page[key][start : start + batch_size]
+                for key in ("ids", "documents", "metadatas", "embeddings")
+            }
+            rows = list(prepare_rows(window, default_country))
+            if rows:
+                yield batch_offset, rows
+
+
+class Checkpoint:
+    """
+    Append-only log of batch offsets that were inserted successfully.
+
+    The first line records the source the offsets belong to; every inserted
+    batch then appends one line, so marking a batch costs one short write
+    however many batches came before it.
+    """
+
+    def __init__(self, path: Optional[Path], source: str):
+        self.path = path
+        self.source = source
+        self.completed: Set[int] = set()
+        self._lock = threading.Lock()
+        self._log = None
+
+    def load(self) -> Set[int]:
+        if not self.path or not self.path.exists():
+            return set()
+        lines = self.path.read_text(encoding="utf-8").splitlines()
+        header = json.loads(lines[0]) if lines else {}
+        if header.get("source") != self.source:
             print(
-                f"[ERROR] Supabase insert failed with status {response.status_code}: {response.text}",
+                f"[ERROR] Checkpoint {self.path} was written for '{header.get('source')}', "
+                f"not '{self.source}'. Delete it or pass a different --checkpoint.",
                 file=sys.stderr,
             )
             sys.exit(1)
+        for line in lines[1:]:
+            try:
+                self.completed.add(json.loads(line)["offset"])
+            except (ValueError, KeyError, TypeError):
+                # A line cut short by an interrupted run: that batch is simply retried.
+                continue
+        return set(self.completed)
+
+    def mark(self, offset: int) -> None:
+        with self._lock:
+            self.completed.add(offset)
+            if not self.path:
+                return
+            if self._log is None:
+                last = b""
+                if self.path.exists() and self.path.stat().st_size:
+                    with self.path.open("rb") as existing:
+                        existing.seek(-1, os.SEEK_END)
+                        last = existing.read(1)
+                self._log = self.path.open("a", encoding="utf-8")
+                if not last:
+                    self._log.write(json.dumps({"source": self.source}) + "\n")
+                elif last != b"\n":
+                    # Start on a fresh line after one cut short by an interrupted run
+                    self._log.write("\n")
+            self._log.write(json.dumps({"offset": offset}) + "\n")
+            self._log.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+
+
+class MigrationStats:
+    """Thread-safe counters for the throughput report."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.rows = 0
+        self.batches = 0
+        self.retries = 0
+        self.failed: List[int] = []
+        self._lock = threading.Lock()
+
+    def record_success(self, rows: int) -> None:
+        with self._lock:
+            self.rows += rows
+            self.batches += 1
+
+    def record_retry(self) -> None:
+        with self._lock:
+            self.retries += 1
+
+    def record_failure(self, offset: int) -> None:
+        with self._lock:
+            self.failed.append(offset)
+
+    def report(self, table: str, skipped: int) -> None:
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        print("=" * 70)
+        print(f"[REPORT] Table:            {table}")
+        print(f"[REPORT] Rows inserted:    {self.rows}")
+        print(f"[REPORT] Batches inserted: {self.batches}")
+        print(f"[REPORT] Batches skipped:  {skipped} (already in checkpoint)")
+        print(f"[REPORT] Retries:          {self.retries}")
+        print(f"[REPORT] Failed batches:   {len(self.failed)}")
+        print(f"[REPORT] Elapsed:          {elapsed:.1f}s")
+        print(f"[REPORT] Throughput:       {self.rows / elapsed:.1f} rows/s")
+        print("=" * 70)
+
+
+def supabase_credentials() -> Dict[str, str]:
+    """Load Supabase URL and service key from env vars."""
+    return {
+        "url": get_env_var("SUPABASE_URL").rstrip("/"),
+        "service_key": get_env_var("SUPABASE_SERVICE_ROLE_KEY"),
+    }
 
-        inserted += len(batch)
-        print(f"[INFO] Inserted {inserted}/{total} rows into Supabase...")
 
-    print(f"[SUCCESS] Completed inserting {total} rows into '{table}'.")
+def build_session(creds: Dict[str, str], pool_size: int) -> requests.Session:
+    """Create a pooled HTTP session shared by all uploader workers."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update(
+        {
+            "apikey": creds["service_key"],
+            "Authorization": f"Bearer {creds['service_key']}",
+            "Content-Type": "application/json",
+            "Prefer": "return=minimal",
+        }
+    )
+    return session
+
+
+def post_batch(
+    session: requests.Session,
+    rest_url: str,
+    offset: int,
+    rows: List[Dict],
+    max_retries: int,
+    stats: MigrationStats,
+) -> bool:
+    """POST one batch, retrying transient failures with exponential backoff."""
+    for attempt in range(max_retries + 1):
+        try:
+            response = session.post(rest_url, json=rows, timeout=60)
+            if response.status_code < 400:
+                return True
+            # 4xx other than throttling means the payload itself is bad; retrying will not help.
+            retryable = response.status_code == 429 or response.status_code >= 500
+            error = f"status {response.status_code}: {response.text[:300]}"
+        except requests.RequestException as exc:
+            retryable = True
+            error = str(exc)
+
+        if not retryable or attempt == max_retries:
+            print(f"[ERROR] Batch at offset {offset} failed ({error})", file=sys.stderr)
+            return False
+
+        stats.record_retry()
+        delay = min(2 ** attempt, 30)
+        print(f"[WARN] Batch at offset {offset} failed ({error}); retrying in {delay}s...")
+        time.sleep(delay)
+    return False
+
+
+def insert_rows(
+    creds: Dict[str, str],
+    table: str,
+    batches: Iterable[Tuple[int, List[Dict]]],
+    *,
+    workers: int,
+    queue_size: int,
+    max_retries: int,
+    checkpoint: Checkpoint,
+    stats: MigrationStats,
+) -> None:
+    """Upload batches with a bounded queue feeding concurrent worker threads."""
+    rest_url = f"{creds['url']}/rest/v1/{table}"
+    session = build_session(creds, workers)
+    work: "queue.Queue[Optional[Tuple[int, List[Dict]]]]" = queue.Queue(maxsize=queue_size)
+
+    def worker() -> None:
+        while True:
+            item = work.get()
+            try:
+                if item is None:
+                    return
+                offset, rows = item
+                if post_batch(session, rest_url, offset, rows, max_retries, stats):
+                    checkpoint.mark(offset)
+                    stats.record_success(len(rows))
+                    print(f"[INFO] Inserted {stats.rows} rows into Supabase...")
+                else:
+                    stats.record_failure(offset)
+            except Exception as exc:
+                # A dead worker would leave work.put() blocked forever: report the batch and keep draining.
+                print(f"[ERROR] Batch at offset {offset} failed unexpectedly: {exc!r}", file=sys.stderr)
+                stats.record_failure(offset)
+            finally:
+                work.task_done()
+
+    print(f"[INFO] Inserting into '{table}' via {rest_url} with {workers} workers ...")
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+
+    # put() blocks while the queue is full, so at most queue_size batches sit in memory.
+    for item in batches:
+        work.put(item)
+    for _ in threads:
+        work.put(None)
+    for thread in threads:
+        thread.join()
+    session.close()
 
 
 def parse_args() -> argparse.Namespace:
@@ -198,15 +395,73 @@ def parse_args() -> argparse.Namespace:
         default=100,
         help="How many rows to insert into Supabase per request",
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        help="Number of concurrent uploader threads",
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=8,
+        help="Maximum insert batches buffered between Chroma and the uploaders",
+    )
+    parser.add_argument(
+        "--max-retries",
+        type=int,
+        default=3,
+        help="Retries per batch for network errors, 429s and 5xx responses",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        default=None,
+        help="Optional JSON-lines log of inserted batches so an interrupted run can resume",
+    )
     return parser.parse_args()
 
 
 def main():
     args = parse_args()
-    dataset = load_from_chroma(args.chroma_path, args.collection, args.fetch_batch_size)
-    rows = prepare_rows(dataset, args.country)
     credentials = supabase_credentials()
-    insert_rows(credentials, args.table, rows, args.insert_batch_size)
+
+    # Batch offsets depend on both batch sizes, so a checkpoint only applies to the same ones
+    source = (
+        f"{Path(args.chroma_path).resolve()}:{args.collection}->{args.table}"
+        f" fetch={args.fetch_batch_size} insert={args.insert_batch_size}"
+    )
+    checkpoint = Checkpoint(Path(args.checkpoint) if args.checkpoint else None, source)
+    completed = checkpoint.load()
+    if completed:
+        print(f"[INFO] Resuming: {len(completed)} batches already inserted per {args.checkpoint}")
+
+    pages = iter_chroma_pages(args.chroma_path, args.collection, args.fetch_batch_size)
+    batches = iter_batches(pages, args.country, args.insert_batch_size, completed)
+
+    stats = MigrationStats()
+    try:
+        insert_rows(
+            credentials,
+            args.table,
+            batches,
+            workers=max(args.workers, 1),
+            queue_size=max(args.queue_size, 1),
+            max_retries=max(args.max_retries, 0),
+            checkpoint=checkpoint,
+            stats=stats,
+        )
+    finally:
+        checkpoint.close()
+    stats.report(args.table, len(completed))
+
+    if stats.failed:
+        print(
+            f"[ERROR] {len(stats.failed)} batches failed (offsets: {sorted(stats.failed)}). "
+            "Re-run with the same --checkpoint to retry only those batches.",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+    print(f"[SUCCESS] Completed inserting {stats.rows} rows into '{args.table}'.")
 
 
 if __name__ == "__main__":
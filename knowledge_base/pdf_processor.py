@@ -2,9 +2,14 @@
 """
 PDF text extraction and chunking for knowledge base.
 Converts PDF documents into chunks suitable for vector embeddings.
+
+Chunking works over the per-page text (no joined full-document string), so each
+chunk records the page range it came from. For very large PDFs,
+`stream_pdf` / `stream_directory` read pages lazily and yield chunks in page
+windows (`process_pdfs.py --stream`).
 """
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Iterable, Iterator
 from pypdf import PdfReader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
@@ -52,29 +57,109 @@ class PDFProcessor:
         print(f"[PDF_PROCESSOR] Extracting text from: {path.name}")
         
         reader = PdfReader(str(path))
+        text_by_page = list(self.iter_pages(reader))
+        total_characters = sum(len(p["text"]) for p in text_by_page)
         
-        text_by_page = []
-        for i, page in enumerate(reader.pages):
-            text = page.extract_text()
-            if text.strip():
-                text_by_page.append({
-                    "page": i + 1,
-                    "text": text
-                })
-        
-        total_text = "\n\n".join([p["text"] for p in text_by_page])
-        
-        print(f"[PDF_PROCESSOR] Extracted {len(text_by_page)} pages, {len(total_text)} characters")
+        print(f"[PDF_PROCESSOR] Extracted {len(text_by_page)} pages, {total_characters} characters")
         
         return {
             "filename": path.stem,
             "total_pages": len(reader.pages),
             "text_pages": len(text_by_page),
-            "total_characters": len(total_text),
-            "full_text": total_text,
+            "total_characters": total_characters,
             "pages": text_by_page
         }
     
+    @staticmethod
+    def iter_pages(reader: PdfReader) -> Iterator[Dict]:
+        """
+        Yield non-empty pages one at a time.
+        
+        Args:
+            reader: Open PdfReader
+            
+        Returns:
+            Iterator of {"page": 1-based page number, "text": page text}
+        """
+        for i, page in enumerate(reader.pages):
+            text = page.extract_text() or ""
+            if text.strip():
+                yield {"page": i + 1, "text": text}
+    
+    def iter_page_chunks(
+        self,
+        pages: Iterable[Dict],
+        metadata: Dict
+    ) -> Iterator[Document]:
+        """
+        Chunk page texts directly, packing consecutive pieces up to chunk_size.
+        Each page is split on its own (overlap applies within a page), so every
+        later piece of a page starts a new chunk; a short page tail is packed with
+        the next page's opening, so chunks may span pages.
+        
+        Args:
+            pages: Iterable of {"page", "text"} dicts in page order
+            metadata: Metadata to attach to each chunk
+            
+        Returns:
+            Iterator of Documents with page_start/page_end metadata
+            (chunk_index is set; total_chunks is not known while streaming)
+        """
+        buffer: List[str] = []
+        buffer_len = 0
+        page_start = page_end = None
+        index = 0
+        
+        def emit() -> Document:
+            chunk_metadata = dict(metadata)
+            chunk_metadata.update({
+                "page_start": page_start,
+                "page_end": page_end,
+                "chunk_index": index,
+            })
+            return Document(page_content="\n\n".join(buffer), metadata=chunk_metadata)
+        
+        for page in pages:
+            for position, piece in enumerate(self.splitter.split_text(page["text"])):
+                added = len(piece) + (2 if buffer else 0)
+                # Later pieces repeat the end of the previous one (splitter overlap): never pack them together
+                if buffer and (position > 0 or buffer_len + added > self.chunk_size):
+                    yield emit()
+                    index += 1
+                    buffer, buffer_len = [], 0
+                    added = len(piece)
+                if not buffer:
+                    page_start = page["page"]
+                buffer.append(piece)
+                buffer_len += added
+                page_end = page["page"]
+        
+        if buffer:
+            yield emit()
+    
+    def chunk_pages(
+        self,
+        pages: Iterable[Dict],
+        metadata: Dict
+    ) -> List[Document]:
+        """
+        Split a PDF's pages into chunks that remember their page range.
+        
+        Args:
+            pages: Iterable of {"page", "text"} dicts in page order
+            metadata: Metadata to attach to each chunk
+            
+        Returns:
+            List of LangChain Document objects
+        """
+        chunks = list(self.iter_page_chunks(pages, metadata))
+        for chunk in chunks:
+            chunk.metadata["total_chunks"] = len(chunks)
+        
+        print(f"[PDF_PROCESSOR] Created {len(chunks)} chunks")
+        
+        return chunks
+    
     def chunk_text(
         self,
         text: str,
@@ -107,9 +192,17 @@ class PDFProcessor:
         
         return chunks
     
+    def _base_metadata(self, pdf_path: str, reader: PdfReader, category: str = None) -> Dict:
+        return {
+            "source": Path(pdf_path).stem,
+            "source_file": Path(pdf_path).name,
+            "total_pages": len(reader.pages),
+            "category": category or "general"
+        }
+    
     def process_pdf(self, pdf_path: str, category: str = None) -> List[Document]:
         """
-        Process PDF: extract text and create chunks.
+        Process PDF: extract text and create page-aware chunks.
         
         Args:
             pdf_path: Path to PDF file
@@ -118,53 +211,88 @@ class PDFProcessor:
         Returns:
             List of Document chunks ready for embedding
         """
-        # Extract text
-        extraction = self.extract_text_from_pdf(pdf_path)
-        
-        # Prepare metadata
-        metadata = {
-            "source": extraction["filename"],
-            "source_file": Path(pdf_path).name,
-            "total_pages": extraction["total_pages"],
-            "category": category or "general"
-        }
+        path = Path(pdf_path)
+        if not path.exists():
+            raise FileNotFoundError(f"PDF not found: {pdf_path}")
         
-        # Create chunks
-        chunks = self.chunk_text(extraction["full_text"], metadata)
+        print(f"[PDF_PROCESSOR] Extracting and chunking: {path.name}")
+        reader = PdfReader(str(path))
+        metadata = self._base_metadata(pdf_path, reader, category)
         
-        return chunks
+        return self.chunk_pages(self.iter_pages(reader), metadata)
     
-    def process_directory(
+    def stream_pdf(
         self,
-        pdf_dir: str,
-        file_categories: Dict[str, str] = None
-    ) -> List[Document]:
+        pdf_path: str,
+        category: str = None,
+        window_size: int = 10
+    ) -> Iterator[List[Document]]:
         """
-        Process all PDFs in a directory.
+        Low-memory mode for very large PDFs: pages are read lazily and chunks
+        are yielded in batches covering roughly `window_size` pages each.
         
         Args:
-            pdf_dir: Directory containing PDF files
-            file_categories: Optional mapping of filename -> category
+            pdf_path: Path to PDF file
+            category: Optional category label
+            window_size: Pages per yielded batch
             
         Returns:
-            List of all document chunks
+            Iterator of Document lists (for VectorStoreManager.add_document_batches)
         """
+        path = Path(pdf_path)
+        if not path.exists():
+            raise FileNotFoundError(f"PDF not found: {pdf_path}")
+        
+        reader = PdfReader(str(path))
+        metadata = self._base_metadata(pdf_path, reader, category)
+        
+        batch: List[Document] = []
+        window_start = None
+        for chunk in self.iter_page_chunks(self.iter_pages(reader), metadata):
+            if window_start is None:
+                window_start = chunk.metadata["page_start"]
+            batch.append(chunk)
+            if chunk.metadata["page_end"] - window_start + 1 >= window_size:
+                yield batch
+                batch, window_start = [], None
+        
+        if batch:
+            yield batch
+    
+    @staticmethod
+    def _pdf_files(pdf_dir: str) -> List[Path]:
         pdf_path = Path(pdf_dir)
         
         if not pdf_path.exists():
             raise FileNotFoundError(f"Directory not found: {pdf_dir}")
         
-        pdf_files = list(pdf_path.glob("*.pdf"))
+        pdf_files = sorted(pdf_path.glob("*.pdf"))
         
         if not pdf_files:
             raise ValueError(f"No PDF files found in: {pdf_dir}")
         
         print(f"\n[PDF_PROCESSOR] Found {len(pdf_files)} PDF files")
         print("=" * 70)
+        return pdf_files
+    
+    def process_directory(
+        self,
+        pdf_dir: str,
+        file_categories: Dict[str, str] = None
+    ) -> List[Document]:
+        """
+        Process all PDFs in a directory.
         
+        Args:
+            pdf_dir: Directory containing PDF files
+            file_categories: Optional mapping of filename -> category
+            
+        Returns:
+            List of all document chunks
+        """
         all_chunks = []
         
-        for pdf_file in sorted(pdf_files):
+        for pdf_file in self._pdf_files(pdf_dir):
             category = None
             if file_categories:
                 category = file_categories.get(pdf_file.name)
@@ -177,6 +305,29 @@ class PDFProcessor:
         print(f"[PDF_PROCESSOR] Total chunks created: {len(all_chunks)}")
         
         return all_chunks
+    
+    def stream_directory(
+        self,
+        pdf_dir: str,
+        file_categories: Dict[str, str] = None,
+        window_size: int = 10
+    ) -> Iterator[List[Document]]:
+        """
+        Low-memory counterpart of process_directory: every PDF goes through
+        `stream_pdf`, so only one page window of chunks is held at a time.
+        
+        Args:
+            pdf_dir: Directory containing PDF files
+            file_categories: Optional mapping of filename -> category
+            window_size: Pages per yielded batch
+            
+        Returns:
+            Iterator of Document lists (for VectorStoreManager.add_document_batches)
+        """
+        for pdf_file in self._pdf_files(pdf_dir):
+            category = (file_categories or {}).get(pdf_file.name)
+            print(f"[PDF_PROCESSOR] Streaming: {pdf_file.name}")
+            yield from self.stream_pdf(str(pdf_file), category, window_size)
 
 
 # Test the processor
@@ -54,6 +54,7 @@ def main():
             print(f"Source: {sample.metadata.get('source', 'unknown')}")
             print(f"Category: {sample.metadata.get('category', 'unknown')}")
             print(f"Sections: {sample.metadata.get('total_sections', 'unknown')}")
+            print(f"Section path: {sample.metadata.get('section_path', '')}")
             print(f"Chunk: {sample.metadata.get('chunk_index', 0)} of {sample.metadata.get('total_chunks', 0)}")
             print(f"\nContent preview:\n{sample.page_content[:300]}...")
         
@@ -2,7 +2,13 @@
 """
 One-time script to process PDFs and create vector embeddings.
 Run this to populate the Chroma DB with your knowledge base.
+
+Usage:
+    python3 process_pdfs.py                 # chunk every PDF, then embed
+    python3 process_pdfs.py --stream        # embed page windows as they are read
+                                            # (low memory, for very large PDFs)
 """
+import argparse
 import sys
 from pathlib import Path
 
@@ -12,8 +18,72 @@ sys.path.insert(0, str(Path(__file__).parent))
 from pdf_processor import PDFProcessor
 from vector_store import VectorStoreManager
 
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Process PDFs into the Chroma knowledge base.")
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Read pages lazily and embed chunks one page window at a time",
+    )
+    parser.add_argument(
+        "--window-size",
+        type=int,
+        default=10,
+        help="Pages per streamed batch (with --stream)",
+    )
+    return parser.parse_args()
+
+
+def process_all(processor: PDFProcessor, pdf_categories: dict) -> VectorStoreManager:
+    """Chunk every PDF up front, show a sample, then embed them all."""
+    print("\n" + "="*70)
+    print("STEP 1: Processing PDFs")
+    print("="*70)
+    
+    chunks = processor.process_directory(
+        pdf_dir="pdf_files",
+        file_categories=pdf_categories
+    )
+    
+    print(f"\n✅ Successfully processed {len(chunks)} chunks")
+    
+    # Show sample
+    if chunks:
+        print("\n" + "="*70)
+        print("Sample Chunk:")
+        print("="*70)
+        sample = chunks[0]
+        print(f"Source: {sample.metadata.get('source', 'unknown')}")
+        print(f"Category: {sample.metadata.get('category', 'unknown')}")
+        print(f"Pages: {sample.metadata.get('total_pages', 'unknown')}")
+        print(f"Chunk: {sample.metadata.get('chunk_index', 0)} of {sample.metadata.get('total_chunks', 0)}")
+        print(f"\nContent preview:\n{sample.page_content[:300]}...")
+    
+    # Initialize vector store
+    print("\n" + "="*70)
+    print("STEP 2: Creating Vector Database")
+    print("="*70)
+    
+    store = VectorStoreManager(
+        persist_directory="chroma_db",
+        collection_name="knowledge_base"
+    )
+    
+    # Add documents to vector store
+    print("\n" + "="*70)
+    print("STEP 3: Adding Documents and Creating Embeddings")
+    print("="*70)
+    print("This will take 1-2 minutes on first run...")
+    print("(Downloading embedding model and processing documents)")
+    
+    store.add_documents(chunks)
+    return store
+
+
 def main():
     """Process all PDFs and create vector database."""
+    args = parse_args()
     
     print("="*70)
     print("PDF KNOWLEDGE BASE SETUP")
@@ -34,47 +104,25 @@ def main():
     
     # Process all PDFs
     try:
-        print("\n" + "="*70)
-        print("STEP 1: Processing PDFs")
-        print("="*70)
-        
-        chunks = processor.process_directory(
-            pdf_dir="pdf_files",
-            file_categories=pdf_categories
-        )
-        
-        print(f"\n✅ Successfully processed {len(chunks)} chunks")
-        
-        # Show sample
-        if chunks:
+        if args.stream:
             print("\n" + "="*70)
-            print("Sample Chunk:")
+            print("STEP 1-3: Streaming PDFs into the Vector Database")
             print("="*70)
-            sample = chunks[0]
-            print(f"Source: {sample.metadata.get('source', 'unknown')}")
-            print(f"Category: {sample.metadata.get('category', 'unknown')}")
-            print(f"Pages: {sample.metadata.get('total_pages', 'unknown')}")
-            print(f"Chunk: {sample.metadata.get('chunk_index', 0)} of {sample.metadata.get('total_chunks', 0)}")
-            print(f"\nContent preview:\n{sample.page_content[:300]}...")
-        
-        # Initialize vector store
-        print("\n" + "="*70)
-        print("STEP 2: Creating Vector Database")
-        print("="*70)
-        
-        store = VectorStoreManager(
-            persist_directory="chroma_db",
-            collection_name="knowledge_base"
-        )
-        
-        # Add documents to vector store
-        print("\n" + "="*70)
-        print("STEP 3: Adding Documents and Creating Embeddings")
-        print("="*70)
-        print("This will take 1-2 minutes on first run...")
-        print("(Downloading embedding model and processing documents)")
-        
-        store.add_documents(chunks)
+            
+            store = VectorStoreManager(
+                persist_directory="chroma_db",
+                collection_name="knowledge_base"
+            )
+            received = store.add_document_batches(
+                processor.stream_directory(
+                    pdf_dir="pdf_files",
+                    file_categories=pdf_categories,
+                    window_size=max(args.window_size, 1)
+                )
+            )
+            print(f"\n✅ Successfully processed {received} chunks")
+        else:
+            store = process_all(processor, pdf_categories)
         
         # Show final stats
         print("\n" + "="*70)
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Duplicate detection and result diversification for the knowledge base.
+
+- Ingest: exact duplicates are caught by a hash of the normalised text and
+  near-duplicates (overlap windows, repeated contact blocks) by 64-bit SimHash
+  over word shingles, indexed in eight 8-bit bands so lookups stay cheap.
+- Query: maximal marginal relevance (MMR) re-ranks candidates so the top-k
+  results are relevant but not copies of each other.
+"""
+import hashlib
+import math
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.documents import Document
+
+SIMHASH_BITS = 64
+BAND_BITS = 8
+
+_NON_WORD = re.compile(r"[^\w@.]+")
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase and strip Markdown punctuation/whitespace so formatting differences don't matter."""
+    return " ".join(_NON_WORD.sub(" ", text.lower()).split())
+
+
+def content_hash(text: str) -> str:
+    """Stable hash of the normalised text (exact duplicate key)."""
+    return hashlib.sha1(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def simhash(text: str, shingle_size: int = 3) -> int:
+    """64-bit SimHash over word shingles of the normalised text."""
+    words = normalize_text(text).split()
+    if len(words) < shingle_size:
+        shingles = [" ".join(words)] if words else []
+    else:
+        shingles = [" ".join(words[i:i + shingle_size]) for i in range(len(words) - shingle_size + 1)]
+
+    weights = [0] * SIMHASH_BITS
+    for shingle in shingles:
+        value = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += 1 if value >> bit & 1 else -1
+
+    fingerprint = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class ChunkDeduplicator:
+    """Track fingerprints of accepted chunks and reject exact or near duplicates."""
+
+    def __init__(self, max_distance: int = 6):
+        """
+        Args:
+            max_distance: Max SimHash Hamming distance treated as a near-duplicate.
+                Band lookup guarantees recall for distances below the band count (8).
+        """
+        self.max_distance = max_distance
+        self._hashes: set = set()
+        self._bands: List[Dict[int, List[int]]] = [{} for _ in range(SIMHASH_BITS // BAND_BITS)]
+        self.stats = {"exact": 0, "near": 0, "kept": 0}
+
+    def _band_keys(self, fingerprint: int) -> List[int]:
+        mask = (1 << BAND_BITS) - 1
+        return [(fingerprint >> (i * BAND_BITS)) & mask for i in range(len(self._bands))]
+
+    def add(self, digest: str, fingerprint: int) -> None:
+        """Register an accepted chunk (also used to seed from an existing collection)."""
+        self._hashes.add(digest)
+        for band, key in zip(self._bands, self._band_keys(fingerprint)):
+            band.setdefault(key, []).append(fingerprint)
+
+    def check(self, text: str) -> Tuple[Optional[str], str, int]:
+        """
+        Classify a chunk without registering it.
+
+        Returns:
+            (reason, digest, fingerprint) where reason is "exact", "near" or None
+        """
+        digest = content_hash(text)
+        fingerprint = simhash(text)
+        if digest in self._hashes:
+            return "exact", digest, fingerprint
+        for band, key in zip(self._bands, self._band_keys(fingerprint)):
+            for candidate in band.get(key, ()):
+                if hamming_distance(candidate, fingerprint) <= self.max_distance:
+                    return "near", digest, fingerprint
+        return None, digest, fingerprint
+
+    def filter_documents(self, documents: Sequence[Document]) -> List[Document]:
+        """
+        Return documents that are not duplicates of earlier ones (or of seeded content).
+        Kept documents get content_hash/simhash metadata so later runs can seed from them.
+        """
+        kept: List[Document] = []
+        for doc in documents:
+            reason, digest, fingerprint = self.check(doc.page_content)
+            if reason:
+                self.stats[reason] += 1
+                continue
+            self.add(digest, fingerprint)
+            doc.metadata["content_hash"] = digest
+            # Hex string: Chroma/JSON metadata can't hold unsigned 64-bit ints safely
+            doc.metadata["simhash"] = f"{fingerprint:016x}"
+            kept.append(doc)
+            self.stats["kept"] += 1
+        return kept
+
+
+def _cosine(a: Sequence[float], b: Sequence[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+def mmr_select(
+    query_vector: Sequence[float],
+    candidate_vectors: Sequence[Sequence[float]],
+    k: int,
+    lambda_mult: float = 0.5,
+) -> List[int]:
+    """
+    Pick k candidate indices by maximal marginal relevance.
+
+    Args:
+        query_vector: Query embedding
+        candidate_vectors: Candidate embeddings, in relevance order
+        k: Number of results to return
+        lambda_mult: 1.0 = pure relevance, 0.0 = pure diversity
+    """
+    if not candidate_vectors:
+        return []
+    relevance = [_cosine(query_vector, vector) for vector in candidate_vectors]
+    selected: List[int] = []
+    remaining = list(range(len(candidate_vectors)))
+
+    while remaining and len(selected) < k:
+        best_index, best_score = remaining[0], -math.inf
+        for index in remaining:
+            redundancy = max(
+                (_cosine(candidate_vectors[index], candidate_vectors[chosen]) for chosen in selected),
+                default=0.0,
+            )
+            score = lambda_mult * relevance[index] - (1 - lambda_mult) * redundancy
+            if score > best_score:
+                best_index, best_score = index, score
+        selected.append(best_index)
+        remaining.remove(best_index)
+    return selected
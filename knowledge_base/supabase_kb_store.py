@@ -5,12 +5,15 @@ from __future__ import annotations
 
 import json
 import os
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 import requests
 from langchain_core.documents import Document
 from langchain_community.embeddings import HuggingFaceEmbeddings
 
+from embedding_registry import get_embeddings
+from similarity import mmr_select
+
 
 class SupabaseKnowledgeStore:
     """Fetch vector matches from Supabase pgvector via RPC."""
@@ -25,6 +28,14 @@ class SupabaseKnowledgeStore:
             )
 
         self.rpc_function = os.getenv("SUPABASE_KB_MATCH_RPC", "match_claim_knowledge_chunks")
+        self.table = os.getenv("SUPABASE_KB_TABLE", "claim_knowledge_chunks")
+        self.timeout = float(os.getenv("SUPABASE_KB_TIMEOUT_SECONDS", "60"))
+        # Maps the default timeout to the one used for a call; the API injects a
+        # resolver that caps it to the request's remaining deadline
+        self.timeout_resolver: Callable[[float], float] = lambda default: default
+        # Optional circuit breaker around the match RPC (injected by the API);
+        # anything with a call(func, *args) method
+        self.breaker: Optional[Any] = None
         self.default_country = (os.getenv("KNOWLEDGE_BASE_COUNTRY") or "malaysia").strip().lower()
 
         model_name = os.getenv("KNOWLEDGE_BASE_EMBEDDING_MODEL", "all-MiniLM-L6-v2")
@@ -32,11 +43,7 @@ class SupabaseKnowledgeStore:
         self.embeddings: Optional[HuggingFaceEmbeddings] = None
 
         try:
-            self.embeddings = HuggingFaceEmbeddings(
-                model_name=model_name,
-                model_kwargs={"device": "cpu"},
-                encode_kwargs={"normalize_embeddings": True},
-            )
+            self.embeddings = get_embeddings(model_name)
         except Exception as exc:
             # Defer the failure until a KB tool is invoked so the API can start without internet access.
             self._embedding_error = exc
@@ -72,15 +79,13 @@ class SupabaseKnowledgeStore:
             payload["filter_category"] = str(category).strip().lower()
         return payload
 
-    def search(
+    def _match(
         self,
-        query: str,
-        k: int = 3,
-        filter_dict: Optional[Dict[str, Any]] = None,
-    ) -> List[Document]:
-        """Return LangChain Documents from Supabase similarity search."""
-        embeddings = self._ensure_embeddings()
-        query_vector = embeddings.embed_query(query)
+        query_vector: List[float],
+        k: int,
+        filter_dict: Optional[Dict[str, Any]],
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """Call the match RPC and return (rows, payload)."""
         payload = self._rpc_payload(query_vector, k, filter_dict)
 
         headers = {
@@ -89,22 +94,85 @@ class SupabaseKnowledgeStore:
             "Content-Type": "application/json",
         }
         rpc_url = f"{self.supabase_url.rstrip('/')}/rest/v1/rpc/{self.rpc_function}"
-        response = requests.post(rpc_url, headers=headers, data=json.dumps(payload), timeout=60)
-
+        timeout = self.timeout_resolver(self.timeout)
+
+        def post() -> List[Dict[str, Any]]:
+            response = requests.post(rpc_url, headers=headers, data=json.dumps(payload), timeout=timeout)
+            if response.status_code >= 400:
+                raise RuntimeError(
+                    f"Supabase knowledge base query failed ({response.status_code}): {response.text}"
+                )
+            return response.json()
+
+        rows = self.breaker.call(post) if self.breaker is not None else post()
+        return rows, payload
+
+    @staticmethod
+    def _to_document(row: Dict[str, Any], payload: Dict[str, Any]) -> Document:
+        metadata = row.get("metadata") or {}
+        if "country" not in metadata and "filter_country" in payload:
+            metadata["country"] = payload["filter_country"]
+        return Document(page_content=row.get("content", ""), metadata=metadata)
+
+    @staticmethod
+    def _parse_embedding(value: Any) -> List[float]:
+        """PostgREST returns pgvector columns as '[0.1,0.2,...]' strings."""
+        if isinstance(value, str):
+            return json.loads(value)
+        return list(value or [])
+
+    def content_version(self) -> str:
+        """Cheap fingerprint of the chunk table (row count); changes when content is re-ingested."""
+        headers = {
+            "apikey": self.service_key,
+            "Authorization": f"Bearer {self.service_key}",
+            "Prefer": "count=exact",
+        }
+        response = requests.get(
+            f"{self.supabase_url.rstrip('/')}/rest/v1/{self.table}",
+            headers=headers,
+            params={"select": "id", "limit": 1},
+            timeout=self.timeout_resolver(15),
+        )
         if response.status_code >= 400:
-            raise RuntimeError(
-                f"Supabase knowledge base query failed ({response.status_code}): {response.text}"
-            )
+            raise RuntimeError(f"Supabase knowledge base count failed ({response.status_code})")
+        total = response.headers.get("Content-Range", "*/0").split("/")[-1]
+        return f"{self.table}:{total}"
+
+    def search(
+        self,
+        query: str,
+        k: int = 3,
+        filter_dict: Optional[Dict[str, Any]] = None,
+    ) -> List[Document]:
+        """Return LangChain Documents from Supabase similarity search."""
+        embeddings = self._ensure_embeddings()
+        query_vector = embeddings.embed_query(query)
+        rows, payload = self._match(query_vector, k, filter_dict)
+        return [self._to_document(row, payload) for row in rows]
 
-        rows = response.json()
-        documents: List[Document] = []
-        for row in rows:
-            metadata = row.get("metadata") or {}
-            if "country" not in metadata and "country" in payload:
-                metadata["country"] = payload["filter_country"]
-            documents.append(Document(page_content=row.get("content", ""), metadata=metadata))
+    def search_mmr(
+        self,
+        query: str,
+        k: int = 3,
+        fetch_k: int = 12,
+        lambda_mult: float = 0.5,
+        filter_dict: Optional[Dict[str, Any]] = None,
+    ) -> List[Document]:
+        """Fetch `fetch_k` matches and return `k` diversified by maximal marginal relevance."""
+        embeddings = self._ensure_embeddings()
+        query_vector = embeddings.embed_query(query)
+        rows, payload = self._match(query_vector, max(fetch_k, k), filter_dict)
+        if len(rows) <= k:
+            return [self._to_document(row, payload) for row in rows]
+
+        vectors = [self._parse_embedding(row.get("embedding")) for row in rows]
+        if not all(vectors):
+            # RPC without embeddings in its result set: fall back to plain ranking
+            return [self._to_document(row, payload) for row in rows[:k]]
 
-        return documents
+        selected = mmr_select(query_vector, vectors, k, lambda_mult)
+        return [self._to_document(rows[index], payload) for index in selected]
 
     def search_with_scores(
         self,
@@ -115,28 +183,5 @@ class SupabaseKnowledgeStore:
         """Return documents and similarity scores."""
         embeddings = self._ensure_embeddings()
         query_vector = embeddings.embed_query(query)
-        payload = self._rpc_payload(query_vector, k, filter_dict)
-
-        headers = {
-            "apikey": self.service_key,
-            "Authorization": f"Bearer {self.service_key}",
-            "Content-Type": "application/json",
-        }
-        rpc_url = f"{self.supabase_url.rstrip('/')}/rest/v1/rpc/{self.rpc_function}"
-        response = requests.post(rpc_url, headers=headers, data=json.dumps(payload), timeout=60)
-
-        if response.status_code >= 400:
-            raise RuntimeError(
-                f"Supabase knowledge base query failed ({response.status_code}): {response.text}"
-            )
-
-        rows = response.json()
-        results: List[Any] = []
-        for row in rows:
-            metadata = row.get("metadata") or {}
-            if "country" not in metadata and "filter_country" in payload:
-                metadata["country"] = payload["filter_country"]
-            doc = Document(page_content=row.get("content", ""), metadata=metadata)
-            results.append((doc, row.get("similarity")))
-
-        return results
+        rows, payload = self._match(query_vector, k, filter_dict)
+        return [(self._to_document(row, payload), row.get("similarity")) for row in rows]
@@ -4,11 +4,13 @@ Chroma DB vector store manager for knowledge base.
 Handles embedding creation and storage.
 """
 from pathlib import Path
-from typing import List, Optional
+from typing import Iterable, List, Optional
 from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_core.documents import Document
 
+from embedding_registry import get_embeddings
+from similarity import ChunkDeduplicator
+
 class VectorStoreManager:
     """Manage Chroma DB vector store for document embeddings."""
     
@@ -32,12 +34,8 @@ class VectorStoreManager:
         print(f"[VECTOR_STORE] Initializing with model: {embedding_model}")
         print(f"[VECTOR_STORE] This will download ~80MB model on first run...")
         
-        # Initialize embeddings (free, runs locally)
-        self.embeddings = HuggingFaceEmbeddings(
-            model_name=embedding_model,
-            model_kwargs={'device': 'cpu'},
-            encode_kwargs={'normalize_embeddings': True}
-        )
+        # Initialize embeddings (free, runs locally; shared with other stores in this process)
+        self.embeddings = get_embeddings(embedding_model)
         
         print(f"[VECTOR_STORE] ✅ Embedding model loaded")
         
@@ -74,19 +72,74 @@ class VectorStoreManager:
                 persist_directory=self.persist_directory
             )
             print(f"[VECTOR_STORE] ✅ New database created")
+
+    def reopen(self):
+        """
+        Re-open the Chroma client, keeping the (shared) embedding model.
+        Called in forked workers: SQLite handles opened in the parent must not be reused.
+        """
+        try:
+            from chromadb.api.client import SharedSystemClient
+            SharedSystemClient.clear_system_cache()
+        except (ImportError, AttributeError):
+            pass
+        self.vectorstore = None
+        self._load_or_create()
+
+    def _seed_deduplicator(self, deduplicator: ChunkDeduplicator):
+        """Register fingerprints of documents already stored in the collection."""
+        try:
+            existing = self.vectorstore.get(include=["metadatas", "documents"])
+        except Exception as e:
+            print(f"[VECTOR_STORE] ⚠️  Could not read existing documents for dedup: {e}")
+            return
+        
+        for metadata, text in zip(existing.get("metadatas") or [], existing.get("documents") or []):
+            metadata = metadata or {}
+            if metadata.get("content_hash") and metadata.get("simhash"):
+                deduplicator.add(metadata["content_hash"], int(metadata["simhash"], 16))
+            elif text:
+                _, digest, fingerprint = deduplicator.check(text)
+                deduplicator.add(digest, fingerprint)
     
-    def add_documents(self, documents: List[Document], batch_size: int = 100):
+    def add_documents(
+        self,
+        documents: List[Document],
+        batch_size: int = 100,
+        deduplicate: bool = True,
+        max_distance: int = 6,
+        deduplicator: Optional[ChunkDeduplicator] = None,
+        persist: bool = True
+    ):
         """
         Add documents to vector store with embeddings.
         
         Args:
             documents: List of Document objects to add
             batch_size: Number of documents to process at once
+            deduplicate: Skip exact and near-duplicate chunks (also against stored ones)
+            max_distance: SimHash Hamming distance treated as a near-duplicate
+            deduplicator: Already-seeded deduplicator to reuse across calls
+            persist: Save to disk afterwards
         """
         if not documents:
             print("[VECTOR_STORE] No documents to add")
             return
         
+        if deduplicate:
+            if deduplicator is None:
+                deduplicator = ChunkDeduplicator(max_distance=max_distance)
+                self._seed_deduplicator(deduplicator)
+            documents = deduplicator.filter_documents(documents)
+            stats = deduplicator.stats
+            print(
+                f"[VECTOR_STORE] Dedup: kept {stats['kept']}, "
+                f"skipped {stats['exact']} exact and {stats['near']} near-duplicates"
+            )
+            if not documents:
+                print("[VECTOR_STORE] No new documents to add")
+                return
+        
         print(f"\n[VECTOR_STORE] Adding {len(documents)} documents to database...")
         print(f"[VECTOR_STORE] Creating embeddings (this may take a minute)...")
         
@@ -98,7 +151,47 @@ class VectorStoreManager:
         
         print(f"[VECTOR_STORE] ✅ All documents added and embedded")
         
-        # Persist to disk
+        if persist:
+            self.persist()
+    
+    def add_document_batches(
+        self,
+        batches: Iterable[List[Document]],
+        batch_size: int = 100,
+        deduplicate: bool = True,
+        max_distance: int = 6
+    ) -> int:
+        """
+        Add documents arriving in batches (PDFProcessor.stream_directory), so a
+        large PDF never has to be chunked into memory all at once.
+        
+        The deduplicator is seeded from stored chunks once and shared by every
+        batch; the store is saved once at the end.
+        
+        Returns:
+            Number of chunks received
+        """
+        deduplicator = None
+        if deduplicate:
+            deduplicator = ChunkDeduplicator(max_distance=max_distance)
+            self._seed_deduplicator(deduplicator)
+        
+        received = 0
+        for documents in batches:
+            received += len(documents)
+            self.add_documents(
+                documents,
+                batch_size=batch_size,
+                deduplicate=deduplicate,
+                deduplicator=deduplicator,
+                persist=False
+            )
+        
+        self.persist()
+        return received
+    
+    def persist(self):
+        """Save the collection to disk."""
         self.vectorstore.persist()
         print(f"[VECTOR_STORE] ✅ Database saved to disk")
     
@@ -130,6 +223,35 @@ class VectorStoreManager:
         
         return results
     
+    def search_mmr(
+        self,
+        query: str,
+        k: int = 3,
+        fetch_k: int = 12,
+        lambda_mult: float = 0.5,
+        filter_dict: Optional[dict] = None
+    ) -> List[Document]:
+        """
+        Diversified search: fetch `fetch_k` candidates, return `k` by maximal marginal relevance.
+        
+        Args:
+            query: Search query
+            k: Number of results to return
+            fetch_k: Candidates considered before re-ranking
+            lambda_mult: 1.0 = pure relevance, 0.0 = pure diversity
+            filter_dict: Optional metadata filter
+            
+        Returns:
+            List of relevant, mutually dissimilar Document objects
+        """
+        return self.vectorstore.max_marginal_relevance_search(
+            query,
+            k=k,
+            fetch_k=max(fetch_k, k),
+            lambda_mult=lambda_mult,
+            filter=filter_dict
+        )
+    
     def search_with_scores(
         self,
         query: str,
@@ -158,6 +280,10 @@ class VectorStoreManager:
         
         return results
     
+    def content_version(self) -> str:
+        """Cheap fingerprint of the collection (document count)."""
+        return f"{self.collection_name}:{self.vectorstore._collection.count()}"
+
     def get_stats(self) -> dict:
         """Get statistics about the vector store."""
         try:
@@ -33,6 +33,7 @@ export interface QueryRequest {
   user_email: string
   query_text: string
   thread_id?: string
+  message_id?: string
   context_messages?: QueryHistoryEntry[]
 }
 
@@ -43,6 +44,8 @@ export interface QueryResponse {
   timestamp: string
   model?: string
   user_email_hash?: string
+  cache_version?: string | null
+  answer_id?: string | null
 }
 
 export interface ClaimBalance {
@@ -75,6 +78,11 @@ export const queryAI = async (data: QueryRequest): Promise<QueryResponse> => {
   return response.data
 }
 
+// Prefetch the user's claim context when the chat opens (fire and forget)
+export const warmSession = async (data: { user_email: string; thread_id?: string }): Promise<void> => {
+  await api.post('/session/warm', data)
+}
+
 export const getClaimBalance = async (email: string): Promise<ClaimBalance> => {
   const response = await api.get(`/balance/${email}`)
   return response.data
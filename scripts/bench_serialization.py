@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark for API/tool JSON serialization.
+
+Compares the previous encodings (json.dumps with default=str, and indent=2 for
+knowledge base results) with the compact encoding now used for tool outputs,
+on payloads shaped like get_user_claims and search_knowledge_base results.
+Reports encode/decode time, payload size, gzip size and LLM tokens
+(tiktoken when installed, otherwise estimated at ~4 characters per token).
+
+Usage:
+    python scripts/bench_serialization.py [--claims 100] [--repeat 200]
+"""
+import argparse
+import gzip
+import json
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from serialization import HAS_ORJSON, dumps_compact, loads  # noqa: E402
+
+try:
+    import tiktoken
+
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+
+    def count_tokens(text: str) -> int:
+        return len(_ENCODING.encode(text))
+
+    TOKEN_NOTE = "tiktoken cl100k_base"
+except ImportError:
+    def count_tokens(text: str) -> int:
+        return max(1, round(len(text) / 4))
+
+    TOKEN_NOTE = "estimated (chars / 4)"
+
+
+def make_claims(count: int) -> dict:
+    """Synthetic claim_analysis rows with the columns the tools return."""
+    rng = random.Random(7)
+    claim_types = ["Travel Reimbursement", "Medical", "Dental", "Optical", "Wellness"]
+    start = datetime(2024, 1, 1)
+    rows = []
+    for index in range(count):
+        submitted = start + timedelta(days=rng.randint(0, 600))
+        rows.append({
+            "id": f"c6f9a3fe-23ed-4478-850c-{index:012d}",
+            "record_key": str(150000 + index),
+            "state": rng.choice(["Paid", "Submitted", "Approved"]),
+            "date_submitted": submitted.strftime("%Y %b %d"),
+            "employee_name": "Alwin Chui",
+            "claim_type": rng.choice(claim_types),
+            "description": f"Claim {index} - clinic visit and medication, Kuala Lumpur",
+            "transaction_currency": "MYR",
+            "transaction_amount": Decimal(f"{rng.uniform(20, 900):.2f}"),
+            "date_paid": (submitted + timedelta(days=6)).strftime("%Y %b %d"),
+            "total_paid": round(rng.uniform(20, 900), 2),
+            "year_submitted": submitted.year,
+            "month_submitted": submitted.month,
+            "when_modified": submitted,
+        })
+    return {"total_claims": len(rows), "claims": rows}
+
+
+def make_kb_results() -> dict:
+    content = (
+        "Outpatient GP visits are covered up to RM 60 per visit. Specialist visits "
+        "require a referral letter from a panel GP. Submit the claim form together "
+        "with original receipts within 30 days of treatment. " * 3
+    )[:500]
+    return {
+        "query": "how do I claim a specialist visit",
+        "total_results": 3,
+        "results": [
+            {
+                "source": f"aia_benefits_guide_{i}.pdf",
+                "category": "benefits",
+                "section": "Outpatient > Specialist",
+                "content": content,
+                "pages": f"{4 + i}-{5 + i}",
+            }
+            for i in range(3)
+        ],
+    }
+
+
+def timed(func, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def bench(name: str, payload: dict, encoders: dict, repeat: int) -> None:
+    print(f"\n{name}")
+    print(f"{'encoding':<22}{'encode ms':>11}{'decode ms':>11}{'bytes':>10}{'gzip':>9}{'tokens':>9}")
+    baseline_tokens = None
+    for label, (encode, decode) in encoders.items():
+        text = encode(payload)
+        encode_ms = timed(lambda: encode(payload), repeat)
+        decode_ms = timed(lambda: decode(text), repeat)
+        raw = text.encode("utf-8")
+        tokens = count_tokens(text)
+        baseline_tokens = baseline_tokens or tokens
+        saving = f" ({(tokens / baseline_tokens - 1) * 100:+.0f}%)" if tokens != baseline_tokens else ""
+        print(
+            f"{label:<22}{encode_ms:>11.3f}{decode_ms:>11.3f}{len(raw):>10}"
+            f"{len(gzip.compress(raw)):>9}{tokens:>9}{saving}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark JSON encodings for API and tool outputs")
+    parser.add_argument("--claims", type=int, default=100, help="Claim rows in the user-claims payload")
+    parser.add_argument("--repeat", type=int, default=200, help="Iterations per timing")
+    args = parser.parse_args()
+
+    print(f"orjson available: {HAS_ORJSON}; tokens: {TOKEN_NOTE}")
+
+    bench(
+        f"get_user_claims ({args.claims} rows)",
+        make_claims(args.claims),
+        {
+            "json default=str": (lambda p: json.dumps(p, default=str), json.loads),
+            "compact": (dumps_compact, loads),
+        },
+        args.repeat,
+    )
+    bench(
+        "search_knowledge_base (3 results)",
+        make_kb_results(),
+        {
+            "json indent=2": (lambda p: json.dumps(p, indent=2), json.loads),
+            "compact": (dumps_compact, loads),
+        },
+        args.repeat,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Prompt-token cost of user-data tool results: raw JSON rows vs the compact
+tabular encoding with precomputed totals (src/tool_encoding.py).
+
+Uses synthetic users shaped like claim_analysis rows (light, typical and
+heavy claimants) and, with --email, real users fetched through
+SupabaseService. Tokens are counted with tiktoken when installed.
+
+Usage:
+    python scripts/bench_tool_encoding.py [--email a@example.com --email b@example.com]
+"""
+import argparse
+import random
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / "src"))
+
+from bench_serialization import TOKEN_NOTE, count_tokens  # noqa: E402
+from serialization import dumps_compact  # noqa: E402
+from tool_encoding import encode_claims  # noqa: E402
+
+DESCRIPTIONS = [
+    "Dental scaling and polishing at Klinik Pergigian Dr. Tan, Mont Kiara - receipt attached",
+    "Prescription glasses (frame + progressive lenses) from Focus Point Mid Valley",
+    "Annual health screening package - BP Healthcare, full blood panel and ECG",
+    "Grab rides to client meeting at Menara KL and back to office, 3 trips",
+    "Parking at KLCC for AIA roadshow, whole day",
+]
+CLAIM_TYPES = ["Employee Benefit", "Travel Reimbursement", "Other Reimbursement"]
+
+
+def synthetic_claims(count: int, seed: int) -> List[Dict]:
+    """Rows with the columns get_claim_analysis selects."""
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    rows = []
+    for index in range(count):
+        submitted = start + timedelta(days=rng.randint(0, 600))
+        rows.append({
+            "id": f"c6f9a3fe-23ed-4478-850c-{seed:04d}{index:08d}",
+            "record_key": f"EXP{150000 + index}",
+            "state": rng.choice(["Paid", "Submitted", "Approved"]),
+            "claim_type": rng.choice(CLAIM_TYPES),
+            "claim_description": rng.choice(DESCRIPTIONS),
+            "description": rng.choice(DESCRIPTIONS),
+            "transaction_amount": f"{rng.uniform(20, 900):.2f}",
+            "transaction_currency": "MYR",
+            "date_paid": (submitted + timedelta(days=6)).strftime("%Y %b %d"),
+            "date_submitted": submitted.strftime("%Y %b %d"),
+        })
+    return rows
+
+
+def raw_payload(claims: List[Dict]) -> Dict:
+    """What get_user_claims returned before: every row as a JSON object."""
+    return {"total_claims": len(claims), "claims": claims}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--email", action="append", default=[], help="Also measure a real user (repeatable)")
+    args = parser.parse_args()
+
+    users = {f"synthetic ({count} claims)": synthetic_claims(count, count) for count in (5, 25, 100)}
+    if args.email:
+        from dotenv import load_dotenv
+        load_dotenv(PROJECT_ROOT / "config" / ".env")
+        from supabase_service import SupabaseService
+
+        service = SupabaseService()
+        for number, email in enumerate(args.email, 1):
+            users[f"user {number}"] = service.get_claim_analysis(email, limit=100)
+
+    print(f"Tokens: {TOKEN_NOTE}\n")
+    print(f"{'user':<26}{'raw json':>10}{'compact':>10}{'change':>9}")
+    total_raw = total_compact = 0
+    for name, claims in users.items():
+        raw = count_tokens(dumps_compact(raw_payload(claims)))
+        compact = count_tokens(dumps_compact(encode_claims(claims)))
+        total_raw += raw
+        total_compact += compact
+        print(f"{name:<26}{raw:>10}{compact:>10}{(compact / raw - 1) * 100:>8.0f}%")
+    print(f"{'all':<26}{total_raw:>10}{total_compact:>10}{(total_compact / total_raw - 1) * 100:>8.0f}%")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Latency and equivalence check for the get_user_context RPC.
+
+Compares the previous table reads (claim_summary, claim_analysis and the
+count(*) request the user tools made) with the single get_user_context call,
+for one user, against whatever SUPABASE_URL points at: the hosted project or
+a local stand-in (`supabase start`, SUPABASE_URL=http://127.0.0.1:54321) with
+supabase_schema/get_user_context.sql applied.
+
+Usage:
+    python scripts/bench_user_context.py --email someone@example.com [--repeat 20]
+"""
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / "src"))
+
+from dotenv import load_dotenv  # noqa: E402
+
+load_dotenv(PROJECT_ROOT / "config" / ".env")
+
+from supabase_service import SupabaseService  # noqa: E402
+
+
+def table_reads(service: SupabaseService, email: str) -> Dict:
+    return {
+        "profile": service.get_claim_summary(email),
+        "recent_claims": service.get_claim_analysis(email, limit=25, claim_type="Employee Benefit"),
+        "claim_count": service.count_claims(email),
+    }
+
+
+def time_calls(func: Callable[[], Dict], repeat: int) -> List[float]:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def describe(name: str, timings: List[float]) -> None:
+    ordered = sorted(timings)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    print(f"{name:<14} p50 {statistics.median(ordered):8.1f} ms   p95 {p95:8.1f} ms   max {ordered[-1]:8.1f} ms")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    service = SupabaseService()
+    # Time the real calls, not the stale-result cache
+    service.stale_max_age = 0
+
+    legacy = table_reads(service, args.email)
+    rpc = service.get_user_context(args.email)
+    if not service._context_rpc_available:
+        print(f"RPC {service.context_rpc} is not deployed; apply supabase_schema/get_user_context.sql first")
+        return 1
+
+    mismatches = []
+    if (legacy["profile"] or {}).get("id") != (rpc["profile"] or {}).get("id"):
+        mismatches.append("profile")
+    if legacy["claim_count"] != rpc["claim_count"]:
+        mismatches.append(f"claim_count ({legacy['claim_count']} vs {rpc['claim_count']})")
+    if [row["id"] for row in legacy["recent_claims"]] != [row["id"] for row in rpc["recent_claims"]]:
+        mismatches.append("recent_claims")
+    print("Equivalent:", "yes" if not mismatches else "NO - " + ", ".join(mismatches))
+    print(f"Per-type totals: {len(rpc['totals_by_type'])} groups\n")
+
+    describe("table reads", time_calls(lambda: table_reads(service, args.email), args.repeat))
+    describe("rpc", time_calls(lambda: service.get_user_context(args.email), args.repeat))
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+First-turn latency with and without /session/warm, against a running API.
+
+Each user is asked one personal question in a fresh thread twice:
+  cold - without warm-up (their claim context is not cached yet)
+  warm - after POST /session/warm and a short pause standing in for typing
+Between the phases the script waits for the per-user context cache to expire,
+so the cold numbers are really cold.
+
+Usage:
+    python scripts/first_turn_latency.py --emails a@example.com,b@example.com \\
+        [--api http://localhost:8000] [--think 2] [--context-ttl 60]
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+import urllib.request
+import uuid
+from typing import Dict, List
+
+QUESTION = "What's my remaining balance?"
+
+
+def post(api: str, path: str, body: Dict) -> Dict:
+    request = urllib.request.Request(
+        f"{api.rstrip('/')}{path}",
+        data=json.dumps(body).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    with urllib.request.urlopen(request, timeout=120) as response:
+        return json.loads(response.read() or b"{}")
+
+
+def first_turn(api: str, email: str, warm: bool, think: float) -> float:
+    """Seconds for the first /query of a new thread."""
+    thread_id = f"latency-{uuid.uuid4()}"
+    if warm:
+        post(api, "/session/warm", {"user_email": email, "thread_id": thread_id})
+        time.sleep(think)
+    started = time.perf_counter()
+    post(api, "/query", {"user_email": email, "query_text": QUESTION, "thread_id": thread_id})
+    return time.perf_counter() - started
+
+
+def describe(name: str, timings: List[float]) -> None:
+    ms = sorted(t * 1000 for t in timings)
+    print(f"{name:<6} n={len(ms):<3} p50 {statistics.median(ms):8.0f} ms   mean {statistics.mean(ms):8.0f} ms   max {ms[-1]:8.0f} ms")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--emails", required=True, help="Comma-separated users with claim data")
+    parser.add_argument("--api", default="http://localhost:8000")
+    parser.add_argument("--think", type=float, default=2.0, help="Seconds between warm-up and question")
+    parser.add_argument("--context-ttl", type=float, default=60.0, help="SUPABASE_CONTEXT_TTL_SECONDS of the server")
+    args = parser.parse_args()
+    emails = [email.strip() for email in args.emails.split(",") if email.strip()]
+
+    cold = [first_turn(args.api, email, warm=False, think=0) for email in emails]
+    print(f"Waiting {args.context_ttl + 1:.0f}s for cached contexts to expire...")
+    time.sleep(args.context_ttl + 1)
+    warm = [first_turn(args.api, email, warm=True, think=args.think) for email in emails]
+
+    describe("cold", cold)
+    describe("warm", warm)
+    print(f"p50 change: {(statistics.median(warm) / statistics.median(cold) - 1) * 100:+.0f}%")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Per-worker memory report for the API server (Linux only; reads /proc).
+
+RSS counts shared pages in every process that maps them, so it overstates
+the real cost of extra workers. PSS splits shared pages between the processes
+that share them and is the number to compare across serving layouts.
+
+Usage:
+    # Report an already running server (master PID and its workers)
+    python scripts/memory_report.py --pid 1234
+
+    # Start both layouts with N workers, wait for /health, report, stop
+    python scripts/memory_report.py --compare --workers 4
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+from typing import Dict, List
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+LAYOUTS = {
+    # Current layout: independent uvicorn workers, each importing the app itself
+    "uvicorn": "uvicorn src.api:app --host 127.0.0.1 --port {port} --workers {workers}",
+    # Pre-fork: app (embedding model, KB tools) loaded once in the master
+    "prefork": "gunicorn -c config/gunicorn.conf.py --bind 127.0.0.1:{port} --workers {workers} src.api:app",
+}
+
+FIELDS = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty")
+
+
+def read_rollup(pid: int) -> Dict[str, int]:
+    """Memory counters in KiB from /proc/<pid>/smaps_rollup."""
+    values: Dict[str, int] = {}
+    with open(f"/proc/{pid}/smaps_rollup", encoding="utf-8") as fh:
+        for line in fh:
+            name, _, rest = line.partition(":")
+            if name in FIELDS:
+                values[name] = int(rest.split()[0])
+    return values
+
+
+def process_tree(pid: int) -> List[int]:
+    """The given PID followed by all of its descendants."""
+    children: Dict[int, List[int]] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", encoding="utf-8") as fh:
+                parent = int(fh.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(parent, []).append(int(entry))
+
+    tree, stack = [], [pid]
+    while stack:
+        current = stack.pop()
+        tree.append(current)
+        stack.extend(sorted(children.get(current, []), reverse=True))
+    return tree
+
+
+def report(pid: int, title: str) -> Dict[str, int]:
+    """Print per-process memory for a server tree and return the totals (KiB)."""
+    totals = {field: 0 for field in FIELDS}
+    print(f"\n{title} (master pid {pid})")
+    print(f"{'pid':>8}{'role':>8}{'RSS MiB':>10}{'PSS MiB':>10}{'shared MiB':>12}{'private MiB':>13}")
+    for index, member in enumerate(process_tree(pid)):
+        try:
+            stats = read_rollup(member)
+        except OSError:
+            continue
+        for field in FIELDS:
+            totals[field] += stats.get(field, 0)
+        shared = stats.get("Shared_Clean", 0) + stats.get("Shared_Dirty", 0)
+        private = stats.get("Private_Clean", 0) + stats.get("Private_Dirty", 0)
+        print(
+            f"{member:>8}{'master' if index == 0 else 'worker':>8}"
+            f"{stats.get('Rss', 0) / 1024:>10.1f}{stats.get('Pss', 0) / 1024:>10.1f}"
+            f"{shared / 1024:>12.1f}{private / 1024:>13.1f}"
+        )
+    print(f"{'total':>16}{totals['Rss'] / 1024:>10.1f}{totals['Pss'] / 1024:>10.1f}")
+    return totals
+
+
+def wait_healthy(port: int, process: subprocess.Popen, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with status {process.returncode}")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=5) as response:
+                if response.status == 200:
+                    return
+        except OSError:
+            pass
+        time.sleep(1)
+    raise RuntimeError(f"Server on port {port} not healthy after {timeout:.0f}s")
+
+
+def compare(workers: int, port: int, timeout: float, settle: float) -> None:
+    results = {}
+    for name, command in LAYOUTS.items():
+        argv = command.format(port=port, workers=workers).split()
+        print(f"\nStarting {name}: {' '.join(argv)}")
+        process = subprocess.Popen(
+            [sys.executable, "-m", *argv],
+            cwd=PROJECT_ROOT,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            wait_healthy(port, process, timeout)
+            # Let every worker finish its startup event before sampling
+            time.sleep(settle)
+            results[name] = report(process.pid, f"{name}, {workers} workers")
+        finally:
+            process.send_signal(signal.SIGTERM)
+            process.wait(timeout=30)
+
+    if len(results) == 2:
+        before, after = results["uvicorn"]["Pss"], results["prefork"]["Pss"]
+        print(
+            f"\nTotal PSS: uvicorn {before / 1024:.1f} MiB -> prefork {after / 1024:.1f} MiB "
+            f"({(after / before - 1) * 100:+.0f}%)"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report per-worker memory of the API server")
+    parser.add_argument("--pid", type=int, help="Master PID of a running server")
+    parser.add_argument("--compare", action="store_true", help="Start both layouts and compare them")
+    parser.add_argument("--workers", type=int, default=2, help="Workers per layout (with --compare)")
+    parser.add_argument("--port", type=int, default=8090, help="Port used with --compare")
+    parser.add_argument("--timeout", type=float, default=300, help="Seconds to wait for /health")
+    parser.add_argument("--settle", type=float, default=10, help="Seconds to wait after /health")
+    args = parser.parse_args()
+
+    if not Path("/proc/self/smaps_rollup").exists():
+        parser.error("/proc/<pid>/smaps_rollup is required (Linux 4.14+)")
+    if args.compare:
+        compare(args.workers, args.port, args.timeout, args.settle)
+    elif args.pid:
+        report(args.pid, "Server")
+    else:
+        parser.error("pass --pid or --compare")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Sync the local claim replica (src/db_retriever.py) from Supabase, and
+optionally compare read latency against the REST path for one user.
+
+The API workers keep the replica current themselves when
+SUPABASE_READ_MODE=replica; this seeds the file before a deploy or forces a
+full copy after bulk deletes.
+
+Usage:
+    python scripts/sync_replica.py [--full] [--db database/claims.db]
+    python scripts/sync_replica.py --email someone@example.com [--repeat 50]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Callable, List
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / "src"))
+
+from dotenv import load_dotenv  # noqa: E402
+
+load_dotenv(PROJECT_ROOT / "config" / ".env")
+
+from db_retriever import DatabaseRetriever  # noqa: E402
+from supabase_service import SupabaseService  # noqa: E402
+
+
+def time_calls(func: Callable[[], object], repeat: int) -> List[float]:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def describe(name: str, timings: List[float]) -> None:
+    ordered = sorted(timings)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    print(f"{name:<10} p50 {statistics.median(ordered):9.3f} ms   p95 {p95:9.3f} ms")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=os.getenv("SUPABASE_REPLICA_PATH", "database/claims.db"))
+    parser.add_argument("--full", action="store_true", help="copy claim_analysis in full (picks up deletes)")
+    parser.add_argument("--email", help="also time the user's claim reads: replica vs REST")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    # REST reads for the sync itself and the comparison
+    os.environ["SUPABASE_READ_MODE"] = "rest"
+    service = SupabaseService()
+    service.stale_max_age = 0
+    replica = DatabaseRetriever(
+        args.db, summary_table=service.summary_table, analysis_table=service.analysis_table
+    )
+
+    started = time.perf_counter()
+    counts = replica.sync(service, full=True if args.full else None)
+    if not counts:
+        print(f"Another process is syncing {args.db}; try again when it finishes")
+        return 1
+    print(f"Synced {counts} into {args.db} in {time.perf_counter() - started:.1f}s")
+
+    if args.email:
+        rest_rows = service.get_claim_analysis(args.email, limit=50)
+        replica_rows = replica.claim_analysis(args.email, limit=50)
+        same = {row["id"] for row in rest_rows} == {row["id"] for row in replica_rows}
+        print(f"Same claims: {'yes' if same else 'NO'} ({len(replica_rows)} rows)\n")
+        describe("rest", time_calls(lambda: service.get_claim_analysis(args.email, limit=50), args.repeat))
+        describe("replica", time_calls(lambda: replica.claim_analysis(args.email, limit=50), args.repeat))
+        return 0 if same else 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
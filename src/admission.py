@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Admission control for agent runs.
+
+Agent runs execute on a bounded thread pool. Requests beyond the pool size wait
+in per-user queues that are drained round-robin, so one chatty user cannot
+starve everyone else. When the queue is full (or a user already has too many
+requests in flight) the request is rejected immediately with a Retry-After hint
+instead of piling up until health checks time out.
+"""
+import asyncio
+import contextvars
+import math
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict
+
+try:
+    from metrics import metrics
+except ImportError:
+    from src.metrics import metrics
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot be queued; carries a Retry-After hint in seconds."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"Request rejected ({reason}); retry after {retry_after}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Bounded, fair scheduler for blocking agent calls."""
+
+    def __init__(
+        self,
+        max_concurrent: int = 4,
+        max_queue: int = 16,
+        per_user_limit: int = 2,
+    ):
+        """
+        Args:
+            max_concurrent: Agent runs executing at once (thread pool size)
+            max_queue: Requests allowed to wait for a slot across all users
+            per_user_limit: Requests (running + queued) allowed per user
+        """
+        self.max_concurrent = max(max_concurrent, 1)
+        self.max_queue = max(max_queue, 0)
+        self.per_user_limit = max(per_user_limit, 1)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrent, thread_name_prefix="agent-run")
+        self._running = 0
+        self._queued = 0
+        self._waiting: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+        self._per_user: Dict[str, int] = {}
+        # Smoothed agent run time, used to estimate Retry-After
+        self._avg_run_seconds = 5.0
+
+    def _retry_after(self) -> int:
+        backlog = self._queued + self._running
+        return max(1, math.ceil(self._avg_run_seconds * backlog / self.max_concurrent))
+
+    def _publish_gauges(self) -> None:
+        metrics.gauge("agent_queue_depth", self._queued)
+        metrics.gauge("agent_running", self._running)
+
+    def _admit(self, user_key: str) -> None:
+        if self._per_user.get(user_key, 0) >= self.per_user_limit:
+            metrics.incr("agent_admission_rejected", reason="user_limit")
+            raise AdmissionRejected("too many requests in flight for this user", self._retry_after())
+        if self._running >= self.max_concurrent and self._queued >= self.max_queue:
+            metrics.incr("agent_admission_rejected", reason="queue_full")
+            raise AdmissionRejected("server busy", self._retry_after())
+        self._per_user[user_key] = self._per_user.get(user_key, 0) + 1
+
+    def _release_user(self, user_key: str) -> None:
+        remaining = self._per_user.get(user_key, 1) - 1
+        if remaining > 0:
+            self._per_user[user_key] = remaining
+        else:
+            self._per_user.pop(user_key, None)
+
+    def _dispatch(self) -> None:
+        """Hand free slots to waiting requests, one user at a time (round-robin)."""
+        while self._running < self.max_concurrent and self._waiting:
+            user_key, tickets = self._waiting.popitem(last=False)
+            ticket = tickets.popleft()
+            if tickets:
+                self._waiting[user_key] = tickets
+            self._queued -= 1
+            if ticket.done():
+                continue
+            self._running += 1
+            ticket.set_result(None)
+        self._publish_gauges()
+
+    def _remove_ticket(self, user_key: str, ticket: asyncio.Future) -> None:
+        tickets = self._waiting.get(user_key)
+        if tickets and ticket in tickets:
+            tickets.remove(ticket)
+            self._queued -= 1
+            if not tickets:
+                del self._waiting[user_key]
+
+    async def run(self, user_key: str, func: Callable[..., Any], *args: Any) -> Any:
+        """
+        Run `func(*args)` on the agent pool once admitted.
+
+        Raises:
+            AdmissionRejected: queue full or per-user cap reached
+        """
+        self._admit(user_key)
+        enqueued_at = time.perf_counter()
+        try:
+            if self._running < self.max_concurrent and not self._waiting:
+                self._running += 1
+            else:
+                ticket = asyncio.get_running_loop().create_future()
+                self._waiting.setdefault(user_key, deque()).append(ticket)
+                self._queued += 1
+                self._publish_gauges()
+                try:
+                    await ticket
+                except asyncio.CancelledError:
+                    if ticket.done() and not ticket.cancelled():
+                        # Slot was granted just before cancellation; give it back
+                        self._running -= 1
+                        self._dispatch()
+                    else:
+                        self._remove_ticket(user_key, ticket)
+                        self._publish_gauges()
+                    raise
+        except BaseException:
+            self._release_user(user_key)
+            raise
+        metrics.observe("agent_queue_wait", time.perf_counter() - enqueued_at)
+        self._publish_gauges()
+
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        # Carry context variables (request deadline etc.) into the worker thread
+        context = contextvars.copy_context()
+        future = loop.run_in_executor(self._executor, context.run, func, *args)
+        # The slot is released when the worker thread finishes, not when the caller
+        # stops waiting: a cancelled request keeps its thread busy until it returns.
+        future.add_done_callback(lambda _: self._finish_run(user_key, started))
+        return await asyncio.shield(future)
+
+    def _finish_run(self, user_key: str, started: float) -> None:
+        elapsed = time.perf_counter() - started
+        self._avg_run_seconds = 0.8 * self._avg_run_seconds + 0.2 * elapsed
+        metrics.observe("agent_run", elapsed)
+        self._running -= 1
+        self._release_user(user_key)
+        self._dispatch()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._running,
+            "queued": self._queued,
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "per_user_limit": self.per_user_limit,
+            "avg_run_seconds": round(self._avg_run_seconds, 2),
+        }
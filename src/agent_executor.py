@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Deadline-aware LangChain runtime pieces for the agent.
+
+- DeadlineChatOpenAI caps every completion request to the remaining request budget.
+- UsageTelemetryHandler records prompt, cached-prompt and completion tokens
+  (and cost per model tier).
+- DeadlineAgentExecutor stops starting new tool iterations once the budget is
+  nearly spent, and replaces LangChain's "Agent stopped due to ..." message with a
+  best-effort answer built from the tool results gathered so far. When the model
+  emits several tool calls in one step it runs them concurrently.
+"""
+import contextvars
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+import openai
+from langchain.agents import AgentExecutor
+from langchain_core.agents import AgentAction, AgentFinish, AgentStep
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from langchain_openai import ChatOpenAI
+
+try:
+    import deadline
+    from metrics import metrics
+except ImportError:
+    from src import deadline
+    from src.metrics import metrics
+
+# Used when the model client has no numeric timeout of its own
+DEFAULT_LLM_TIMEOUT_SECONDS = 60.0
+
+# Prefix of the output AgentExecutor returns when it stops early
+STOPPED_PREFIX = "Agent stopped due to"
+
+# Shared by all requests; tools are I/O bound (Supabase, KB RPC)
+TOOL_WORKERS = int(os.getenv("AGENT_TOOL_WORKERS", "8"))
+_tool_pool: Optional[ThreadPoolExecutor] = None
+_tool_pool_lock = threading.Lock()
+
+# Tool calls of the step being executed on this thread: id(action) -> future
+_step_state = threading.local()
+
+
+def _get_tool_pool() -> ThreadPoolExecutor:
+    global _tool_pool
+    with _tool_pool_lock:
+        if _tool_pool is None:
+            _tool_pool = ThreadPoolExecutor(max_workers=TOOL_WORKERS, thread_name_prefix="agent-tool")
+        return _tool_pool
+
+
+def _usage(response: LLMResult) -> Tuple[int, int, int]:
+    """(prompt, cached prompt, completion) tokens of one chat completion."""
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                cached = (usage.get("input_token_details") or {}).get("cache_read") or 0
+                return usage.get("input_tokens", 0), cached, usage.get("output_tokens", 0)
+    # Older clients only report the raw OpenAI usage block
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+    return usage.get("prompt_tokens", 0), cached, usage.get("completion_tokens", 0)
+
+
+class UsageTelemetryHandler(BaseCallbackHandler):
+    """Token usage per completion, including prompt tokens served from the provider's prompt cache."""
+
+    def __init__(
+        self,
+        logger: Optional[logging.Logger] = None,
+        tier: Optional[str] = None,
+        price: Optional[Tuple[float, float, float]] = None,
+    ):
+        """
+        Args:
+            logger: Logs one usage line per completion when set
+            tier: Model tier label for per-tier token and cost metrics (src/model_router.py)
+            price: USD per 1M (input, cached input, output) tokens; enables llm_cost_usd
+        """
+        self.logger = logger
+        self.tier = tier
+        self.price = price
+        self._lock = threading.Lock()
+        self._prompt_tokens = 0
+        self._cached_tokens = 0
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        prompt, cached, completion = _usage(response)
+        if not prompt and not completion:
+            return
+        metrics.incr("llm_calls")
+        metrics.incr("llm_prompt_tokens", prompt)
+        metrics.incr("llm_cached_prompt_tokens", cached)
+        metrics.incr("llm_completion_tokens", completion)
+        with self._lock:
+            self._prompt_tokens += prompt
+            self._cached_tokens += cached
+            ratio = self._cached_tokens / self._prompt_tokens if self._prompt_tokens else 0.0
+        metrics.gauge("llm_prompt_cache_hit_ratio", round(ratio, 3))
+        if self.tier:
+            metrics.incr("llm_tier_prompt_tokens", prompt, tier=self.tier)
+            metrics.incr("llm_tier_completion_tokens", completion, tier=self.tier)
+            if self.price:
+                input_price, cached_price, output_price = self.price
+                cost = ((prompt - cached) * input_price + cached * cached_price + completion * output_price) / 1e6
+                metrics.incr("llm_cost_usd", cost, tier=self.tier)
+        if self.logger:
+            self.logger.info(f"LLM usage: prompt={prompt} cached={cached} completion={completion}")
+
+
+class DeadlineChatOpenAI(ChatOpenAI):
+    """ChatOpenAI whose per-request timeout follows the request deadline."""
+
+    def _get_request_payload(self, input_: Any, *, stop: Optional[List[str]] = None, **kwargs: Any) -> dict:
+        payload = super()._get_request_payload(input_, stop=stop, **kwargs)
+        if deadline.remaining() is not None:
+            default = self.request_timeout if isinstance(self.request_timeout, (int, float)) else None
+            payload["timeout"] = deadline.call_timeout(default or DEFAULT_LLM_TIMEOUT_SECONDS, "llm")
+        return payload
+
+    def _generate(self, *args: Any, **kwargs: Any):
+        try:
+            return super()._generate(*args, **kwargs)
+        except openai.APITimeoutError:
+            if deadline.is_exhausted():
+                deadline.exceeded("llm")
+            raise
+
+
+class DeadlineAgentExecutor(AgentExecutor):
+    """AgentExecutor that respects the request deadline."""
+
+    # Budget kept back for composing the final answer
+    answer_reserve_seconds: float = 8.0
+    # (inputs, intermediate_steps) -> answer, used when the loop stops early
+    best_effort_answer: Optional[Callable[[Dict[str, Any], List[Tuple[AgentAction, Any]]], str]] = None
+    # Run the tool calls of one step concurrently
+    parallel_tool_calls: bool = True
+
+    def _should_continue(self, iterations: int, time_elapsed: float) -> bool:
+        if not super()._should_continue(iterations, time_elapsed):
+            return False
+        left = deadline.remaining()
+        if left is None:
+            return True
+        # The first step always runs if a call can still start; later steps
+        # only while enough budget remains to answer afterwards
+        reserve = self.answer_reserve_seconds if iterations else 0.0
+        if left <= reserve + deadline.MIN_CALL_SECONDS:
+            deadline.exceeded("agent_loop")
+            return False
+        return True
+
+    def _iter_next_step(
+        self,
+        name_to_tool_map: Dict[str, Any],
+        color_mapping: Dict[str, str],
+        inputs: Dict[str, str],
+        intermediate_steps: List[Tuple[AgentAction, str]],
+        run_manager=None,
+    ) -> Iterator[Union[AgentFinish, AgentAction, AgentStep]]:
+        """
+        AgentExecutor yields every action of a step before performing any of
+        them, so each action is started on the tool pool as it is yielded;
+        `_perform_agent_action` then just collects the results in the original
+        order. (The async path already gathers tool calls in LangChain.)
+        """
+        if not self.parallel_tool_calls:
+            yield from super()._iter_next_step(
+                name_to_tool_map, color_mapping, inputs, intermediate_steps, run_manager
+            )
+            return
+
+        perform = super()._perform_agent_action
+        pending: Dict[int, Future] = {}
+        durations: List[float] = []
+        started = time.perf_counter()
+
+        def timed(action: AgentAction) -> AgentStep:
+            call_started = time.perf_counter()
+            try:
+                return perform(name_to_tool_map, color_mapping, action, run_manager)
+            finally:
+                elapsed = time.perf_counter() - call_started
+                durations.append(elapsed)
+                metrics.observe("agent_tool_call", elapsed, tool=action.tool)
+
+        previous = getattr(_step_state, "pending", None)
+        _step_state.pending = pending
+        try:
+            for item in super()._iter_next_step(
+                name_to_tool_map, color_mapping, inputs, intermediate_steps, run_manager
+            ):
+                if isinstance(item, AgentAction):
+                    if not pending:
+                        started = time.perf_counter()
+                    # Copy the context so the request deadline follows the call
+                    context = contextvars.copy_context()
+                    pending[id(item)] = _get_tool_pool().submit(context.run, timed, item)
+                yield item
+        finally:
+            _step_state.pending = previous
+            for future in pending.values():
+                future.cancel()
+
+        if durations:
+            metrics.observe("agent_step_tools_wall", time.perf_counter() - started)
+            metrics.observe("agent_step_tools_sum", sum(durations))
+            if len(durations) > 1:
+                metrics.incr("agent_parallel_tool_steps")
+                metrics.incr("agent_parallel_tool_calls", len(durations))
+
+    def _perform_agent_action(
+        self,
+        name_to_tool_map: Dict[str, Any],
+        color_mapping: Dict[str, str],
+        agent_action: AgentAction,
+        run_manager=None,
+    ) -> AgentStep:
+        pending = getattr(_step_state, "pending", None)
+        future = pending.pop(id(agent_action), None) if pending is not None else None
+        if future is not None:
+            return future.result()
+        return super()._perform_agent_action(name_to_tool_map, color_mapping, agent_action, run_manager)
+
+    def _finish(self, inputs: Dict[str, Any], outputs: Dict[str, Any]) -> Dict[str, Any]:
+        output = outputs.get("output")
+        if self.best_effort_answer and isinstance(output, str) and output.startswith(STOPPED_PREFIX):
+            metrics.incr("agent_best_effort_answers")
+            outputs["output"] = self.best_effort_answer(inputs, outputs.get("intermediate_steps", []))
+        return outputs
+
+    def _call(self, inputs: Dict[str, Any], run_manager=None) -> Dict[str, Any]:
+        return self._finish(inputs, super()._call(inputs, run_manager=run_manager))
+
+    async def _acall(self, inputs: Dict[str, Any], run_manager=None) -> Dict[str, Any]:
+        return self._finish(inputs, await super()._acall(inputs, run_manager=run_manager))
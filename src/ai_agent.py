@@ -4,23 +4,70 @@ AI-powered agent using OpenAI GPT-4o-mini with LangChain.
 All queries are email-scoped for security.
 """
 import os
+import time
 from typing import List, Dict, Any, Optional
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
-from langchain.agents import AgentExecutor, create_tool_calling_agent
+from langchain.agents import create_tool_calling_agent
 from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain.memory import ConversationBufferMemory
-from langchain_core.messages import HumanMessage, AIMessage
+from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 
 # Use absolute imports for better compatibility
 try:
-    from tools import ALL_TOOLS
+    import deadline
+    from tools import ALL_TOOLS, USER_DATA_TOOLS, knowledge_base_version, supabase_service
+    from agent_executor import DeadlineAgentExecutor, DeadlineChatOpenAI, UsageTelemetryHandler
+    from answer_cache import SemanticAnswerCache, prompt_fingerprint
+    from guardrails import Guardrails, PrototypeClassifier, guardrails_enabled
+    from model_router import FAST, STRONG, TEMPLATE, ModelRouter
+    from prompt_modules import CORE, build_system_prompt, full_prompt, select_modules
     from auth_stub import mask_email
     from logger import setup_logger, ConversationLogger, log_system_event
+    from metrics import metrics
 except ImportError:
-    from src.tools import ALL_TOOLS
+    from src import deadline
+    from src.tools import ALL_TOOLS, USER_DATA_TOOLS, knowledge_base_version, supabase_service
+    from src.agent_executor import DeadlineAgentExecutor, DeadlineChatOpenAI, UsageTelemetryHandler
+    from src.answer_cache import SemanticAnswerCache, prompt_fingerprint
+    from src.guardrails import Guardrails, PrototypeClassifier, guardrails_enabled
+    from src.model_router import FAST, STRONG, TEMPLATE, ModelRouter
+    from src.prompt_modules import CORE, build_system_prompt, full_prompt, select_modules
     from src.auth_stub import mask_email
     from src.logger import setup_logger, ConversationLogger, log_system_event
+    from src.metrics import metrics
+
+_TRUE_VALUES = {"1", "true", "yes", "on"}
+USER_DATA_TOOL_NAMES = {t.name for t in USER_DATA_TOOLS}
+
+BEST_EFFORT_PROMPT = (
+    "You are a claims and benefits assistant for Deriv employees. Time ran out before the "
+    "full answer was ready. Answer the user's question as well as possible using only the "
+    "tool results below, and say briefly if anything could not be checked."
+)
+
+# Per-user part of the system instructions; kept after the static system prompt
+# so the static prefix stays identical across users
+USER_CONTEXT_PROMPT = (
+    "Authenticated user email: {user_email}\n"
+    "IMPORTANT: When calling user data tools, always pass user_email=\"{user_email}\" as the parameter."
+)
+
+TIMEOUT_ANSWER = (
+    "Sorry, this is taking longer than expected and I couldn't finish looking it up. "
+    "Please try again in a moment, or contact my-hrops@deriv.com if it's urgent."
+)
+
+
+def _query_embedder():
+    """Embed questions with the shared knowledge base model (loaded on first use)."""
+    model_name = os.getenv("KNOWLEDGE_BASE_EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+
+    def embed(text: str) -> List[float]:
+        # knowledge_base/ is on sys.path once tools.py has been imported
+        from embedding_registry import get_embeddings
+        return get_embeddings(model_name).embed_query(text)
+
+    return embed
 
 # Load environment variables from config/.env
 load_dotenv("config/.env")
@@ -55,365 +102,173 @@ class ClaimAIAgent:
         
         self.logger.info(f"Using model: {self.model_name}")
         
-        # Initialize LLM
-        self.llm = ChatOpenAI(
-            model=self.model_name,
-            temperature=0.7,
-            api_key=self.api_key
-        )
+        # Model cascade (src/model_router.py): MODEL_NAME is the strong tier,
+        # MODEL_FAST_NAME (if different) takes simple turns
+        self.router = ModelRouter.from_env(self.model_name)
+        
+        # Initialize LLM (per-request timeout follows the request deadline;
+        # token usage, including prompt-cache hits, goes to metrics)
+        self.llm = self._build_llm(STRONG)
         
         self.logger.info("LLM initialized successfully")
         
-        # Create system prompt
-        self.system_prompt = """You are a friendly and helpful AI assistant for Deriv employee claim and benefits queries in Malaysia.
-
-⚠️ CRITICAL SCOPE BOUNDARIES ⚠️
-
-You are a SPECIALIZED assistant for Deriv employee claims and benefits ONLY.
-
-✅ YOU MUST ONLY ANSWER questions about:
-- Employee claims (medical, dental, optical, health screening)
-- AIA Medical Insurance coverage and procedures
-- Deriv Employee Benefits (MYR 2,000 limit)
-- Claim submission processes and requirements
-- Benefits coverage, limits, and exclusions
-- HR policies related to claims and benefits
-- AIA+ app and Sage People usage for claims
-- Contact information for claims support
-
-❌ YOU MUST NOT ANSWER questions about:
-- General knowledge or trivia
-- Entertainment requests (jokes, stories, games)
-- Current events, news, politics, celebrities
-- Personal advice unrelated to benefits
-- Technical support unrelated to claims
-- Weather, sports, or other general topics
-- Any topic not directly related to employee claims/benefits
-
-🛑 REJECTION PROTOCOL:
-
-When a user asks an off-topic question, respond naturally and conversationally:
-
-1. Acknowledge their request warmly and empathetically
-2. Politely explain you focus specifically on claims and benefits
-3. Offer to help with something relevant to your expertise
-4. Keep it brief, friendly, and conversational
-5. Use emojis when appropriate to add warmth 😊
-
-REJECTION EXAMPLES (Be natural, not robotic):
-
-❌ "Tell me a joke"
-✅ "Haha, I wish I could! But I'm specifically here to help with your claims and benefits. Need help with anything related to your AIA insurance or Deriv health benefits? 😊"
-
-❌ "Who is Donald Trump?" or "Who is [any person]?"
-✅ "That's outside my area of expertise! I focus on helping Deriv employees with their claims and benefits. Anything I can help you with regarding your medical, dental, or optical coverage?"
-
-❌ "Entertain me"
-✅ "I'd love to, but I'm specifically trained for claims and benefits! However, if you have questions about your AIA insurance or Deriv health benefits, I'm all ears! 😊"
-
-❌ "What's the weather?" or general knowledge
-✅ "That's not my specialty! I'm here to help with your employee claims and benefits. Need to check your coverage or submit a claim?"
-
-❌ "I feel tired" or personal issues
-✅ "I understand! While I can't help with general wellness, I'm here if you need assistance with your health benefits or medical claims. Need to check your AIA coverage? 😊"
-
-❌ "Help me with my code" or technical support
-✅ "That's outside my wheelhouse! I specialize in helping with claims and benefits. Got any questions about your AIA insurance or Deriv health benefits?"
-
-KEY PRINCIPLES FOR REJECTIONS:
-- Be warm, friendly, and empathetic
-- Acknowledge what they asked naturally
-- Politely decline without being rigid or robotic
-- Offer relevant help in a conversational way
-- Keep responses brief (2-3 sentences max)
-- Use emojis to add personality when appropriate 😊
-- Vary your responses - don't sound like a template!
-
-EXAMPLES OF QUERIES TO ACCEPT:
-✅ "What's my claim balance?" → Use tools to answer
-✅ "How do I submit a dental claim?" → Provide guidance
-✅ "Is cancer treatment covered?" → Check our resources
-✅ "What's the AIA hotline?" → Provide contact info
-✅ "Can I claim for glasses?" → Explain optical benefits
-
-QUERY VALIDATION CHECKLIST:
-Before answering ANY query, ask yourself:
-1. Is this about claims, benefits, or insurance?
-2. Is this about Deriv or AIA policies/procedures?
-3. Can I answer this using my tools or our resources?
-
-If NO to all three → Use rejection protocol immediately
-If YES to any → Proceed to answer
-
-Your role:
-- Help employees understand their TWO separate benefit systems:
-  1. AIA Medical Insurance (RM 150,000 annual limit)
-  2. Deriv Employee Benefits (MYR 2,000 annual limit for dental/optical/health screening)
-- Guide employees through claim submission processes
-- Answer questions about coverage, exclusions, and procedures
-- Provide step-by-step instructions for using AIA+ app and Sage People
-- Explain the difference between cashless (AIA panel) and reimbursement claims
-
-CRITICAL DISTINCTIONS:
-
-AIA Medical Insurance (RM 150,000 annual limit):
-- Covers: GP visits, Specialist consultations, Hospital care, Emergency treatment
-- Coverage: Employee + Dependents (if added to policy)
-- Dependents: Check your AIA+ app to see who's covered, or contact my-hrops@deriv.com
-- Limits:
-  * GP (Outpatient): No annual limit
-  * Specialist: RM 1,000 per visit (no annual limit)
-  * Overall annual limit: RM 150,000
-- Method: Cashless at panel clinics/hospitals using AIA e-Medical card
-- Claim deadline: 30 days from treatment date
-- Processing: 21 days after AIA receives complete documents
-- Requires: GP referral for specialists (valid 30 days)
-- Emergency hotline: 1300 8888 60/70
-
-Deriv Employee Benefits (MYR 2,000):
-- Covers: Dental, Optical, Health Screening ONLY
-- Coverage: Employee ONLY (no dependents)
-- Method: Pay first, claim via Sage People
-- Eligibility: Confirmed employees only (after probation)
-- Claim deadline: Same month as service date
-- Annual reset: January 1st (no rollover)
-- Contact: my-hrops@deriv.com
-
-IMPORTANT RULES:
-
-1. ALWAYS clarify which benefit system the user is asking about
-2. GP/Specialist/Hospital queries → AIA Insurance
-3. Dental/Optical/Health Screening queries → Deriv Benefits
-4. Panel clinic visits → Use AIA e-Medical card (cashless)
-5. Non-panel emergency → Pay first, claim within 30 days
-6. Specialist visits → MUST have GP referral letter (valid 30 days)
-7. Hospital admission → Apply Guarantee Letter via AIA+ app (1 day before)
-8. Medical report required if: GP claim >RM80, Specialist >RM150, Hospital >RM500
-
-DEPENDENT COVERAGE:
-- AIA Medical Insurance: DOES cover dependents (if added to your policy)
-  * Check your AIA+ app to see who's covered
-  * Contact my-hrops@deriv.com to add/remove dependents
-- Deriv Employee Benefits (MYR 2,000): Employee ONLY, no dependents
-
-CLAIM SUBMISSION PROCESS:
-
-For AIA Claims (Non-Panel/Emergency):
-1. Complete AIA Corporate Solutions Claim Form
-2. Attach: Original receipts, IC/Passport copy, Medical report (if required)
-3. Submit to HR Department
-4. Processing: 21 days
-
-For Deriv Benefits (Dental/Optical/Health Screening):
-1. Pay upfront at any provider
-2. Get receipt with your name
-3. Get approval from authorised person
-4. Submit via Sage People within same month
-5. Use Staff Claim Reimbursement Form (ClickUp)
-
-STAFF CLAIM FORM (5 Types):
-1. Employee Benefit - Dental/Optical/Health Screening (NO e-invoice needed)
-2. Travel Reimbursement - Travel/Parking/Taxi/Mileage (e-invoice required for MY)
-3. Educational Assistance - Courses/Training (needs Talent Dev approval + e-invoice)
-4. Other Reimbursement - Team Building/Lunch (needs proposal form + e-invoice)
-5. Cash Advance - Marketing purposes (e-invoice required)
-
-E-INVOICING (Malaysia staff):
-- Required for ALL claims EXCEPT Employee Benefits (dental/optical/health screening)
-- Request e-invoice with company details from supplier
-- Not applicable to AIA medical insurance claims
-
-EXCLUSIONS TO REMEMBER:
-
-AIA Does NOT Cover:
-- Cosmetic procedures, LASIK (unless medically necessary)
-- Dental care (except accidental injuries)
-- Pregnancy/childbirth
-- Pre-existing conditions during waiting period
-- Alternative therapies (acupuncture, chiropractic, etc.)
-- Vitamins, supplements, over-the-counter items
-- Mental health conditions
-- Preventive vaccinations (except mandatory child immunizations)
-
-Deriv Benefits (MYR 2,000) Do NOT Cover:
-- Non-prescription sunglasses
-- Cosmetic dental treatments
-- Dependent claims (employee only - no dependents covered)
-- Services before confirmation date
-
-IMPORTANT: AIA Medical Insurance CAN cover dependents if they are added to your policy. Check your AIA+ app or contact my-hrops@deriv.com to verify your dependent coverage.
-
-RESPONSE STYLE:
-
-1. Be warm, friendly, and empathetic
-2. Use clear, simple language (avoid jargon)
-3. Provide step-by-step instructions when needed
-4. Always mention relevant deadlines and limits
-5. Clarify which benefit system applies
-6. Offer to explain further if needed
-7. Include contact information when appropriate
-
-CONTACT INFORMATION:
-
-- AIA 24-hour hotline: 1300 8888 60/70
-- Deriv MY HR Operations: my-hrops@deriv.com
-- Staff Claim Reimbursement Form: https://forms.clickup.com/20696747/f/kqknb-810315/DFDX4GPVELIFPNN9VA
-
-IMPORTANT - EMPLOYEE BENEFIT SHORTCUTS:
-
-When users mention "employee benefit" or "deriv benefits" or "deriv health benefits", immediately recognize this as dental/optical/health screening and provide the form link:
-
-User: "employee benefit"
-Bot: "For Employee Benefits (dental, optical, health screening), submit via the [Staff Claim Reimbursement Form](https://forms.clickup.com/20696747/f/kqknb-810315/DFDX4GPVELIFPNN9VA).
-
-Steps:
-1. Select 'Employee Benefit' as claim type
-2. Attach your receipt (must have your name)
-3. Get approval from authorised person
-4. Submit within the same month as service date
-
-No e-invoice needed! 😊"
-
-IMPORTANT - CLAIM SUBMISSION INSTRUCTIONS:
-
-When users ask "how to submit claim" or "submit my claim", you MUST clarify which type:
-
-1. **For Employee Benefits (Dental, Optical, Health Screening):**
-   - ALWAYS provide the direct form link
-   - Format: "For dental/optical/health screening claims, submit via the [Staff Claim Reimbursement Form](https://forms.clickup.com/20696747/f/kqknb-810315/DFDX4GPVELIFPNN9VA)"
-   - Mention: Select 'Employee Benefit' type, no e-invoice needed
-   - Remind: Attach receipt with your name, get approval, submit same month
-
-2. **For AIA Medical Insurance (GP, Specialist, Hospital):**
-   - Panel clinics: Use AIA e-Medical card (cashless)
-   - Non-panel/Emergency: Pay first, submit AIA claim form to HR within 30 days
-   - Contact: my-hrops@deriv.com or AIA hotline 1300 8888 60/70
-
-Example responses:
-
-User: "How do I submit a claim?"
-Bot: "It depends on the type of claim:
-
-**For Dental/Optical/Health Screening:**
-Submit via the [Staff Claim Reimbursement Form](https://forms.clickup.com/20696747/f/kqknb-810315/DFDX4GPVELIFPNN9VA). Select 'Employee Benefit' as the claim type. No e-invoice needed!
-
-**For Medical (GP/Specialist/Hospital):**
-- Panel clinics: Use your AIA e-Medical card (cashless)
-- Non-panel: Pay first, submit AIA claim form to my-hrops@deriv.com within 30 days
-
-Which type of claim are you submitting?"
-
-User: "How to submit dental claim?"
-Bot: "To submit your dental claim, use the [Staff Claim Reimbursement Form](https://forms.clickup.com/20696747/f/kqknb-810315/DFDX4GPVELIFPNN9VA). 
-
-Steps:
-1. Select 'Employee Benefit' as claim type
-2. Attach your receipt (must have your name)
-3. Get approval from authorised person
-4. Submit within the same month as service date
-
-No e-invoice needed for dental claims! 😊"
-
-SECURITY RULES:
-- Each user can ONLY see their own data
-- All tools require user_email parameter - always pass it
-- Never make up data - only use information from the tools
-- If you don't know something, say so clearly
-
-⚠️ CRITICAL PRIVACY RULE - REJECT OTHER USER QUERIES:
-
-If a user asks about ANOTHER person's claim data (using email, name, or employee ID), you MUST reject immediately:
-
-DETECTION RULES (Be precise - only reject actual references to OTHER people):
-
-✅ ALLOW (these are about the user's OWN data/conversation):
-- "my last question", "previous message", "what did I ask"
-- "our conversation", "conversation history", "what we discussed"
-- "my balance", "my claims", "my data"
-- "tell me about...", "what is...", "how to..."
-
-❌ REJECT (these reference OTHER people):
-- Email addresses: "john@deriv.com", "sathish.badrinara@deriv.com"
-- Names with possessive: "John's balance", "Sarah's claims", "Sathish's data"
-- Employee IDs: "employee 12345", "ID 67890", "staff number 123"
-- "For [name]": "balance for John", "claims for Sarah"
-- "Check [name]": "check John", "look up Sarah"
-
-REJECTION RESPONSE (use this exact format):
-"I'm unable to help with that request. For privacy and security reasons, I can only provide information about your own claims and benefits. Each employee can only access their personal data. If you need information about another employee's claims, please contact my-hrops@deriv.com."
-
-EXAMPLES:
-
-✅ ALLOW:
-- "What's my last question?" → Answer about conversation history
-- "What did we discuss?" → Summarize previous conversation
-- "Previous message" → Refer to chat history
-
-❌ REJECT:
-- "What's John's balance?" → Privacy rejection
-- "Give me claim amount for sathish.badrinara@deriv.com" → Privacy rejection
-- "Check balance for employee ID 12345" → Privacy rejection
-- "How much has Sarah claimed?" → Privacy rejection
-
-IMPORTANT: 
-- Only reject when there's a CLEAR reference to another person (name, email, ID)
-- Do NOT reject questions about conversation history or general information
-- Reject IMMEDIATELY without using tools
-- Do NOT send to DM - reject in the channel itself
-- Be firm but polite about privacy policy
-
-Available tools:
-1. User-Specific Data Tools (require user_email):
-   - get_user_claims: Fetch THIS USER's claim records
-   - calculate_balance: Get THIS USER's remaining balance
-   - calculate_total_spent: Calculate THIS USER's total spent
-   - get_claim_count: Count THIS USER's claims
-   - get_user_summary: THIS USER's complete data summary
-   - get_max_amount: Get THIS USER's max claim limit
-
-2. General Information Tools (NO user_email needed - applies to ALL employees):
-   - search_knowledge_base: Search company policies, procedures, benefits info
-   - get_claim_submission_guide: Get general claim submission instructions
-   - get_benefits_information: Get general benefits coverage details
-
-CRITICAL: 
-- Questions about "my balance", "my claims", "how much I spent" → Use User Data Tools
-- Questions about "how to claim", "what benefits", "procedures", "eligibility" → Use General Information Tools
-- General Information tools provide company-wide information that applies to ALL employees
-- User Data tools provide SPECIFIC information for the authenticated user only
-
-Remember: You're here to help employees navigate both AIA insurance and Deriv benefits easily!"""
+        # System prompt modules (src/prompt_modules.py); each turn sends core plus
+        # the modules its question needs. This is the full set, for fingerprints.
+        self.system_prompt = full_prompt()
         
-        # Create prompt template with memory
+        # Create prompt template with memory.
+        # The tool schemas and the core prompt module open every request with the
+        # same bytes, so the provider can serve them from its prompt cache; topic
+        # modules follow in a fixed order, and anything per-user (identity,
+        # history, question) comes strictly after them.
         self.prompt = ChatPromptTemplate.from_messages([
-            ("system", self.system_prompt),
+            ("system", "{system_prompt}"),
+            ("system", USER_CONTEXT_PROMPT),
             MessagesPlaceholder(variable_name="chat_history", optional=True),
             ("human", "{input}"),
             MessagesPlaceholder(variable_name="agent_scratchpad"),
         ])
         
-        # Create agent
-        self.agent = create_tool_calling_agent(
-            llm=self.llm,
-            tools=ALL_TOOLS,
-            prompt=self.prompt
-        )
-        
-        # Create executor
-        self.executor = AgentExecutor(
-            agent=self.agent,
-            tools=ALL_TOOLS,
-            verbose=True,
-            handle_parsing_errors=True,
-            max_iterations=5
-        )
+        # Changes only when the core prompt or tools change (i.e. when the prompt cache goes cold)
+        prefix_hash = prompt_fingerprint(CORE.text, *(f"{t.name}:{t.description}" for t in ALL_TOOLS))
+        self.logger.info(f"Static prompt prefix fingerprint: {prefix_hash}")
+
+        # Create agent and executor (one per model tier)
+        self.executor = self._build_executor(self.llm)
+        self.executors = {STRONG: self.executor}
+        if self.router.has_fast_tier:
+            self.executors[FAST] = self._build_executor(self._build_llm(FAST))
+            self.logger.info(f"Fast tier model: {self.router.tiers[FAST].model}")
         
         # Memory for conversation history
         self.memory = {}
+        # Set once the query embedding model has run in this process (warm_session)
+        self._embedder_warm = False
+
+        # Off-topic and other-person questions answered before the agent runs
+        classifier = None
+        if os.getenv("GUARDRAIL_EMBEDDINGS", "false").strip().lower() in _TRUE_VALUES:
+            classifier = PrototypeClassifier(
+                _query_embedder(),
+                min_similarity=float(os.getenv("GUARDRAIL_EMBEDDING_SIMILARITY", "0.5")),
+                margin=float(os.getenv("GUARDRAIL_EMBEDDING_MARGIN", "0.15")),
+            )
+        self.guardrails = Guardrails(classifier=classifier)
+
+        # Cache for answers to general questions (no user-data tools involved)
+        self.answer_cache: Optional[SemanticAnswerCache] = None
+        self._cache_version_checked_at = 0.0
+        if os.getenv("ANSWER_CACHE_ENABLED", "true").strip().lower() in _TRUE_VALUES:
+            semantic = os.getenv("ANSWER_CACHE_SEMANTIC", "true").strip().lower() in _TRUE_VALUES
+            self.answer_cache = SemanticAnswerCache(
+                embed_fn=_query_embedder() if semantic else None,
+                threshold=float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.92")),
+                ttl_seconds=float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "86400")),
+                max_entries=int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "2000")),
+                signing_key=os.getenv("ANSWER_CACHE_SIGNING_KEY") or None,
+                evict_downvotes=int(os.getenv("ANSWER_CACHE_EVICT_DOWNVOTES", "2")),
+            )
+            self.refresh_answer_cache_version()
         
         log_system_event("AI_AGENT_READY", f"Agent ready with model {self.model_name}")
         self.logger.info("AI Agent initialization complete")
     
+    def _build_llm(self, tier: str) -> DeadlineChatOpenAI:
+        config = self.router.tiers[tier]
+        return DeadlineChatOpenAI(
+            model=config.model,
+            temperature=config.temperature,
+            api_key=self.api_key,
+            callbacks=[UsageTelemetryHandler(self.logger, tier=tier, price=config.price)]
+        )
+
+    def _build_executor(self, llm: DeadlineChatOpenAI) -> DeadlineAgentExecutor:
+        agent = create_tool_calling_agent(
+            llm=llm,
+            tools=ALL_TOOLS,
+            prompt=self.prompt
+        )
+        return DeadlineAgentExecutor(
+            agent=agent,
+            tools=ALL_TOOLS,
+            verbose=True,
+            handle_parsing_errors=True,
+            max_iterations=5,
+            return_intermediate_steps=True,  # tells us which tools an answer used
+            answer_reserve_seconds=float(os.getenv("AGENT_ANSWER_RESERVE_SECONDS", "8")),
+            best_effort_answer=self._best_effort_answer,
+            # Tool calls emitted in the same step run concurrently
+            parallel_tool_calls=os.getenv("AGENT_PARALLEL_TOOLS", "true").strip().lower() in {"1", "true", "yes", "on"}
+        )
+
+    def refresh_answer_cache_version(self, force: bool = True) -> Optional[str]:
+        """
+        Re-derive the answer cache version from the KB content and prompt hash.
+        Without force, the KB is re-checked at most every ANSWER_CACHE_VERSION_CHECK_SECONDS.
+        """
+        if self.answer_cache is None:
+            return None
+        interval = float(os.getenv("ANSWER_CACHE_VERSION_CHECK_SECONDS", "300"))
+        now = time.monotonic()
+        if force or now - self._cache_version_checked_at >= interval:
+            self._cache_version_checked_at = now
+            prompt_hash = prompt_fingerprint(self.system_prompt, USER_CONTEXT_PROMPT, self.model_name)
+            self.answer_cache.set_version(f"{knowledge_base_version()}:{prompt_hash}")
+        return self.answer_cache.version
+
+    def _best_effort_answer(self, inputs: Dict[str, Any], intermediate_steps: List) -> str:
+        """
+        Answer from the tool results gathered so far when the agent loop stops early.
+        """
+        observations = [
+            f"[{action.tool}] {str(observation)[:1500]}"
+            for action, observation in intermediate_steps
+        ]
+        left = deadline.remaining()
+        if observations and (left is None or left > deadline.MIN_CALL_SECONDS):
+            try:
+                message = self.llm.invoke([
+                    SystemMessage(content=BEST_EFFORT_PROMPT),
+                    HumanMessage(content=f"{inputs['input']}\n\nTool results:\n" + "\n".join(observations)),
+                ])
+                return message.content
+            except Exception as exc:
+                self.logger.warning(f"Best-effort answer failed: {exc}")
+        return TIMEOUT_ANSWER
+
+    def warm_session(self, user_email: str, thread_id: str = None) -> Dict[str, Any]:
+        """
+        Prepare for a user's first question before they type it: prefetch their
+        claim context into the per-user cache, create the thread's memory and
+        make sure the query embedding model has run once in this process.
+        """
+        started = time.perf_counter()
+        self._get_user_memory(user_email, thread_id)
+        context_ready = supabase_service.prefetch_user_context(user_email)
+
+        if not self._embedder_warm and knowledge_base_version() != "disabled":
+            try:
+                _query_embedder()("claim benefits")
+                self._embedder_warm = True
+            except Exception as exc:
+                self.logger.warning(f"Embedding warm-up failed: {exc}")
+
+        elapsed = time.perf_counter() - started
+        metrics.observe("session_warm", elapsed)
+        return {
+            "context": context_ready,
+            "embedder": self._embedder_warm,
+            "elapsed_ms": round(elapsed * 1000, 1),
+        }
+
+    @staticmethod
+    def _has_prior_turns(chat_history: List, query_text: str) -> bool:
+        """True when earlier user turns exist (the current question may be sent as context too)."""
+        human_turns = [m for m in chat_history if isinstance(m, HumanMessage)]
+        if human_turns and human_turns[-1].content.strip() == query_text.strip():
+            human_turns = human_turns[:-1]
+        return bool(human_turns)
+
     def _get_memory_key(self, user_email: str, thread_id: str = None) -> str:
         """
         Generate memory key for user + optional thread.
@@ -469,7 +324,7 @@ Remember: You're here to help employees navigate both AIA insurance and Deriv be
     def _contains_pii_query(self, query_text: str) -> bool:
         """
         Detect if query contains PII-related requests about the USER'S OWN data.
-        Returns False if query is about someone else's data (will be rejected by AI).
+        Returns False if query is about someone else's data (will be rejected).
         
         Args:
             query_text: User's query
@@ -477,53 +332,7 @@ Remember: You're here to help employees navigate both AIA insurance and Deriv be
         Returns:
             True if query is about user's own PII data, False otherwise
         """
-        import re
-        
-        query_lower = query_text.lower()
-        
-        # First, check if query references OTHER people's data
-        # This should NOT trigger DM - let AI agent reject it in channel
-        
-        # Check for email addresses (indicates asking about someone else)
-        if '@' in query_text and '.' in query_text:
-            # Pattern: word@word.word
-            email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-            if re.search(email_pattern, query_text):
-                return False  # Query references another person's email
-        
-        # Check for possessive forms indicating OTHER people
-        # Examples: "John's balance", "Sarah's claims", "Sathish's data"
-        other_person_patterns = [
-            r'\b[A-Z][a-z]+\'s\s+(balance|claim|data|limit|amount)',  # Name's + PII keyword
-            r'\bfor\s+[A-Z][a-z]+\b',  # "for John", "for Sarah"
-            r'\bemployee\s+\d+',  # "employee 12345"
-            r'\bstaff\s+(number\s+)?\d+',  # "staff 123", "staff number 123"
-            r'\b(ID|id)\s+\d+',  # "ID 67890"
-            r'\bcheck\s+[A-Z][a-z]+',  # "check John", "check Sarah"
-            r'\blook\s+up\s+[A-Z][a-z]+',  # "look up John"
-        ]
-        
-        for pattern in other_person_patterns:
-            if re.search(pattern, query_text):
-                return False  # Query is about someone else - don't send to DM
-        
-        # Now check if it's about user's OWN PII data
-        # These should trigger DM for privacy
-        own_pii_keywords = [
-            'my balance', 'my claim', 'my claims',
-            'my limit', 'my data', 'my information',
-            'my remaining', 'my total',
-            'how much have i', 'how much did i',
-            'how much i have', 'how much i\'ve',
-            'what\'s my', 'whats my',
-            'show me my', 'tell me my',
-            'do i have', 'can i claim',
-            'my claim history', 'my transactions',
-            'my claim records', 'my claim details',
-        ]
-        
-        # Check if any own PII keyword is in the query
-        return any(keyword in query_lower for keyword in own_pii_keywords)
+        return self.guardrails.is_own_data_query(query_text)
     
     def query(
         self,
@@ -546,16 +355,6 @@ Remember: You're here to help employees navigate both AIA insurance and Deriv be
         user_email = user_email.strip().lower()
         masked = mask_email(user_email)
         
-        # Detect PII queries
-        contains_pii = self._contains_pii_query(query_text)
-        
-        # Log with thread context if available
-        thread_info = f" [thread: {thread_id[:8]}...]" if thread_id else ""
-        pii_info = " [PII]" if contains_pii else ""
-        print(f"\n[AI AGENT] Query from {masked}{thread_info}{pii_info}: {query_text}")
-        self.logger.info(f"Query from {masked}{thread_info}{pii_info}: {query_text}")
-        self.conv_logger.log_query(user_email, query_text, masked)
-        
         # Get conversation history (thread-specific if thread_id provided)
         chat_history = self._get_user_memory(user_email, thread_id)
         if context_messages:
@@ -571,22 +370,121 @@ Remember: You're here to help employees navigate both AIA insurance and Deriv be
                     external_history.append(HumanMessage(content=content))
             if external_history:
                 chat_history = list(chat_history) + external_history
+        previous_turns = [m.content for m in chat_history if isinstance(m, HumanMessage)]
+        if previous_turns and previous_turns[-1].strip() == query_text.strip():
+            previous_turns = previous_turns[:-1]
+        previous_text = previous_turns[-1] if previous_turns else ""
+
+        # Detect PII queries and clearly off-topic / other-person questions
+        verdict = self.guardrails.check(query_text, user_email, previous_text)
+        contains_pii = verdict.own_data
         
-        # Prepare input with user_email injected into tools
-        # We need to bind user_email to all tool calls
-        modified_input = f"""User email: {user_email}
-User query: {query_text}
+        # Log with thread context if available
+        thread_info = f" [thread: {thread_id[:8]}...]" if thread_id else ""
+        pii_info = " [PII]" if contains_pii else ""
+        print(f"\n[AI AGENT] Query from {masked}{thread_info}{pii_info}: {query_text}")
+        self.logger.info(f"Query from {masked}{thread_info}{pii_info}: {query_text}")
+        self.conv_logger.log_query(user_email, query_text, masked)
+
+        if verdict.rejected and guardrails_enabled():
+            self.logger.info(
+                f"Guardrail rejected query from {masked} ({verdict.reason}, "
+                f"confidence {verdict.confidence}, matched {verdict.matched})"
+            )
+            self.conv_logger.log_response(user_email, verdict.answer, masked)
+            self._add_to_memory(user_email, query_text, verdict.answer)
+            return {
+                "answer": verdict.answer,
+                "user_email_hash": masked,
+                "model": self.model_name,
+                "status": "success",
+                "contains_pii": False,
+                "cached": False,
+                "guardrail": verdict.reason,
+            }
 
-IMPORTANT: When calling tools, always pass user_email="{user_email}" as the parameter."""
+        # Small talk gets a fixed reply; other turns go to the fast or strong model
+        route = self.router.route(query_text, select_modules(query_text, previous_text), previous_text)
+        if route.tier == TEMPLATE:
+            self.router.record_template()
+            self.conv_logger.log_response(user_email, route.answer, masked)
+            self._add_to_memory(user_email, query_text, route.answer)
+            return {
+                "answer": route.answer,
+                "user_email_hash": masked,
+                "model": TEMPLATE,
+                "model_tier": TEMPLATE,
+                "status": "success",
+                "contains_pii": False,
+                "cached": False,
+            }
+        
+        # General first-turn questions can be answered from the cache
+        cacheable = (
+            self.answer_cache is not None
+            and not contains_pii
+            and self.answer_cache.is_general(query_text)
+            and not self._has_prior_turns(chat_history, query_text)
+        )
+        if cacheable:
+            self.refresh_answer_cache_version(force=False)
+            cached = self.answer_cache.lookup(query_text)
+            if cached:
+                answer = cached["answer"]
+                self.logger.info(f"Answer cache hit ({cached['match']}, {cached['source']}) for {masked}")
+                self.conv_logger.log_response(user_email, answer, masked)
+                self._add_to_memory(user_email, query_text, answer)
+                return {
+                    "answer": answer,
+                    "user_email_hash": masked,
+                    "model": self.model_name,
+                    "status": "success",
+                    "contains_pii": False,
+                    "cached": True,
+                    "cache_version": self.answer_cache.version,
+                    "answer_id": self.answer_cache.issue(cached["query"], answer, masked),
+                }
         
         try:
+            # Budget may already be spent waiting for an agent slot
+            deadline.check("queue")
+
             # Run agent
-            response = self.executor.invoke({
-                "input": modified_input,
+            # Only the prompt modules this question needs (core always first)
+            system_prompt, modules = build_system_prompt(query_text, previous_text)
+            for module in modules:
+                metrics.incr("prompt_modules", module=module)
+            metrics.incr("prompt_system_chars", len(system_prompt))
+
+            # user_email fills the per-user system message (after the static prefix)
+            inputs = {
+                "system_prompt": system_prompt,
+                "input": query_text,
+                "user_email": user_email,
                 "chat_history": chat_history
-            })
+            }
+            response, tier, escalation = self.router.run(
+                route, lambda name: self.executors[name].invoke(inputs)
+            )
+            self.logger.info(
+                f"Model tier {tier} for {masked} (score {route.score:.2f}, {route.reasons}"
+                + (f", escalated: {escalation})" if escalation else ")")
+            )
             
             answer = response["output"]
+
+            # Cache the answer only if it used no personal data
+            cache_version = answer_id = None
+            tools_used = {action.tool for action, _ in response.get("intermediate_steps", [])}
+            if (
+                cacheable
+                and not tools_used & USER_DATA_TOOL_NAMES
+                and user_email not in answer.lower()
+            ):
+                self.answer_cache.store(query_text, answer)
+                cache_version = self.answer_cache.version
+                # Feedback on this answer refers to the server's record by id
+                answer_id = self.answer_cache.issue(query_text, answer, masked)
             
             # Log response
             self.logger.info(f"Response generated for {masked}")
@@ -598,9 +496,23 @@ IMPORTANT: When calling tools, always pass user_email="{user_email}" as the para
             return {
                 "answer": answer,
                 "user_email_hash": mask_email(user_email),
-                "model": self.model_name,
+                "model": self.router.tiers[tier].model,
+                "model_tier": tier,
                 "status": "success",
-                "contains_pii": contains_pii
+                "contains_pii": contains_pii,
+                "cached": False,
+                "cache_version": cache_version,
+                "answer_id": answer_id,
+            }
+        
+        except deadline.DeadlineExceeded as e:
+            self.logger.warning(f"Deadline exceeded for {masked} at stage {e.stage}")
+            return {
+                "answer": TIMEOUT_ANSWER,
+                "user_email_hash": masked,
+                "model": self.model_name,
+                "status": "timeout",
+                "contains_pii": False
             }
         
         except Exception as e:
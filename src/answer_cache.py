@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""
+Semantic answer cache for general (non-personal) questions.
+
+Answers the agent produced without calling any user-data tool are cached by
+normalised question text. Lookups try an exact match first and then the most
+similar cached question by embedding (cosine >= threshold). The cache is
+versioned by knowledge base content and system prompt hash: when either
+changes, every entry is dropped.
+
+Feedback never supplies answer text. Every cacheable answer the server hands
+out is recorded under an answer_id (an HMAC of version, question and answer);
+a thumbs-up or thumbs-down refers to that id, only counts from a user the
+answer was issued to, and the cache is updated from the server's own record.
+"""
+import hashlib
+import hmac
+import re
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy ships with pandas in requirements
+    np = None
+
+try:
+    from metrics import metrics
+except ImportError:
+    from src.metrics import metrics
+
+_NON_WORD = re.compile(r"[^\w\s]+")
+# Any first-person reference marks a question as personal: "my balance", but also
+# "how much do I have left", "what have I claimed", "can I claim", "show me"
+_PERSONAL = re.compile(r"\b(i|me|my|mine|myself)\b", re.IGNORECASE)
+
+
+def normalize_query(text: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace."""
+    return " ".join(_NON_WORD.sub(" ", text.lower()).split())
+
+
+def prompt_fingerprint(*parts: str) -> str:
+    """Short stable hash of the prompt/model inputs that shape an answer."""
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:12]
+
+
+class SemanticAnswerCache:
+    """In-process cache of general answers with exact and embedding lookup."""
+
+    def __init__(
+        self,
+        embed_fn: Optional[Callable[[str], List[float]]] = None,
+        threshold: float = 0.92,
+        ttl_seconds: float = 86400.0,
+        max_entries: int = 2000,
+        signing_key: Optional[str] = None,
+        evict_downvotes: int = 2,
+    ):
+        """
+        Args:
+            embed_fn: Text -> L2-normalised vector; None disables similarity lookup
+            threshold: Minimum cosine similarity for a semantic hit
+            ttl_seconds: Lifetime of a cached answer
+            max_entries: Cap on cached answers (least recently used evicted first)
+            signing_key: Secret for answer ids; with a random per-process key (the
+                default) ids from earlier processes cannot be verified, so
+                seeding from feedback needs a fixed key
+            evict_downvotes: Distinct users whose thumbs-down evicts an answer
+        """
+        self.embed_fn = embed_fn
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.version = ""
+        self.evict_downvotes = max(evict_downvotes, 1)
+        self._signing_key = (signing_key or secrets.token_hex(32)).encode("utf-8")
+        # answer_id -> the answer as issued (query, answer, who received it, down votes)
+        self._issued: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # Row-aligned with _keys; rebuilt lazily after changes
+        self._keys: List[str] = []
+        self._matrix = None
+        self._dirty = False
+
+    def set_version(self, version: str) -> None:
+        """Switch to a new KB/prompt version, dropping answers from the old one."""
+        with self._lock:
+            if version == self.version:
+                return
+            if self._entries:
+                metrics.incr("answer_cache_invalidations")
+            self.version = version
+            self._entries.clear()
+            self._issued.clear()
+            self._dirty = True
+
+    @staticmethod
+    def is_general(query_text: str) -> bool:
+        """Questions in the first person are never served from (or written to) the cache."""
+        return not _PERSONAL.search(query_text)
+
+    def _embed(self, text: str) -> Optional[List[float]]:
+        if self.embed_fn is None:
+            return None
+        try:
+            return self.embed_fn(text)
+        except Exception:
+            metrics.incr("answer_cache_embed_errors")
+            return None
+
+    def _rebuild_matrix(self) -> None:
+        self._keys = [key for key, entry in self._entries.items() if entry["vector"] is not None]
+        if np is not None and self._keys:
+            self._matrix = np.asarray([self._entries[key]["vector"] for key in self._keys], dtype=np.float32)
+        else:
+            self._matrix = None
+        self._dirty = False
+
+    def _nearest(self, vector: List[float]) -> Optional[str]:
+        if self._dirty:
+            self._rebuild_matrix()
+        if not self._keys:
+            return None
+        if self._matrix is not None:
+            scores = self._matrix @ np.asarray(vector, dtype=np.float32)
+            index = int(scores.argmax())
+            best_key, best_score = self._keys[index], float(scores[index])
+        else:
+            best_key, best_score = None, -1.0
+            for key in self._keys:
+                score = sum(a * b for a, b in zip(self._entries[key]["vector"], vector))
+                if score > best_score:
+                    best_key, best_score = key, score
+        return best_key if best_score >= self.threshold else None
+
+    def lookup(self, query_text: str) -> Optional[Dict[str, Any]]:
+        """
+        Return the cached entry for a question ({"answer", "query", "source", ...}) or None.
+        """
+        key = normalize_query(query_text)
+        # Personal questions need the user's own data, however close a general answer is
+        if not key or not self.is_general(query_text):
+            return None
+        started = time.perf_counter()
+        with self._lock:
+            entry = self._entries.get(key)
+            match = "exact" if entry else None
+        if entry is None:
+            vector = self._embed(key)
+            if vector is not None:
+                with self._lock:
+                    nearest = self._nearest(vector)
+                    entry = self._entries.get(nearest) if nearest else None
+                    match = "semantic" if entry else None
+
+        if entry is not None and entry["expires_at"] < time.monotonic():
+            self.invalidate(entry["query"])
+            entry = None
+        metrics.observe("answer_cache_lookup", time.perf_counter() - started)
+        if entry is None:
+            metrics.incr("answer_cache_requests", result="miss")
+            return None
+        with self._lock:
+            entry_key = normalize_query(entry["query"])
+            if entry_key in self._entries:
+                self._entries.move_to_end(entry_key)
+        metrics.incr("answer_cache_requests", result=match)
+        return {**entry, "match": match}
+
+    def store(self, query_text: str, answer: str, source: str = "agent") -> None:
+        key = normalize_query(query_text)
+        if not key or not answer or not self.is_general(query_text):
+            return
+        vector = self._embed(key)
+        with self._lock:
+            self._entries[key] = {
+                "query": query_text,
+                "answer": answer,
+                "source": source,
+                "vector": vector,
+                "expires_at": time.monotonic() + self.ttl_seconds,
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._dirty = True
+
+    def invalidate(self, query_text: str) -> bool:
+        """Drop the answer cached for a question (e.g. after a thumbs-down)."""
+        with self._lock:
+            removed = self._entries.pop(normalize_query(query_text), None) is not None
+            if removed:
+                self._dirty = True
+        return removed
+
+    def answer_id(self, query_text: str, answer: str, version: Optional[str] = None) -> str:
+        """Signed id of an answer to a question under a cache version."""
+        message = "\0".join((self.version if version is None else version, normalize_query(query_text), answer))
+        return hmac.new(self._signing_key, message.encode("utf-8"), hashlib.sha256).hexdigest()[:32]
+
+    def issue(self, query_text: str, answer: str, recipient: str) -> str:
+        """
+        Record a cacheable answer handed to a user; feedback refers to it by the returned id.
+
+        Args:
+            recipient: Hash of the user who received it (only they can vote on it)
+        """
+        answer_id = self.answer_id(query_text, answer)
+        with self._lock:
+            record = self._issued.get(answer_id)
+            if record is None:
+                record = self._issued[answer_id] = {
+                    "query": query_text,
+                    "answer": answer,
+                    "recipients": set(),
+                    "down_votes": set(),
+                }
+            record["recipients"].add(recipient)
+            record["expires_at"] = time.monotonic() + self.ttl_seconds
+            self._issued.move_to_end(answer_id)
+            while len(self._issued) > self.max_entries * 2:
+                self._issued.popitem(last=False)
+        return answer_id
+
+    def issued(self, answer_id: str) -> Optional[Dict[str, Any]]:
+        """The server's record of an issued answer ({"query", "answer"}) or None."""
+        with self._lock:
+            record = self._issued.get(answer_id or "")
+            if record is None or record["expires_at"] < time.monotonic():
+                return None
+            return {"query": record["query"], "answer": record["answer"]}
+
+    def apply_feedback(
+        self,
+        answer_id: str,
+        rating: str,
+        voter: str,
+        query_text: Optional[str] = None,
+        answer: Optional[str] = None,
+    ) -> str:
+        """
+        Apply a thumbs-up/down to an issued answer.
+
+        Args:
+            query_text, answer: The text the client was given; only used when
+                this process has no record of the id (another worker issued
+                it) and only if they verify against answer_id
+
+        Returns:
+            stored (up), evicted (enough down votes), counted (down, below the
+            threshold) or ignored (unknown id, or the voter never received it)
+        """
+        if (
+            answer_id
+            and query_text
+            and answer
+            and self.issued(answer_id) is None
+            and hmac.compare_digest(self.answer_id(query_text, answer), answer_id)
+        ):
+            # Signed by a worker sharing the key, so it is an answer the server produced
+            self.issue(query_text, answer, voter)
+        with self._lock:
+            record = self._issued.get(answer_id or "")
+            if record is None or record["expires_at"] < time.monotonic() or voter not in record["recipients"]:
+                result = "ignored"
+            elif rating == "up":
+                result = "stored"
+            else:
+                record["down_votes"].add(voter)
+                result = "evicted" if len(record["down_votes"]) >= self.evict_downvotes else "counted"
+            query_text, answer = (record["query"], record["answer"]) if record else (None, None)
+
+        if result == "stored":
+            self.store(query_text, answer, source="feedback")
+        elif result == "evicted":
+            with self._lock:
+                # Only the answer that was voted on; a newer answer for the question stays
+                entry = self._entries.get(normalize_query(query_text))
+                if entry is not None and entry["answer"] == answer:
+                    del self._entries[normalize_query(query_text)]
+                    self._dirty = True
+        metrics.incr("answer_cache_feedback", result=result)
+        return result
+
+    def seed(self, rows: List[Dict[str, Any]]) -> int:
+        """
+        Load answers rated "up" by users.
+
+        Args:
+            rows: Feedback rows whose metadata carries the server-recorded
+                cache_query_text / cache_answer_text written by /feedback, the
+                answer_id and the cache_version the answer was produced under
+
+        Returns:
+            Number of answers loaded (other versions and ids that do not verify
+            against the signing key are skipped)
+        """
+        loaded = 0
+        for row in rows:
+            metadata = row.get("metadata") or {}
+            query_text = metadata.get("cache_query_text")
+            answer = metadata.get("cache_answer_text")
+            if not query_text or not answer or metadata.get("cache_version") != self.version:
+                continue
+            if not self.is_general(query_text):
+                continue
+            expected = self.answer_id(query_text, answer)
+            if not hmac.compare_digest(expected, str(metadata.get("answer_id") or "")):
+                metrics.incr("answer_cache_seed_rejected")
+                continue
+            self.store(query_text, answer, source="feedback")
+            loaded += 1
+        metrics.incr("answer_cache_seeded", loaded)
+        return loaded
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "issued": len(self._issued),
+                "version": self.version,
+                "threshold": self.threshold,
+                "semantic": self.embed_fn is not None,
+            }
@@ -3,34 +3,61 @@
 FastAPI server for ClaimBot API.
 Handles REST API endpoints for the AI agent.
 """
+import asyncio
+import hashlib
+import json
 import os
 import time
 from typing import Dict, Any
 from dotenv import load_dotenv
-from fastapi import FastAPI, Request, HTTPException
+from fastapi import BackgroundTasks, FastAPI, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.responses import JSONResponse
+from pydantic import ValidationError
 
 # Load environment variables from config/.env
 load_dotenv("config/.env")
 
 # Import AI agent
 try:
+    import deadline
+    from admission import AdmissionController, AdmissionRejected
     from ai_agent import ClaimAIAgent
-    from auth_stub import mask_email, validate_email
+    from auth_stub import mask_email
+    from circuit_breaker import OPEN, breaker_stats
+    from feedback_buffer import FeedbackBuffer
     from logger import setup_logger
+    from metrics import metrics
+    from request_coalescer import RequestCoalescer, SOURCE_COMPUTED
+    from schemas import FeedbackRequest, QueryRequest, SessionWarmRequest, validation_detail
+    from serialization import HAS_ORJSON
     from supabase_service import SupabaseService, SupabaseServiceError
 except ImportError:
+    from src import deadline
+    from src.admission import AdmissionController, AdmissionRejected
     from src.ai_agent import ClaimAIAgent
-    from src.auth_stub import mask_email, validate_email
+    from src.auth_stub import mask_email
+    from src.circuit_breaker import OPEN, breaker_stats
+    from src.feedback_buffer import FeedbackBuffer
     from src.logger import setup_logger
+    from src.metrics import metrics
+    from src.request_coalescer import RequestCoalescer, SOURCE_COMPUTED
+    from src.schemas import FeedbackRequest, QueryRequest, SessionWarmRequest, validation_detail
+    from src.serialization import HAS_ORJSON
     from src.supabase_service import SupabaseService, SupabaseServiceError
 
+if HAS_ORJSON:
+    from fastapi.responses import ORJSONResponse as FastJSONResponse
+else:
+    FastJSONResponse = JSONResponse
+
 # Initialize FastAPI app
 app = FastAPI(
     title="ClaimBot API",
     description="AI-powered claim chatbot for Deriv employees",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=FastJSONResponse,
 )
 
 # Add CORS middleware to allow requests from frontend
@@ -56,6 +83,14 @@ app.add_middleware(
     allow_headers=["*"],  # Allow all headers
 )
 
+# Compress larger responses (/metrics, long answers); Brotli when brotli-asgi is installed
+COMPRESSION_MIN_BYTES = int(os.getenv("API_COMPRESSION_MIN_BYTES", "1024"))
+try:
+    from brotli_asgi import BrotliMiddleware
+    app.add_middleware(BrotliMiddleware, minimum_size=COMPRESSION_MIN_BYTES, gzip_fallback=True)
+except ImportError:
+    app.add_middleware(GZipMiddleware, minimum_size=COMPRESSION_MIN_BYTES)
+
 # Initialize logger
 logger = setup_logger('api')
 
@@ -63,6 +98,37 @@ logger = setup_logger('api')
 agent = None
 supabase_client = None
 
+# Repeated /query submissions (double-click, retry, reload) share one agent run
+query_coalescer = RequestCoalescer(
+    ttl_seconds=float(os.getenv("QUERY_IDEMPOTENCY_TTL_SECONDS", "120")),
+    max_entries=int(os.getenv("QUERY_IDEMPOTENCY_MAX_ENTRIES", "1000")),
+)
+
+# Bounded, per-user-fair pool for agent runs; overflow is shed with 429
+agent_admission = AdmissionController(
+    max_concurrent=int(os.getenv("AGENT_MAX_CONCURRENCY", "4")),
+    max_queue=int(os.getenv("AGENT_MAX_QUEUE", "16")),
+    per_user_limit=int(os.getenv("AGENT_PER_USER_LIMIT", "2")),
+)
+
+# Feedback is spooled locally and flushed to Supabase in batches (write-behind)
+FEEDBACK_WRITE_BEHIND = os.getenv("FEEDBACK_WRITE_BEHIND", "true").lower() in {"1", "true", "yes"}
+feedback_buffer = FeedbackBuffer(
+    flush_fn=lambda rows: get_supabase_client().insert_feedback_batch(rows),
+    spool_path=os.getenv("FEEDBACK_SPOOL_PATH", "logs/feedback_spool.jsonl"),
+    max_batch=int(os.getenv("FEEDBACK_FLUSH_BATCH_SIZE", "50")),
+    flush_interval=float(os.getenv("FEEDBACK_FLUSH_INTERVAL_SECONDS", "2")),
+)
+
+# Per-request time budget for /query (X-Request-Timeout header, capped)
+QUERY_TIMEOUT_SECONDS = float(os.getenv("QUERY_TIMEOUT_SECONDS", "45"))
+QUERY_MAX_TIMEOUT_SECONDS = float(os.getenv("QUERY_MAX_TIMEOUT_SECONDS", "120"))
+
+# Preload the answer cache with answers users rated "up"
+ANSWER_CACHE_SEED_FROM_FEEDBACK = (
+    os.getenv("ANSWER_CACHE_SEED_FROM_FEEDBACK", "false").lower() in {"1", "true", "yes"}
+)
+
 def get_agent():
     """Get or create AI agent instance."""
     global agent
@@ -80,6 +146,16 @@ def get_supabase_client():
     return supabase_client
 
 
+def _seed_answer_cache():
+    """Load up-voted general answers for the current cache version (runs off the event loop)."""
+    try:
+        rows = get_supabase_client().get_cacheable_feedback(agent.answer_cache.version)
+        loaded = agent.answer_cache.seed(rows)
+        logger.info(f"Answer cache seeded with {loaded} up-voted answers")
+    except SupabaseServiceError as exc:
+        logger.warning(f"Answer cache seeding skipped: {exc}")
+
+
 @app.on_event("startup")
 async def startup_event():
     """Initialize services on startup."""
@@ -92,6 +168,9 @@ async def startup_event():
     if missing_vars:
         logger.warning(f"Missing environment variables: {', '.join(missing_vars)}")
     
+    if FEEDBACK_WRITE_BEHIND:
+        feedback_buffer.start()
+
     # Initialize agent
     try:
         get_agent()
@@ -100,6 +179,16 @@ async def startup_event():
         logger.error(f"Failed to initialize agent: {e}")
         raise
 
+    if agent.answer_cache is not None and ANSWER_CACHE_SEED_FROM_FEEDBACK:
+        asyncio.get_running_loop().run_in_executor(None, _seed_answer_cache)
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Flush buffered feedback before the process exits."""
+    if FEEDBACK_WRITE_BEHIND:
+        feedback_buffer.stop()
+
 
 @app.get("/")
 async def root():
@@ -110,7 +199,9 @@ async def root():
         "version": "1.0.0",
         "endpoints": {
             "health": "/health",
-            "query": "/query"
+            "query": "/query",
+            "session_warm": "/session/warm",
+            "metrics": "/metrics"
         }
     }
 
@@ -121,28 +212,78 @@ async def health_check():
     try:
         agent = get_agent()
         stats = agent.get_memory_stats()
+        circuits = breaker_stats()
+        # Still serving (stale data / local KB), so report degraded rather than unhealthy
+        degraded = any(circuit["state"] == OPEN for circuit in circuits.values())
         
         return {
-            "status": "healthy",
+            "status": "degraded" if degraded else "healthy",
             "agent": "ready",
             "memory": {
                 "active_threads": stats["total_threads"],
                 "total_messages": stats["total_messages"],
                 "unique_users": stats["unique_users"]
-            }
+            },
+            "agent_pool": agent_admission.stats(),
+            "circuits": circuits
         }
     except Exception as e:
         logger.error(f"Health check failed: {e}")
-        return JSONResponse(
+        return FastJSONResponse(
             status_code=503,
             content={"status": "unhealthy", "error": str(e)}
         )
 
 
+@app.get("/metrics")
+async def metrics_endpoint():
+    """In-process counters, gauges and timings."""
+    snapshot = metrics.snapshot()
+    snapshot["query_idempotency"] = query_coalescer.stats()
+    snapshot["agent_pool"] = agent_admission.stats()
+    snapshot["feedback_buffer"] = feedback_buffer.stats()
+    snapshot["circuits"] = breaker_stats()
+    return snapshot
+
+
 @app.options("/query")
 async def query_options():
     """Handle CORS preflight for /query endpoint."""
-    return JSONResponse(content={}, status_code=200)
+    return FastJSONResponse(content={}, status_code=200)
+
+
+def _query_idempotency_key(request: Request, body: QueryRequest) -> str:
+    """
+    Resolve the idempotency key for a /query call, scoped to the user and the body.
+    Uses the Idempotency-Key header or body field, else thread + message id.
+    Returns an empty string when the request cannot be identified.
+
+    The key includes a hash of what is being asked, so a reused key or message id
+    with a different query runs the agent instead of replaying the earlier answer.
+    """
+    user_hash = hashlib.sha256(body.user_email.strip().lower().encode()).hexdigest()
+    body_hash = hashlib.sha256(
+        json.dumps(
+            [body.thread_id, body.query_text, body.context_messages], sort_keys=True, default=str
+        ).encode()
+    ).hexdigest()
+    explicit = request.headers.get("Idempotency-Key") or body.idempotency_key
+    if explicit:
+        return f"{user_hash}:key:{explicit.strip()}:{body_hash}"
+
+    if body.message_id:
+        return f"{user_hash}:{body.thread_id or ''}:{body.message_id}:{body_hash}"
+    return ""
+
+
+def _query_budget(request: Request) -> float:
+    """Seconds this /query may take: the X-Request-Timeout header or the server default."""
+    raw = request.headers.get("X-Request-Timeout")
+    try:
+        requested = float(raw) if raw else QUERY_TIMEOUT_SECONDS
+    except ValueError:
+        requested = QUERY_TIMEOUT_SECONDS
+    return min(max(requested, 1.0), QUERY_MAX_TIMEOUT_SECONDS)
 
 
 @app.post("/query")
@@ -155,72 +296,179 @@ async def query_endpoint(request: Request):
         "user_email": "user@example.com",
         "query_text": "What's my balance?",
         "thread_id": "optional-thread-id",
+        "message_id": "optional-client-message-id",
         "context_messages": [{"role": "user", "content": "..."}]
     }
+    
+    Requests carrying the same Idempotency-Key header (or idempotency_key /
+    thread_id + message_id) share one agent run and replay its result.
+
+    The whole run (queueing, LLM, Supabase and KB calls) shares one deadline,
+    taken from the X-Request-Timeout header (seconds) or QUERY_TIMEOUT_SECONDS.
     """
+    # Context variable; copied into the agent worker thread by the admission pool
+    deadline_token = deadline.start(_query_budget(request))
     try:
-        data = await request.json()
-        user_email = data.get("user_email")
-        query_text = data.get("query_text")  # Changed from "query" to "query_text"
-        thread_id = data.get("thread_id")
-        context_messages = data.get("context_messages")
-        
-        if not user_email or not query_text:
+        try:
+            body = QueryRequest.model_validate_json(await request.body())
+        except ValidationError as exc:
             raise HTTPException(
                 status_code=400,
-                detail="Missing required fields: user_email and query_text"
+                detail=validation_detail(exc, "Missing required fields: user_email and query_text")
             )
+        user_email = body.user_email
+        query_text = body.query_text  # Changed from "query" to "query_text"
+        thread_id = body.thread_id
+        context_messages = body.context_messages
         
-        # Query agent
+        # Query agent on the bounded pool; duplicate requests join the in-flight run
         agent = get_agent()
-        result = agent.query(user_email, query_text, thread_id, context_messages)
+        user_key = mask_email(user_email.strip().lower())
+
+        async def run_agent() -> Dict[str, Any]:
+            return await agent_admission.run(
+                user_key, agent.query, user_email, query_text, thread_id, context_messages
+            )
+
+        idempotency_key = _query_idempotency_key(request, body)
+        if idempotency_key:
+            result, source = await query_coalescer.run(
+                idempotency_key,
+                run_agent,
+                should_store=lambda r: r.get("status") == "success",
+            )
+        else:
+            result, source = await run_agent(), SOURCE_COMPUTED
+
+        metrics.incr("query_requests", source=source)
+        metrics.incr("query_status", status=result.get("status", "unknown"))
+        headers = {}
+        if source != SOURCE_COMPUTED:
+            metrics.incr("query_llm_runs_saved")
+            headers["Idempotent-Replayed"] = "true"
+            logger.info(f"Query served without agent run ({source})")
         
         # Return response in format expected by React frontend
-        return {
+        # (rendered directly, skipping FastAPI's jsonable_encoder pass)
+        return FastJSONResponse({
             "status": "success",
             "response": result["answer"],  # Changed from "answer" to "response"
             "thread_id": thread_id or result.get("thread_id", ""),
             "timestamp": str(time.time()),
             "user_email_hash": result["user_email_hash"],
-            "model": result["model"]
-        }
+            "model": result["model"],
+            # Set when the answer is general and cacheable; echoed back with feedback
+            "cache_version": result.get("cache_version"),
+            "answer_id": result.get("answer_id"),
+        }, headers=headers)
         
+    except HTTPException:
+        raise
+    except AdmissionRejected as exc:
+        logger.warning(f"Query shed: {exc}")
+        return FastJSONResponse(
+            status_code=429,
+            content={"status": "error", "detail": str(exc)},
+            headers={"Retry-After": str(exc.retry_after)},
+        )
     except Exception as e:
         logger.error(f"Query endpoint error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        deadline.reset(deadline_token)
+
+
+@app.post("/session/warm", status_code=202)
+async def session_warm_endpoint(request: Request, background_tasks: BackgroundTasks):
+    """
+    Called by the chat page when it opens, before the user types.
+
+    Body sample:
+    {
+        "user_email": "user@example.com",
+        "thread_id": "optional-thread-id"
+    }
+
+    Returns immediately; the user's claim context is prefetched into a
+    short-lived per-user cache after the response is sent, so the first
+    question's tool calls are served locally.
+    """
+    try:
+        body = SessionWarmRequest.model_validate_json(await request.body())
+    except ValidationError as exc:
+        raise HTTPException(status_code=400, detail=validation_detail(exc, "Invalid user_email"))
+
+    agent = get_agent()
+    background_tasks.add_task(agent.warm_session, body.user_email, body.thread_id)
+    metrics.incr("session_warm_requests")
+    return {"status": "warming"}
+
+
+# Written by the server only (from the answer cache's record); never taken from the client
+_SERVER_FEEDBACK_FIELDS = ("cache_query_text", "cache_answer_text")
+
+
+def _apply_feedback_to_answer_cache(payload: Dict[str, Any]) -> None:
+    """
+    Thumbs-up re-caches an answer the server issued, thumbs-down counts towards
+    evicting it. The question and answer come from the server's record of the
+    answer_id (or client text that verifies against its signature), never from
+    unverified feedback.
+    """
+    metadata = payload["metadata"] = dict(payload["metadata"] or {})
+    for field in _SERVER_FEEDBACK_FIELDS:
+        metadata.pop(field, None)
+    cache = agent.answer_cache if agent is not None else None
+    if cache is None or metadata.get("cache_version") != cache.version:
+        return
+    answer_id = str(metadata.get("answer_id") or "")
+    result = cache.apply_feedback(
+        answer_id,
+        payload["rating"],
+        payload["user_email_hash"],
+        # Checked against the signed answer_id; unverifiable text is ignored
+        query_text=metadata.get("query_text"),
+        answer=metadata.get("answer_text"),
+    )
+    record = cache.issued(answer_id)
+    if result == "evicted":
+        logger.info("Evicted down-voted answer from the answer cache")
+    if record is not None and result != "ignored":
+        # Lets ANSWER_CACHE_SEED_FROM_FEEDBACK restore it (verified against answer_id)
+        metadata["cache_query_text"] = record["query"]
+        metadata["cache_answer_text"] = record["answer"]
 
 
 @app.post("/feedback")
 async def feedback_endpoint(request: Request):
     """Collect thumbs up/down feedback for AI responses."""
     try:
-        data = await request.json()
-        user_email = (data.get("user_email") or "").strip().lower()
-        if not validate_email(user_email):
-            raise HTTPException(status_code=400, detail="Invalid user_email")
-
-        message_id = (data.get("message_id") or "").strip()
-        rating = (data.get("rating") or "").strip().lower()
-        response_text = (data.get("response_text") or "").strip()
-
-        if not message_id:
-            raise HTTPException(status_code=400, detail="Missing message_id")
-        if rating not in {"up", "down"}:
-            raise HTTPException(status_code=400, detail="rating must be 'up' or 'down'")
-        if not response_text:
-            raise HTTPException(status_code=400, detail="Missing response_text")
-
-        thread_id = (data.get("thread_id") or "").strip() or None
-        comment = data.get("comment")
-        if isinstance(comment, str):
-            comment = comment.strip() or None
-        else:
-            comment = None
+        try:
+            body = FeedbackRequest.model_validate_json(await request.body())
+        except ValidationError as exc:
+            raise HTTPException(status_code=400, detail=validation_detail(exc, "Invalid feedback payload"))
 
-        model = (data.get("model") or "").strip() or None
-        metadata = data.get("metadata")
-        if not isinstance(metadata, dict):
-            metadata = {}
+        payload: Dict[str, Any] = {
+            "thread_id": body.thread_id,
+            "message_id": body.message_id,
+            "user_email_hash": mask_email(body.user_email),
+            "rating": body.rating,
+            "comment": body.comment,
+            "response_text": body.response_text,
+            "model": body.model,
+            "metadata": body.metadata,
+        }
+
+        _apply_feedback_to_answer_cache(payload)
+
+        if FEEDBACK_WRITE_BEHIND:
+            # Durable in the local spool; the background flusher writes it to Supabase
+            payload["id"] = feedback_buffer.submit(payload)
+            return {
+                "status": "success",
+                "feedback_id": payload["id"],
+                "data": payload,
+            }
 
         try:
             supabase = get_supabase_client()
@@ -228,17 +476,6 @@ async def feedback_endpoint(request: Request):
             logger.error(f"Supabase configuration error: {exc}")
             raise HTTPException(status_code=500, detail="Supabase service unavailable")
 
-        payload: Dict[str, Any] = {
-            "thread_id": thread_id,
-            "message_id": message_id,
-            "user_email_hash": mask_email(user_email),
-            "rating": rating,
-            "comment": comment,
-            "response_text": response_text,
-            "model": model,
-            "metadata": metadata,
-        }
-
         inserted = supabase.insert_feedback(payload)
 
         return {
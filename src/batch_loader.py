@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+DataLoader-style batching of per-key lookups across threads.
+
+Concurrent requests each looking up one user (get_claim_summary for a
+different email in every worker thread) become one query per short window:
+the first caller in a window waits `window_seconds` for others to join, then
+runs load_many for every key collected and hands each waiting caller its own
+result. A batch that reaches `max_batch` keys is dispatched at once. There is
+no background thread, so the loader is safe to build before gunicorn forks.
+"""
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional
+
+try:
+    from metrics import metrics
+except ImportError:
+    from src.metrics import metrics
+
+
+class _Pending:
+    """One key's slot in a batch."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class BatchLoader:
+    """Coalesces load(key) calls from many threads into load_many(keys) calls."""
+
+    def __init__(
+        self,
+        load_many: Callable[[List[Hashable]], Dict[Hashable, Any]],
+        label: str,
+        window_seconds: float = 0.005,
+        max_batch: int = 100,
+    ):
+        """
+        Args:
+            load_many: Keys -> {key: value}; keys it leaves out load as None
+            label: Metric label for this loader
+            window_seconds: How long the first caller of a batch waits for others
+            max_batch: Keys per load_many call
+        """
+        self.load_many = load_many
+        self.label = label
+        self.window_seconds = window_seconds
+        self.max_batch = max(max_batch, 1)
+        self._lock = threading.Lock()
+        self._pending: Dict[Hashable, _Pending] = {}
+        self._scheduled = False
+
+    def load(self, key: Hashable, timeout: Optional[float] = None) -> Any:
+        """
+        Value for `key`, loaded together with whatever other keys arrive in the window.
+
+        Raises:
+            TimeoutError: the batch did not finish within `timeout` seconds
+            Exception: whatever load_many raised for the batch
+        """
+        started = time.perf_counter()
+        batch: Optional[Dict[Hashable, _Pending]] = None
+        leader = False
+        with self._lock:
+            entry = self._pending.get(key)
+            if entry is None:
+                entry = self._pending[key] = _Pending()
+            if len(self._pending) >= self.max_batch:
+                batch = self._take()
+            elif not self._scheduled:
+                self._scheduled = leader = True
+
+        if leader:
+            time.sleep(self.window_seconds)
+            with self._lock:
+                # Empty when the batch filled up and went out early
+                batch = self._take()
+        if batch:
+            self._dispatch(batch)
+
+        if not entry.event.wait(timeout):
+            metrics.incr("batch_loader_timeouts", loader=self.label)
+            raise TimeoutError(f"{self.label} batch did not finish within {timeout:.1f}s")
+        metrics.observe("batch_loader_wait", time.perf_counter() - started, loader=self.label)
+        if entry.error is not None:
+            raise entry.error
+        return entry.value
+
+    def load_all(self, keys: Iterable[Hashable]) -> Dict[Hashable, Any]:
+        """Load many keys directly (no window), in max_batch chunks."""
+        unique = list(dict.fromkeys(keys))
+        results: Dict[Hashable, Any] = {}
+        for start in range(0, len(unique), self.max_batch):
+            chunk = unique[start: start + self.max_batch]
+            self._record(len(chunk))
+            loaded = self.load_many(chunk)
+            results.update({key: loaded.get(key) for key in chunk})
+        return results
+
+    def _take(self) -> Dict[Hashable, _Pending]:
+        """Caller holds _lock."""
+        batch, self._pending = self._pending, {}
+        self._scheduled = False
+        return batch
+
+    def _dispatch(self, batch: Dict[Hashable, _Pending]) -> None:
+        self._record(len(batch))
+        try:
+            loaded = self.load_many(list(batch))
+        except BaseException as exc:
+            for entry in batch.values():
+                entry.error = exc
+                entry.event.set()
+            return
+        for key, entry in batch.items():
+            entry.value = loaded.get(key)
+            entry.event.set()
+
+    def _record(self, size: int) -> None:
+        metrics.incr("batch_loader_batches", loader=self.label)
+        metrics.incr("batch_loader_keys", size, loader=self.label)
+        metrics.gauge("batch_loader_last_size", size, loader=self.label)
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Circuit breakers for slow or failing dependencies (Supabase REST, pgvector RPC).
+
+A breaker watches the last N calls. When the failure rate or the slow-call
+rate crosses its threshold it opens, and calls fail immediately with
+CircuitOpenError instead of waiting out their timeouts. After `open_seconds`
+it lets a few probe calls through (half-open); a successful probe closes it,
+a failed one opens it again.
+"""
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Tuple
+
+try:
+    import deadline
+    from metrics import metrics
+except ImportError:
+    from src import deadline
+    from src.metrics import metrics
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+_STATE_GAUGE = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a dependency whose breaker is open."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} is temporarily unavailable (circuit open, retry in {retry_after:.0f}s)")
+        self.name = name
+        self.retry_after = retry_after
+
+
+def is_dependency_failure(exc: BaseException) -> bool:
+    # A call cut short by the caller's own request budget says nothing about the dependency
+    return not isinstance(exc, deadline.DeadlineExceeded) and not deadline.is_exhausted()
+
+
+class CircuitBreaker:
+    """Failure-rate and latency based breaker with half-open probing."""
+
+    def __init__(
+        self,
+        name: str,
+        window: int = 20,
+        min_calls: int = 5,
+        failure_rate: float = 0.5,
+        slow_call_seconds: float = 5.0,
+        slow_call_rate: float = 0.8,
+        open_seconds: float = 30.0,
+        half_open_calls: int = 1,
+        is_failure: Callable[[BaseException], bool] = is_dependency_failure,
+    ):
+        """
+        Args:
+            name: Dependency name (metrics label, /health key)
+            window: Number of recent calls considered
+            min_calls: Calls needed in the window before the breaker may open
+            failure_rate: Fraction of failed calls that opens the breaker
+            slow_call_seconds: Calls slower than this count as slow
+            slow_call_rate: Fraction of slow calls that opens the breaker
+            open_seconds: How long the breaker stays open before probing
+            half_open_calls: Concurrent probe calls allowed while half-open
+            is_failure: Whether an exception counts against the dependency
+        """
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self.is_failure = is_failure
+
+        self._lock = threading.Lock()
+        # (failed, slow) per recent call
+        self._window: Deque[Tuple[bool, bool]] = deque(maxlen=window)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        metrics.gauge("circuit_state", _STATE_GAUGE[CLOSED], dependency=name)
+
+    def _transition(self, state: str) -> None:
+        """Caller holds the lock."""
+        if state == self._state:
+            return
+        self._state = state
+        self._probes = 0
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+        if state == CLOSED:
+            self._window.clear()
+        metrics.gauge("circuit_state", _STATE_GAUGE[state], dependency=self.name)
+        metrics.incr("circuit_transitions", dependency=self.name, to=state)
+        print(f"[CIRCUIT] {self.name} -> {state}")
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+                self._transition(HALF_OPEN)
+            return self._state
+
+    def _acquire(self) -> bool:
+        """Return whether a call may proceed; True marks it as a half-open probe."""
+        with self._lock:
+            if self._state == OPEN:
+                elapsed = time.monotonic() - self._opened_at
+                if elapsed < self.open_seconds:
+                    metrics.incr("circuit_rejected", dependency=self.name)
+                    raise CircuitOpenError(self.name, self.open_seconds - elapsed)
+                self._transition(HALF_OPEN)
+            if self._state == HALF_OPEN:
+                if self._probes >= self.half_open_calls:
+                    metrics.incr("circuit_rejected", dependency=self.name)
+                    raise CircuitOpenError(self.name, 1)
+                self._probes += 1
+                return True
+            return False
+
+    def _record(self, probe: bool, failed: bool, elapsed: float) -> None:
+        slow = elapsed >= self.slow_call_seconds
+        with self._lock:
+            if probe:
+                self._transition(OPEN if failed or slow else CLOSED)
+                return
+            self._window.append((failed, slow))
+            calls = len(self._window)
+            if self._state != CLOSED or calls < self.min_calls:
+                return
+            failures = sum(1 for f, _ in self._window if f)
+            slow_calls = sum(1 for _, s in self._window if s)
+            if failures / calls >= self.failure_rate or slow_calls / calls >= self.slow_call_rate:
+                self._transition(OPEN)
+
+    def call(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """
+        Run func through the breaker.
+
+        Raises:
+            CircuitOpenError: breaker open (func not called)
+        """
+        probe = self._acquire()
+        started = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as exc:
+            failed = self.is_failure(exc)
+            if failed or probe:
+                self._record(probe, failed, time.perf_counter() - started)
+            raise
+        self._record(probe, False, time.perf_counter() - started)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        state = self.state
+        with self._lock:
+            calls = len(self._window)
+            return {
+                "state": state,
+                "window_calls": calls,
+                "failure_rate": round(sum(1 for f, _ in self._window if f) / calls, 2) if calls else 0.0,
+                "slow_rate": round(sum(1 for _, s in self._window if s) / calls, 2) if calls else 0.0,
+            }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_registry_lock = threading.Lock()
+
+
+def get_breaker(name: str, **options: Any) -> CircuitBreaker:
+    """Process-wide breaker per dependency name (options apply on first creation)."""
+    with _registry_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(name, **options)
+        return breaker
+
+
+def breaker_stats() -> Dict[str, Dict[str, Any]]:
+    with _registry_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.stats() for breaker in breakers}
+
+
+def breaker_options(prefix: str, slow_call_seconds: float) -> Dict[str, Any]:
+    """Breaker settings from <PREFIX>_BREAKER_* environment variables."""
+    return {
+        "failure_rate": float(os.getenv(f"{prefix}_BREAKER_FAILURE_RATE", "0.5")),
+        "slow_call_seconds": float(os.getenv(f"{prefix}_BREAKER_SLOW_SECONDS", str(slow_call_seconds))),
+        "open_seconds": float(os.getenv(f"{prefix}_BREAKER_OPEN_SECONDS", "30")),
+    }
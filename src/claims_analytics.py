@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Grouped claim aggregates for the get_claims_analytics tool.
+
+"How much did I spend on optical this year?" or "Which month did I claim the
+most?" used to mean the model adding up raw get_user_claims rows over several
+steps. Here the user's claim_analysis rows are loaded once into a DataFrame and
+grouped with pandas (plain Python when pandas is not installed), so the agent
+gets counts, totals, averages and the largest claim per group in one call.
+
+Frames are cached per user and keyed by a cheap data version (row count plus
+the newest row, see SupabaseService.claims_version): a new, removed or
+re-stated recent claim reloads the rows, and ANALYTICS_CACHE_TTL_SECONDS
+bounds how long edits to older rows can go unnoticed.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import pandas as pd
+except ImportError:  # pragma: no cover - pandas is in requirements
+    pd = None
+
+try:
+    from metrics import metrics
+    from supabase_service import SupabaseService
+    from tool_encoding import claim_month, encode_table, to_amount
+except ImportError:
+    from src.metrics import metrics
+    from src.supabase_service import SupabaseService
+    from src.tool_encoding import claim_month, encode_table, to_amount
+
+# Dimensions the tool can group by; amounts are always split by currency
+GROUP_FIELDS = ("claim_type", "month", "year", "state")
+_FRAME_COLUMNS = ("claim_type", "state", "currency", "month", "year", "amount", "text")
+_STAT_COLUMNS = ("count", "total", "average", "largest")
+# claim_analysis columns claim_records reads
+SOURCE_COLUMNS = (
+    "claim_type", "state", "transaction_currency", "transaction_amount",
+    "date_submitted", "date_paid", "description", "claim_description",
+)
+
+
+def parse_group_by(group_by: Optional[str]) -> List[str]:
+    """'claim_type, month' -> ['claim_type', 'month'] (unknown fields are rejected)."""
+    fields = [field.strip().lower() for field in (group_by or "claim_type").split(",") if field.strip()]
+    unknown = [field for field in fields if field not in GROUP_FIELDS]
+    if unknown:
+        raise ValueError(
+            f"Cannot group by {', '.join(unknown)}; choose from {', '.join(GROUP_FIELDS)}"
+        )
+    # Keep the caller's order, drop repeats
+    return list(dict.fromkeys(fields)) or ["claim_type"]
+
+
+def claim_records(claims: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Reduce claim_analysis rows to the fields analytics groups and sums."""
+    records = []
+    for claim in claims:
+        month = claim_month(claim)
+        records.append({
+            "claim_type": claim.get("claim_type"),
+            "state": claim.get("state"),
+            "currency": claim.get("transaction_currency"),
+            "month": month,
+            "year": month[:4] if month else None,
+            "amount": to_amount(claim.get("transaction_amount")),
+            # Lowercased descriptions for keyword filters ("optical", "dental")
+            "text": " ".join(
+                str(claim.get(field) or "") for field in ("description", "claim_description")
+            ).casefold(),
+        })
+    return records
+
+
+class ClaimsFrame:
+    """One user's claims, ready for repeated grouping."""
+
+    def __init__(self, records: List[Dict[str, Any]]):
+        self.size = len(records)
+        if pd is not None:
+            self._frame = pd.DataFrame.from_records(records, columns=list(_FRAME_COLUMNS))
+            self._records = None
+        else:
+            self._frame = None
+            self._records = records
+
+    def aggregate(
+        self,
+        group_by: Sequence[str],
+        *,
+        year: Optional[int] = None,
+        claim_type: Optional[str] = None,
+        keyword: Optional[str] = None,
+    ) -> Tuple[int, List[Tuple[Any, ...]]]:
+        """
+        (matching claim count, rows of group values + currency + count, total,
+        average, largest), sorted by group values.
+        """
+        keys = list(group_by) + ["currency"]
+        keyword = keyword.strip().casefold() if keyword else None
+        if self._frame is not None:
+            return self._aggregate_frame(keys, year, claim_type, keyword)
+        return self._aggregate_records(keys, year, claim_type, keyword)
+
+    def _aggregate_frame(
+        self, keys: List[str], year: Optional[int], claim_type: Optional[str], keyword: Optional[str]
+    ) -> Tuple[int, List[Tuple[Any, ...]]]:
+        frame = self._frame
+        if year is not None:
+            frame = frame[frame["year"] == str(year)]
+        if claim_type:
+            frame = frame[frame["claim_type"].str.casefold() == claim_type.casefold()]
+        if keyword:
+            frame = frame[frame["text"].str.contains(keyword, regex=False)]
+        if frame.empty:
+            return 0, []
+
+        # Missing months/types form their own group instead of being dropped
+        grouped = frame.fillna({key: "unknown" for key in keys}).groupby(keys, sort=False)["amount"]
+        stats = grouped.agg(["count", "sum", "mean", "max"]).reset_index()
+        rows = [
+            tuple(_plain(value) for value in row[: len(keys)])
+            + (int(row[-4]), round(float(row[-3]), 2), round(float(row[-2]), 2), round(float(row[-1]), 2))
+            for row in stats.itertuples(index=False, name=None)
+        ]
+        return len(frame), sorted(rows, key=_group_order(len(keys)))
+
+    def _aggregate_records(
+        self, keys: List[str], year: Optional[int], claim_type: Optional[str], keyword: Optional[str]
+    ) -> Tuple[int, List[Tuple[Any, ...]]]:
+        groups: Dict[Tuple, List[float]] = defaultdict(list)
+        matched = 0
+        for record in self._records:
+            if year is not None and record["year"] != str(year):
+                continue
+            if claim_type and (record["claim_type"] or "").casefold() != claim_type.casefold():
+                continue
+            if keyword and keyword not in record["text"]:
+                continue
+            matched += 1
+            key = tuple("unknown" if record[field] is None else record[field] for field in keys)
+            groups[key].append(record["amount"])
+
+        rows = [
+            key + (len(amounts), round(sum(amounts), 2), round(sum(amounts) / len(amounts), 2), round(max(amounts), 2))
+            for key, amounts in groups.items()
+        ]
+        return matched, sorted(rows, key=_group_order(len(keys)))
+
+
+def _group_order(width: int):
+    """Sort key over the first `width` (group) values of a row."""
+    return lambda row: tuple(str(value) for value in row[:width])
+
+
+def _plain(value: Any) -> Any:
+    """numpy scalars -> Python values, so results serialise like the other tools."""
+    return value.item() if hasattr(value, "item") else value
+
+
+class ClaimsAnalytics:
+    """Per-user cached claim frames and the aggregates computed from them."""
+
+    def __init__(self, service: SupabaseService):
+        self.service = service
+        self.ttl = float(os.getenv("ANALYTICS_CACHE_TTL_SECONDS", "900"))
+        self.max_entries = int(os.getenv("ANALYTICS_CACHE_MAX_ENTRIES", "500"))
+        # Upper bound on rows loaded per user (claim_analysis is per line item)
+        self.max_rows = int(os.getenv("ANALYTICS_MAX_ROWS", "2000"))
+        self._frames: "OrderedDict[str, Tuple[str, float, ClaimsFrame]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def summarize(
+        self,
+        email: str,
+        group_by: Optional[str] = None,
+        *,
+        year: Optional[int] = None,
+        claim_type: Optional[str] = None,
+        keyword: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Tool payload: the requested grouping plus overall totals per currency.
+
+        Raises:
+            ValueError: group_by names an unsupported field
+            SupabaseServiceError: the claims (or their version) could not be read
+        """
+        fields = parse_group_by(group_by)
+        frame = self._frame(email)
+
+        started = time.perf_counter()
+        filters = {"year": year, "claim_type": claim_type, "keyword": keyword}
+        matched, rows = frame.aggregate(fields, **filters)
+        _, overall = frame.aggregate([], **filters)
+        metrics.observe("claims_analytics_aggregate", time.perf_counter() - started)
+
+        payload: Dict[str, Any] = {
+            "claims_considered": matched,
+            "groups": encode_table(rows, fields + ["currency"] + list(_STAT_COLUMNS)),
+            "overall": encode_table(overall, ("currency",) + _STAT_COLUMNS),
+        }
+        applied = {name: value for name, value in filters.items() if value}
+        if applied:
+            payload["filters"] = applied
+        if rows:
+            # Answers "which month/type did I claim the most" without scanning the table
+            top = max(rows, key=lambda row: row[len(fields) + 2])
+            payload["highest_total"] = dict(zip(fields + ["currency", "count", "total"], top))
+        if frame.size >= self.max_rows:
+            payload["note"] = f"Only the {self.max_rows} most recent claims were analysed."
+        return payload
+
+    def invalidate(self, email: str) -> None:
+        with self._lock:
+            self._frames.pop(email.strip().lower(), None)
+
+    def _frame(self, email: str) -> ClaimsFrame:
+        key = email.strip().lower()
+        version = self.service.claims_version(key)
+        with self._lock:
+            entry = self._frames.get(key)
+            if entry is not None and entry[0] == version and entry[1] > time.monotonic():
+                self._frames.move_to_end(key)
+                metrics.incr("claims_analytics_cache", result="hit")
+                return entry[2]
+        metrics.incr("claims_analytics_cache", result="miss" if entry is None else "outdated")
+
+        # Streamed page by page; only the reduced records are kept
+        claims = self.service.iter_claim_analysis(key, columns=SOURCE_COLUMNS, max_rows=self.max_rows)
+        frame = ClaimsFrame(claim_records(claims))
+        # Rows served from the outage cache are not remembered as current
+        if self.ttl > 0 and not self.service.serving_stale():
+            with self._lock:
+                self._frames[key] = (version, time.monotonic() + self.ttl, frame)
+                self._frames.move_to_end(key)
+                while len(self._frames) > self.max_entries:
+                    self._frames.popitem(last=False)
+        return frame
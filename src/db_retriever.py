@@ -0,0 +1,500 @@
+#!/usr/bin/env python3
+"""
+Local SQLite read replica of claim_summary and claim_analysis.
+
+With SUPABASE_READ_MODE=replica, SupabaseService serves the user-data tool
+reads from this file instead of a Supabase REST round trip per call. A
+background thread keeps it current:
+
+- claim_summary (one row per employee per year) is copied in full each sync.
+- claim_analysis is synced incrementally by its when_modified watermark,
+  paging on (when_modified, id), with a full copy every
+  SUPABASE_REPLICA_FULL_SYNC_SECONDS to pick up deletes.
+
+The sync state lives in the database, so forked workers sharing one file
+skip a sync another worker has just done. A lease row (taken under BEGIN
+IMMEDIATE, renewed with every page) lets only one process sync at a time:
+a full copy deletes the rows it did not see, so two overlapping copies
+would delete each other's. The legacy retrieve()/compute() API used by
+cli/cli_db.py and tests/test_all_users.py reads the same tables.
+"""
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+try:
+    from metrics import metrics
+    from tool_encoding import parse_date
+except ImportError:
+    from src.metrics import metrics
+    from src.tool_encoding import parse_date
+
+SUMMARY = "claim_summary"
+ANALYSIS = "claim_analysis"
+
+# Columns copied from Supabase
+SUMMARY_COLUMNS = (
+    "id", "year", "employee_id", "email", "employee_name", "company", "currency", "country",
+    "max_amount", "total_transaction_amount", "remaining_balance",
+)
+ANALYSIS_COLUMNS = (
+    "id", "email", "record_key", "state", "claim_type", "claim_description", "description",
+    "transaction_amount", "transaction_currency", "date_paid", "date_submitted", "when_modified",
+)
+
+# Columns returned to callers (the same ones SupabaseService selects)
+SUMMARY_SELECT = (
+    "id", "year", "employee_id", "email", "employee_name", "currency", "max_amount",
+    "total_transaction_amount", "remaining_balance",
+)
+ANALYSIS_SELECT = (
+    "id", "record_key", "state", "claim_type", "claim_description", "description",
+    "transaction_amount", "transaction_currency", "date_paid", "date_submitted",
+)
+
+# Table names used by the CSV-era callers (cli/cli_db.py)
+TABLE_ALIASES = {"claims_2025": SUMMARY, "claims": ANALYSIS}
+OPERATIONS = {"sum": "sum", "avg": "avg", "mean": "avg", "min": "min", "max": "max", "count": "count"}
+
+_SCHEMA = """
+create table if not exists claim_summary (
+    id text primary key,
+    year integer,
+    employee_id text,
+    email text,
+    employee_name text,
+    company text,
+    currency text,
+    country text,
+    max_amount real,
+    total_transaction_amount real,
+    remaining_balance real,
+    synced_at real
+);
+create index if not exists claim_summary_email_year_idx on claim_summary (email, year desc);
+
+create table if not exists claim_analysis (
+    id text primary key,
+    email text,
+    record_key text,
+    state text,
+    claim_type text,
+    claim_description text,
+    description text,
+    transaction_amount real,
+    transaction_currency text,
+    date_paid text,
+    date_submitted text,
+    when_modified text,
+    -- date_paid is stored as exported ('2024 Sep 12'); this sorts chronologically
+    date_paid_iso text,
+    synced_at real
+);
+create index if not exists claim_analysis_email_date_paid_idx on claim_analysis (email, date_paid_iso desc);
+create index if not exists claim_analysis_email_type_state_idx on claim_analysis (email, claim_type, state);
+
+create table if not exists sync_state (
+    table_name text primary key,
+    watermark text,
+    watermark_id text,
+    synced_at real,
+    full_synced_at real
+);
+
+-- One row while a process is syncing; expires if that process dies mid-sync
+create table if not exists sync_lease (
+    name text primary key,
+    owner text,
+    expires_at real
+);
+"""
+
+
+def _iso_date(value: Any) -> Optional[str]:
+    parsed = parse_date(value)
+    return parsed.date().isoformat() if parsed else None
+
+
+class ReplicaLeaseLost(RuntimeError):
+    """Another process took over the sync lease (this one stalled past its expiry)."""
+
+
+class DatabaseRetriever:
+    """Email-scoped reads from the local replica, and the sync that fills it."""
+
+    def __init__(
+        self,
+        db_path: str = "database/claims.db",
+        *,
+        summary_table: str = SUMMARY,
+        analysis_table: str = ANALYSIS,
+        page_size: int = 1000,
+        full_sync_seconds: float = 86400.0,
+        lease_seconds: float = 300.0,
+    ):
+        """
+        Args:
+            db_path: SQLite file (created if missing)
+            summary_table: Supabase table copied into claim_summary
+            analysis_table: Supabase table copied into claim_analysis
+            page_size: Rows per Supabase request while syncing
+            full_sync_seconds: Interval between full claim_analysis copies
+            lease_seconds: How long a sync holds the lease without renewing it
+                (renewed after every page)
+        """
+        self.db_path = str(db_path)
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.remote_tables = {SUMMARY: summary_table, ANALYSIS: analysis_table}
+        self.page_size = page_size
+        self.full_sync_seconds = full_sync_seconds
+        self.lease_seconds = lease_seconds
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._sync_pid: Optional[int] = None
+        self._connection().executescript(_SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        """One connection per thread (and per process, after a fork)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            # Readers never wait for the sync's writes
+            conn.execute("pragma journal_mode=wal")
+            conn.execute("pragma synchronous=normal")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _select(self, sql: str, args: Sequence[Any] = ()) -> List[Dict[str, Any]]:
+        return [dict(row) for row in self._connection().execute(sql, args).fetchall()]
+
+    # ------------------------------------------------------------------ reads
+
+    def claim_summary(self, email: str) -> Optional[Dict[str, Any]]:
+        """Latest claim_summary row for the user."""
+        rows = self._select(
+            f"select {', '.join(SUMMARY_SELECT)} from claim_summary where email = ? order by year desc limit 1",
+            (email.strip().lower(),),
+        )
+        return rows[0] if rows else None
+
+    @staticmethod
+    def _claim_filter(email: str, claim_type: Optional[str], exclude_state: Optional[str]) -> Tuple[str, List[Any]]:
+        clauses, args = ["email = ?"], [email.strip().lower()]
+        if claim_type:
+            clauses.append("claim_type = ?")
+            args.append(claim_type)
+        if exclude_state:
+            # Like PostgREST's neq, NULL states are excluded too
+            clauses.append("state != ?")
+            args.append(exclude_state)
+        return " and ".join(clauses), args
+
+    def claim_analysis(
+        self,
+        email: str,
+        *,
+        limit: int = 50,
+        claim_type: Optional[str] = None,
+        exclude_state: Optional[str] = "Complete",
+    ) -> List[Dict[str, Any]]:
+        """The user's claim_analysis rows, most recently paid first."""
+        where, args = self._claim_filter(email, claim_type, exclude_state)
+        return self._select(
+            f"select {', '.join(ANALYSIS_SELECT)} from claim_analysis where {where} "
+            f"order by date_paid_iso desc limit ?",
+            args + [max(limit, 1)],
+        )
+
+    def count_claims(
+        self,
+        email: str,
+        *,
+        claim_type: Optional[str] = "Employee Benefit",
+        exclude_state: Optional[str] = "Complete",
+    ) -> int:
+        where, args = self._claim_filter(email, claim_type, exclude_state)
+        return self._connection().execute(f"select count(*) from claim_analysis where {where}", args).fetchone()[0]
+
+    def totals_by_type(self, email: str, exclude_state: Optional[str] = "Complete") -> List[Dict[str, Any]]:
+        """Per claim type and currency count/total (the get_user_context RPC's totals_by_type)."""
+        where, args = self._claim_filter(email, None, exclude_state)
+        return self._select(
+            "select claim_type, transaction_currency as currency, count(*) as claim_count, "
+            f"coalesce(sum(transaction_amount), 0) as total_amount from claim_analysis where {where} "
+            "group by claim_type, transaction_currency order by claim_type, transaction_currency",
+            args,
+        )
+
+    def retrieve(self, email: str, limit: int = 50) -> List[Dict[str, Any]]:
+        """The user's summary and claim rows, each tagged with its source_table."""
+        key = email.strip().lower()
+        docs = [
+            {**row, "source_table": SUMMARY}
+            for row in self._select("select * from claim_summary where email = ? order by year desc", (key,))
+        ]
+        docs += [
+            {**row, "source_table": ANALYSIS}
+            for row in self._select(
+                "select * from claim_analysis where email = ? order by date_paid_iso desc limit ?", (key, max(limit, 1))
+            )
+        ]
+        for doc in docs:
+            doc.pop("synced_at", None)
+            doc.pop("date_paid_iso", None)
+        return docs
+
+    def compute(
+        self, email: str, operation: str, column: Optional[str] = None, table: str = SUMMARY
+    ) -> Dict[str, Any]:
+        """
+        sum/avg/min/max/count of one column over the user's rows.
+
+        Returns:
+            {"result", "rows_used", "table", "operation", "column"} or {"error": ...}
+        """
+        table = TABLE_ALIASES.get(table, table)
+        function = OPERATIONS.get(operation.lower())
+        if table not in (SUMMARY, ANALYSIS):
+            return {"error": f"Unknown table: {table}"}
+        if function is None:
+            return {"error": f"Unsupported operation: {operation}"}
+
+        columns = SUMMARY_COLUMNS if table == SUMMARY else ANALYSIS_COLUMNS
+        if column is None:
+            if function != "count":
+                return {"error": f"{operation} needs a column"}
+            target = "*"
+        else:
+            # Column names are matched case-insensitively ("Remaining_Balance") and never interpolated raw
+            target = next((name for name in columns if name == column.lower()), None)
+            if target is None:
+                return {"error": f"Unknown column for {table}: {column}"}
+
+        result, rows_used = self._connection().execute(
+            f"select {function}({target}), count(*) from {table} where email = ?", (email.strip().lower(),)
+        ).fetchone()
+        return {"result": result, "rows_used": rows_used, "table": table, "operation": function, "column": column}
+
+    # ------------------------------------------------------------------- sync
+
+    def _state(self, table: str) -> Optional[Dict[str, Any]]:
+        rows = self._select("select * from sync_state where table_name = ?", (table,))
+        return rows[0] if rows else None
+
+    @property
+    def ready(self) -> bool:
+        """True once both tables have been copied at least once."""
+        return all((self._state(table) or {}).get("full_synced_at") for table in (SUMMARY, ANALYSIS))
+
+    def age(self) -> Optional[float]:
+        """Seconds since the last completed sync (None before the first)."""
+        state = self._state(ANALYSIS)
+        if not state or not state.get("synced_at"):
+            return None
+        return time.time() - state["synced_at"]
+
+    def version(self) -> str:
+        """Changes whenever a sync brought in rows or a full copy ran."""
+        state = self._state(ANALYSIS) or {}
+        return f"{state.get('watermark')}:{state.get('watermark_id')}:{state.get('full_synced_at')}"
+
+    def sync(self, source: Any, full: Optional[bool] = None) -> Dict[str, int]:
+        """
+        Pull changes from Supabase.
+
+        Args:
+            source: Object with fetch_rows(table, params) -> rows (SupabaseService)
+            full: Copy claim_analysis in full; by default only when the last full
+                copy is older than full_sync_seconds
+
+        Returns:
+            Rows received per table; empty when another process holds the sync lease
+
+        Raises:
+            ReplicaLeaseLost: the lease expired mid-sync and another process took it
+        """
+        with self._sync_lock:
+            token = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+            if not self._acquire_lease(token):
+                metrics.incr("replica_sync_skipped", reason="leased")
+                return {}
+            try:
+                return self._sync_leased(source, full, token)
+            finally:
+                self._release_lease(token)
+
+    def _sync_leased(self, source: Any, full: Optional[bool], token: str) -> Dict[str, int]:
+        started = time.perf_counter()
+        # Read under the lease: the previous holder may have just finished
+        state = self._state(ANALYSIS) or {}
+        if full is None:
+            last_full = state.get("full_synced_at")
+            full = not last_full or time.time() - last_full >= self.full_sync_seconds
+
+        counts = {SUMMARY: self._copy_table(source, SUMMARY, SUMMARY_COLUMNS, token)}
+        if full:
+            counts[ANALYSIS] = self._copy_table(source, ANALYSIS, ANALYSIS_COLUMNS, token)
+        else:
+            counts[ANALYSIS] = self._sync_changes(source, state.get("watermark"), state.get("watermark_id"), token)
+
+        metrics.observe("replica_sync", time.perf_counter() - started, mode="full" if full else "incremental")
+        for table, count in counts.items():
+            metrics.incr("replica_rows_synced", count, table=table)
+        metrics.gauge("replica_lag_seconds", 0.0)
+        return counts
+
+    def _acquire_lease(self, token: str) -> bool:
+        """Take the sync lease unless another process holds an unexpired one."""
+        with self._write_lock:
+            conn = self._connection()
+            # BEGIN IMMEDIATE takes the database write lock, so check-and-set is atomic across processes
+            conn.execute("begin immediate")
+            try:
+                row = conn.execute("select owner, expires_at from sync_lease where name = 'sync'").fetchone()
+                if row is not None and row["owner"] != token and row["expires_at"] > time.time():
+                    conn.rollback()
+                    return False
+                conn.execute(
+                    "insert or replace into sync_lease (name, owner, expires_at) values ('sync', ?, ?)",
+                    (token, time.time() + self.lease_seconds),
+                )
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            return True
+
+    def _renew_lease(self, conn: sqlite3.Connection, token: str) -> None:
+        """Extend the lease inside the caller's write transaction (raises if it was lost)."""
+        renewed = conn.execute(
+            "update sync_lease set expires_at = ? where name = 'sync' and owner = ?",
+            (time.time() + self.lease_seconds, token),
+        ).rowcount
+        if not renewed:
+            raise ReplicaLeaseLost("Replica sync lease was taken over by another process")
+
+    def _release_lease(self, token: str) -> None:
+        with self._write_lock:
+            conn = self._connection()
+            with conn:
+                conn.execute("delete from sync_lease where name = 'sync' and owner = ?", (token,))
+
+    def _copy_table(self, source: Any, table: str, columns: Sequence[str], token: str) -> int:
+        """Copy a whole table (keyset pages on id), then drop local rows Supabase no longer has."""
+        copy_started = time.time()
+        last_id, total = None, 0
+        while True:
+            params: Dict[str, Any] = {"select": ",".join(columns), "order": "id.asc", "limit": self.page_size}
+            if last_id is not None:
+                params["id"] = f"gt.{last_id}"
+            rows = source.fetch_rows(self.remote_tables[table], params)
+            self._upsert(table, columns, rows, copy_started, token)
+            total += len(rows)
+            if len(rows) < self.page_size:
+                break
+            last_id = rows[-1]["id"]
+
+        with self._write_lock:
+            conn = self._connection()
+            with conn:
+                # Only while this copy still holds the lease: nobody else upserted in between
+                self._renew_lease(conn, token)
+                conn.execute(f"delete from {table} where synced_at < ?", (copy_started,))
+                watermark = watermark_id = None
+                if table == ANALYSIS:
+                    newest = conn.execute(
+                        "select when_modified, id from claim_analysis where when_modified is not null "
+                        "order by when_modified desc, id desc limit 1"
+                    ).fetchone()
+                    watermark, watermark_id = (newest[0], newest[1]) if newest else (None, None)
+                conn.execute(
+                    "insert or replace into sync_state (table_name, watermark, watermark_id, synced_at, full_synced_at) "
+                    "values (?, ?, ?, ?, ?)",
+                    (table, watermark, watermark_id, time.time(), copy_started),
+                )
+        return total
+
+    def _sync_changes(
+        self, source: Any, watermark: Optional[str], watermark_id: Optional[str], token: str
+    ) -> int:
+        """claim_analysis rows modified after the watermark, in (when_modified, id) order."""
+        total = 0
+        while True:
+            params: Dict[str, Any] = {
+                "select": ",".join(ANALYSIS_COLUMNS),
+                "order": "when_modified.asc,id.asc",
+                "limit": self.page_size,
+            }
+            if watermark is None:
+                params["when_modified"] = "not.is.null"
+            else:
+                params["or"] = f"(when_modified.gt.{watermark},and(when_modified.eq.{watermark},id.gt.{watermark_id}))"
+            rows = source.fetch_rows(self.remote_tables[ANALYSIS], params)
+            synced_at = time.time()
+            self._upsert(ANALYSIS, ANALYSIS_COLUMNS, rows, synced_at, token)
+            total += len(rows)
+            if rows:
+                watermark, watermark_id = rows[-1]["when_modified"], rows[-1]["id"]
+            with self._write_lock:
+                conn = self._connection()
+                with conn:
+                    conn.execute(
+                        "update sync_state set watermark = ?, watermark_id = ?, synced_at = ? where table_name = ?",
+                        (watermark, watermark_id, synced_at, ANALYSIS),
+                    )
+            if len(rows) < self.page_size:
+                return total
+
+    def _upsert(
+        self, table: str, columns: Sequence[str], rows: List[Dict[str, Any]], synced_at: float, token: str
+    ) -> None:
+        names = list(columns) + (["date_paid_iso"] if table == ANALYSIS else []) + ["synced_at"]
+        values = []
+        for row in rows:
+            record = [row.get(name) for name in columns]
+            record[columns.index("email")] = (row.get("email") or "").strip().lower()
+            if table == ANALYSIS:
+                record.append(_iso_date(row.get("date_paid")))
+            record.append(synced_at)
+            values.append(record)
+        sql = f"insert or replace into {table} ({', '.join(names)}) values ({', '.join('?' * len(names))})"
+        with self._write_lock:
+            conn = self._connection()
+            with conn:
+                # Renewed with every page, in the same transaction as the page's rows
+                self._renew_lease(conn, token)
+                conn.executemany(sql, values)
+
+    def start_background_sync(self, source: Any, interval: float) -> None:
+        """Start the sync thread for this process (a no-op if it is already running)."""
+        if self._sync_pid == os.getpid():
+            return
+        self._sync_pid = os.getpid()
+        thread = threading.Thread(
+            target=self._sync_loop, args=(source, interval), name="replica-sync", daemon=True
+        )
+        thread.start()
+
+    def _sync_loop(self, source: Any, interval: float) -> None:
+        while True:
+            age = self.age()
+            # Another worker sharing the file may have synced already
+            if age is None or age >= interval:
+                try:
+                    counts = self.sync(source)
+                    if any(counts.values()):
+                        print(f"[REPLICA] Synced {counts}")
+                except Exception as exc:
+                    metrics.incr("replica_sync_errors")
+                    print(f"[REPLICA] ⚠️  Sync failed: {exc}")
+            age = self.age()
+            if age is not None:
+                metrics.gauge("replica_lag_seconds", round(age, 1))
+            time.sleep(interval)
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Per-request deadlines.
+
+The API sets a deadline when a request starts; it lives in a context variable,
+so it follows the request into the agent worker thread (AdmissionController
+copies the context) and down to every outbound call. Each call asks
+`call_timeout()` for its timeout: the smaller of its usual timeout and the
+remaining budget. Code running without a deadline (CLI, background flushes)
+gets its usual timeout unchanged.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+try:
+    from metrics import metrics
+except ImportError:
+    from src.metrics import metrics
+
+# Below this many seconds an outbound call is not worth starting
+MIN_CALL_SECONDS = 0.5
+
+_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when the request budget is spent before a call can start."""
+
+    def __init__(self, stage: str):
+        super().__init__(f"Request deadline exceeded ({stage})")
+        self.stage = stage
+
+
+def start(seconds: float):
+    """Set the deadline for the current context; returns a token for `reset()`."""
+    return _deadline.set(time.monotonic() + seconds)
+
+
+def reset(token) -> None:
+    _deadline.reset(token)
+
+
+@contextmanager
+def deadline_scope(seconds: float) -> Iterator[None]:
+    token = start(seconds)
+    try:
+        yield
+    finally:
+        reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left, or None when no deadline is set."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def exceeded(stage: str) -> None:
+    """Count a deadline-exceeded outcome for a stage."""
+    metrics.incr("deadline_exceeded", stage=stage)
+
+
+def check(stage: str, reserve: float = 0.0) -> None:
+    """
+    Raise DeadlineExceeded if fewer than `reserve` (+ MIN_CALL_SECONDS) seconds remain.
+    """
+    left = remaining()
+    if left is not None and left <= reserve + MIN_CALL_SECONDS:
+        exceeded(stage)
+        raise DeadlineExceeded(stage)
+
+
+def call_timeout(default: float, stage: str) -> float:
+    """
+    Timeout for an outbound call: `default`, capped to the remaining budget.
+
+    Raises:
+        DeadlineExceeded: too little budget left to start the call
+    """
+    check(stage)
+    left = remaining()
+    return default if left is None else min(default, left)
+
+
+def is_exhausted() -> bool:
+    """True when a deadline is set and (nearly) spent; used to attribute timeouts."""
+    left = remaining()
+    return left is not None and left <= MIN_CALL_SECONDS
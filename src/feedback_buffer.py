@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Write-behind buffer for AI feedback.
+
+/feedback accepts a vote immediately: the row gets a locally generated id, is
+appended to an append-only spool file (fsync'd), and a background thread
+flushes pending rows to Supabase in multi-row batches when the batch size or
+flush interval is reached. Flushed progress is recorded as a byte offset next to
+the spool, so rows accepted before a crash are replayed on the next start.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX dev machines
+    fcntl = None
+
+try:
+    from logger import setup_logger
+    from metrics import metrics
+    from supabase_service import SupabaseServiceError
+except ImportError:
+    from src.logger import setup_logger
+    from src.metrics import metrics
+    from src.supabase_service import SupabaseServiceError
+
+logger = setup_logger('feedback_buffer')
+
+# Spool slots tried per base path; each process locks one so workers never share a file
+MAX_SPOOL_SLOTS = 32
+
+
+def _is_poison(exc: Exception) -> bool:
+    """A 4xx (other than timeout/throttling) means the rows themselves are rejected."""
+    status = getattr(exc, "status_code", None)
+    return status is not None and 400 <= status < 500 and status not in (408, 429)
+
+
+class FeedbackBuffer:
+    """Durable spool + batched background flush to the feedback table."""
+
+    def __init__(
+        self,
+        flush_fn: Callable[[List[Dict[str, Any]]], None],
+        spool_path: str,
+        max_batch: int = 50,
+        flush_interval: float = 2.0,
+        fsync: bool = True,
+    ):
+        """
+        Args:
+            flush_fn: Persists a list of rows (raises SupabaseServiceError on failure)
+            spool_path: Base path of the append-only spool file
+            max_batch: Rows per flush; reaching it triggers an immediate flush
+            flush_interval: Seconds between time-triggered flushes
+            fsync: fsync every append (crash-safe) rather than relying on the page cache
+        """
+        self.flush_fn = flush_fn
+        self.base_path = Path(spool_path)
+        self.max_batch = max(max_batch, 1)
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        # Pending rows with the spool offset just past each row
+        self._pending: List[Tuple[Dict[str, Any], int]] = []
+        self._spool = None
+        self._spool_path: Optional[Path] = None
+        self._committed = 0
+        self._retry_delay = 0.0
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+
+    # ------------------------------------------------------------------ spool
+
+    def _offset_path(self) -> Path:
+        return self._spool_path.with_name(self._spool_path.name + ".offset")
+
+    def _claim_spool(self) -> None:
+        """Open and lock the first free spool slot (base, base.1, base.2, ...)."""
+        self.base_path.parent.mkdir(parents=True, exist_ok=True)
+        for slot in range(MAX_SPOOL_SLOTS):
+            path = self.base_path if slot == 0 else self.base_path.with_name(f"{self.base_path.name}.{slot}")
+            handle = open(path, "a+b")
+            if fcntl is None:
+                self._spool, self._spool_path = handle, path
+                return
+            try:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                handle.close()
+                continue
+            self._spool, self._spool_path = handle, path
+            return
+        raise RuntimeError(f"No free feedback spool slot next to {self.base_path}")
+
+    def _write_offset(self, offset: int) -> None:
+        tmp_path = self._offset_path().with_suffix(".tmp")
+        tmp_path.write_text(str(offset), encoding="utf-8")
+        os.replace(tmp_path, self._offset_path())
+        self._committed = offset
+
+    def _recover(self) -> None:
+        """Queue rows that were spooled but never flushed (e.g. after a crash)."""
+        offset_path = self._offset_path()
+        committed = int(offset_path.read_text() or 0) if offset_path.exists() else 0
+        self._spool.seek(committed)
+        position = committed
+        recovered = 0
+        for line in self._spool:
+            position += len(line)
+            if not line.endswith(b"\n"):
+                break  # torn final write; the client never got a success for it
+            try:
+                self._pending.append((json.loads(line), position))
+                recovered += 1
+            except ValueError:
+                logger.error(f"Skipping corrupt feedback spool line at offset {position - len(line)}")
+        self._committed = committed
+        if recovered:
+            logger.info(f"Recovered {recovered} unflushed feedback rows from {self._spool_path}")
+
+    def _compact_if_idle(self) -> None:
+        """Truncate the spool once everything in it has been flushed. Caller holds the lock."""
+        if self._pending:
+            return
+        self._spool.truncate(0)
+        self._spool.flush()
+        self._write_offset(0)
+
+    # --------------------------------------------------------------- lifecycle
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._claim_spool()
+        self._recover()
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="feedback-flush", daemon=True)
+        self._thread.start()
+        logger.info(f"Feedback write-behind started (spool: {self._spool_path})")
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Flush what we can and stop the background thread; unflushed rows stay spooled."""
+        if self._thread is None:
+            return
+        with self._wakeup:
+            self._stopping = True
+            self._wakeup.notify()
+        self._thread.join(timeout)
+        self._thread = None
+        self._spool.close()
+
+    # ------------------------------------------------------------------ submit
+
+    def submit(self, payload: Dict[str, Any]) -> str:
+        """
+        Accept a feedback row and return its id. The row is durable once this returns.
+        """
+        row = dict(payload)
+        row["id"] = row.get("id") or str(uuid.uuid4())
+        line = (json.dumps(row, default=str, separators=(",", ":")) + "\n").encode("utf-8")
+
+        with self._wakeup:
+            if self._spool is None:
+                raise RuntimeError("Feedback buffer is not started")
+            self._spool.seek(0, os.SEEK_END)
+            self._spool.write(line)
+            self._spool.flush()
+            if self.fsync:
+                os.fsync(self._spool.fileno())
+            self._pending.append((row, self._spool.tell()))
+            metrics.incr("feedback_accepted")
+            metrics.gauge("feedback_pending", len(self._pending))
+            if len(self._pending) >= self.max_batch and not self._retry_delay:
+                self._wakeup.notify()
+        return row["id"]
+
+    # ------------------------------------------------------------------- flush
+
+    def _run(self) -> None:
+        while True:
+            with self._wakeup:
+                if not self._stopping and (len(self._pending) < self.max_batch or self._retry_delay):
+                    self._wakeup.wait(max(self.flush_interval, self._retry_delay))
+                batch = self._pending[:self.max_batch]
+                stopping = self._stopping
+            if batch:
+                try:
+                    self._flush(batch)
+                except Exception:
+                    # A bug or unexpected error must not kill the thread: the rows stay
+                    # spooled and pending, and are retried after the backoff
+                    self._back_off()
+                    logger.exception(f"Unexpected error flushing feedback, retrying in {self._retry_delay:.0f}s")
+            if stopping:
+                with self._lock:
+                    if not self._pending or self._retry_delay:
+                        return
+
+    def _dedupe(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Keep the latest vote per (message_id, user) so one upsert never hits a row twice."""
+        latest: Dict[Tuple[Any, Any], Dict[str, Any]] = {}
+        for row in rows:
+            latest[(row.get("message_id"), row.get("user_email_hash"))] = row
+        return list(latest.values())
+
+    def _dead_letter(self, rows: List[Dict[str, Any]], exc: Exception) -> None:
+        dead_path = self._spool_path.with_name(self._spool_path.name + ".dead")
+        with open(dead_path, "a", encoding="utf-8") as fh:
+            for row in rows:
+                fh.write(json.dumps({"error": str(exc), "row": row}, default=str) + "\n")
+        metrics.incr("feedback_dead_lettered", len(rows))
+        logger.error(f"Dead-lettered {len(rows)} feedback rows to {dead_path}: {exc}")
+
+    def _back_off(self) -> None:
+        self._retry_delay = min(max(self._retry_delay * 2, 1.0), 60.0)
+        metrics.incr("feedback_flush_failures")
+
+    def _flush(self, batch: List[Tuple[Dict[str, Any], int]]) -> None:
+        rows = self._dedupe([row for row, _ in batch])
+        started = time.perf_counter()
+        try:
+            self.flush_fn(rows)
+        except SupabaseServiceError as exc:
+            if not _is_poison(exc):
+                self._back_off()
+                logger.warning(f"Feedback flush failed, retrying in {self._retry_delay:.0f}s: {exc}")
+                return
+            # Isolate the rejected rows and keep the rest
+            for row in rows:
+                try:
+                    self.flush_fn([row])
+                except SupabaseServiceError as row_exc:
+                    if not _is_poison(row_exc):
+                        self._back_off()
+                        return
+                    self._dead_letter([row], row_exc)
+
+        self._retry_delay = 0.0
+        metrics.observe("feedback_flush", time.perf_counter() - started)
+        metrics.incr("feedback_flushed", len(batch))
+
+        with self._lock:
+            del self._pending[:len(batch)]
+            self._write_offset(batch[-1][1])
+            self._compact_if_idle()
+            metrics.gauge("feedback_pending", len(self._pending))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "pending": len(self._pending),
+                "spool": str(self._spool_path) if self._spool_path else None,
+                "retry_delay_seconds": self._retry_delay,
+            }
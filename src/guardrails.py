@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+Pre-agent guardrails: reject clearly off-topic and other-person questions
+without an LLM call.
+
+"Tell me a joke" or "What's John's balance?" used to cost a full agent round
+trip just for the model to follow the rejection and privacy instructions in
+its prompt. Guardrails.check runs before the agent with everything compiled
+once at import: keyword lexicons go through a single Aho-Corasick pass, and
+the other-person and topic checks reuse the prompt module classifier. Only
+high-confidence cases are answered here, with the same templated replies the
+prompt asks the model to give; anything ambiguous ("Can my wife claim her
+glasses?") still goes to the agent, which sees the privacy/rejection modules.
+
+An optional embedding classifier (GUARDRAIL_EMBEDDINGS=true) compares
+questions the rules leave undecided with on- and off-topic examples.
+"""
+import os
+import re
+from collections import deque
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    from metrics import metrics
+    from prompt_modules import is_conversational, is_topical, other_person_signals
+except ImportError:
+    from src.metrics import metrics
+    from src.prompt_modules import is_conversational, is_topical, other_person_signals
+
+OFF_TOPIC = "off_topic"
+OTHER_PERSON = "other_person"
+
+# Same wording as the privacy prompt module
+PRIVACY_REJECTION = (
+    "I'm unable to help with that request. For privacy and security reasons, I can only provide "
+    "information about your own claims and benefits. Each employee can only access their personal "
+    "data. If you need information about another employee's claims, please contact my-hrops@deriv.com."
+)
+
+# Off-topic replies per category, from the rejection prompt module's examples
+OFF_TOPIC_REJECTIONS: Dict[str, str] = {
+    "fun": (
+        "Haha, I wish I could! But I'm specifically here to help with your claims and benefits. "
+        "Need help with anything related to your AIA insurance or Deriv health benefits? 😊"
+    ),
+    "people": (
+        "That's outside my area of expertise! I focus on helping Deriv employees with their claims "
+        "and benefits. Anything I can help you with regarding your medical, dental, or optical coverage?"
+    ),
+    "general": (
+        "That's not my specialty! I'm here to help with your employee claims and benefits. "
+        "Need to check your coverage or submit a claim?"
+    ),
+    "tech": (
+        "That's outside my wheelhouse! I specialize in helping with claims and benefits. "
+        "Got any questions about your AIA insurance or Deriv health benefits?"
+    ),
+}
+
+# Off-topic vocabulary -> reply category
+OFF_TOPIC_KEYWORDS: Dict[str, str] = {
+    **dict.fromkeys((
+        "joke", "jokes", "funny", "entertain", "entertain me", "riddle", "poem", "story", "sing",
+        "song", "songs", "movie", "movies", "game", "games", "play a game", "bored",
+    ), "fun"),
+    **dict.fromkeys((
+        "president", "prime minister", "celebrity", "famous", "politics", "election",
+    ), "people"),
+    **dict.fromkeys((
+        "weather", "forecast", "temperature", "news", "stock price", "stocks", "bitcoin", "crypto",
+        "recipe", "cook", "football", "sports", "capital of", "translate", "horoscope",
+    ), "general"),
+    **dict.fromkeys((
+        "python", "javascript", "java", "code", "coding", "program", "programming", "script",
+        "bug", "debug", "sql", "excel formula", "regex", "compile", "laptop", "wifi",
+    ), "tech"),
+}
+
+# Phrases that mark a question about the user's own claim data (DM-worthy)
+OWN_DATA_PHRASES = (
+    "my balance", "my claim", "my claims", "my limit", "my data", "my information",
+    "my remaining", "my total", "how much have i", "how much did i", "how much i have",
+    "how much i've", "what's my", "whats my", "show me my", "tell me my", "do i have",
+    "can i claim", "my claim history", "my transactions", "my claim records", "my claim details",
+)
+
+# "What's 2+2?", "calculate 15 * 4"
+_ARITHMETIC = re.compile(
+    r"^\W*(?:what(?:'s| is)|calculate|solve)?\s*[\d\s.()]+[-+*/x^][\d\s.()+*/x^-]+\W*$", re.IGNORECASE
+)
+# "Who is Donald Trump?" (a capitalised name; topical questions never get this far)
+_WHO_IS = re.compile(r"^\s*[Ww]ho\s+(?:is|was|are)\s+[A-Z]")
+_APOSTROPHES = str.maketrans({"’": "'", "‘": "'"})
+
+
+class AhoCorasick:
+    """
+    Multi-keyword matcher: one pass over the text finds every keyword, however
+    many there are. Matches are whole words (or phrases) only.
+    """
+
+    def __init__(self, keywords: Dict[str, str]):
+        """
+        Args:
+            keywords: Lowercase keyword -> label returned with each match
+        """
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[Tuple[str, str]]] = [[]]
+        for keyword, label in keywords.items():
+            self._add(keyword.lower(), label)
+        self._link()
+
+    def _add(self, keyword: str, label: str) -> None:
+        state = 0
+        for char in keyword:
+            nxt = self._goto[state].get(char)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][char] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = nxt
+        self._output[state].append((keyword, label))
+
+    def _link(self) -> None:
+        """Breadth-first failure links; each state inherits its suffix state's outputs."""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[nxt] = self._goto[fallback].get(char, 0)
+                self._output[nxt] = self._output[nxt] + self._output[self._fail[nxt]]
+
+    def find(self, text: str) -> List[Tuple[str, str]]:
+        """(keyword, label) for every whole-word match in `text`, in order of appearance."""
+        text = text.lower()
+        matches = []
+        state = 0
+        for end, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for keyword, label in self._output[state]:
+                start = end - len(keyword) + 1
+                if _is_boundary(text, start - 1) and _is_boundary(text, end + 1):
+                    matches.append((keyword, label))
+        return matches
+
+
+def _is_boundary(text: str, index: int) -> bool:
+    return index < 0 or index >= len(text) or not (text[index].isalnum() or text[index] == "_")
+
+
+class Verdict:
+    """Outcome of a guardrail check."""
+
+    def __init__(
+        self,
+        reason: Optional[str] = None,
+        answer: Optional[str] = None,
+        confidence: float = 0.0,
+        own_data: bool = False,
+        matched: Sequence[str] = (),
+    ):
+        self.reason = reason
+        self.answer = answer
+        self.confidence = confidence
+        self.own_data = own_data
+        self.matched = list(matched)
+
+    @property
+    def rejected(self) -> bool:
+        return self.answer is not None
+
+    def __repr__(self) -> str:
+        return f"Verdict(reason={self.reason!r}, confidence={self.confidence}, own_data={self.own_data})"
+
+
+class PrototypeClassifier:
+    """
+    Nearest-example topic classifier over sentence embeddings. Used only for
+    questions the rules leave undecided.
+    """
+
+    ON_TOPIC_EXAMPLES = (
+        "How much of my benefit allowance is left?",
+        "Is this treatment covered by my insurance?",
+        "How do I get reimbursed for a medical bill?",
+        "Which clinics can I visit?",
+        "When will my claim be paid?",
+    )
+    OFF_TOPIC_EXAMPLES = (
+        "Tell me something funny",
+        "Who won the match last night?",
+        "Write a function that sorts a list",
+        "What should I cook for dinner?",
+        "Explain how black holes work",
+    )
+
+    def __init__(
+        self,
+        embed_fn: Callable[[str], List[float]],
+        min_similarity: float = 0.5,
+        margin: float = 0.15,
+    ):
+        """
+        Args:
+            embed_fn: Text -> L2-normalised vector
+            min_similarity: Cosine similarity to an off-topic example needed to reject
+            margin: How much closer to off-topic than on-topic examples the text must be
+        """
+        self.embed_fn = embed_fn
+        self.min_similarity = min_similarity
+        self.margin = margin
+        self._on: Optional[List[List[float]]] = None
+        self._off: Optional[List[List[float]]] = None
+
+    def _best(self, vector: List[float], examples: Iterable[List[float]]) -> float:
+        return max(sum(a * b for a, b in zip(vector, example)) for example in examples)
+
+    def is_off_topic(self, text: str) -> Tuple[bool, float]:
+        """(off topic?, similarity to the nearest off-topic example)."""
+        if self._on is None:
+            self._on = [self.embed_fn(example) for example in self.ON_TOPIC_EXAMPLES]
+            self._off = [self.embed_fn(example) for example in self.OFF_TOPIC_EXAMPLES]
+        vector = self.embed_fn(text)
+        off, on = self._best(vector, self._off), self._best(vector, self._on)
+        return off >= self.min_similarity and off - on >= self.margin, off
+
+
+class Guardrails:
+    """Compiled pre-agent checks; build once and share."""
+
+    def __init__(self, classifier: Optional[PrototypeClassifier] = None):
+        self.classifier = classifier
+        self._off_topic = AhoCorasick(OFF_TOPIC_KEYWORDS)
+        self._own_data = AhoCorasick(dict.fromkeys(OWN_DATA_PHRASES, "own_data"))
+
+    def is_own_data_query(self, query_text: str) -> bool:
+        """About the user's OWN claim data (and nobody else's)."""
+        text = query_text.translate(_APOSTROPHES)
+        return not other_person_signals(text) and bool(self._own_data.find(text))
+
+    def check(self, query_text: str, user_email: str = "", previous_text: str = "") -> Verdict:
+        """
+        Args:
+            query_text: The user's question
+            user_email: The authenticated user (their own address is not "someone else")
+            previous_text: The previous user turn; follow-ups to an on-topic turn are never rejected
+
+        Returns:
+            Verdict; `answer` is set when the question should be rejected without the agent
+        """
+        text = query_text.translate(_APOSTROPHES)
+        if user_email:
+            text = re.sub(re.escape(user_email), "me", text, flags=re.IGNORECASE)
+
+        signals = other_person_signals(text)
+        own_data = not signals and bool(self._own_data.find(text))
+
+        # Another person, identified unambiguously (an address other than the user's,
+        # an ID that is not "my ..."). Names are only guessed ("for January",
+        # "Panel clinics"), so those questions go to the agent with the privacy module
+        if signals & {"email", "employee_id"}:
+            return self._reject(OTHER_PERSON, PRIVACY_REJECTION, 0.95, sorted(signals))
+
+        if is_topical(text) or is_conversational(text):
+            return Verdict(own_data=own_data)
+        if previous_text and is_topical(previous_text):
+            # Probably a follow-up ("and for him?"); let the agent read the context
+            return Verdict(own_data=own_data)
+
+        keywords = self._off_topic.find(text)
+        if keywords:
+            category = keywords[0][1]
+            return self._reject(OFF_TOPIC, OFF_TOPIC_REJECTIONS[category], 0.95, [k for k, _ in keywords])
+        if _ARITHMETIC.match(text):
+            return self._reject(OFF_TOPIC, OFF_TOPIC_REJECTIONS["general"], 0.95, ["arithmetic"])
+        if _WHO_IS.match(text):
+            return self._reject(OFF_TOPIC, OFF_TOPIC_REJECTIONS["people"], 0.9, ["who is"])
+
+        if self.classifier is not None:
+            try:
+                off_topic, similarity = self.classifier.is_off_topic(text)
+            except Exception:
+                metrics.incr("guardrail_classifier_errors")
+            else:
+                if off_topic:
+                    return self._reject(OFF_TOPIC, OFF_TOPIC_REJECTIONS["general"], round(similarity, 2), ["embedding"])
+        return Verdict(own_data=own_data)
+
+    @staticmethod
+    def _reject(reason: str, answer: str, confidence: float, matched: Sequence[str]) -> Verdict:
+        metrics.incr("guardrail_rejections", reason=reason)
+        return Verdict(reason=reason, answer=answer, confidence=confidence, matched=matched)
+
+
+def guardrails_enabled() -> bool:
+    """
+    GUARDRAILS=off sends every question to the agent again (rollback switch);
+    verdicts are still counted in guardrail_rejections.
+    """
+    return (os.getenv("GUARDRAILS") or "on").strip().lower() not in {"0", "off", "false", "no"}
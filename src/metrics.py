@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+In-process metrics for the API and agent.
+Thread-safe counters, gauges and timing summaries exposed via GET /metrics.
+"""
+import threading
+from typing import Any, Dict
+
+
+def _metric_key(name: str, labels: Dict[str, Any]) -> str:
+    """Render name + labels as a flat key, e.g. query_runs{source=replayed}."""
+    if not labels:
+        return name
+    rendered = ",".join(f"{key}={labels[key]}" for key in sorted(labels))
+    return f"{name}{{{rendered}}}"
+
+
+class MetricsRegistry:
+    """Minimal metrics store; snapshot() returns a JSON-serializable dict."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = {}
+        self._gauges: Dict[str, float] = {}
+        self._timings: Dict[str, Dict[str, float]] = {}
+
+    def incr(self, name: str, value: float = 1, **labels) -> None:
+        """Increase a counter."""
+        key = _metric_key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def gauge(self, name: str, value: float, **labels) -> None:
+        """Set a gauge to its current value."""
+        key = _metric_key(name, labels)
+        with self._lock:
+            self._gauges[key] = value
+
+    def observe(self, name: str, seconds: float, **labels) -> None:
+        """Record a duration (count / total / max)."""
+        key = _metric_key(name, labels)
+        with self._lock:
+            timing = self._timings.setdefault(key, {"count": 0, "total": 0.0, "max": 0.0})
+            timing["count"] += 1
+            timing["total"] += seconds
+            timing["max"] = max(timing["max"], seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return a copy of all metrics with average durations filled in."""
+        with self._lock:
+            timings = {
+                key: {
+                    "count": value["count"],
+                    "avg_ms": round(value["total"] / value["count"] * 1000, 2) if value["count"] else 0.0,
+                    "max_ms": round(value["max"] * 1000, 2),
+                }
+                for key, value in self._timings.items()
+            }
+            return {
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges),
+                "timings": timings,
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._timings.clear()
+
+
+# Process-wide registry
+metrics = MetricsRegistry()
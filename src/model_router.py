@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Model cascade: pick the cheapest tier that can handle a turn.
+
+Every turn used to go to the one MODEL_NAME model, including "thanks!" and
+one-fact follow-ups. Turns are now scored for complexity before the agent runs:
+
+- template: pure small talk ("hi", "thanks", "bye") gets a fixed reply, no LLM
+- fast:     short single-topic questions run on MODEL_FAST_NAME
+- strong:   everything else runs on MODEL_NAME, as before
+
+A fast-tier answer is escalated (re-run on the strong tier) when one of its
+tool calls failed or the answer reads as unsure, as long as the request
+deadline leaves room for a second run. Turns, latency, cost and escalations
+are recorded per tier in metrics.
+"""
+import os
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+try:
+    import deadline
+    from metrics import metrics
+except ImportError:
+    from src import deadline
+    from src.metrics import metrics
+
+TEMPLATE = "template"
+FAST = "fast"
+STRONG = "strong"
+
+# USD per 1M tokens: (input, cached input, output)
+MODEL_PRICES: Dict[str, Tuple[float, float, float]] = {
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4.1-nano": (0.10, 0.025, 0.40),
+    "gpt-4.1-mini": (0.40, 0.10, 1.60),
+    "gpt-4.1": (2.00, 0.50, 8.00),
+}
+
+_GREETING = re.compile(
+    r"^\W*(?:hi|hello|hey|hiya|good (?:morning|afternoon|evening))(?:\s+there)?\W*$", re.IGNORECASE
+)
+_THANKS = re.compile(
+    r"^\W*(?:thanks|thank you|thx|cheers|ok(?:ay)?,? thanks?)(?:\s+(?:so much|a lot|again))?\W*$", re.IGNORECASE
+)
+_BYE = re.compile(r"^\W*(?:bye|goodbye|see you|that's all|that is all)\W*$", re.IGNORECASE)
+
+TEMPLATE_REPLIES = (
+    (_GREETING, "Hi! 👋 I can help with your claims and benefits: your balance, what's covered "
+                "under AIA or Deriv benefits, and how to submit a claim. What would you like to know?"),
+    (_THANKS, "You're welcome! 😊 Let me know if there's anything else about your claims or benefits."),
+    (_BYE, "Take care! I'm here whenever you need help with your claims or benefits. 👋"),
+)
+
+# Signals that a turn needs more than a single lookup
+_REASONING = re.compile(
+    r"\b(?:why|explain|compare|comparison|difference|differ|versus|vs\.?|better|should i|recommend|"
+    r"what if|if i|calculate|both|either|instead|pros|cons|plan|strategy)\b",
+    re.IGNORECASE,
+)
+_FOLLOW_UP = re.compile(
+    r"^\W*(?:and|what about|how about|also|then|so)\b|\b(?:it|that|those|them|this)\b", re.IGNORECASE
+)
+_CLAUSE_JOIN = re.compile(r"\b(?:and also|and then|as well as)\b|\?.+\?", re.IGNORECASE)
+
+# Answers that read as unsure (escalated from the fast tier)
+LOW_CONFIDENCE_PHRASES = (
+    "i'm not sure", "i am not sure", "i don't know", "i do not know", "i couldn't find",
+    "i could not find", "not certain", "unable to determine", "i don't have that information",
+    "i encountered an error",
+)
+
+
+class ModelTier:
+    """One model configuration of the cascade."""
+
+    def __init__(self, name: str, model: str, temperature: float = 0.7):
+        self.name = name
+        self.model = model
+        self.temperature = temperature
+
+    @property
+    def price(self) -> Optional[Tuple[float, float, float]]:
+        return MODEL_PRICES.get(self.model)
+
+    def __repr__(self) -> str:
+        return f"ModelTier({self.name!r}, {self.model!r})"
+
+
+def tiers_from_env(strong_model: str) -> Dict[str, ModelTier]:
+    """The strong tier is the agent's main model; MODEL_FAST_NAME (if set) is the fast one."""
+    return {
+        FAST: ModelTier(FAST, os.getenv("MODEL_FAST_NAME") or strong_model),
+        STRONG: ModelTier(STRONG, strong_model),
+    }
+
+
+def template_reply(query_text: str) -> Optional[str]:
+    """Fixed reply for messages that are nothing but small talk."""
+    for pattern, reply in TEMPLATE_REPLIES:
+        if pattern.match(query_text):
+            return reply
+    return None
+
+
+def complexity_score(
+    query_text: str, modules: Sequence[str] = (), previous_text: str = ""
+) -> Tuple[float, List[str]]:
+    """
+    0 (one quick lookup) .. 1 (multi-part reasoning), with the reasons that added to it.
+
+    Args:
+        query_text: The user's question
+        modules: Prompt modules selected for the turn (src/prompt_modules.py)
+        previous_text: The previous user turn, if any
+    """
+    score = 0.0
+    reasons = []
+    words = len(query_text.split())
+    if words > 25:
+        score += 0.3
+        reasons.append("long")
+    elif words > 12:
+        score += 0.1
+        reasons.append("medium_length")
+    if _CLAUSE_JOIN.search(query_text):
+        score += 0.3
+        reasons.append("multi_part")
+    if _REASONING.search(query_text):
+        score += 0.35
+        reasons.append("reasoning")
+    topics = [name for name in modules if name not in ("core", "privacy", "rejection")]
+    if len(topics) > 1:
+        score += 0.2
+        reasons.append("multi_topic")
+    if "privacy" in modules:
+        # Other people come up: leave the judgement call to the strong model
+        score += 0.5
+        reasons.append("privacy")
+    if previous_text and _FOLLOW_UP.search(query_text):
+        score += 0.15
+        reasons.append("follow_up")
+    return min(score, 1.0), reasons
+
+
+class RouteDecision:
+    """Tier chosen for one turn."""
+
+    def __init__(self, tier: str, score: float = 0.0, reasons: Sequence[str] = (), answer: Optional[str] = None):
+        self.tier = tier
+        self.score = score
+        self.reasons = list(reasons)
+        # Set for the template tier
+        self.answer = answer
+
+    def __repr__(self) -> str:
+        return f"RouteDecision({self.tier!r}, score={self.score:.2f}, reasons={self.reasons})"
+
+
+class ModelRouter:
+    """Scores turns, picks a tier and runs the fast -> strong cascade."""
+
+    def __init__(
+        self,
+        tiers: Dict[str, ModelTier],
+        fast_max_score: float = 0.3,
+        escalation_min_seconds: float = 10.0,
+        enabled: bool = True,
+    ):
+        """
+        Args:
+            tiers: fast and strong ModelTier
+            fast_max_score: Highest complexity score still sent to the fast tier
+            escalation_min_seconds: Deadline budget needed to re-run a turn on the strong tier
+            enabled: False sends every turn to the strong tier (templates included)
+        """
+        self.tiers = tiers
+        self.fast_max_score = fast_max_score
+        self.escalation_min_seconds = escalation_min_seconds
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._fast_turns = 0
+        self._escalations = 0
+
+    @classmethod
+    def from_env(cls, strong_model: str) -> "ModelRouter":
+        return cls(
+            tiers_from_env(strong_model),
+            fast_max_score=float(os.getenv("MODEL_ROUTER_FAST_MAX_SCORE", "0.3")),
+            escalation_min_seconds=float(os.getenv("MODEL_ROUTER_ESCALATION_MIN_SECONDS", "10")),
+            enabled=(os.getenv("MODEL_ROUTING") or "on").strip().lower() not in {"0", "off", "false", "no"},
+        )
+
+    @property
+    def has_fast_tier(self) -> bool:
+        """A fast tier only helps when it is a different model from the strong one."""
+        return self.tiers[FAST].model != self.tiers[STRONG].model
+
+    def route(self, query_text: str, modules: Sequence[str] = (), previous_text: str = "") -> RouteDecision:
+        if not self.enabled:
+            return RouteDecision(STRONG, reasons=["routing_disabled"])
+        reply = template_reply(query_text)
+        if reply is not None:
+            return RouteDecision(TEMPLATE, answer=reply, reasons=["small_talk"])
+        score, reasons = complexity_score(query_text, modules, previous_text)
+        if self.has_fast_tier and score <= self.fast_max_score:
+            return RouteDecision(FAST, score, reasons)
+        return RouteDecision(STRONG, score, reasons)
+
+    @staticmethod
+    def escalation_reason(answer: str, intermediate_steps: Sequence[Tuple[Any, Any]]) -> Optional[str]:
+        """Why a fast-tier result should be re-run on the strong tier (None to keep it)."""
+        for action, observation in intermediate_steps:
+            # Parsing failures come back as the "_Exception" pseudo tool; tools report {"error": ...}
+            if getattr(action, "tool", "") == "_Exception" or '"error"' in str(observation)[:200]:
+                return "tool_failure"
+        text = (answer or "").strip().lower()
+        if not text:
+            return "empty_answer"
+        if any(phrase in text for phrase in LOW_CONFIDENCE_PHRASES):
+            return "low_confidence"
+        return None
+
+    def run(
+        self, decision: RouteDecision, run_tier: Callable[[str], Dict[str, Any]]
+    ) -> Tuple[Dict[str, Any], str, Optional[str]]:
+        """
+        Run the turn on the decided tier, escalating fast -> strong when needed.
+
+        Args:
+            decision: From route() (not the template tier)
+            run_tier: Tier name -> executor response ({"output", "intermediate_steps"})
+
+        Returns:
+            (response, tier that produced it, escalation reason or None)
+        """
+        response = self._timed(decision.tier, run_tier)
+        if decision.tier != FAST:
+            return response, decision.tier, None
+
+        reason = self.escalation_reason(response.get("output", ""), response.get("intermediate_steps", []))
+        left = deadline.remaining()
+        if reason and left is not None and left < self.escalation_min_seconds:
+            metrics.incr("model_router_escalations_skipped", reason=reason)
+            reason = None
+        self._count_fast_turn(escalated=reason is not None)
+        if reason is None:
+            return response, FAST, None
+
+        metrics.incr("model_router_escalations", reason=reason)
+        return self._timed(STRONG, run_tier), STRONG, reason
+
+    def record_template(self) -> None:
+        metrics.incr("model_tier_turns", tier=TEMPLATE)
+
+    def _timed(self, tier: str, run_tier: Callable[[str], Dict[str, Any]]) -> Dict[str, Any]:
+        metrics.incr("model_tier_turns", tier=tier)
+        started = time.perf_counter()
+        try:
+            return run_tier(tier)
+        finally:
+            metrics.observe("model_tier_latency", time.perf_counter() - started, tier=tier)
+
+    def _count_fast_turn(self, escalated: bool) -> None:
+        with self._lock:
+            self._fast_turns += 1
+            self._escalations += int(escalated)
+            rate = self._escalations / self._fast_turns
+        metrics.gauge("model_router_escalation_rate", round(rate, 3))
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Idempotency support for expensive endpoints.
+
+Concurrent requests with the same key share one in-flight computation, and the
+result is replayed to repeats that arrive within a short window (double-clicks,
+network retries, tab reloads), so the agent and LLM run only once.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+# How a request was served
+SOURCE_COMPUTED = "computed"
+SOURCE_COALESCED = "coalesced"
+SOURCE_REPLAYED = "replayed"
+
+
+class RequestCoalescer:
+    """Single-flight execution plus a TTL result cache, keyed by idempotency key."""
+
+    def __init__(self, ttl_seconds: float = 120.0, max_entries: int = 1000):
+        """
+        Args:
+            ttl_seconds: How long a finished result is replayed for repeats
+            max_entries: Cap on stored results (oldest evicted first)
+        """
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._results: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def _lookup(self, key: str) -> Optional[Any]:
+        entry = self._results.get(key)
+        if entry is None:
+            return None
+        expires_at, result = entry
+        if expires_at < time.monotonic():
+            del self._results[key]
+            return None
+        return result
+
+    def _store(self, key: str, result: Any) -> None:
+        self._results[key] = (time.monotonic() + self.ttl_seconds, result)
+        self._results.move_to_end(key)
+        while len(self._results) > self.max_entries:
+            self._results.popitem(last=False)
+
+    async def run(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        should_store: Callable[[Any], bool] = lambda result: True,
+    ) -> Tuple[Any, str]:
+        """
+        Return (result, source) for `key`, computing it at most once at a time.
+
+        Args:
+            key: Idempotency key
+            compute: Coroutine factory performing the real work
+            should_store: Whether a finished result may be replayed (e.g. skip errors)
+        """
+        stored = self._lookup(key)
+        if stored is not None:
+            return stored, SOURCE_REPLAYED
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            # shield() so a disconnecting follower does not cancel the leader's work
+            return await asyncio.shield(inflight), SOURCE_COALESCED
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await compute()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as exc:
+            future.set_exception(exc)
+            # Mark the exception as retrieved when nobody else was waiting on it
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            if should_store(result):
+                self._store(key, result)
+            return result, SOURCE_COMPUTED
+        finally:
+            self._inflight.pop(key, None)
+
+    def stats(self) -> Dict[str, int]:
+        return {"inflight": len(self._inflight), "stored_results": len(self._results)}
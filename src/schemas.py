@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Request models for the API.
+
+Bodies are parsed and validated in one pass with Pydantic's JSON parser
+(`Model.model_validate_json(raw_bytes)`), replacing `await request.json()`
+followed by hand-written field checks.
+"""
+from typing import Any, Dict, List, Literal, Optional
+
+from pydantic import BaseModel, ValidationError, field_validator
+
+try:
+    from auth_stub import validate_email
+except ImportError:
+    from src.auth_stub import validate_email
+
+
+def _strip_or_none(value: Any) -> Optional[str]:
+    if isinstance(value, str):
+        return value.strip() or None
+    return None
+
+
+class QueryRequest(BaseModel):
+    """Body of POST /query."""
+
+    user_email: str
+    query_text: str
+    thread_id: Optional[str] = None
+    message_id: Optional[str] = None
+    idempotency_key: Optional[str] = None
+    context_messages: Optional[List[Dict[str, Any]]] = None
+
+    @field_validator("user_email", "query_text")
+    @classmethod
+    def _required(cls, value: str) -> str:
+        if not value:
+            raise ValueError("Missing required fields: user_email and query_text")
+        return value
+
+    @field_validator("thread_id", "message_id", "idempotency_key", mode="before")
+    @classmethod
+    def _optional_id(cls, value: Any) -> Optional[str]:
+        if value is None:
+            return None
+        return str(value).strip() or None
+
+
+class FeedbackRequest(BaseModel):
+    """Body of POST /feedback (fields normalised the same way the endpoint always did)."""
+
+    user_email: str
+    message_id: str
+    rating: Literal["up", "down"]
+    response_text: str
+    thread_id: Optional[str] = None
+    comment: Optional[str] = None
+    model: Optional[str] = None
+    metadata: Dict[str, Any] = {}
+
+    @field_validator("user_email", mode="before")
+    @classmethod
+    def _email(cls, value: Any) -> str:
+        email = value.strip().lower() if isinstance(value, str) else ""
+        if not validate_email(email):
+            raise ValueError("Invalid user_email")
+        return email
+
+    @field_validator("message_id", mode="before")
+    @classmethod
+    def _message_id(cls, value: Any) -> str:
+        if not _strip_or_none(value):
+            raise ValueError("Missing message_id")
+        return value.strip()
+
+    @field_validator("rating", mode="before")
+    @classmethod
+    def _rating(cls, value: Any) -> str:
+        rating = (value or "").strip().lower() if isinstance(value, str) else ""
+        if rating not in {"up", "down"}:
+            raise ValueError("rating must be 'up' or 'down'")
+        return rating
+
+    @field_validator("response_text", mode="before")
+    @classmethod
+    def _response_text(cls, value: Any) -> str:
+        if not _strip_or_none(value):
+            raise ValueError("Missing response_text")
+        return value.strip()
+
+    @field_validator("thread_id", "comment", "model", mode="before")
+    @classmethod
+    def _optional_text(cls, value: Any) -> Optional[str]:
+        return _strip_or_none(value)
+
+    @field_validator("metadata", mode="before")
+    @classmethod
+    def _metadata(cls, value: Any) -> Dict[str, Any]:
+        return value if isinstance(value, dict) else {}
+
+
+class SessionWarmRequest(BaseModel):
+    """Body of POST /session/warm."""
+
+    user_email: str
+    thread_id: Optional[str] = None
+
+    @field_validator("user_email", mode="before")
+    @classmethod
+    def _email(cls, value: Any) -> str:
+        # Kept as sent (not lowercased) so it maps to the same memory key as /query
+        email = value.strip() if isinstance(value, str) else ""
+        if not validate_email(email.lower()):
+            raise ValueError("Invalid user_email")
+        return email
+
+    @field_validator("thread_id", mode="before")
+    @classmethod
+    def _optional_text(cls, value: Any) -> Optional[str]:
+        return _strip_or_none(value)
+
+
+# Per model: messages for fields that are absent altogether (validators only run
+# on present fields). Models without an entry use the endpoint's default message.
+_MISSING_MESSAGES: Dict[str, Dict[str, str]] = {
+    "FeedbackRequest": {
+        "user_email": "Invalid user_email",
+        "message_id": "Missing message_id",
+        "rating": "rating must be 'up' or 'down'",
+        "response_text": "Missing response_text",
+    },
+    "SessionWarmRequest": {"user_email": "Invalid user_email"},
+}
+
+
+def validation_detail(exc: ValidationError, default: str) -> str:
+    """
+    Turn the first validation error into the short 400 detail clients already expect.
+
+    Args:
+        exc: Error raised by model_validate_json
+        default: Message used when the error has no specific mapping
+    """
+    error = exc.errors()[0]
+    if error["type"] == "json_invalid":
+        return "Invalid JSON body"
+    if error["type"] == "value_error":
+        return str(error["ctx"]["error"])
+    if error["type"] == "missing" and error["loc"]:
+        return _MISSING_MESSAGES.get(exc.title, {}).get(error["loc"][0], default)
+    return default
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+JSON encoding helpers for API responses and tool outputs.
+
+Uses orjson when installed (several times faster than the stdlib encoder) and
+falls back to the stdlib json module otherwise. Tool outputs are written
+compactly (no indentation, no spaces after separators, raw UTF-8) because
+every byte is fed back to the LLM as prompt tokens.
+"""
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+HAS_ORJSON = orjson is not None
+
+
+def dumps_compact(obj: Any) -> str:
+    """
+    Serialize obj as compact JSON text; unknown types (Decimal, UUID...) become str.
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+        except TypeError:
+            # e.g. integers beyond 64 bits; the stdlib encoder handles them
+            pass
+    return json.dumps(obj, default=str, separators=(",", ":"), ensure_ascii=False)
+
+
+def loads(data: Any) -> Any:
+    """Parse JSON from str or bytes."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
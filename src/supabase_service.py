@@ -4,14 +4,110 @@ Lightweight Supabase REST helper for backend tools.
 Fetches claim_summary and claim_analysis rows using the service-role key.
 """
 import os
-from typing import Any, Dict, List, Optional, Tuple
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
 
 import requests
 
+try:
+    import deadline
+    from batch_loader import BatchLoader
+    from circuit_breaker import CircuitOpenError, breaker_options, get_breaker, is_dependency_failure
+    from db_retriever import DatabaseRetriever
+    from metrics import metrics
+except ImportError:
+    from src import deadline
+    from src.batch_loader import BatchLoader
+    from src.circuit_breaker import CircuitOpenError, breaker_options, get_breaker, is_dependency_failure
+    from src.db_retriever import DatabaseRetriever
+    from src.metrics import metrics
+
 
 class SupabaseServiceError(RuntimeError):
     """Raised when Supabase requests fail."""
 
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        # HTTP status when Supabase answered with an error (None for network failures)
+        self.status_code = status_code
+
+
+def _is_client_error(exc: BaseException) -> bool:
+    status = getattr(exc, "status_code", None)
+    return status is not None and 400 <= status < 500 and status not in (408, 429)
+
+
+def _counts_against_supabase(exc: BaseException) -> bool:
+    """Bad queries (4xx) are our fault, not an outage; don't let them open the breaker."""
+    return is_dependency_failure(exc) and not _is_client_error(exc)
+
+
+# Age in seconds of the oldest stale result served in the current context (per tool call)
+_stale_age: ContextVar[Optional[float]] = ContextVar("supabase_stale_age", default=None)
+
+
+# Recent claims included in the cached user context
+USER_CONTEXT_RECENT_LIMIT = 25
+
+CLAIM_SUMMARY_COLUMNS = (
+    "id",
+    "year",
+    "employee_id",
+    "email",
+    "employee_name",
+    "currency",
+    "max_amount",
+    "total_transaction_amount",
+    "remaining_balance",
+)
+CLAIM_ANALYSIS_COLUMNS = (
+    "id",
+    "record_key",
+    "state",
+    "claim_type",
+    "claim_description",
+    "description",
+    "transaction_amount",
+    "transaction_currency",
+    "date_paid",
+    "date_submitted",
+)
+# PostgREST Prefer: count= modes (exact runs count(*); planned/estimated use planner statistics)
+COUNT_MODES = ("exact", "planned", "estimated")
+# Newest paid first; id breaks ties so keyset pages never skip or repeat rows
+_CLAIM_ORDER = "date_paid.desc.nullslast,id.desc"
+
+
+def _quoted(value: Any) -> str:
+    """A value inside a PostgREST or=(...) filter (dates contain spaces, ids may contain commas)."""
+    return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+class ClaimStream:
+    """
+    Lazily paged claim_analysis rows (see SupabaseService.iter_claim_analysis).
+
+    Only one page is held at a time. `total` is filled in once the first page
+    has been read, when a count was requested.
+    """
+
+    def __init__(self, pages: Callable[["ClaimStream"], Iterator[List[Dict[str, Any]]]]):
+        """
+        Args:
+            pages: Called on iteration with this stream; yields pages of rows
+        """
+        self._pages = pages
+        self.total: Optional[int] = None
+        self.pages_read = 0
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for page in self._pages(self):
+            self.pages_read += 1
+            yield from page
+
 
 class SupabaseService:
     """Provides typed helpers for the four ClaimEase tables in Supabase."""
@@ -44,27 +140,201 @@ class SupabaseService:
             or os.getenv("NEXT_PUBLIC_SUPABASE_FEEDBACK_TABLE")
             or "claim_ai_feedback"
         )
+        self.context_rpc = os.getenv("SUPABASE_USER_CONTEXT_RPC", "get_user_context")
+        # Cleared when the RPC is not deployed; get_user_context then uses table reads
+        self._context_rpc_available = True
+        # Short-lived per-user contexts (session warm-up, repeated tool calls in a turn)
+        self.context_ttl = float(os.getenv("SUPABASE_CONTEXT_TTL_SECONDS", "60"))
+        self.context_max_entries = int(os.getenv("SUPABASE_CONTEXT_MAX_ENTRIES", "1000"))
+        self._contexts: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._context_inflight: Dict[str, threading.Event] = {}
+        self._context_lock = threading.Lock()
         self.rest_url = self.supabase_url.rstrip("/") + "/rest/v1"
+        # Per-call timeout; shortened to the request's remaining budget when one is set
+        self.timeout = float(os.getenv("SUPABASE_TIMEOUT_SECONDS", "15"))
+
+        # Fail fast while Supabase is down or slow, serving recent results when we have them
+        self.breaker = get_breaker(
+            "supabase",
+            is_failure=_counts_against_supabase,
+            **breaker_options("SUPABASE", slow_call_seconds=5.0),
+        )
+        self.stale_max_age = float(os.getenv("SUPABASE_STALE_MAX_AGE_SECONDS", "3600"))
+        self.stale_max_entries = int(os.getenv("SUPABASE_STALE_MAX_ENTRIES", "256"))
+        self._stale: "OrderedDict[Tuple, Tuple[float, List[Dict[str, Any]], Optional[int]]]" = OrderedDict()
+        self._stale_lock = threading.Lock()
         self.default_headers = {
             "apikey": self.service_key,
             "Authorization": f"Bearer {self.service_key}",
             "Accept": "application/json",
             "Content-Type": "application/json",
-            "Prefer": "count=exact",
         }
+        self.claim_page_size = int(os.getenv("SUPABASE_CLAIM_PAGE_SIZE", "500"))
+        # Concurrent get_claim_summary calls within the window share one email=in.(...) request
+        self.summary_loader = BatchLoader(
+            self._load_summaries,
+            "claim_summary",
+            window_seconds=float(os.getenv("SUPABASE_BATCH_WINDOW_MS", "5")) / 1000,
+            max_batch=int(os.getenv("SUPABASE_BATCH_MAX_KEYS", "100")),
+        )
+
+        # SUPABASE_READ_MODE=replica serves claim reads from a local SQLite copy
+        # (src/db_retriever.py) kept in sync by a background thread
+        self.read_mode = (os.getenv("SUPABASE_READ_MODE") or "rest").strip().lower()
+        self.replica: Optional[DatabaseRetriever] = None
+        self.replica_sync_seconds = float(os.getenv("SUPABASE_REPLICA_SYNC_SECONDS", "60"))
+        if self.read_mode == "replica":
+            self.replica = DatabaseRetriever(
+                os.getenv("SUPABASE_REPLICA_PATH", "database/claims.db"),
+                summary_table=self.summary_table,
+                analysis_table=self.analysis_table,
+                full_sync_seconds=float(os.getenv("SUPABASE_REPLICA_FULL_SYNC_SECONDS", "86400")),
+            )
+
+    def _timeout(self) -> float:
+        """Timeout for the next call, bounded by the request deadline."""
+        try:
+            return deadline.call_timeout(self.timeout, "supabase")
+        except deadline.DeadlineExceeded as exc:
+            raise SupabaseServiceError(str(exc)) from exc
+
+    @staticmethod
+    def _note_timeout(exc: Exception) -> None:
+        if isinstance(exc, requests.Timeout) and deadline.is_exhausted():
+            deadline.exceeded("supabase")
+
+    def _remember(self, key: Tuple, data: List[Dict[str, Any]], count: Optional[int]) -> None:
+        with self._stale_lock:
+            self._stale[key] = (time.time(), data, count)
+            self._stale.move_to_end(key)
+            while len(self._stale) > self.stale_max_entries:
+                self._stale.popitem(last=False)
+
+    def _recall(self, key: Tuple) -> Optional[Tuple[float, List[Dict[str, Any]], Optional[int]]]:
+        with self._stale_lock:
+            entry = self._stale.get(key)
+        if entry is None or time.time() - entry[0] > self.stale_max_age:
+            return None
+        return entry
+
+    def pop_freshness_note(self) -> Optional[str]:
+        """
+        Note for the agent when results in this context came from the stale cache
+        (reset after reading, so each tool call reports only its own data).
+        """
+        age = _stale_age.get()
+        if age is None:
+            return None
+        _stale_age.set(None)
+        minutes = max(1, round(age / 60))
+        return (
+            f"Live claim data is temporarily unavailable; this data was last refreshed "
+            f"{minutes} minute{'s' if minutes != 1 else ''} ago and may be out of date."
+        )
+
+    def serving_stale(self) -> bool:
+        """True when a result in this context came from the stale cache (without resetting it)."""
+        return _stale_age.get() is not None
+
+    def _replica_reader(self) -> Optional[DatabaseRetriever]:
+        """The replica when reads can be served from it (None in rest mode or before the first sync)."""
+        if self.replica is None:
+            return None
+        self.replica.start_background_sync(self, self.replica_sync_seconds)
+        if not self.replica.ready:
+            metrics.incr("replica_reads", result="not_ready")
+            return None
+        metrics.incr("replica_reads", result="hit")
+        return self.replica
+
+    def fetch_rows(self, table: str, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """GET rows through the breaker without the stale fallback (used by the replica sync)."""
+        rows, _ = self.breaker.call(self._fetch, table, params, self.timeout)
+        return rows
+
+    def _request(
+        self, table: str, params: Dict[str, Any], count: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """
+        GET rows from a Supabase table (through the breaker, with stale fallback).
 
-    def _request(self, table: str, params: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        Args:
+            count: exact/planned/estimated to also get the total row count (None skips it)
+        """
+        if count is not None and count not in COUNT_MODES:
+            raise ValueError(f"count must be one of {', '.join(COUNT_MODES)}")
+        timeout = self._timeout()
+        key = (table, count, tuple(sorted((name, str(value)) for name, value in params.items())))
+        return self._guarded(key, self._fetch, table, params, timeout, count)
+
+    def _rpc(self, function: str, payload: Dict[str, Any]) -> Any:
+        """Call a Postgres function (through the breaker, with stale fallback)."""
+        timeout = self._timeout()
+        key = (f"rpc/{function}", tuple(sorted((name, str(value)) for name, value in payload.items())))
+        data, _ = self._guarded(key, self._post_rpc, function, payload, timeout)
+        return data
+
+    def _guarded(self, key: Tuple, func, *args: Any) -> Tuple[Any, Optional[int]]:
+        """
+        Run a fetch through the circuit breaker. When Supabase fails, fall back to
+        the last successful result for the same query.
+        """
+        try:
+            data, count = self.breaker.call(func, *args)
+        except (SupabaseServiceError, CircuitOpenError) as exc:
+            stale = None if _is_client_error(exc) else self._recall(key)
+            if stale is None:
+                if isinstance(exc, CircuitOpenError):
+                    raise SupabaseServiceError(str(exc)) from exc
+                raise
+            fetched_at, data, count = stale
+            metrics.incr("supabase_stale_served")
+            age = time.time() - fetched_at
+            _stale_age.set(max(_stale_age.get() or 0.0, age))
+            return data, count
+
+        self._remember(key, data, count)
+        return data, count
+
+    def _post_rpc(self, function: str, payload: Dict[str, Any], timeout: float) -> Tuple[Any, None]:
+        try:
+            response = requests.post(
+                f"{self.rest_url}/rpc/{function}",
+                headers=self.default_headers,
+                json=payload,
+                timeout=timeout,
+            )
+            response.raise_for_status()
+        except requests.RequestException as exc:
+            self._note_timeout(exc)
+            status = exc.response.status_code if getattr(exc, "response", None) is not None else None
+            raise SupabaseServiceError(f"Supabase RPC {function} failed: {exc}", status_code=status) from exc
+
+        try:
+            return response.json(), None
+        except ValueError as exc:
+            raise SupabaseServiceError(f"Failed to parse Supabase response: {exc}") from exc
+
+    def _fetch(
+        self, table: str, params: Dict[str, Any], timeout: float, count: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[int]]:
         """Execute a GET request against a Supabase table."""
+        headers = self.default_headers
+        if count:
+            # Counting is a second scan on Postgres; only ask for it when the caller uses it
+            headers = {**headers, "Prefer": f"count={count}"}
         try:
             response = requests.get(
                 f"{self.rest_url}/{table}",
-                headers=self.default_headers,
+                headers=headers,
                 params=params,
-                timeout=15,
+                timeout=timeout,
             )
             response.raise_for_status()
         except requests.RequestException as exc:
-            raise SupabaseServiceError(f"Supabase request failed: {exc}") from exc
+            self._note_timeout(exc)
+            status = exc.response.status_code if getattr(exc, "response", None) is not None else None
+            raise SupabaseServiceError(f"Supabase request failed: {exc}", status_code=status) from exc
 
         count: Optional[int] = None
         content_range = response.headers.get("Content-Range")
@@ -82,28 +352,93 @@ class SupabaseService:
         return data, count
 
     def get_claim_summary(self, email: str) -> Optional[Dict[str, Any]]:
-        """Return the latest claim_summary row for the user."""
+        """
+        Return the latest claim_summary row for the user.
+
+        Batched with other threads' lookups arriving within SUPABASE_BATCH_WINDOW_MS
+        (0 sends each lookup on its own).
+        """
+        replica = self._replica_reader()
+        if replica is not None:
+            return replica.claim_summary(email)
+
+        key = email.strip().lower()
+        if self.summary_loader.window_seconds <= 0:
+            loaded = self._load_summaries([key])[key]
+        else:
+            timeout = self._timeout()
+            try:
+                loaded = self.summary_loader.load(key, timeout)
+            except TimeoutError as exc:
+                raise SupabaseServiceError(str(exc)) from exc
+        return self._unwrap_summary(loaded)
+
+    def get_claim_summaries(self, emails: Sequence[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        Latest claim_summary row per email (None when the user has none), in one
+        request per SUPABASE_BATCH_MAX_KEYS emails. For admin and dashboard views.
+        """
+        keys = list(dict.fromkeys(email.strip().lower() for email in emails if email and email.strip()))
+        replica = self._replica_reader()
+        if replica is not None:
+            return {key: replica.claim_summary(key) for key in keys}
+        loaded = self.summary_loader.load_all(keys)
+        return {key: self._unwrap_summary(loaded[key]) for key in keys}
+
+    def _load_summaries(
+        self, emails: List[str]
+    ) -> Dict[str, Union[Tuple[Optional[Dict[str, Any]], Optional[float]], SupabaseServiceError]]:
+        """
+        One request for several users' summaries.
+
+        Each email's result is remembered on its own, so when the request fails
+        every email falls back to its own last result, whichever batch that came
+        from. Emails with nothing to fall back on get the error instead (raised
+        by _unwrap_summary in their caller's thread only).
+
+        Returns:
+            email -> (latest row or None, age of the stale result it came from or None),
+            or the SupabaseServiceError for an email with no stale result
+        """
         params = {
-            "select": ",".join(
-                [
-                    "id",
-                    "year",
-                    "employee_id",
-                    "email",
-                    "employee_name",
-                    "currency",
-                    "max_amount",
-                    "total_transaction_amount",
-                    "remaining_balance",
-                ]
-            ),
-            "email": f"eq.{email.strip().lower()}",
-            "order": "year.desc",
-            "limit": 1,
+            "select": ",".join(CLAIM_SUMMARY_COLUMNS),
+            "email": "in.(" + ",".join(_quoted(email) for email in emails) + ")",
+            "order": "email.asc,year.desc",
         }
+        try:
+            rows, _ = self.breaker.call(self._fetch, self.summary_table, params, self._timeout())
+        except (SupabaseServiceError, CircuitOpenError) as exc:
+            if _is_client_error(exc):
+                raise
+            error = exc if isinstance(exc, SupabaseServiceError) else SupabaseServiceError(str(exc))
+            results: Dict[str, Any] = {}
+            for email in emails:
+                stale = self._recall((self.summary_table, email))
+                if stale is None:
+                    results[email] = error
+                    continue
+                fetched_at, data, _ = stale
+                metrics.incr("supabase_stale_served")
+                results[email] = (data[0] if data else None, time.time() - fetched_at)
+            return results
 
-        rows, _ = self._request(self.summary_table, params)
-        return rows[0] if rows else None
+        latest: Dict[str, Dict[str, Any]] = {}
+        for row in rows:
+            # Rows arrive newest year first per email
+            latest.setdefault((row.get("email") or "").strip().lower(), row)
+        for email in emails:
+            row = latest.get(email)
+            self._remember((self.summary_table, email), [row] if row else [], None)
+        return {email: (latest.get(email), None) for email in emails}
+
+    @staticmethod
+    def _unwrap_summary(loaded: Any) -> Optional[Dict[str, Any]]:
+        if isinstance(loaded, SupabaseServiceError):
+            raise loaded
+        row, age = loaded or (None, None)
+        if age is not None:
+            _stale_age.set(max(_stale_age.get() or 0.0, age))
+        return row
 
     def get_claim_analysis(
         self,
@@ -113,24 +448,15 @@ class SupabaseService:
         claim_type: Optional[str] = None,
         exclude_state: Optional[str] = "Complete",
     ) -> List[Dict[str, Any]]:
-        """Return claim_analysis rows for the user."""
+        """Return claim_analysis rows for the user (one request; see iter_claim_analysis for all of them)."""
+        replica = self._replica_reader()
+        if replica is not None:
+            return replica.claim_analysis(email, limit=limit, claim_type=claim_type, exclude_state=exclude_state)
+
         params: Dict[str, Any] = {
-            "select": ",".join(
-                [
-                    "id",
-                    "record_key",
-                    "state",
-                    "claim_type",
-                    "claim_description",
-                    "description",
-                    "transaction_amount",
-                    "transaction_currency",
-                    "date_paid",
-                    "date_submitted",
-                ]
-            ),
+            "select": ",".join(CLAIM_ANALYSIS_COLUMNS),
             "email": f"eq.{email.strip().lower()}",
-            "order": "date_paid.desc.nullslast",
+            "order": _CLAIM_ORDER,
             "limit": max(limit, 1),
         }
 
@@ -142,6 +468,103 @@ class SupabaseService:
         rows, _ = self._request(self.analysis_table, params)
         return rows
 
+    def iter_claim_analysis(
+        self,
+        email: str,
+        *,
+        columns: Optional[Sequence[str]] = None,
+        claim_type: Optional[str] = None,
+        exclude_state: Optional[str] = "Complete",
+        page_size: Optional[int] = None,
+        max_rows: Optional[int] = None,
+        count: Optional[str] = None,
+    ) -> ClaimStream:
+        """
+        Stream all of the user's claim_analysis rows, newest paid first.
+
+        Pages by keyset on (date_paid, id) rather than offset, so each page is
+        an index range scan and rows stay in order across pages however many
+        the user has.
+
+        Args:
+            columns: Columns to select (default: those get_claim_analysis returns)
+            page_size: Rows per request (SUPABASE_CLAIM_PAGE_SIZE)
+            max_rows: Stop after this many rows
+            count: exact/planned/estimated to fill in ClaimStream.total
+
+        Raises:
+            SupabaseServiceError: while iterating, when a page cannot be read
+        """
+        if count is not None and count not in COUNT_MODES:
+            raise ValueError(f"count must be one of {', '.join(COUNT_MODES)}")
+        columns = list(columns or CLAIM_ANALYSIS_COLUMNS)
+        return ClaimStream(
+            lambda stream: self._claim_pages(
+                stream, email, columns, claim_type, exclude_state, page_size or self.claim_page_size, max_rows, count
+            )
+        )
+
+    def _claim_pages(
+        self,
+        stream: ClaimStream,
+        email: str,
+        columns: List[str],
+        claim_type: Optional[str],
+        exclude_state: Optional[str],
+        page_size: int,
+        max_rows: Optional[int],
+        count: Optional[str],
+    ) -> Iterator[List[Dict[str, Any]]]:
+        replica = self._replica_reader()
+        if replica is not None:
+            if count:
+                stream.total = replica.count_claims(email, claim_type=claim_type, exclude_state=exclude_state)
+            rows = replica.claim_analysis(
+                email, limit=max_rows or 1_000_000, claim_type=claim_type, exclude_state=exclude_state
+            )
+            yield [{name: row.get(name) for name in columns} for row in rows]
+            return
+
+        # The cursor columns are always fetched, then dropped if not asked for
+        select = list(dict.fromkeys(columns + ["date_paid", "id"]))
+        base: Dict[str, Any] = {
+            "select": ",".join(select),
+            "email": f"eq.{email.strip().lower()}",
+            "order": _CLAIM_ORDER,
+        }
+        if claim_type:
+            base["claim_type"] = f"eq.{claim_type}"
+        if exclude_state:
+            base["state"] = f"neq.{exclude_state}"
+
+        cursor: Optional[Dict[str, Any]] = None
+        remaining = max_rows
+        while remaining is None or remaining > 0:
+            limit = page_size if remaining is None else min(page_size, remaining)
+            params = {**base, "limit": limit}
+            if cursor is not None:
+                params.update(self._after(cursor))
+            rows, total = self._request(self.analysis_table, params, count if stream.pages_read == 0 else None)
+            if stream.pages_read == 0 and count:
+                stream.total = total
+            metrics.incr("claim_pages_read")
+            if not rows:
+                return
+            cursor = rows[-1]
+            if remaining is not None:
+                remaining -= len(rows)
+            yield [{name: row.get(name) for name in columns} for row in rows]
+            if len(rows) < limit:
+                return
+
+    @staticmethod
+    def _after(row: Dict[str, Any]) -> Dict[str, str]:
+        """Filter for the rows after `row` in date_paid desc (nulls last), id desc order."""
+        if row.get("date_paid") is None:
+            return {"date_paid": "is.null", "id": f"lt.{row['id']}"}
+        paid, row_id = _quoted(row["date_paid"]), _quoted(row["id"])
+        return {"or": f"(date_paid.lt.{paid},and(date_paid.eq.{paid},id.lt.{row_id}),date_paid.is.null)"}
+
     def insert_feedback(self, payload: Dict[str, Any]) -> Dict[str, Any]:
         """Insert a single feedback row into Supabase."""
         if not isinstance(payload, dict):
@@ -157,10 +580,11 @@ class SupabaseService:
                 f"{self.rest_url}/{self.feedback_table}",
                 headers=headers,
                 json=[payload],
-                timeout=15,
+                timeout=self._timeout(),
             )
             response.raise_for_status()
         except requests.RequestException as exc:
+            self._note_timeout(exc)
             raise SupabaseServiceError(f"Failed to insert feedback: {exc}") from exc
 
         try:
@@ -173,36 +597,243 @@ class SupabaseService:
 
         return data[0]
 
+    def get_cacheable_feedback(self, cache_version: str, limit: int = 500) -> List[Dict[str, Any]]:
+        """Answers rated "up" that were produced under the given answer-cache version."""
+        params = {
+            "select": "response_text,metadata",
+            "rating": "eq.up",
+            "metadata->>cache_version": f"eq.{cache_version}",
+            "limit": limit,
+        }
+        rows, _ = self._request(self.feedback_table, params)
+        return rows
+
+    def insert_feedback_batch(self, rows: List[Dict[str, Any]]) -> None:
+        """
+        Upsert several feedback rows in one request.
+
+        Rows conflicting on (message_id, user_email_hash) are merged, so a changed
+        vote replaces the earlier one and replaying a batch after a failure is safe.
+        """
+        if not rows:
+            return
+
+        headers = {
+            **self.default_headers,
+            "Prefer": "return=minimal,resolution=merge-duplicates",
+        }
+
+        try:
+            response = requests.post(
+                f"{self.rest_url}/{self.feedback_table}",
+                headers=headers,
+                params={"on_conflict": "message_id,user_email_hash"},
+                json=rows,
+                timeout=self._timeout(),
+            )
+        except requests.RequestException as exc:
+            raise SupabaseServiceError(f"Failed to insert feedback batch: {exc}") from exc
+
+        if response.status_code >= 400:
+            raise SupabaseServiceError(
+                f"Failed to insert feedback batch: HTTP {response.status_code} {response.text[:200]}",
+                status_code=response.status_code,
+            )
+
     def count_claims(
         self,
         email: str,
         *,
         claim_type: Optional[str] = "Employee Benefit",
         exclude_state: Optional[str] = "Complete",
+        count: str = "exact",
     ) -> int:
-        """Return the total number of claim_analysis rows for the user."""
+        """
+        Return the total number of claim_analysis rows for the user.
+
+        Args:
+            count: exact, or planned/estimated for a cheaper approximate count
+        """
+        replica = self._replica_reader()
+        if replica is not None:
+            return replica.count_claims(email, claim_type=claim_type, exclude_state=exclude_state)
+
+        # The count comes from Content-Range; one row is enough to get it
         params: Dict[str, Any] = {
             "select": "id",
             "email": f"eq.{email.strip().lower()}",
+            "limit": 1,
         }
         if claim_type:
             params["claim_type"] = f"eq.{claim_type}"
         if exclude_state:
             params["state"] = f"neq.{exclude_state}"
 
-        rows, count = self._request(self.analysis_table, params)
-        if count is not None:
-            return count
+        rows, total = self._request(self.analysis_table, params, count)
+        if total is not None:
+            return total
         return len(rows)
 
+    def claims_version(self, email: str, *, exclude_state: Optional[str] = "Complete") -> str:
+        """
+        Cheap fingerprint of the user's claim_analysis rows: the row count plus
+        the newest row's id, state and amount (one single-row request).
+        With the replica, its sync position (any synced change bumps it).
+        """
+        replica = self._replica_reader()
+        if replica is not None:
+            return "replica:" + replica.version()
+
+        params: Dict[str, Any] = {
+            "select": "id,state,transaction_amount",
+            "email": f"eq.{email.strip().lower()}",
+            "order": _CLAIM_ORDER,
+            "limit": 1,
+        }
+        if exclude_state:
+            params["state"] = f"neq.{exclude_state}"
+
+        rows, count = self._request(self.analysis_table, params, "exact")
+        newest = rows[0] if rows else {}
+        return ":".join(
+            str(value)
+            for value in (count, newest.get("id"), newest.get("state"), newest.get("transaction_amount"))
+        )
+
+    def get_user_context(self, email: str, *, recent_limit: int = USER_CONTEXT_RECENT_LIMIT) -> Dict[str, Any]:
+        """
+        Profile, recent Employee Benefit claims, their total count and per-type
+        totals in one round trip (supabase_schema/get_user_context.sql).
+
+        The default-sized context is kept per user for SUPABASE_CONTEXT_TTL_SECONDS,
+        and concurrent calls for the same user share one fetch.
+        """
+        if recent_limit != USER_CONTEXT_RECENT_LIMIT or self.context_ttl <= 0:
+            return self._load_user_context(email, recent_limit)
+
+        key = email.strip().lower()
+        with self._context_lock:
+            cached = self._cached_context(key)
+            if cached is not None:
+                metrics.incr("user_context_cache", result="hit")
+                return cached
+            event = self._context_inflight.get(key)
+            leader = event is None
+            if leader:
+                event = self._context_inflight[key] = threading.Event()
+
+        if not leader:
+            event.wait(self._timeout())
+            with self._context_lock:
+                cached = self._cached_context(key)
+            if cached is not None:
+                metrics.incr("user_context_cache", result="coalesced")
+                return cached
+            # The leader failed or is too slow; fetch independently
+            metrics.incr("user_context_cache", result="miss")
+            return self._load_user_context(key, recent_limit)
+
+        metrics.incr("user_context_cache", result="miss")
+        try:
+            context = self._load_user_context(key, recent_limit)
+            # Stale fallback data is not cached as fresh
+            if _stale_age.get() is None:
+                with self._context_lock:
+                    self._contexts[key] = (time.monotonic() + self.context_ttl, context)
+                    self._contexts.move_to_end(key)
+                    while len(self._contexts) > self.context_max_entries:
+                        self._contexts.popitem(last=False)
+            return context
+        finally:
+            with self._context_lock:
+                self._context_inflight.pop(key, None)
+            event.set()
+
+    def _cached_context(self, key: str) -> Optional[Dict[str, Any]]:
+        """Caller holds _context_lock."""
+        entry = self._contexts.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._contexts[key]
+            return None
+        return entry[1]
+
+    def get_profile(self, email: str) -> Optional[Dict[str, Any]]:
+        """
+        The user's latest claim_summary row, for the balance and limit tools.
+
+        Taken from the user context when that costs at most one call (already
+        cached, or the RPC is deployed); otherwise a single claim_summary read
+        instead of the fallback context's three table reads.
+        """
+        if self._context_rpc_available:
+            return self.get_user_context(email)["profile"]
+        with self._context_lock:
+            cached = self._cached_context(email.strip().lower())
+        if cached is not None:
+            return cached["profile"]
+        return self.get_claim_summary(email)
+
+    def prefetch_user_context(self, email: str) -> bool:
+        """
+        Load the user's context into the per-user cache ahead of their first question.
+        Returns False when the fetch failed (the first tool call will simply retry).
+        """
+        try:
+            self.get_user_context(email)
+        except SupabaseServiceError as exc:
+            print(f"[SUPABASE] ⚠️  Context prefetch failed: {exc}")
+            return False
+        return True
+
+    def invalidate_user_context(self, email: str) -> None:
+        with self._context_lock:
+            self._contexts.pop(email.strip().lower(), None)
+
+    def _load_user_context(self, email: str, recent_limit: int) -> Dict[str, Any]:
+        """Fetch the context, using table reads while the RPC is not deployed."""
+        replica = self._replica_reader()
+        if replica is not None:
+            return {
+                "profile": replica.claim_summary(email),
+                "recent_claims": replica.claim_analysis(email, limit=recent_limit, claim_type="Employee Benefit"),
+                "claim_count": replica.count_claims(email),
+                "totals_by_type": replica.totals_by_type(email),
+            }
+
+        if self._context_rpc_available:
+            try:
+                context = self._rpc(
+                    self.context_rpc,
+                    {"p_email": email.strip().lower(), "p_recent_limit": recent_limit},
+                )
+            except SupabaseServiceError as exc:
+                if exc.status_code != 404:
+                    raise
+                print(f"[SUPABASE] ⚠️  RPC {self.context_rpc} not found; using table reads")
+                self._context_rpc_available = False
+            else:
+                return {
+                    "profile": context.get("profile"),
+                    "recent_claims": context.get("recent_claims") or [],
+                    "claim_count": context.get("claim_count") or 0,
+                    "totals_by_type": context.get("totals_by_type") or [],
+                }
+
+        return {
+            "profile": self.get_claim_summary(email),
+            "recent_claims": self.get_claim_analysis(email, limit=recent_limit, claim_type="Employee Benefit"),
+            "claim_count": self.count_claims(email),
+            "totals_by_type": None,
+        }
+
     def build_user_summary(self, email: str) -> Dict[str, Any]:
         """Return a consolidated summary object for quick AI consumption."""
-        summary = self.get_claim_summary(email)
-        claims = self.get_claim_analysis(email, limit=25, claim_type="Employee Benefit")
-        claim_count = len(claims)
-
+        context = self.get_user_context(email)
         return {
-            "profile": summary,
-            "recent_claims": claims,
-            "claim_count": claim_count,
+            "profile": context["profile"],
+            "recent_claims": context["recent_claims"],
+            "claim_count": context["claim_count"],
+            "totals_by_type": context["totals_by_type"],
         }
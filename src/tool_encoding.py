@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Token-efficient encodings for user-data tool results.
+
+Tool output is fed back to the LLM, so every repeated key and long description
+costs prompt tokens on the next step. Claim rows are returned as a table (one
+header, positional rows) with truncated descriptions and no UUIDs, alongside
+precomputed totals by claim type, month and state, so the model does not have
+to add up rows itself.
+"""
+import os
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Set TOOL_OUTPUT_FORMAT=json to return the raw rows again
+COMPACT_OUTPUT = (os.getenv("TOOL_OUTPUT_FORMAT") or "compact").strip().lower() != "json"
+DESCRIPTION_LIMIT = int(os.getenv("TOOL_DESCRIPTION_CHARS", "60"))
+# Claim rows listed per tool result; totals always cover every claim
+CLAIM_ROWS_LIMIT = int(os.getenv("TOOL_CLAIM_ROWS", "100"))
+
+CLAIM_COLUMNS = ("record_key", "date_submitted", "date_paid", "claim_type", "state", "amount", "currency", "description")
+
+_DATE_FORMATS = ("%Y-%m-%d", "%Y %b %d", "%d %b %Y", "%d/%m/%Y", "%Y/%m/%d")
+
+
+def truncate(text: Optional[str], limit: int = DESCRIPTION_LIMIT) -> Optional[str]:
+    """Collapse whitespace and cut to `limit` characters (with an ellipsis)."""
+    if not text:
+        return text
+    text = " ".join(str(text).split())
+    return text if len(text) <= limit else text[: limit - 1].rstrip() + "…"
+
+
+def to_amount(value: Any) -> float:
+    try:
+        return round(float(value), 2)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def parse_date(value: Any) -> Optional[datetime]:
+    """Dates arrive as ISO strings or Sage exports like '2025 Jan 06'."""
+    if isinstance(value, datetime):
+        return value
+    if not value:
+        return None
+    text = str(value).strip()
+    try:
+        return datetime.fromisoformat(text.replace("Z", "+00:00"))
+    except ValueError:
+        pass
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.strptime(text[:11], fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def encode_table(rows: Iterable[Sequence[Any]], columns: Sequence[str]) -> Dict[str, Any]:
+    return {"columns": list(columns), "rows": [list(row) for row in rows]}
+
+
+def _claim_row(claim: Dict[str, Any]) -> Tuple[Any, ...]:
+    description = claim.get("description") or claim.get("claim_description")
+    return (
+        claim.get("record_key"),
+        claim.get("date_submitted"),
+        claim.get("date_paid"),
+        claim.get("claim_type"),
+        claim.get("state"),
+        to_amount(claim.get("transaction_amount")),
+        claim.get("transaction_currency"),
+        truncate(description),
+    )
+
+
+def claims_table(claims: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """claim_analysis rows as {"columns": [...], "rows": [[...], ...]}."""
+    return encode_table((_claim_row(claim) for claim in claims), CLAIM_COLUMNS)
+
+
+def claim_month(claim: Dict[str, Any]) -> Optional[str]:
+    """YYYY-MM the claim was submitted (paid date when submission date is missing)."""
+    parsed = parse_date(claim.get("date_submitted")) or parse_date(claim.get("date_paid"))
+    return parsed.strftime("%Y-%m") if parsed else None
+
+
+def _grouped(claims: List[Dict[str, Any]], key_fn) -> List[Tuple[Any, ...]]:
+    """(key..., currency, count, total) rows, sorted by key."""
+    groups: Dict[Tuple, List[float]] = defaultdict(lambda: [0, 0.0])
+    for claim in claims:
+        key = key_fn(claim) + (claim.get("transaction_currency"),)
+        groups[key][0] += 1
+        groups[key][1] += to_amount(claim.get("transaction_amount"))
+    ordered = sorted(groups.items(), key=lambda item: str(item[0]))
+    return [key + (count, round(total, 2)) for key, (count, total) in ordered]
+
+
+def claim_aggregates(claims: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Totals by claim type, month and state (each also split by currency)."""
+    return {
+        "by_type": encode_table(
+            _grouped(claims, lambda claim: (claim.get("claim_type"),)),
+            ("claim_type", "currency", "count", "total"),
+        ),
+        "by_month": encode_table(
+            _grouped(claims, lambda claim: (claim_month(claim),)),
+            ("month", "currency", "count", "total"),
+        ),
+        "by_state": encode_table(
+            _grouped(claims, lambda claim: (claim.get("state"),)),
+            ("state", "currency", "count", "total"),
+        ),
+    }
+
+
+def encode_claims(
+    claims: List[Dict[str, Any]], aggregates: bool = True, max_rows: Optional[int] = CLAIM_ROWS_LIMIT
+) -> Dict[str, Any]:
+    """
+    Tool payload for a list of claims (raw rows when TOOL_OUTPUT_FORMAT=json).
+
+    Only the first `max_rows` claims are listed; total_claims and the totals
+    count all of them.
+    """
+    shown = claims if max_rows is None else claims[:max_rows]
+    if not COMPACT_OUTPUT:
+        payload: Dict[str, Any] = {"total_claims": len(claims), "claims": shown}
+    else:
+        payload = {
+            "total_claims": len(claims),
+            "claims": claims_table(shown),
+        }
+        if aggregates and claims:
+            payload["totals"] = claim_aggregates(claims)
+    if len(shown) < len(claims):
+        payload["note"] = f"Listing the {len(shown)} most recently paid of {len(claims)} claims; totals include all of them."
+    return payload
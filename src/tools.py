@@ -3,19 +3,40 @@
 LangChain tools for AI agent.
 All tools are email-scoped for security.
 """
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from langchain.tools import tool
-import json
+import os
 import sys
 from pathlib import Path
 
 # Use absolute imports for better compatibility
 try:
+    import deadline
+    from circuit_breaker import breaker_options, get_breaker
+    from claims_analytics import ClaimsAnalytics
+    from serialization import dumps_compact
+    from tool_encoding import COMPACT_OUTPUT, claims_table, encode_claims
     from supabase_service import SupabaseService, SupabaseServiceError
 except ImportError:
+    from src import deadline
+    from src.circuit_breaker import breaker_options, get_breaker
+    from src.claims_analytics import ClaimsAnalytics
+    from src.serialization import dumps_compact
+    from src.tool_encoding import COMPACT_OUTPUT, claims_table, encode_claims
     from src.supabase_service import SupabaseService, SupabaseServiceError
 
 supabase_service = SupabaseService()
+claims_analytics = ClaimsAnalytics(supabase_service)
+# Claims read for get_user_claims totals (streamed in SUPABASE_CLAIM_PAGE_SIZE pages)
+USER_CLAIMS_MAX_ROWS = int(os.getenv("USER_CLAIMS_MAX_ROWS", "2000"))
+
+
+def _respond(payload: Dict[str, Any]) -> str:
+    """Serialise a tool result, noting when it was served from stale cached data."""
+    note = supabase_service.pop_freshness_note()
+    if note:
+        payload = {**payload, "data_freshness": note}
+    return dumps_compact(payload)
 
 
 @tool
@@ -27,20 +48,15 @@ def get_user_claims(user_email: str) -> str:
         user_email: The authenticated user's email address
         
     Returns:
-        JSON string containing user's claim records
+        JSON string with the user's claims as a table ("columns" + "rows",
+        descriptions shortened) and "totals" by claim type, month and state
     """
     try:
-        docs = supabase_service.get_claim_analysis(user_email, limit=100)
+        docs = list(supabase_service.iter_claim_analysis(user_email, max_rows=USER_CLAIMS_MAX_ROWS))
     except SupabaseServiceError as exc:
-        return json.dumps({"error": str(exc)})
+        return _respond({"error": str(exc)})
 
-    return json.dumps(
-        {
-            "total_claims": len(docs),
-            "claims": docs,
-        },
-        default=str,
-    )
+    return _respond(encode_claims(docs))
 
 
 @tool
@@ -55,14 +71,14 @@ def calculate_balance(user_email: str) -> str:
         JSON string with balance information
     """
     try:
-        summary = supabase_service.get_claim_summary(user_email)
+        summary = supabase_service.get_profile(user_email)
     except SupabaseServiceError as exc:
-        return json.dumps({"error": str(exc)})
+        return _respond({"error": str(exc)})
 
     if not summary:
-        return json.dumps({"message": "No claim summary found for user."})
+        return _respond({"message": "No claim summary found for user."})
 
-    return json.dumps(
+    return _respond(
         {
             "year": summary.get("year"),
             "currency": summary.get("currency"),
@@ -70,8 +86,7 @@ def calculate_balance(user_email: str) -> str:
             "total_transaction_amount": summary.get("total_transaction_amount"),
             "max_amount": summary.get("max_amount"),
             "employee_name": summary.get("employee_name"),
-        },
-        default=str,
+        }
     )
 
 
@@ -87,20 +102,19 @@ def calculate_total_spent(user_email: str) -> str:
         JSON string with spending information
     """
     try:
-        summary = supabase_service.get_claim_summary(user_email)
+        summary = supabase_service.get_profile(user_email)
     except SupabaseServiceError as exc:
-        return json.dumps({"error": str(exc)})
+        return _respond({"error": str(exc)})
 
     if not summary:
-        return json.dumps({"message": "No claim summary found for user."})
+        return _respond({"message": "No claim summary found for user."})
 
-    return json.dumps(
+    return _respond(
         {
             "currency": summary.get("currency"),
             "total_transaction_amount": summary.get("total_transaction_amount"),
             "max_amount": summary.get("max_amount"),
-        },
-        default=str,
+        }
     )
 
 
@@ -116,11 +130,11 @@ def get_claim_count(user_email: str) -> str:
         JSON string with claim count
     """
     try:
-        count = supabase_service.count_claims(user_email)
+        count = supabase_service.get_user_context(user_email)["claim_count"]
     except SupabaseServiceError as exc:
-        return json.dumps({"error": str(exc)})
+        return _respond({"error": str(exc)})
 
-    return json.dumps({"claim_count": count})
+    return _respond({"claim_count": count})
 
 
 @tool
@@ -137,9 +151,11 @@ def get_user_summary(user_email: str) -> str:
     try:
         summary = supabase_service.build_user_summary(user_email)
     except SupabaseServiceError as exc:
-        return json.dumps({"error": str(exc)})
+        return _respond({"error": str(exc)})
 
-    return json.dumps(summary, default=str)
+    if COMPACT_OUTPUT:
+        summary = {**summary, "recent_claims": claims_table(summary["recent_claims"])}
+    return _respond(summary)
 
 
 @tool  
@@ -154,14 +170,48 @@ def get_max_amount(user_email: str) -> str:
         JSON string with max amount information
     """
     try:
-        summary = supabase_service.get_claim_summary(user_email)
+        summary = supabase_service.get_profile(user_email)
     except SupabaseServiceError as exc:
-        return json.dumps({"error": str(exc)})
+        return _respond({"error": str(exc)})
 
     if not summary:
-        return json.dumps({"message": "No claim summary found for user."})
+        return _respond({"message": "No claim summary found for user."})
+
+    return _respond({"max_amount": summary.get("max_amount"), "currency": summary.get("currency")})
+
+
+@tool
+def get_claims_analytics(
+    user_email: str,
+    group_by: str = "claim_type",
+    year: Optional[int] = None,
+    claim_type: Optional[str] = None,
+    keyword: Optional[str] = None,
+) -> str:
+    """
+    Totals, counts, averages and largest claim for the authenticated user, grouped
+    by claim type, month, year or state (amounts are always split by currency).
+    Use this for "how much did I spend on optical this year" or "which month did
+    I claim the most" instead of adding up get_user_claims rows.
+
+    Args:
+        user_email: The authenticated user's email address
+        group_by: Comma-separated fields to group by: claim_type, month, year, state
+        year: Only claims submitted in this year (e.g. 2025)
+        claim_type: Only this claim type (e.g. "Employee Benefit")
+        keyword: Only claims whose description mentions this word (e.g. "optical")
+
+    Returns:
+        JSON string with "groups" and "overall" tables and the group with the highest total
+    """
+    try:
+        payload = claims_analytics.summarize(
+            user_email, group_by, year=year, claim_type=claim_type, keyword=keyword
+        )
+    except (ValueError, SupabaseServiceError) as exc:
+        return _respond({"error": str(exc)})
 
-    return json.dumps({"max_amount": summary.get("max_amount"), "currency": summary.get("currency")})
+    return _respond(payload)
 
 
 # Import knowledge base tools
@@ -169,18 +219,36 @@ kb_path = Path(__file__).parent.parent / "knowledge_base"
 sys.path.insert(0, str(kb_path))
 
 try:
-    from knowledge_tools import KNOWLEDGE_BASE_TOOLS
+    import knowledge_tools
+    from knowledge_tools import KNOWLEDGE_BASE_TOOLS, knowledge_base_version
+    # Cap knowledge base RPCs to the request's remaining deadline
+    if hasattr(knowledge_tools.kb_store, "timeout_resolver"):
+        knowledge_tools.kb_store.timeout_resolver = (
+            lambda default: deadline.call_timeout(default, "knowledge_base")
+        )
+    # Fail fast while the pgvector RPC is down (the local fallback, if any, takes over)
+    if hasattr(knowledge_tools.kb_store, "breaker"):
+        knowledge_tools.kb_store.breaker = get_breaker(
+            "knowledge_base", **breaker_options("SUPABASE_KB", slow_call_seconds=10.0)
+        )
     print("[TOOLS] ✅ Knowledge base tools loaded")
 except Exception as e:
     print(f"[TOOLS] ⚠️  Knowledge base tools not available: {e}")
     KNOWLEDGE_BASE_TOOLS = []
 
-# Export all tools as a list
-ALL_TOOLS = [
+    def knowledge_base_version() -> str:
+        return "disabled"
+
+# Tools that read the authenticated user's own records
+USER_DATA_TOOLS = [
     get_user_claims,
     calculate_balance,
     calculate_total_spent,
     get_claim_count,
     get_user_summary,
     get_max_amount,
-] + KNOWLEDGE_BASE_TOOLS
+    get_claims_analytics,
+]
+
+# Export all tools as a list
+ALL_TOOLS = USER_DATA_TOOLS + KNOWLEDGE_BASE_TOOLS
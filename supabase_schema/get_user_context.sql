@@ -0,0 +1,87 @@
+-- Everything the user-data tools need about one employee, in a single round trip.
+-- Replaces the separate claim_summary / claim_analysis / count(*) REST reads.
+-- Run in the Supabase SQL editor or via migration tooling.
+
+-- Supports the per-user filters and the date_paid ordering below
+create index if not exists claim_analysis_email_date_paid_idx
+    on public.claim_analysis (lower(email), date_paid desc nulls last);
+create index if not exists claim_summary_email_year_idx
+    on public.claim_summary (lower(email), year desc);
+
+create or replace function public.get_user_context(
+    p_email text,
+    p_recent_limit int default 25,
+    p_claim_type text default 'Employee Benefit',
+    p_exclude_state text default 'Complete'
+)
+returns jsonb
+language sql
+stable
+as
+$$
+    with user_claims as (
+        select
+            ca.id,
+            ca.record_key,
+            ca.state,
+            ca.claim_type,
+            ca.claim_description,
+            ca.description,
+            ca.transaction_amount,
+            ca.transaction_currency,
+            ca.date_paid,
+            ca.date_submitted
+        from claim_analysis ca
+        where lower(ca.email) = lower(p_email)
+          -- <> like PostgREST's neq and the replica: claims with a NULL state are excluded too
+          and (p_exclude_state is null or ca.state <> p_exclude_state)
+    ),
+    matching as (
+        select * from user_claims uc
+        where p_claim_type is null or uc.claim_type = p_claim_type
+    )
+    select jsonb_build_object(
+        'profile', (
+            select to_jsonb(p) from (
+                select
+                    cs.id,
+                    cs.year,
+                    cs.employee_id,
+                    cs.email,
+                    cs.employee_name,
+                    cs.currency,
+                    cs.max_amount,
+                    cs.total_transaction_amount,
+                    cs.remaining_balance
+                from claim_summary cs
+                where lower(cs.email) = lower(p_email)
+                order by cs.year desc
+                limit 1
+            ) p
+        ),
+        'recent_claims', coalesce((
+            select jsonb_agg(to_jsonb(r) order by r.date_paid desc nulls last) from (
+                select * from matching
+                order by date_paid desc nulls last
+                limit greatest(p_recent_limit, 0)
+            ) r
+        ), '[]'::jsonb),
+        'claim_count', (select count(*) from matching),
+        'totals_by_type', coalesce((
+            select jsonb_agg(t order by t->>'claim_type', t->>'currency') from (
+                select jsonb_build_object(
+                    'claim_type', uc.claim_type,
+                    'currency', uc.transaction_currency,
+                    'claim_count', count(*),
+                    'total_amount', coalesce(sum(uc.transaction_amount), 0)
+                ) t
+                from user_claims uc
+                group by uc.claim_type, uc.transaction_currency
+            ) totals
+        ), '[]'::jsonb)
+    );
+$$;
+
+-- Returns personal claim data: backend (service role) only
+revoke execute on function public.get_user_context(text, int, text, text) from public, anon, authenticated;
+grant execute on function public.get_user_context(text, int, text, text) to service_role;
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Scope-boundary cases shared by test_boundaries.py (live agent) and
+test_prompt_modules.py (prompt module selection with a fake LLM).
+"""
+
+# (query, should_reject)
+BOUNDARY_CASES = [
+    # Off-topic queries that SHOULD be rejected
+    ("Tell me a joke", True),
+    ("Who is Donald Trump?", True),
+    ("Entertain me", True),
+    ("What's the weather today?", True),
+    ("Help me with my Python code", True),
+    ("What's 2+2?", True),
+
+    # On-topic queries that SHOULD be answered
+    ("What's my claim balance?", False),
+    ("How do I submit a dental claim?", False),
+    ("Is cancer treatment covered?", False),
+    ("What's the AIA hotline?", False),
+    ("Can I claim for glasses?", False),
+]
+
+# Keywords that indicate a rejection (more flexible than exact phrase)
+REJECTION_KEYWORDS = [
+    "claims and benefits",
+    "specifically",
+    "focus on",
+    "help with",
+    "outside",
+    "not my",
+    "can't help with"
+]
+
+
+def is_rejection(answer: str) -> bool:
+    """Polite rejection keywords plus an offer to help with claims/benefits."""
+    answer = answer.lower()
+    has_rejection_keywords = any(keyword in answer for keyword in REJECTION_KEYWORDS)
+    mentions_claims_benefits = "claim" in answer or "benefit" in answer
+    return has_rejection_keywords and mentions_claims_benefits
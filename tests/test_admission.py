@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Tests for the agent admission controller: rejections with Retry-After,
+round-robin dispatch across users, and slot accounting on cancellation.
+
+Agent runs are stand-ins that block on a threading.Event, so each test
+decides exactly when a worker thread finishes.
+"""
+import asyncio
+import sys
+import threading
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pytest
+
+from src.admission import AdmissionController, AdmissionRejected
+
+
+class Blocker:
+    """A blocking agent run that records the order calls start in."""
+
+    def __init__(self):
+        self.gate = threading.Event()
+        self.started = []
+
+    def __call__(self, name):
+        self.started.append(name)
+        self.gate.wait(5)
+        return name
+
+
+async def settle(condition, timeout=5.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not condition():
+        assert loop.time() < deadline, "condition not reached"
+        await asyncio.sleep(0.01)
+
+
+def test_full_queue_is_rejected_with_retry_after():
+    async def scenario():
+        controller = AdmissionController(max_concurrent=1, max_queue=1, per_user_limit=5)
+        controller._avg_run_seconds = 3.0
+        run = Blocker()
+        running = asyncio.create_task(controller.run("a", run, "a1"))
+        queued = asyncio.create_task(controller.run("b", run, "b1"))
+        await settle(lambda: controller.stats()["queued"] == 1)
+
+        with pytest.raises(AdmissionRejected) as rejected:
+            await controller.run("c", run, "c1")
+        assert rejected.value.reason == "server busy"
+        # One running plus one queued, 3s each, on a single slot
+        assert rejected.value.retry_after == 6
+
+        run.gate.set()
+        assert await asyncio.gather(running, queued) == ["a1", "b1"]
+        assert controller.stats()["running"] == 0 and controller.stats()["queued"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_user_with_too_many_requests_in_flight_is_rejected():
+    async def scenario():
+        controller = AdmissionController(max_concurrent=4, max_queue=4, per_user_limit=1)
+        run = Blocker()
+        first = asyncio.create_task(controller.run("a", run, "a1"))
+        await settle(lambda: run.started)
+
+        with pytest.raises(AdmissionRejected) as rejected:
+            await controller.run("a", run, "a2")
+        assert "too many requests" in rejected.value.reason
+        assert rejected.value.retry_after >= 1
+
+        # Other users are unaffected
+        other = asyncio.create_task(controller.run("b", run, "b1"))
+        run.gate.set()
+        assert await asyncio.gather(first, other) == ["a1", "b1"]
+        # The user's slot is back once the run finished
+        assert await controller.run("a", run, "a3") == "a3"
+
+    asyncio.run(scenario())
+
+
+def test_waiting_users_are_served_round_robin():
+    async def scenario():
+        controller = AdmissionController(max_concurrent=1, max_queue=8, per_user_limit=4)
+        run = Blocker()
+        tasks = [asyncio.create_task(controller.run("z", run, "z1"))]
+        await settle(lambda: run.started)
+        for user, name in [("a", "a1"), ("a", "a2"), ("a", "a3"), ("b", "b1"), ("c", "c1")]:
+            tasks.append(asyncio.create_task(controller.run(user, run, name)))
+            await asyncio.sleep(0)
+        await settle(lambda: controller.stats()["queued"] == 5)
+
+        run.gate.set()
+        await asyncio.gather(*tasks)
+        assert run.started == ["z1", "a1", "b1", "c1", "a2", "a3"]
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_queued_request_gives_back_its_place():
+    async def scenario():
+        controller = AdmissionController(max_concurrent=1, max_queue=1, per_user_limit=1)
+        run = Blocker()
+        running = asyncio.create_task(controller.run("a", run, "a1"))
+        queued = asyncio.create_task(controller.run("b", run, "b1"))
+        await settle(lambda: controller.stats()["queued"] == 1)
+
+        queued.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await queued
+        assert controller.stats()["queued"] == 0
+        # Both the queue place and b's per-user slot are free again
+        retry = asyncio.create_task(controller.run("b", run, "b2"))
+        await settle(lambda: controller.stats()["queued"] == 1)
+
+        run.gate.set()
+        assert await asyncio.gather(running, retry) == ["a1", "b2"]
+        assert run.started == ["a1", "b2"]
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_run_keeps_its_slot_until_the_thread_finishes():
+    async def scenario():
+        controller = AdmissionController(max_concurrent=1, max_queue=1, per_user_limit=1)
+        run = Blocker()
+        running = asyncio.create_task(controller.run("a", run, "a1"))
+        await settle(lambda: run.started)
+        queued = asyncio.create_task(controller.run("b", run, "b1"))
+        await settle(lambda: controller.stats()["queued"] == 1)
+
+        running.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await running
+        await asyncio.sleep(0.05)
+        # The worker thread is still busy: nothing else may start on its slot
+        assert controller.stats()["running"] == 1
+        assert run.started == ["a1"]
+        with pytest.raises(AdmissionRejected):
+            await controller.run("a", run, "a2")
+
+        run.gate.set()
+        assert await queued == "b1"
+        assert controller.stats()["running"] == 0
+
+    asyncio.run(scenario())
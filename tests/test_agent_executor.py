@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Tests for the agent runtime (deadlines, parallel tool calls, token usage
+telemetry) without a model.
+
+ScriptedAgent is a multi-action agent that replays planned steps: a list
+of tool calls (one step with several calls), then a final answer. Tools
+track how many of them are running at once.
+"""
+import sys
+import threading
+import time
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pytest
+
+pytest.importorskip("langchain_openai")
+
+from langchain.agents import BaseMultiActionAgent
+from langchain_core.agents import AgentAction, AgentFinish
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, LLMResult
+from langchain_core.tools import Tool
+
+from src import deadline
+from src.agent_executor import (
+    DEFAULT_LLM_TIMEOUT_SECONDS,
+    DeadlineAgentExecutor,
+    DeadlineChatOpenAI,
+    UsageTelemetryHandler,
+)
+from src.metrics import metrics
+
+
+class ScriptedAgent(BaseMultiActionAgent):
+    """Returns each planned step in turn, then finishes with every observation."""
+
+    steps: list = []
+    calls: int = 0
+
+    @property
+    def input_keys(self):
+        return ["input"]
+
+    def plan(self, intermediate_steps, callbacks=None, **kwargs):
+        self.calls += 1
+        if self.steps:
+            return self.steps.pop(0)
+        return AgentFinish({"output": ",".join(str(observation) for _, observation in intermediate_steps)}, "done")
+
+    async def aplan(self, intermediate_steps, callbacks=None, **kwargs):
+        return self.plan(intermediate_steps, callbacks, **kwargs)
+
+
+class Tracker:
+    """Tool body that sleeps and records the peak number of concurrent calls."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.active = 0
+        self.peak = 0
+
+    def tool(self, name, seconds):
+        def run(query):
+            with self.lock:
+                self.active += 1
+                self.peak = max(self.peak, self.active)
+            try:
+                time.sleep(seconds)
+                return f"{name}:{query}"
+            finally:
+                with self.lock:
+                    self.active -= 1
+
+        return Tool(name=name, func=run, description=f"{name} tool")
+
+
+def calls(*names):
+    return [AgentAction(tool=name, tool_input=f"q{i}", log="") for i, name in enumerate(names)]
+
+
+def make_executor(steps, tools, **options):
+    agent = ScriptedAgent(steps=steps)
+    return DeadlineAgentExecutor(agent=agent, tools=tools, return_intermediate_steps=True, **options)
+
+
+def test_tool_calls_of_one_step_run_concurrently_in_order():
+    tracker = Tracker()
+    # The first call is the slowest, so completion order differs from call order
+    tools = [tracker.tool("slow", 0.3), tracker.tool("medium", 0.2), tracker.tool("fast", 0.1)]
+    executor = make_executor([calls("slow", "medium", "fast")], tools)
+
+    started = time.perf_counter()
+    result = executor.invoke({"input": "hi"})
+    elapsed = time.perf_counter() - started
+
+    assert tracker.peak == 3
+    assert elapsed < 0.55
+    assert [action.tool for action, _ in result["intermediate_steps"]] == ["slow", "medium", "fast"]
+    assert result["output"] == "slow:q0,medium:q1,fast:q2"
+
+
+def test_sequential_when_parallel_tool_calls_is_off():
+    tracker = Tracker()
+    tools = [tracker.tool("slow", 0.1), tracker.tool("fast", 0.05)]
+    executor = make_executor([calls("slow", "fast", "slow")], tools, parallel_tool_calls=False)
+
+    result = executor.invoke({"input": "hi"})
+    assert tracker.peak == 1
+    assert result["output"] == "slow:q0,fast:q1,slow:q2"
+
+
+def test_steps_run_one_after_another():
+    tracker = Tracker()
+    tools = [tracker.tool("a", 0.05), tracker.tool("b", 0.05)]
+    executor = make_executor([calls("a", "b"), calls("b")], tools)
+
+    result = executor.invoke({"input": "hi"})
+    # Calls within a step overlap; the next step waits for all of them
+    assert tracker.peak == 2
+    assert result["output"] == "a:q0,b:q1,b:q0"
+    assert executor.agent.calls == 3
+
+
+def test_completion_timeout_follows_the_deadline():
+    llm = DeadlineChatOpenAI(api_key="test-key", model="gpt-4o-mini", request_timeout=30)
+    messages = [HumanMessage("hi")]
+    assert "timeout" not in llm._get_request_payload(messages)
+
+    with deadline.deadline_scope(10.0):
+        assert 9.0 < llm._get_request_payload(messages)["timeout"] <= 10.0
+    with deadline.deadline_scope(100.0):
+        assert llm._get_request_payload(messages)["timeout"] == 30
+        llm.request_timeout = None
+        assert llm._get_request_payload(messages)["timeout"] == DEFAULT_LLM_TIMEOUT_SECONDS
+    with deadline.deadline_scope(deadline.MIN_CALL_SECONDS / 2):
+        with pytest.raises(deadline.DeadlineExceeded):
+            llm._get_request_payload(messages)
+
+
+def test_answer_reserve_stops_the_loop_after_the_first_step():
+    tracker = Tracker()
+    answered = []
+
+    def best_effort(inputs, steps):
+        answered.append([observation for _, observation in steps])
+        return "best effort"
+
+    executor = make_executor(
+        [calls("a"), calls("a")], [tracker.tool("a", 0)], answer_reserve_seconds=8.0, best_effort_answer=best_effort
+    )
+    with deadline.deadline_scope(5.0):
+        result = executor.invoke({"input": "hi"})
+
+    # The first step always runs; 5s left is under the 8s answer reserve, so no second step
+    assert executor.agent.calls == 1
+    assert answered == [["a:q0"]]
+    assert result["output"] == "best effort"
+
+    executor = make_executor([calls("a"), calls("a")], [tracker.tool("a", 0)], answer_reserve_seconds=8.0)
+    with deadline.deadline_scope(20.0):
+        assert executor.invoke({"input": "hi"})["output"] == "a:q0,a:q0"
+
+
+def test_no_step_starts_without_budget_for_a_call():
+    executor = make_executor([calls("a")], [Tracker().tool("a", 0)])
+    with deadline.deadline_scope(deadline.MIN_CALL_SECONDS / 2):
+        result = executor.invoke({"input": "hi"})
+    assert executor.agent.calls == 0
+    assert result["output"].startswith("Agent stopped due to")
+
+
+def counters():
+    return dict(metrics.snapshot()["counters"])
+
+
+def increase(before, after, key):
+    return after.get(key, 0) - before.get(key, 0)
+
+
+def test_usage_from_the_openai_token_usage_block():
+    handler = UsageTelemetryHandler(tier="test-tier", price=(1.0, 0.5, 4.0))
+    result = LLMResult(
+        generations=[[ChatGeneration(message=AIMessage(content="answer"))]],
+        llm_output={
+            "token_usage": {
+                "prompt_tokens": 1000,
+                "completion_tokens": 50,
+                "total_tokens": 1050,
+                "prompt_tokens_details": {"cached_tokens": 800},
+            }
+        },
+    )
+    before = counters()
+    handler.on_llm_end(result)
+    after = counters()
+
+    assert increase(before, after, "llm_calls") == 1
+    assert increase(before, after, "llm_prompt_tokens") == 1000
+    assert increase(before, after, "llm_cached_prompt_tokens") == 800
+    assert increase(before, after, "llm_completion_tokens") == 50
+    assert increase(before, after, "llm_tier_prompt_tokens{tier=test-tier}") == 1000
+    assert increase(before, after, "llm_tier_completion_tokens{tier=test-tier}") == 50
+    # 200 uncached and 800 cached prompt tokens plus 50 completion tokens, USD per 1M
+    assert increase(before, after, "llm_cost_usd{tier=test-tier}") == pytest.approx((200 + 400 + 200) / 1e6)
+    assert metrics.snapshot()["gauges"]["llm_prompt_cache_hit_ratio"] == 0.8
+
+
+def test_usage_metadata_is_preferred_and_the_hit_ratio_accumulates():
+    handler = UsageTelemetryHandler()
+    handler.on_llm_end(LLMResult(
+        generations=[[ChatGeneration(message=AIMessage(content="a"))]],
+        llm_output={"token_usage": {"prompt_tokens": 1000, "completion_tokens": 10,
+                                    "prompt_tokens_details": {"cached_tokens": 1000}}},
+    ))
+    message = AIMessage(
+        content="b",
+        usage_metadata={
+            "input_tokens": 1000,
+            "output_tokens": 20,
+            "total_tokens": 1020,
+            "input_token_details": {"cache_read": 0},
+        },
+    )
+    before = counters()
+    handler.on_llm_end(LLMResult(
+        generations=[[ChatGeneration(message=message)]],
+        # Ignored: the message's own usage comes first
+        llm_output={"token_usage": {"prompt_tokens": 9, "completion_tokens": 9}},
+    ))
+    after = counters()
+
+    assert increase(before, after, "llm_prompt_tokens") == 1000
+    assert increase(before, after, "llm_cached_prompt_tokens") == 0
+    assert increase(before, after, "llm_completion_tokens") == 20
+    # Per handler: 1000 of 2000 prompt tokens were cached
+    assert metrics.snapshot()["gauges"]["llm_prompt_cache_hit_ratio"] == 0.5
+
+
+def test_completions_without_usage_are_not_counted():
+    before = counters()
+    UsageTelemetryHandler().on_llm_end(LLMResult(generations=[[ChatGeneration(message=AIMessage(content="x"))]]))
+    assert increase(before, counters(), "llm_calls") == 0
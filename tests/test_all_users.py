@@ -44,8 +44,8 @@ for email in test_users:
     # Show sample data
     if docs:
         sample = docs[0]
-        print(f"✅ Name: {sample.get('Employee_Name', 'Unknown')}")
-        print(f"✅ Company: {sample.get('Company', 'Unknown')}")
+        print(f"✅ Name: {sample.get('employee_name', 'Unknown')}")
+        print(f"✅ Company: {sample.get('company', 'Unknown')}")
 
 print(f"\n{'='*70}")
 print("Test Complete")
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Tests for answer-cache feedback.
+
+Feedback must only ever promote or evict answers the server itself issued:
+forged answer text, ids the voter never received and unsigned seed rows are
+all ignored.
+"""
+import os
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pytest
+
+from src.answer_cache import SemanticAnswerCache
+
+QUESTION = "Is dental covered?"
+ANSWER = "Yes, up to RM 500 a year under the Deriv dental benefit."
+
+
+def make_cache(**options):
+    cache = SemanticAnswerCache(signing_key="test-key", **options)
+    cache.set_version("v1")
+    return cache
+
+
+def issued_cache(**options):
+    cache = make_cache(**options)
+    cache.store(QUESTION, ANSWER)
+    answer_id = cache.issue(QUESTION, ANSWER, "alice")
+    return cache, answer_id
+
+
+def test_up_vote_restores_the_issued_answer():
+    cache, answer_id = issued_cache()
+    cache.invalidate(QUESTION)
+
+    assert cache.apply_feedback(answer_id, "up", "alice") == "stored"
+    assert cache.lookup(QUESTION)["answer"] == ANSWER
+
+
+def test_feedback_cannot_supply_answer_text():
+    cache = make_cache()
+    forged = cache.apply_feedback("0" * 32, "up", "mallory", query_text=QUESTION, answer="Call 555-SCAM")
+
+    assert forged == "ignored"
+    assert cache.lookup(QUESTION) is None
+
+
+def test_unknown_or_unissued_votes_are_ignored():
+    cache, answer_id = issued_cache()
+
+    assert cache.apply_feedback("not-an-id", "down", "alice") == "ignored"
+    # Mallory never received this answer
+    assert cache.apply_feedback(answer_id, "down", "mallory") == "ignored"
+    assert cache.lookup(QUESTION)["answer"] == ANSWER
+
+
+def test_eviction_needs_distinct_down_votes():
+    cache, answer_id = issued_cache(evict_downvotes=2)
+    cache.issue(QUESTION, ANSWER, "bob")
+
+    assert cache.apply_feedback(answer_id, "down", "alice") == "counted"
+    assert cache.apply_feedback(answer_id, "down", "alice") == "counted"
+    assert cache.lookup(QUESTION) is not None
+    assert cache.apply_feedback(answer_id, "down", "bob") == "evicted"
+    assert cache.lookup(QUESTION) is None
+
+
+def test_eviction_keeps_a_newer_answer():
+    cache, answer_id = issued_cache(evict_downvotes=1)
+    cache.store(QUESTION, "Updated answer")
+
+    assert cache.apply_feedback(answer_id, "down", "alice") == "evicted"
+    assert cache.lookup(QUESTION)["answer"] == "Updated answer"
+
+
+def test_signed_answer_from_another_worker_is_accepted():
+    issuer, answer_id = issued_cache()
+    other = make_cache()
+
+    assert other.apply_feedback(answer_id, "up", "alice", query_text=QUESTION, answer=ANSWER) == "stored"
+    assert other.lookup(QUESTION)["answer"] == ANSWER
+    # The same id with different text does not verify
+    assert make_cache().apply_feedback(answer_id, "up", "alice", query_text=QUESTION, answer="Other") == "ignored"
+
+
+def test_seed_only_loads_signed_rows():
+    cache = make_cache()
+    answer_id = cache.answer_id(QUESTION, ANSWER)
+    rows = [
+        {"metadata": {"cache_version": "v1", "answer_id": answer_id,
+                      "cache_query_text": QUESTION, "cache_answer_text": ANSWER}},
+        # Client-written text without a valid signature
+        {"metadata": {"cache_version": "v1", "answer_id": answer_id,
+                      "cache_query_text": "What is the AIA hotline?", "cache_answer_text": "Call 555-SCAM"}},
+        {"response_text": "Call 555-SCAM",
+         "metadata": {"cache_version": "v1", "query_text": "Who do I call?", "answer_text": "Call 555-SCAM"}},
+        {"metadata": {"cache_version": "v0", "answer_id": answer_id,
+                      "cache_query_text": QUESTION, "cache_answer_text": ANSWER}},
+    ]
+
+    assert cache.seed(rows) == 1
+    assert cache.lookup(QUESTION)["answer"] == ANSWER
+    assert cache.lookup("What is the AIA hotline?") is None
+
+
+def test_version_change_drops_issued_answers():
+    cache, answer_id = issued_cache()
+    cache.set_version("v2")
+    assert cache.issued(answer_id) is None
+
+
+def test_feedback_endpoint_ignores_client_answer_text(monkeypatch):
+    pytest.importorskip("fastapi")
+    os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+    os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "test-key")
+    from src import api
+
+    cache, answer_id = issued_cache()
+
+    class Agent:
+        answer_cache = cache
+
+    monkeypatch.setattr(api, "agent", Agent())
+    payload = {
+        "user_email_hash": "mallory",
+        "rating": "up",
+        "metadata": {"cache_version": "v1", "query_text": "Who do I call?", "answer_text": "Call 555-SCAM",
+                     "cache_query_text": "Who do I call?", "cache_answer_text": "Call 555-SCAM"},
+    }
+    api._apply_feedback_to_answer_cache(payload)
+    assert cache.lookup("Who do I call?") is None
+    assert "cache_answer_text" not in payload["metadata"]
+
+    payload = {"user_email_hash": "alice", "rating": "up", "metadata": {"cache_version": "v1", "answer_id": answer_id}}
+    api._apply_feedback_to_answer_cache(payload)
+    assert payload["metadata"]["cache_answer_text"] == ANSWER
+
+
+@pytest.mark.parametrize("question", [
+    "How much do I have left for dental?",
+    "How much have I claimed this year?",
+    "How much can I claim for dental?",
+    "What did I spend on optical?",
+    "Show me the dental claims",
+    "What's my balance?",
+    "Is that claim mine?",
+])
+def test_first_person_questions_are_personal(question):
+    assert not SemanticAnswerCache.is_general(question)
+
+
+@pytest.mark.parametrize("question", ["Is dental covered?", "What is the AIA hotline?", "Imaging limits for MRI?"])
+def test_impersonal_questions_are_general(question):
+    assert SemanticAnswerCache.is_general(question)
+
+
+def test_personal_questions_never_hit_a_close_general_answer():
+    # Every question embeds to the same vector: any lookup would be a semantic match
+    cache = SemanticAnswerCache(embed_fn=lambda text: [1.0, 0.0], signing_key="test-key")
+    cache.set_version("v1")
+    cache.store(QUESTION, ANSWER)
+
+    assert cache.lookup("Is dental covered for spouses?")["answer"] == ANSWER
+    assert cache.lookup("How much do I have left for dental?") is None
+    assert cache.lookup("How much have I claimed this year?") is None
+
+    cache.store("How much have I claimed this year?", "RM 1,200")
+    assert cache.lookup("How much have I claimed this year?") is None
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Tests for the DataLoader-style batch loader.
+
+load_many is a fake that records the key lists it was given and sleeps a
+little, so concurrent callers from a thread pool can be checked to share
+batches and each get their own value (or the batch's error).
+"""
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pytest
+
+from src.batch_loader import BatchLoader
+from src.metrics import metrics
+
+
+class FakeSource:
+    def __init__(self, delay: float = 0.02, fail: bool = False):
+        self.delay = delay
+        self.fail = fail
+        self.batches = []
+        self._lock = threading.Lock()
+
+    def load_many(self, keys):
+        with self._lock:
+            self.batches.append(list(keys))
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("source down")
+        # Odd keys are "not found"
+        return {key: f"value-{key}" for key in keys if key % 2 == 0}
+
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+def test_concurrent_loads_share_batches():
+    source = FakeSource()
+    loader = BatchLoader(source.load_many, "test", window_seconds=0.02, max_batch=100)
+    with ThreadPoolExecutor(32) as pool:
+        results = list(pool.map(lambda key: loader.load(key, timeout=5), range(64)))
+
+    assert results == [f"value-{key}" if key % 2 == 0 else None for key in range(64)]
+    assert len(source.batches) < 64
+    assert sorted(key for batch in source.batches for key in batch) == list(range(64))
+
+
+def test_repeated_key_in_a_window_is_loaded_once():
+    source = FakeSource()
+    loader = BatchLoader(source.load_many, "test", window_seconds=0.05)
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(lambda _: loader.load(4, timeout=5), range(8)))
+
+    assert results == ["value-4"] * 8
+    assert all(batch.count(4) == 1 for batch in source.batches)
+
+
+def test_full_batch_is_dispatched_without_waiting():
+    source = FakeSource(delay=0)
+    loader = BatchLoader(source.load_many, "test", window_seconds=5, max_batch=1)
+    started = time.perf_counter()
+    assert loader.load(2, timeout=1) == "value-2"
+    assert time.perf_counter() - started < 1
+
+
+def test_batch_error_reaches_every_caller():
+    loader = BatchLoader(FakeSource(fail=True).load_many, "test", window_seconds=0.02)
+    with ThreadPoolExecutor(4) as pool:
+        futures = [pool.submit(loader.load, key, 5) for key in range(4)]
+    for future in futures:
+        with pytest.raises(RuntimeError, match="source down"):
+            future.result()
+
+
+def test_load_all_chunks_by_max_batch():
+    source = FakeSource(delay=0)
+    loader = BatchLoader(source.load_many, "test", max_batch=3)
+    results = loader.load_all([0, 1, 2, 2, 3, 4, 5, 6])
+
+    assert results == {key: (f"value-{key}" if key % 2 == 0 else None) for key in range(7)}
+    assert [len(batch) for batch in source.batches] == [3, 3, 1]
+
+
+def test_metrics_record_batch_sizes_and_waits():
+    source = FakeSource(delay=0)
+    loader = BatchLoader(source.load_many, "test", window_seconds=0.01)
+    loader.load(2, timeout=1)
+    loader.load_all(range(5))
+
+    snapshot = metrics.snapshot()
+    assert snapshot["counters"]["batch_loader_batches{loader=test}"] == 2
+    assert snapshot["counters"]["batch_loader_keys{loader=test}"] == 6
+    assert snapshot["timings"]["batch_loader_wait{loader=test}"]["count"] == 1
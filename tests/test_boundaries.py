@@ -16,6 +16,7 @@ env_path = Path(__file__).parent.parent / "config" / ".env"
 load_dotenv(env_path)
 
 from src.ai_agent import ClaimAIAgent
+from tests.boundary_cases import BOUNDARY_CASES, REJECTION_KEYWORDS
 
 def test_boundaries():
     """Test that agent rejects off-topic queries."""
@@ -27,39 +28,10 @@ def test_boundaries():
     agent = ClaimAIAgent()
     test_email = "test@regentmarkets.com"
     
-    # Test cases: (query, should_reject)
-    test_cases = [
-        # Off-topic queries that SHOULD be rejected
-        ("Tell me a joke", True),
-        ("Who is Donald Trump?", True),
-        ("Entertain me", True),
-        ("What's the weather today?", True),
-        ("Help me with my Python code", True),
-        ("What's 2+2?", True),
-        
-        # On-topic queries that SHOULD be answered
-        ("What's my claim balance?", False),
-        ("How do I submit a dental claim?", False),
-        ("Is cancer treatment covered?", False),
-        ("What's the AIA hotline?", False),
-        ("Can I claim for glasses?", False),
-    ]
-    
-    # Keywords that indicate a rejection (more flexible than exact phrase)
-    rejection_keywords = [
-        "claims and benefits",
-        "specifically",
-        "focus on",
-        "help with",
-        "outside",
-        "not my",
-        "can't help with"
-    ]
-    
     passed = 0
     failed = 0
     
-    for query, should_reject in test_cases:
+    for query, should_reject in BOUNDARY_CASES:
         print(f"\n{'='*70}")
         print(f"Query: {query}")
         print(f"Expected: {'REJECT' if should_reject else 'ANSWER'}")
@@ -70,7 +42,7 @@ def test_boundaries():
         
         # Check if answer contains rejection indicators
         # Look for keywords that suggest polite rejection + offer to help with claims
-        has_rejection_keywords = any(keyword in answer for keyword in rejection_keywords)
+        has_rejection_keywords = any(keyword in answer for keyword in REJECTION_KEYWORDS)
         mentions_claims_benefits = "claim" in answer or "benefit" in answer
         is_rejected = has_rejection_keywords and mentions_claims_benefits
         
@@ -90,7 +62,7 @@ def test_boundaries():
             failed += 1
     
     print(f"\n{'='*70}")
-    print(f"RESULTS: {passed} passed, {failed} failed out of {len(test_cases)} tests")
+    print(f"RESULTS: {passed} passed, {failed} failed out of {len(BOUNDARY_CASES)} tests")
     print("="*70)
     
     return failed == 0
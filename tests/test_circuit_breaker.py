@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Tests for the circuit breaker: opening on failure and slow-call rates,
+half-open probes, deadline errors, and SupabaseService's stale fallback
+when the breaker refuses a call.
+
+FakeClock replaces the breaker module's clock, so open periods and slow
+calls are simulated without sleeping.
+"""
+import os
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pytest
+
+from src import circuit_breaker, deadline
+from src.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def perf_counter(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(circuit_breaker, "time", clock)
+    return clock
+
+
+def make_breaker(**options):
+    settings = {"window": 4, "min_calls": 4, "failure_rate": 0.5, "slow_call_seconds": 1.0, "open_seconds": 10.0}
+    settings.update(options)
+    return CircuitBreaker("test-dependency", **settings)
+
+
+def ok():
+    return "ok"
+
+
+def fail():
+    raise ConnectionError("boom")
+
+
+def call_ignoring_errors(breaker, func):
+    try:
+        breaker.call(func)
+    except ConnectionError:
+        pass
+
+
+def test_opens_on_failure_rate(clock):
+    breaker = make_breaker()
+    breaker.call(ok)
+    call_ignoring_errors(breaker, fail)
+    breaker.call(ok)
+    # Three calls: below min_calls, so it stays closed whatever the rate
+    assert breaker.state == CLOSED
+
+    call_ignoring_errors(breaker, fail)
+    assert breaker.state == OPEN
+    called = []
+    with pytest.raises(CircuitOpenError) as rejected:
+        breaker.call(lambda: called.append(1))
+    assert called == []
+    assert rejected.value.retry_after == pytest.approx(10.0)
+
+
+def test_stays_closed_below_failure_rate(clock):
+    breaker = make_breaker()
+    for func in (ok, ok, fail, ok, ok, ok):
+        call_ignoring_errors(breaker, func)
+    assert breaker.state == CLOSED
+    assert breaker.stats()["failure_rate"] == 0.25
+
+
+def test_opens_on_slow_call_rate(clock):
+    breaker = make_breaker(slow_call_rate=0.75)
+
+    def slow():
+        clock.advance(1.5)
+        return "late"
+
+    for func in (slow, ok, slow):
+        assert breaker.call(func)
+    assert breaker.state == CLOSED
+    # Successful but slow calls still open it: 3 of 4 took too long
+    breaker.call(slow)
+    assert breaker.state == OPEN
+
+
+def test_half_open_probe_closes_or_reopens(clock):
+    breaker = make_breaker(half_open_calls=1)
+    for _ in range(4):
+        call_ignoring_errors(breaker, fail)
+    assert breaker.state == OPEN
+
+    clock.advance(10.0)
+    assert breaker.state == HALF_OPEN
+    # A failed probe opens it again for another full period
+    call_ignoring_errors(breaker, fail)
+    assert breaker.state == OPEN
+    clock.advance(9.0)
+    with pytest.raises(CircuitOpenError):
+        breaker.call(ok)
+
+    clock.advance(1.0)
+    assert breaker.call(ok) == "ok"
+    assert breaker.state == CLOSED
+    assert breaker.stats()["window_calls"] == 0
+
+
+def test_only_one_probe_at_a_time(clock):
+    breaker = make_breaker(half_open_calls=1)
+    for _ in range(4):
+        call_ignoring_errors(breaker, fail)
+    clock.advance(10.0)
+
+    def probe():
+        # A second caller arrives while the probe is still running
+        with pytest.raises(CircuitOpenError):
+            breaker.call(ok)
+        return "probed"
+
+    assert breaker.call(probe) == "probed"
+    assert breaker.state == CLOSED
+
+
+def test_deadline_errors_are_not_failures(clock):
+    breaker = make_breaker()
+
+    def out_of_budget():
+        raise deadline.DeadlineExceeded("supabase")
+
+    for _ in range(6):
+        with pytest.raises(deadline.DeadlineExceeded):
+            breaker.call(out_of_budget)
+    assert breaker.state == CLOSED
+    assert breaker.stats()["window_calls"] == 0
+
+    # A timeout while the request's own budget is spent is not held against the dependency either
+    with deadline.deadline_scope(0.1):
+        for _ in range(6):
+            call_ignoring_errors(breaker, fail)
+    assert breaker.state == CLOSED
+
+    for _ in range(4):
+        call_ignoring_errors(breaker, fail)
+    assert breaker.state == OPEN
+
+
+class FlakyTable:
+    """A Supabase table that answers until told to fail."""
+
+    def __init__(self):
+        self.calls = 0
+        self.error = None
+
+    def fetch(self, table, params, timeout, count=None):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return [{"id": 1, "email": params["email"][len("eq."):]}], None
+
+
+@pytest.fixture
+def service(monkeypatch):
+    pytest.importorskip("requests")
+    os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+    os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "test-key")
+    from src.supabase_service import SupabaseService
+
+    monkeypatch.setenv("SUPABASE_READ_MODE", "rest")
+    service = SupabaseService()
+    service.breaker = make_breaker(window=2, min_calls=2)
+    yield service
+    # The staleness marker is a context variable; don't leak it into the next test
+    service.pop_freshness_note()
+
+
+def test_guarded_serves_stale_rows_while_the_breaker_is_open(clock, service):
+    from src.supabase_service import SupabaseServiceError
+
+    table = FlakyTable()
+    service._fetch = table.fetch
+    params = {"email": "eq.a@x.com"}
+    rows, _ = service._request("claim_summary", params)
+    assert not service.serving_stale()
+
+    table.error = SupabaseServiceError("Supabase request failed: 503", status_code=503)
+    for _ in range(2):
+        assert service._request("claim_summary", params)[0] == rows
+    assert service.breaker.state == OPEN
+    note = service.pop_freshness_note()
+    assert note is not None
+
+    # Open breaker: the last good rows are served without calling Supabase
+    calls = table.calls
+    assert service._request("claim_summary", params)[0] == rows
+    assert table.calls == calls
+    assert service.serving_stale()
+
+    # A query that never succeeded has nothing to fall back to
+    with pytest.raises(SupabaseServiceError, match="circuit open"):
+        service._request("claim_summary", {"email": "eq.new@x.com"})
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Tests for get_claims_analytics aggregates.
+
+The same claims are grouped with pandas and with the plain-Python fallback
+(claims_analytics.pd set to None) and must give identical rows. FakeService
+stands in for SupabaseService: claims_version and the streamed rows are
+plain attributes, so cache hits and reloads can be counted.
+"""
+import os
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pytest
+
+pytest.importorskip("requests")
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "test-key")
+
+from src import claims_analytics
+from src.claims_analytics import ClaimsAnalytics, ClaimsFrame, claim_records, parse_group_by
+
+
+def claim(amount, claim_type="Employee Benefit", submitted="2025 Jan 06", currency="MYR", state="Paid", text=""):
+    return {
+        "claim_type": claim_type,
+        "state": state,
+        "transaction_currency": currency,
+        "transaction_amount": amount,
+        "date_submitted": submitted,
+        "date_paid": None,
+        "description": text,
+        "claim_description": None,
+    }
+
+
+CLAIMS = [
+    claim(120, submitted="2025 Jan 06", text="Optical glasses"),
+    claim(80.5, submitted="2025-01-20", text="Dental scaling"),
+    claim(300, submitted="2025 Mar 02", text="Optical lenses"),
+    claim(45, claim_type="Medical", submitted="2024 Dec 30", text="GP visit"),
+    claim(25, claim_type="Medical", submitted="2025 Mar 15", currency="USD", text="Pharmacy"),
+    claim(60, claim_type=None, submitted=None, state=None, text="Unknown receipt"),
+]
+
+
+class FakeService:
+    def __init__(self, claims):
+        self.claims = claims
+        self.version = "v1"
+        self.loads = 0
+        self.stale = False
+
+    def claims_version(self, email):
+        return self.version
+
+    def iter_claim_analysis(self, email, columns=None, max_rows=None):
+        self.loads += 1
+        return iter(self.claims[:max_rows])
+
+    def serving_stale(self):
+        return self.stale
+
+
+def frames(monkeypatch):
+    """The same claims as a pandas frame and as plain records."""
+    pytest.importorskip("pandas")
+    records = claim_records(CLAIMS)
+    with_pandas = ClaimsFrame(records)
+    monkeypatch.setattr(claims_analytics, "pd", None)
+    plain = ClaimsFrame(records)
+    assert with_pandas._frame is not None and plain._frame is None
+    return with_pandas, plain
+
+
+@pytest.mark.parametrize("group_by", [[], ["claim_type"], ["month"], ["year", "state"], ["claim_type", "month"]])
+@pytest.mark.parametrize("filters", [
+    {},
+    {"year": 2025},
+    {"claim_type": "employee benefit"},
+    {"keyword": " OPTICAL "},
+    {"year": 2025, "claim_type": "Medical"},
+    {"year": 1999},
+])
+def test_pandas_and_plain_python_agree(monkeypatch, group_by, filters):
+    with_pandas, plain = frames(monkeypatch)
+    assert with_pandas.aggregate(group_by, **filters) == plain.aggregate(group_by, **filters)
+
+
+def test_grouped_values(monkeypatch):
+    _, plain = frames(monkeypatch)
+
+    assert plain.aggregate(["claim_type"]) == (6, [
+        ("Employee Benefit", "MYR", 3, 500.5, 166.83, 300.0),
+        ("Medical", "MYR", 1, 45.0, 45.0, 45.0),
+        ("Medical", "USD", 1, 25.0, 25.0, 25.0),
+        ("unknown", "MYR", 1, 60.0, 60.0, 60.0),
+    ])
+    assert plain.aggregate(["month"], year=2025) == (4, [
+        ("2025-01", "MYR", 2, 200.5, 100.25, 120.0),
+        ("2025-03", "MYR", 1, 300.0, 300.0, 300.0),
+        ("2025-03", "USD", 1, 25.0, 25.0, 25.0),
+    ])
+    assert plain.aggregate([], keyword="optical") == (2, [("MYR", 2, 420.0, 210.0, 300.0)])
+    assert plain.aggregate(["claim_type"], year=1999) == (0, [])
+
+
+def test_parse_group_by():
+    assert parse_group_by(None) == ["claim_type"]
+    assert parse_group_by(" , ") == ["claim_type"]
+    assert parse_group_by("Month, claim_type, month") == ["month", "claim_type"]
+    with pytest.raises(ValueError, match="Cannot group by employee"):
+        parse_group_by("month,employee")
+
+
+def test_summarize_payload():
+    analytics = ClaimsAnalytics(FakeService(CLAIMS))
+    payload = analytics.summarize("A@x.com", "month", year=2025)
+
+    assert payload["claims_considered"] == 4
+    assert payload["groups"]["columns"] == ["month", "currency", "count", "total", "average", "largest"]
+    assert payload["overall"]["rows"] == [["MYR", 3, 500.5, 166.83, 300.0], ["USD", 1, 25.0, 25.0, 25.0]]
+    assert payload["filters"] == {"year": 2025}
+    assert payload["highest_total"] == {"month": "2025-03", "currency": "MYR", "count": 1, "total": 300.0}
+    assert "note" not in payload
+
+    with pytest.raises(ValueError):
+        analytics.summarize("a@x.com", "colour")
+
+
+def test_frame_is_cached_until_the_claims_version_changes():
+    service = FakeService(CLAIMS)
+    analytics = ClaimsAnalytics(service)
+
+    analytics.summarize("a@x.com")
+    analytics.summarize(" A@X.com ", "month")
+    assert service.loads == 1
+
+    service.claims = CLAIMS[:2]
+    service.version = "v2"
+    assert analytics.summarize("a@x.com")["claims_considered"] == 2
+    assert service.loads == 2
+
+    analytics.invalidate("a@x.com")
+    analytics.summarize("a@x.com")
+    assert service.loads == 3
+
+
+def test_stale_rows_are_not_cached_and_max_rows_is_noted():
+    service = FakeService(CLAIMS)
+    service.stale = True
+    analytics = ClaimsAnalytics(service)
+    analytics.max_rows = 3
+
+    payload = analytics.summarize("a@x.com")
+    assert payload["claims_considered"] == 3
+    assert "Only the 3 most recent" in payload["note"]
+    analytics.summarize("a@x.com")
+    assert service.loads == 2
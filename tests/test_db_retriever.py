@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Tests for the SQLite claim replica.
+
+FakeSource stands in for SupabaseService.fetch_rows: it applies the id
+keyset, the (when_modified, id) watermark filter and the limit the sync
+sends, so paging and deletes can be checked without a network.
+"""
+import re
+import sys
+import time
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pytest
+
+from src.db_retriever import DatabaseRetriever, ReplicaLeaseLost
+
+_WATERMARK = re.compile(r"\(when_modified\.gt\.(.+),and\(when_modified\.eq\.(.+),id\.gt\.(.+)\)\)")
+
+
+def claim(index, email="a@x.com", **fields):
+    row = {
+        "id": f"c{index:03d}",
+        "email": email,
+        "record_key": f"R{index}",
+        "state": "Paid",
+        "claim_type": "Employee Benefit",
+        "claim_description": "Optical",
+        "description": "glasses",
+        "transaction_amount": 10.0 * index,
+        "transaction_currency": "MYR",
+        "date_paid": f"2024 Sep {index % 28 + 1:02d}",
+        "date_submitted": "2024-09-01",
+        "when_modified": f"2024-09-{index % 28 + 1:02d}T00:00:00",
+    }
+    row.update(fields)
+    return row
+
+
+SUMMARY = {
+    "id": "s1", "year": 2024, "employee_id": "E1", "email": "a@x.com", "employee_name": "Alice",
+    "company": "Deriv", "currency": "MYR", "country": "MY", "max_amount": 1000.0,
+    "total_transaction_amount": 250.0, "remaining_balance": 750.0,
+}
+
+
+class FakeSource:
+    def __init__(self, claims, summaries=(SUMMARY,)):
+        self.claims = list(claims)
+        self.summaries = list(summaries)
+        self.calls = []
+        self.on_fetch = None
+
+    def fetch_rows(self, table, params):
+        self.calls.append((table, dict(params)))
+        if self.on_fetch:
+            self.on_fetch(table, params)
+        rows = self.summaries if table == "claim_summary" else self.claims
+        rows = sorted(rows, key=lambda row: row["id"])
+        if "id" in params:
+            rows = [row for row in rows if row["id"] > params["id"][len("gt."):]]
+        if params.get("when_modified") == "not.is.null":
+            rows = [row for row in rows if row["when_modified"] is not None]
+        if "or" in params:
+            after, _, after_id = _WATERMARK.match(params["or"]).groups()
+            rows = [row for row in rows if row["when_modified"] and (row["when_modified"], row["id"]) > (after, after_id)]
+        if params["order"].startswith("when_modified"):
+            rows = sorted(rows, key=lambda row: (row["when_modified"], row["id"]))
+        return [dict(row) for row in rows[: params["limit"]]]
+
+    def analysis_calls(self):
+        return [params for table, params in self.calls if table == "claim_analysis"]
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "replica" / "claims.db")
+
+
+@pytest.fixture
+def synced(db_path):
+    claims = [claim(i) for i in range(1, 8)]
+    claims += [
+        claim(8, claim_type="Medical", transaction_currency="USD"),
+        claim(9, state="Complete"),
+        claim(10, email="b@x.com"),
+    ]
+    source = FakeSource(claims)
+    replica = DatabaseRetriever(db_path, page_size=4)
+    replica.sync(source)
+    return replica, source
+
+
+def test_first_sync_copies_both_tables(db_path):
+    source = FakeSource([claim(i) for i in range(1, 11)])
+    replica = DatabaseRetriever(db_path, page_size=4)
+    assert not replica.ready
+    assert replica.age() is None
+
+    assert replica.sync(source) == {"claim_summary": 1, "claim_analysis": 10}
+    assert replica.ready
+    assert replica.age() < 5
+    # Keyset pages on id: 4 + 4 + 2
+    assert [params.get("id") for params in source.analysis_calls()] == [None, "gt.c004", "gt.c008"]
+
+
+def test_read_methods(synced):
+    replica, _ = synced
+
+    assert replica.claim_summary(" A@X.com ")["remaining_balance"] == 750.0
+    assert replica.claim_summary("nobody@x.com") is None
+
+    rows = replica.claim_analysis("a@x.com", limit=3)
+    # Most recently paid first; the Complete claim (c009) is excluded by default
+    assert [row["id"] for row in rows] == ["c008", "c007", "c006"]
+    assert "email" not in rows[0]
+    assert all(row["state"] != "Complete" for row in replica.claim_analysis("a@x.com"))
+    assert len(replica.claim_analysis("a@x.com", exclude_state=None)) == 9
+    assert [row["id"] for row in replica.claim_analysis("a@x.com", claim_type="Medical")] == ["c008"]
+
+    assert replica.count_claims("a@x.com") == 7
+    assert replica.count_claims("a@x.com", claim_type=None, exclude_state=None) == 9
+    assert replica.totals_by_type("a@x.com") == [
+        {"claim_type": "Employee Benefit", "currency": "MYR", "claim_count": 7, "total_amount": 280.0},
+        {"claim_type": "Medical", "currency": "USD", "claim_count": 1, "total_amount": 80.0},
+    ]
+
+
+def test_compute_and_retrieve(synced):
+    replica, _ = synced
+
+    assert replica.compute("A@x.com", "sum", "Remaining_Balance", table="claims_2025")["result"] == 750.0
+    assert replica.compute("a@x.com", "count", table="claims")["result"] == 9
+    assert replica.compute("a@x.com", "mean", "transaction_amount", table="claims")["operation"] == "avg"
+    assert "error" in replica.compute("a@x.com", "sum", "x; drop table claim_summary")
+    assert "error" in replica.compute("a@x.com", "median", "max_amount")
+    assert "error" in replica.compute("a@x.com", "sum")
+
+    docs = replica.retrieve("a@x.com", limit=2)
+    assert [doc["source_table"] for doc in docs] == ["claim_summary", "claim_analysis", "claim_analysis"]
+    assert "synced_at" not in docs[1]
+
+
+def test_incremental_sync_pages_by_watermark(synced):
+    replica, source = synced
+    version = replica.version()
+    source.calls.clear()
+
+    # Three changes sharing one when_modified, and one later: pages of 2 would
+    # skip or repeat rows if paging ignored the id tie-breaker
+    for row in source.claims[:3]:
+        row.update(when_modified="2025-01-01T00:00:00", transaction_amount=1.0)
+    source.claims[3].update(when_modified="2025-01-02T00:00:00")
+    source.claims.append(claim(11, when_modified="2025-01-01T00:00:00"))
+    replica.page_size = 2
+
+    assert replica.sync(source) == {"claim_summary": 1, "claim_analysis": 5}
+    filters = [params.get("or") for params in source.analysis_calls()]
+    assert filters == [
+        "(when_modified.gt.2024-09-11T00:00:00,and(when_modified.eq.2024-09-11T00:00:00,id.gt.c010))",
+        "(when_modified.gt.2025-01-01T00:00:00,and(when_modified.eq.2025-01-01T00:00:00,id.gt.c002))",
+        "(when_modified.gt.2025-01-01T00:00:00,and(when_modified.eq.2025-01-01T00:00:00,id.gt.c011))",
+    ]
+    assert replica.compute("a@x.com", "sum", "transaction_amount", table="claims")["result"] == pytest.approx(
+        sum(row["transaction_amount"] for row in source.claims if row["email"] == "a@x.com")
+    )
+    assert replica.version() != version
+
+    # Nothing new: one request, watermark unchanged
+    source.calls.clear()
+    version = replica.version()
+    assert replica.sync(source)["claim_analysis"] == 0
+    assert len(source.analysis_calls()) == 1
+    assert replica.version() == version
+
+
+def test_incremental_sync_keeps_deleted_rows_until_a_full_copy(synced):
+    replica, source = synced
+    source.claims = [row for row in source.claims if row["id"] != "c001"]
+
+    replica.sync(source, full=False)
+    assert replica.count_claims("a@x.com", claim_type=None, exclude_state=None) == 9
+
+    assert replica.sync(source, full=True)["claim_analysis"] == 9
+    assert replica.count_claims("a@x.com", claim_type=None, exclude_state=None) == 8
+    assert replica.compute("a@x.com", "count", table="claims")["result"] == 8
+
+
+def test_full_copy_is_due_after_full_sync_seconds(synced):
+    replica, source = synced
+    source.calls.clear()
+    replica.sync(source)
+    assert "or" in source.analysis_calls()[0]
+
+    replica.full_sync_seconds = 0
+    source.calls.clear()
+    replica.sync(source)
+    assert "or" not in source.analysis_calls()[0]
+
+
+def test_second_process_skips_while_the_lease_is_held(synced, db_path):
+    replica, source = synced
+    other = DatabaseRetriever(db_path)
+    results = []
+    # The other worker tries to sync while this one is mid-copy
+    source.on_fetch = lambda table, params: results.append(other.sync(FakeSource([])))
+    replica.sync(source, full=True)
+
+    assert results and all(result == {} for result in results)
+    source.on_fetch = None
+    # The lease is released afterwards, and the skipped sync deleted nothing
+    assert other.sync(source) != {}
+    assert replica.count_claims("a@x.com", claim_type=None, exclude_state=None) == 9
+
+
+def test_expired_lease_is_taken_over(db_path):
+    stalled = DatabaseRetriever(db_path, lease_seconds=0.05)
+    assert stalled._acquire_lease("stalled-worker")
+    fresh = DatabaseRetriever(db_path)
+    assert fresh.sync(FakeSource([claim(1)])) == {}
+
+    time.sleep(0.1)
+    assert fresh.sync(FakeSource([claim(1)])) == {"claim_summary": 1, "claim_analysis": 1}
+
+
+def test_lost_lease_aborts_before_deleting(synced, db_path):
+    replica, source = synced
+    replica.lease_seconds = 0.05
+    other = DatabaseRetriever(db_path)
+    source.claims = source.claims[:2]
+
+    def stall(table, params):
+        if table == "claim_analysis":
+            time.sleep(0.1)
+            other._acquire_lease("other-worker")
+
+    source.on_fetch = stall
+    with pytest.raises(ReplicaLeaseLost):
+        replica.sync(source, full=True)
+
+    # The stalled copy neither deleted rows nor released the new owner's lease
+    assert replica.count_claims("a@x.com", claim_type=None, exclude_state=None) == 9
+    assert replica.sync(FakeSource([])) == {}
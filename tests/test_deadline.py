@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Tests for per-request deadlines: call timeouts capped to the remaining
+budget, and the deadline following a request into admission worker threads.
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pytest
+
+from src import deadline
+from src.admission import AdmissionController
+from src.metrics import metrics
+
+
+def test_no_deadline_keeps_the_usual_timeout():
+    assert deadline.remaining() is None
+    assert deadline.call_timeout(30.0, "supabase") == 30.0
+    assert not deadline.is_exhausted()
+
+
+def test_call_timeout_is_capped_to_the_remaining_budget():
+    with deadline.deadline_scope(5.0):
+        assert 4.5 < deadline.call_timeout(30.0, "supabase") <= 5.0
+        # A shorter usual timeout is kept
+        assert deadline.call_timeout(2.0, "supabase") == 2.0
+    assert deadline.remaining() is None
+
+
+def test_call_timeout_raises_below_the_minimum():
+    before = metrics.snapshot()["counters"].get("deadline_exceeded{stage=kb}", 0)
+    with deadline.deadline_scope(deadline.MIN_CALL_SECONDS / 2):
+        assert deadline.is_exhausted()
+        with pytest.raises(deadline.DeadlineExceeded) as exceeded:
+            deadline.call_timeout(30.0, "kb")
+    assert exceeded.value.stage == "kb"
+    assert metrics.snapshot()["counters"]["deadline_exceeded{stage=kb}"] == before + 1
+
+
+def test_check_keeps_a_reserve():
+    with deadline.deadline_scope(3.0):
+        deadline.check("agent_loop", reserve=1.0)
+        with pytest.raises(deadline.DeadlineExceeded):
+            deadline.check("agent_loop", reserve=3.0)
+
+
+def test_deadline_reaches_admission_worker_threads():
+    async def scenario():
+        controller = AdmissionController(max_concurrent=1)
+        assert await controller.run("a", deadline.remaining) is None
+        with deadline.deadline_scope(20.0):
+            left = await controller.run("a", deadline.remaining)
+            # Set on the event loop, read on the agent-run thread
+            assert 19.0 < left <= 20.0
+            assert await controller.run("a", deadline.call_timeout, 5.0, "llm") == 5.0
+            with deadline.deadline_scope(0.1):
+                with pytest.raises(deadline.DeadlineExceeded):
+                    await controller.run("a", deadline.call_timeout, 30.0, "llm")
+
+    asyncio.run(scenario())
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Tests for the feedback write-behind buffer's flush thread.
+"""
+import sys
+import time
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pytest
+
+pytest.importorskip("requests")
+
+from src.feedback_buffer import FeedbackBuffer
+from src.supabase_service import SupabaseServiceError
+
+
+class FlakyFlush:
+    """Raises the queued errors in turn, then records the rows it is given."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.flushed = []
+
+    def __call__(self, rows):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.flushed.extend(rows)
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+@pytest.fixture
+def make_buffer(tmp_path):
+    buffers = []
+
+    def make(flush_fn):
+        buffer = FeedbackBuffer(flush_fn, str(tmp_path / "feedback.spool"), max_batch=1, flush_interval=0.05, fsync=False)
+        buffer.start()
+        buffers.append(buffer)
+        return buffer
+
+    yield make
+    for buffer in buffers:
+        buffer.stop(timeout=1)
+
+
+@pytest.mark.parametrize("error", [
+    RuntimeError("unexpected"),
+    KeyError("row"),
+    SupabaseServiceError("Supabase request failed: 503", status_code=503),
+])
+def test_flush_thread_survives_errors_and_retries(make_buffer, error):
+    flush = FlakyFlush(error)
+    buffer = make_buffer(flush)
+    buffer.submit({"message_id": "m1", "rating": "up"})
+
+    assert wait_for(lambda: flush.flushed)
+    assert buffer._thread.is_alive()
+    assert [row["message_id"] for row in flush.flushed] == ["m1"]
+    assert buffer.stats()["pending"] == 0 and buffer.stats()["retry_delay_seconds"] == 0.0
+
+
+def test_rejected_rows_are_dead_lettered(make_buffer, tmp_path):
+    flush = FlakyFlush(
+        SupabaseServiceError("Supabase request failed: 400", status_code=400),
+        SupabaseServiceError("Supabase request failed: 400", status_code=400),
+    )
+    buffer = make_buffer(flush)
+    buffer.submit({"message_id": "bad", "rating": "up"})
+
+    assert wait_for(lambda: buffer.stats()["pending"] == 0)
+    assert flush.flushed == []
+    assert "bad" in (tmp_path / "feedback.spool.dead").read_text()
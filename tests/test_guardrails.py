@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Tests for the pre-agent guardrails.
+
+The test_boundaries.py cases are replayed through Guardrails.check: every
+question it rejects must be one the agent is expected to reject (precision),
+the templated replies must read as rejections, and a check must stay far
+cheaper than an LLM call (its latency is reported, with a loose bound).
+"""
+import sys
+import time
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pytest
+
+from src.guardrails import (
+    OFF_TOPIC,
+    OTHER_PERSON,
+    AhoCorasick,
+    Guardrails,
+    PrototypeClassifier,
+)
+from tests.boundary_cases import BOUNDARY_CASES, is_rejection
+
+USER_EMAIL = "test@regentmarkets.com"
+
+PRIVACY_CASES = [
+    "Give me claim amount for sathish.badrinara@deriv.com",
+    "Check balance for employee ID 12345",
+    "What has john@deriv.com claimed this year?",
+]
+
+# Mention other people or stray from claims, but must still reach the agent
+AGENT_CASES = [
+    "Can my wife claim her glasses?",
+    "What did we discuss?",
+    "Thanks!",
+    "What's AIA's claim limit?",
+    f"What's the balance for {USER_EMAIL}?",
+    "Is the wellness program covered?",
+    # Names are only guessed: the agent decides, with the privacy module
+    "What's John's balance?",
+    "How much has Sarah claimed?",
+    # Own-data questions with capitalised words or possessives that are not people
+    "How much did I claim for January?",
+    "What's my balance for March?",
+    "Can I claim for Panel clinics?",
+    "What's the hospital's claim limit?",
+    "How much is the dentist's claim limit?",
+    "Claim balance for Malaysia?",
+    "my employee number 10023 claim",
+    "Can I email my-hrops@deriv.com about my claim?",
+]
+
+guardrails = Guardrails()
+
+
+def test_boundary_cases_precision_and_recall():
+    rejected = {query for query, _ in BOUNDARY_CASES if guardrails.check(query, USER_EMAIL).rejected}
+    expected = {query for query, should_reject in BOUNDARY_CASES if should_reject}
+
+    true_positives = len(rejected & expected)
+    precision = true_positives / len(rejected) if rejected else 1.0
+    recall = true_positives / len(expected)
+    assert precision == 1.0, rejected - expected
+    assert recall == 1.0, expected - rejected
+
+
+@pytest.mark.parametrize("query,should_reject", BOUNDARY_CASES)
+def test_rejections_read_like_the_agent(query, should_reject):
+    verdict = guardrails.check(query, USER_EMAIL)
+    if should_reject:
+        assert verdict.reason == OFF_TOPIC
+        assert is_rejection(verdict.answer), verdict.answer
+    else:
+        assert not verdict.rejected
+
+
+@pytest.mark.parametrize("query", PRIVACY_CASES)
+def test_other_person_rejected(query):
+    verdict = guardrails.check(query, USER_EMAIL)
+    assert verdict.reason == OTHER_PERSON
+    assert "my-hrops@deriv.com" in verdict.answer
+    assert not verdict.own_data
+
+
+@pytest.mark.parametrize("query", AGENT_CASES)
+def test_ambiguous_questions_reach_the_agent(query):
+    assert not guardrails.check(query, USER_EMAIL).rejected
+
+
+def test_follow_up_to_on_topic_turn_is_not_rejected():
+    assert guardrails.check("Tell me a joke", USER_EMAIL, previous_text="Is dental covered?").rejected is False
+
+
+@pytest.mark.parametrize("query,own_data", [
+    ("What's my claim balance?", True),
+    ("How much did I spend this year?", True),
+    ("Show me my claim history", True),
+    ("How do I submit a dental claim?", False),
+    ("What's John's balance?", False),
+    ("How much did I claim for January?", True),
+    ("What's my balance for March?", True),
+])
+def test_own_data_flag(query, own_data):
+    assert guardrails.is_own_data_query(query) is own_data
+    assert guardrails.check(query, USER_EMAIL).own_data is own_data
+
+
+def test_aho_corasick_whole_words_and_overlaps():
+    matcher = AhoCorasick({"he": "a", "she": "b", "hers": "c", "his": "d", "play a game": "e"})
+    assert matcher.find("ushers") == []
+    assert [keyword for keyword, _ in matcher.find("she said hers, his")] == ["she", "hers", "his"]
+    assert matcher.find("Let's PLAY A GAME!") == [("play a game", "e")]
+
+
+def test_embedding_classifier_only_for_undecided_questions():
+    vectors = {
+        "Tell me something funny": [1.0, 0.0],
+        "Explain quantum entanglement": [0.96, 0.28],
+    }
+
+    def embed(text):
+        return vectors.get(text, [0.0, 1.0])
+
+    classifier = PrototypeClassifier(embed, min_similarity=0.5, margin=0.15)
+    with_classifier = Guardrails(classifier=classifier)
+    verdict = with_classifier.check("Explain quantum entanglement", USER_EMAIL)
+    assert verdict.reason == OFF_TOPIC and verdict.matched == ["embedding"]
+    assert not Guardrails().check("Explain quantum entanglement", USER_EMAIL).rejected
+    # Topical questions never reach the classifier
+    assert not with_classifier.check("Is dental covered?", USER_EMAIL).rejected
+
+
+def test_check_latency():
+    queries = [query for query, _ in BOUNDARY_CASES] + PRIVACY_CASES + AGENT_CASES
+    rounds = 200
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for query in queries:
+            guardrails.check(query, USER_EMAIL)
+    per_check_ms = (time.perf_counter() - started) * 1000 / (rounds * len(queries))
+    print(f"\nGuardrails.check: {per_check_ms:.3f} ms per check")
+    # Typically ~0.05 ms; the bound only catches pathological regressions on a loaded CI host
+    # (an LLM round trip is ~1000 ms)
+    assert per_check_ms < 50.0, f"{per_check_ms:.3f} ms per check"
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Tests for structure-aware Markdown chunking: heading paths in metadata,
+packing of small sections, the chunk size limit, and overlap when an
+oversized section falls back to character splitting.
+"""
+import sys
+from pathlib import Path
+
+# Add knowledge_base directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "knowledge_base"))
+
+import pytest
+
+pytest.importorskip("langchain_text_splitters")
+
+from md_processor import MarkdownProcessor
+
+CLAIMS_PROSE = (
+    "Submit every claim through the staff portal within thirty days of the treatment date. "
+    "Attach the original receipt and the completed claim form, and make sure the amounts match. "
+    "Claims without a receipt are returned to the employee for correction. "
+    "The finance team reviews submitted claims every Tuesday and Thursday, and approved amounts "
+    "are paid with the next monthly salary. Late claims need written approval from the head of "
+    "department before finance can process them, and repeated late submissions may be rejected outright."
+)
+
+GUIDE = f"""# Benefits Guide
+
+## Dental
+
+### Limits
+
+Dental treatment is covered up to RM 500 per calendar year.
+
+### Exclusions
+
+Teeth whitening and veneers are not covered.
+
+## Optical
+
+One pair of spectacles every two years, capped at RM 300.
+
+| Item | Limit |
+|------|-------|
+| Frames | RM 150 |
+| Lenses | RM 150 |
+
+## Claims Process
+
+{CLAIMS_PROSE}
+
+```bash
+# not a heading: example export command
+claims export --month 2025-01
+```
+"""
+
+
+@pytest.fixture
+def chunks(tmp_path):
+    path = tmp_path / "Benefits_Guide.md"
+    path.write_text(GUIDE, encoding="utf-8")
+    processor = MarkdownProcessor(chunk_size=300, chunk_overlap=60)
+    return processor.process_md(str(path), category="benefits_guide")
+
+
+def test_sections_and_heading_paths(chunks):
+    assert [chunk.metadata["section_path"] for chunk in chunks] == [
+        "Benefits Guide",
+        "Benefits Guide > Optical",
+        "Benefits Guide > Claims Process",
+        "Benefits Guide > Claims Process",
+        "Benefits Guide > Claims Process",
+    ]
+    # The title block and the small Dental subsections are packed into one chunk
+    assert "### Limits" in chunks[0].page_content and "### Exclusions" in chunks[0].page_content
+    assert chunks[0].metadata["heading_level"] == 1
+    assert chunks[1].metadata["section_title"] == "Optical"
+    assert chunks[1].metadata["heading_level"] == 2
+    assert all(chunk.metadata["total_chunks"] == len(chunks) for chunk in chunks)
+    assert [chunk.metadata["chunk_index"] for chunk in chunks] == list(range(len(chunks)))
+    assert chunks[0].metadata["source"] == "Benefits_Guide"
+    assert chunks[0].metadata["category"] == "benefits_guide"
+
+
+def test_headings_inside_code_fences_are_ignored():
+    sections = MarkdownProcessor().split_sections(GUIDE)
+    assert [section["title"] for section in sections] == [
+        "Benefits Guide", "Dental", "Limits", "Exclusions", "Optical", "Claims Process",
+    ]
+    assert sections[2]["path"] == ["Benefits Guide", "Dental", "Limits"]
+
+
+def test_tables_and_code_blocks_stay_whole(chunks):
+    table = GUIDE[GUIDE.index("| Item"):GUIDE.index("\n\n## Claims")]
+    assert table in chunks[1].page_content
+    fence = GUIDE[GUIDE.index("```bash"):].rstrip()
+    assert fence in chunks[-1].page_content
+
+
+def test_chunks_respect_the_size_limit(chunks):
+    assert all(len(chunk.page_content) <= 300 for chunk in chunks)
+    # The oversized section keeps its heading with the first piece and repeats it after
+    claims = chunks[2:]
+    assert claims[0].page_content.startswith("## Claims Process\n\nSubmit every claim")
+    assert all(chunk.page_content.startswith("## Claims Process (continued)\n\n") for chunk in claims[1:])
+
+
+def test_split_pieces_overlap_without_repeating_text(chunks):
+    bodies = [chunk.page_content.split("\n\n", 1)[1] for chunk in chunks[2:]]
+    prose = [body.split("\n\n```", 1)[0] for body in bodies]
+    # Consecutive pieces share an overlap, and together they cover the whole section
+    for previous, following in zip(prose, prose[1:]):
+        overlap = following[:20]
+        assert overlap in previous
+    assert prose[0].startswith(CLAIMS_PROSE[:40]) and CLAIMS_PROSE.endswith(prose[-1][-40:])
+    # ...but each piece is one contiguous stretch of the text: overlapping parts are never packed together
+    assert all(body in CLAIMS_PROSE for body in prose)
+
+
+def test_plain_character_splitting_when_structure_aware_is_off():
+    processor = MarkdownProcessor(chunk_size=300, chunk_overlap=60, structure_aware=False)
+    chunks = processor.chunk_text(GUIDE, {"source": "guide"})
+    assert len(chunks) > 1
+    assert all(len(chunk.page_content) <= 300 for chunk in chunks)
+    assert "section_path" not in chunks[0].metadata
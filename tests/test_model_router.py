@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Tests for the model cascade.
+
+A fake LLM per tier stands in for the agent executors: each records the turns
+it ran and answers from a script, so routing, escalation and the per-tier
+metrics are checked without calling OpenAI.
+"""
+import logging
+import os
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pytest
+
+from src import deadline
+from src.guardrails import Guardrails
+from src.metrics import metrics
+from src.model_router import (
+    FAST,
+    STRONG,
+    TEMPLATE,
+    ModelRouter,
+    ModelTier,
+    complexity_score,
+)
+from src.prompt_modules import select_modules
+from tests.boundary_cases import BOUNDARY_CASES
+
+
+class FakeAction:
+    def __init__(self, tool):
+        self.tool = tool
+
+
+class FakeLLM:
+    """
+    Executor stand-in for one tier: replies with the scripted output and
+    intermediate steps for a question, or a plain answer by default.
+    """
+
+    def __init__(self, tier, script=None):
+        self.tier = tier
+        self.script = script or {}
+        self.calls = []
+
+    def invoke(self, inputs):
+        self.calls.append(inputs["input"])
+        output, steps = self.script.get(inputs["input"], (f"{self.tier} answer", []))
+        return {"output": output, "intermediate_steps": steps}
+
+
+def make_router(**options):
+    tiers = {FAST: ModelTier(FAST, "gpt-4o-mini"), STRONG: ModelTier(STRONG, "gpt-4o")}
+    return ModelRouter(tiers, **options)
+
+
+def run_turn(router, llms, query, previous_text=""):
+    route = router.route(query, select_modules(query, previous_text), previous_text)
+    if route.tier == TEMPLATE:
+        router.record_template()
+        return route.answer, TEMPLATE, None
+    response, tier, escalation = router.run(route, lambda name: llms[name].invoke({"input": query}))
+    return response["output"], tier, escalation
+
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+@pytest.mark.parametrize("query", [query for query, should_reject in BOUNDARY_CASES if not should_reject])
+def test_simple_on_topic_questions_use_fast_tier(query):
+    assert make_router().route(query, select_modules(query)).tier == FAST
+
+
+@pytest.mark.parametrize("query", [
+    "What's the difference between AIA outpatient cover and the Deriv dental benefit, and which should I use?",
+    "Why was my claim rejected? I submitted the receipt and the form last week.",
+    "What's John's balance?",
+])
+def test_complex_or_sensitive_questions_use_strong_tier(query):
+    decision = make_router().route(query, select_modules(query))
+    assert decision.tier == STRONG, decision
+
+
+@pytest.mark.parametrize("query", ["hi", "Hello there!", "Thanks!", "thank you so much", "bye"])
+def test_small_talk_uses_template(query):
+    decision = make_router().route(query, select_modules(query))
+    assert decision.tier == TEMPLATE
+    assert "claims" in decision.answer
+
+
+def test_follow_up_adds_to_score():
+    alone, _ = complexity_score("what about that one?", ["core"])
+    follow_up, reasons = complexity_score("what about that one?", ["core"], previous_text="Is dental covered?")
+    assert follow_up > alone and "follow_up" in reasons
+
+
+def test_no_fast_tier_when_models_match():
+    tiers = {FAST: ModelTier(FAST, "gpt-4o-mini"), STRONG: ModelTier(STRONG, "gpt-4o-mini")}
+    router = ModelRouter(tiers)
+    assert not router.has_fast_tier
+    assert router.route("What's my claim balance?").tier == STRONG
+
+
+def test_routing_disabled_sends_everything_to_strong():
+    router = make_router(enabled=False)
+    assert router.route("hi").tier == STRONG
+    assert router.route("What's the AIA hotline?").tier == STRONG
+
+
+def test_fast_answer_kept():
+    llms = {FAST: FakeLLM(FAST), STRONG: FakeLLM(STRONG)}
+    answer, tier, escalation = run_turn(make_router(), llms, "What's the AIA hotline?")
+    assert (answer, tier, escalation) == ("fast answer", FAST, None)
+    assert llms[STRONG].calls == []
+
+
+def test_tool_failure_escalates():
+    query = "What's my claim balance?"
+    steps = [(FakeAction("calculate_balance"), '{"error":"Supabase request failed"}')]
+    llms = {FAST: FakeLLM(FAST, {query: ("Sorry, something went wrong.", steps)}), STRONG: FakeLLM(STRONG)}
+    answer, tier, escalation = run_turn(make_router(), llms, query)
+    assert (answer, tier, escalation) == ("strong answer", STRONG, "tool_failure")
+    assert llms[FAST].calls == llms[STRONG].calls == [query]
+
+
+def test_low_confidence_escalates():
+    query = "Is cancer treatment covered?"
+    llms = {
+        FAST: FakeLLM(FAST, {query: ("I'm not sure whether that is covered.", [])}),
+        STRONG: FakeLLM(STRONG, {query: ("Yes, up to RM 150,000 a year under AIA.", [])}),
+    }
+    answer, tier, escalation = run_turn(make_router(), llms, query)
+    assert tier == STRONG and escalation == "low_confidence"
+    assert "RM 150,000" in answer
+
+
+def test_no_escalation_when_deadline_is_nearly_spent():
+    query = "Is cancer treatment covered?"
+    llms = {FAST: FakeLLM(FAST, {query: ("I don't know.", [])}), STRONG: FakeLLM(STRONG)}
+    with deadline.deadline_scope(5):
+        _, tier, escalation = run_turn(make_router(escalation_min_seconds=10), llms, query)
+    assert (tier, escalation) == (FAST, None)
+    assert llms[STRONG].calls == []
+    assert metrics.snapshot()["counters"]["model_router_escalations_skipped{reason=low_confidence}"] == 1
+
+
+def test_per_tier_metrics_and_escalation_rate():
+    unsure = "Can I claim for glasses?"
+    router = make_router()
+    llms = {FAST: FakeLLM(FAST, {unsure: ("I couldn't find that.", [])}), STRONG: FakeLLM(STRONG)}
+    for query in ["hi", "What's the AIA hotline?", unsure, "Why was my claim rejected and what should I do?"]:
+        run_turn(router, llms, query)
+
+    snapshot = metrics.snapshot()
+    counters = snapshot["counters"]
+    assert counters["model_tier_turns{tier=template}"] == 1
+    assert counters["model_tier_turns{tier=fast}"] == 2
+    assert counters["model_tier_turns{tier=strong}"] == 2
+    assert counters["model_router_escalations{reason=low_confidence}"] == 1
+    assert snapshot["gauges"]["model_router_escalation_rate"] == 0.5
+    assert snapshot["timings"]["model_tier_latency{tier=fast}"]["count"] == 2
+
+
+class NullConversationLogger:
+    def log_query(self, *args):
+        pass
+
+    def log_response(self, *args):
+        pass
+
+    def log_error(self, *args):
+        pass
+
+
+@pytest.fixture
+def ai_agent():
+    """src.ai_agent imported the way production does (the src. fallback imports)."""
+    pytest.importorskip("langchain")
+    pytest.importorskip("dotenv")
+    # tools.py builds a SupabaseService at import; no request is made here
+    os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+    os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "test-key")
+    from src import ai_agent as module
+    return module
+
+
+def make_agent(ai_agent, llms, router=None):
+    """ClaimAIAgent wired to fake per-tier executors (no OpenAI client)."""
+    agent = ai_agent.ClaimAIAgent.__new__(ai_agent.ClaimAIAgent)
+    agent.logger = logging.getLogger("test_model_router")
+    agent.conv_logger = NullConversationLogger()
+    agent.model_name = "gpt-4o"
+    agent.router = router or make_router()
+    agent.executors = llms
+    agent.guardrails = Guardrails()
+    agent.answer_cache = None
+    agent.memory = {}
+    return agent
+
+
+def test_query_routes_through_agent(ai_agent):
+    llms = {FAST: FakeLLM(FAST), STRONG: FakeLLM(STRONG)}
+    agent = make_agent(ai_agent, llms)
+
+    result = agent.query("me@deriv.com", "What's the AIA hotline?")
+    assert result["status"] == "success", result
+    assert (result["answer"], result["model_tier"], result["model"]) == ("fast answer", FAST, "gpt-4o-mini")
+
+    result = agent.query("me@deriv.com", "Why was my claim rejected? I submitted the receipt and the form last week.")
+    assert (result["answer"], result["model_tier"]) == ("strong answer", STRONG)
+
+
+def test_query_escalates_through_agent(ai_agent):
+    query = "What's my claim balance?"
+    steps = [(FakeAction("calculate_balance"), '{"error":"Supabase request failed"}')]
+    llms = {FAST: FakeLLM(FAST, {query: ("Sorry, something went wrong.", steps)}), STRONG: FakeLLM(STRONG)}
+    result = make_agent(ai_agent, llms).query("me@deriv.com", query)
+    assert (result["status"], result["answer"], result["model_tier"]) == ("success", "strong answer", STRONG)
+
+
+def test_query_small_talk_skips_executors(ai_agent):
+    llms = {FAST: FakeLLM(FAST), STRONG: FakeLLM(STRONG)}
+    result = make_agent(ai_agent, llms).query("me@deriv.com", "thanks!")
+    assert result["model_tier"] == TEMPLATE
+    assert llms[FAST].calls == llms[STRONG].calls == []
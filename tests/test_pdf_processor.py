@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Tests for page-aware PDF chunking: page range metadata, packing of short
+pages, overlap without repeated text inside a chunk, and the page windows
+stream_pdf yields.
+
+FakeReader stands in for pypdf's PdfReader so page texts are exact.
+"""
+import re
+import sys
+from pathlib import Path
+
+# Add knowledge_base directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "knowledge_base"))
+
+import pytest
+
+pytest.importorskip("pypdf")
+pytest.importorskip("langchain_text_splitters")
+
+import pdf_processor
+from pdf_processor import PDFProcessor
+
+METADATA = {"source": "handbook"}
+
+
+class FakePage:
+    def __init__(self, text):
+        self.text = text
+
+    def extract_text(self):
+        return self.text
+
+
+class FakeReader:
+    def __init__(self, texts):
+        self.pages = [FakePage(text) for text in texts]
+
+
+def sentences(page, count):
+    """Numbered sentences, so repeated text is easy to spot."""
+    return " ".join(f"Page {page} sentence {i:02d} describes a claim rule." for i in range(count))
+
+
+def numbered(text):
+    return re.findall(r"Page \d+ sentence \d+", text)
+
+
+@pytest.fixture
+def processor():
+    return PDFProcessor(chunk_size=200, chunk_overlap=60)
+
+
+def test_short_pages_are_packed_with_their_page_range(processor):
+    pages = [{"page": number, "text": f"Page {number} has one short paragraph."} for number in range(1, 9)]
+    chunks = list(processor.iter_page_chunks(pages, METADATA))
+
+    assert [(c.metadata["page_start"], c.metadata["page_end"]) for c in chunks] == [(1, 6), (7, 8)]
+    assert [c.metadata["chunk_index"] for c in chunks] == [0, 1]
+    assert all(len(c.page_content) <= 200 for c in chunks)
+    assert chunks[0].metadata["source"] == "handbook"
+    assert "total_chunks" not in chunks[0].metadata
+
+
+def test_long_pages_overlap_without_repeating_text_in_a_chunk(processor):
+    pages = [
+        {"page": 3, "text": sentences(3, 12)},
+        {"page": 4, "text": "Short closing note."},
+        {"page": 7, "text": sentences(7, 3)},
+    ]
+    chunks = processor.chunk_pages(pages, METADATA)
+
+    for chunk in chunks:
+        found = numbered(chunk.page_content)
+        assert len(found) == len(set(found)), chunk.page_content
+        assert len(chunk.page_content) <= 200
+    # Overlap still carries context from one piece of a page into the next chunk
+    page_three = [numbered(c.page_content) for c in chunks if c.metadata["page_start"] == 3]
+    assert any(set(a) & set(b) for a, b in zip(page_three, page_three[1:]))
+    # Every sentence survives, and pages missing from the PDF text (5, 6) leave no gap in the ranges
+    assert {s for c in chunks for s in numbered(c.page_content)} == set(numbered(sentences(3, 12) + sentences(7, 3)))
+    assert chunks[-1].metadata["page_end"] == 7
+    assert all(c.metadata["total_chunks"] == len(chunks) for c in chunks)
+
+
+def test_page_tail_is_packed_with_the_next_page(processor):
+    pages = [{"page": 1, "text": sentences(1, 5)}, {"page": 2, "text": "Next page opening."}]
+    chunks = list(processor.iter_page_chunks(pages, METADATA))
+
+    last = chunks[-1]
+    assert (last.metadata["page_start"], last.metadata["page_end"]) == (1, 2)
+    assert last.page_content.endswith("\n\nNext page opening.")
+
+
+def test_stream_pdf_yields_page_windows(processor, monkeypatch, tmp_path):
+    # One chunk per page
+    texts = [sentences(number, 3) for number in range(1, 13)]
+    texts[3] = "   "  # empty pages are skipped
+    monkeypatch.setattr(pdf_processor, "PdfReader", lambda path: FakeReader(texts))
+    path = tmp_path / "Handbook.pdf"
+    path.write_bytes(b"%PDF-1.4")
+
+    batches = list(processor.stream_pdf(str(path), category="benefits_guide", window_size=4))
+    ranges = [[(c.metadata["page_start"], c.metadata["page_end"]) for c in batch] for batch in batches]
+    assert ranges == [
+        [(1, 1), (2, 2), (3, 3), (5, 5)],
+        [(6, 6), (7, 7), (8, 8), (9, 9)],
+        [(10, 10), (11, 11), (12, 12)],
+    ]
+
+    streamed = [chunk for batch in batches for chunk in batch]
+    whole = processor.process_pdf(str(path), category="benefits_guide")
+    assert [c.page_content for c in streamed] == [c.page_content for c in whole]
+    assert [c.metadata["chunk_index"] for c in streamed] == list(range(len(whole)))
+    assert streamed[0].metadata["total_pages"] == 12
+    assert streamed[0].metadata["category"] == "benefits_guide"
+
+
+def test_stream_pdf_window_of_one_page(processor, monkeypatch, tmp_path):
+    texts = [sentences(number, 6) for number in range(1, 4)]
+    monkeypatch.setattr(pdf_processor, "PdfReader", lambda path: FakeReader(texts))
+    path = tmp_path / "Handbook.pdf"
+    path.write_bytes(b"%PDF-1.4")
+
+    batches = list(processor.stream_pdf(str(path), window_size=1))
+    # Every chunk reaches the end of a one-page window, so each is its own batch
+    assert all(len(batch) == 1 for batch in batches)
+    assert len(batches) == len(processor.process_pdf(str(path))) > 3
+
+    with pytest.raises(FileNotFoundError):
+        list(processor.stream_pdf(str(tmp_path / "missing.pdf")))
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Tests for intent-scoped system prompt assembly.
+
+Replays the test_boundaries.py cases against a fake LLM that can only use
+what its system prompt contains, so module selection is checked without
+calling OpenAI.
+"""
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pytest
+
+from src.prompt_modules import (
+    CORE,
+    MODULES,
+    assemble_prompt,
+    build_system_prompt,
+    full_prompt,
+    select_modules,
+)
+from tests.boundary_cases import BOUNDARY_CASES, is_rejection
+
+# What the model must find in its prompt to answer each on-topic case
+REQUIRED_FACTS = {
+    "What's my claim balance?": "calculate_balance",
+    "How do I submit a dental claim?": "Staff Claim Reimbursement Form",
+    "Is cancer treatment covered?": "RM 150,000",
+    "What's the AIA hotline?": "1300 8888 60/70",
+    "Can I claim for glasses?": "Optical",
+}
+
+REJECTION_EXAMPLE_MARKER = "REJECTION EXAMPLES"
+
+
+class FakeLLM:
+    """
+    Chat model stand-in that knows nothing beyond its system prompt: it follows
+    the prompt's rejection examples when they are present, and otherwise answers
+    with the prompt line holding the fact the question needs.
+    """
+
+    def invoke(self, system_prompt: str, query: str) -> str:
+        if REJECTION_EXAMPLE_MARKER in system_prompt:
+            # First example reply under REJECTION EXAMPLES
+            examples = system_prompt.split(REJECTION_EXAMPLE_MARKER, 1)[1]
+            return next(line for line in examples.splitlines() if line.startswith("✅"))[2:].strip(' "')
+        fact = REQUIRED_FACTS.get(query, "")
+        for line in system_prompt.splitlines():
+            if fact and fact in line:
+                return line.strip()
+        return "I don't have that information."
+
+
+@pytest.mark.parametrize("query,should_reject", BOUNDARY_CASES)
+def test_boundary_cases_with_fake_llm(query, should_reject):
+    system_prompt, _ = build_system_prompt(query)
+    answer = FakeLLM().invoke(system_prompt, query)
+
+    assert is_rejection(answer) == should_reject, answer
+    if not should_reject:
+        assert REQUIRED_FACTS[query] in answer
+
+
+def test_core_first_and_canonical_order():
+    prompt = assemble_prompt(["claim_forms", "aia_policy"])
+    assert prompt.startswith(CORE.text)
+    assert prompt.index("CRITICAL DISTINCTIONS") < prompt.index("CLAIM SUBMISSION PROCESS")
+    assert assemble_prompt([]) == CORE.text
+
+
+def test_full_prompt_has_every_module(monkeypatch):
+    for module in MODULES:
+        assert module.text in full_prompt()
+    monkeypatch.setenv("PROMPT_MODULES", "full")
+    prompt, names = build_system_prompt("What's my claim balance?")
+    assert prompt == full_prompt()
+    assert names == [module.name for module in MODULES]
+
+
+@pytest.mark.parametrize("query", [
+    "What's John's balance?",
+    "Give me claim amount for sathish.badrinara@deriv.com",
+    "Check balance for employee ID 12345",
+    "How much has Sarah claimed?",
+])
+def test_privacy_module_for_other_people(query):
+    assert "privacy" in select_modules(query)
+
+
+@pytest.mark.parametrize("query", ["What's my claim balance?", "Can I claim for glasses?", "What did we discuss?"])
+def test_no_privacy_module_for_own_data(query):
+    assert "privacy" not in select_modules(query)
+
+
+def test_follow_up_uses_previous_turn():
+    assert "aia_policy" in select_modules("and for my wife?", previous_text="Is cancer treatment covered?")
+    assert "rejection" not in select_modules("why?", previous_text="How do I submit a dental claim?")
+
+
+def test_average_prompt_is_smaller_than_full():
+    full = len(full_prompt())
+    sizes = [len(build_system_prompt(query)[0]) for query, _ in BOUNDARY_CASES]
+    assert sum(sizes) / len(sizes) < 0.6 * full
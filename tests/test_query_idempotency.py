@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Tests for /query idempotency keys: a repeat of the same request shares the
+key, while a reused key with a different query or another user does not.
+"""
+import os
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pytest
+
+pytest.importorskip("fastapi")
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "test-key")
+
+from src import api
+from src.schemas import QueryRequest
+
+
+class FakeRequest:
+    def __init__(self, headers=None):
+        self.headers = headers or {}
+
+
+def key(headers=None, **fields):
+    body = {"user_email": "alice@deriv.com", "query_text": "What is my balance?", **fields}
+    return api._query_idempotency_key(FakeRequest(headers), QueryRequest(**body))
+
+
+def test_repeat_of_the_same_request_shares_the_key():
+    assert key(idempotency_key="k1") == key(headers={"Idempotency-Key": "k1"})
+    assert key(thread_id="t1", message_id="m1") == key(thread_id="t1", message_id="m1")
+    assert key() == ""
+
+
+def test_reused_key_with_a_different_query_is_a_new_request():
+    assert key(idempotency_key="k1") != key(idempotency_key="k1", query_text="How many claims do I have?")
+    assert key(message_id="m1") != key(message_id="m1", query_text="How many claims do I have?")
+    assert key(message_id="m1", thread_id="t1") != key(message_id="m1", thread_id="t2")
+
+
+def test_key_is_scoped_by_the_full_user_digest():
+    alice, bob = key(idempotency_key="k1"), key(idempotency_key="k1", user_email="bob@deriv.com")
+    assert alice != bob
+    assert len(alice.split(":")[0]) == 64
+    assert key(idempotency_key="k1", user_email=" Alice@Deriv.com ") == alice
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Tests for the API request models and their 400 details.
+"""
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pytest
+
+pytest.importorskip("pydantic")
+
+from pydantic import ValidationError
+
+from src.schemas import FeedbackRequest, QueryRequest, SessionWarmRequest, validation_detail
+
+QUERY_DEFAULT = "Missing required fields: user_email and query_text"
+
+
+def detail(model, body, default):
+    with pytest.raises(ValidationError) as caught:
+        model.model_validate_json(body)
+    return validation_detail(caught.value, default)
+
+
+@pytest.mark.parametrize("body", [
+    b'{"query_text": "How much can I claim?"}',
+    b'{"user_email": "a@deriv.com"}',
+    b'{"user_email": "", "query_text": "How much can I claim?"}',
+])
+def test_query_missing_fields_keep_the_query_message(body):
+    assert detail(QueryRequest, body, QUERY_DEFAULT) == QUERY_DEFAULT
+
+
+def test_feedback_and_warm_missing_fields_use_their_own_messages():
+    assert detail(FeedbackRequest, b'{"rating": "up"}', "Invalid feedback") == "Invalid user_email"
+    assert detail(
+        FeedbackRequest, b'{"user_email": "a@deriv.com", "message_id": "m1", "response_text": "ok"}', "Invalid feedback"
+    ) == "rating must be 'up' or 'down'"
+    assert detail(SessionWarmRequest, b"{}", "Invalid user_email") == "Invalid user_email"
+
+
+def test_invalid_json():
+    assert detail(QueryRequest, b"{not json", QUERY_DEFAULT) == "Invalid JSON body"
+
+
+def test_numeric_ids_are_coerced_to_strings():
+    body = QueryRequest.model_validate_json(
+        b'{"user_email": "a@deriv.com", "query_text": "hi", "thread_id": 42, "message_id": 7, "idempotency_key": " "}'
+    )
+    assert body.thread_id == "42"
+    assert body.message_id == "7"
+    assert body.idempotency_key is None
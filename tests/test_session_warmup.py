@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Tests for session warm-up: ClaimAIAgent.warm_session prefetches the user's
+context into SupabaseService's per-user cache, so the first tool call of the
+conversation makes no REST request until the cache entry expires.
+
+CountingRest stands in for the service's _fetch (the context RPC is marked
+as not deployed, so the context comes from three table reads).
+"""
+import json
+import logging
+import os
+import sys
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pytest
+
+pytest.importorskip("langchain")
+pytest.importorskip("dotenv")
+# tools.py builds a SupabaseService at import; no request is made here
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "test-key")
+
+from src import ai_agent, tools
+from src.circuit_breaker import CircuitBreaker
+from src.supabase_service import SupabaseServiceError
+
+EMAIL = "me@deriv.com"
+SUMMARY = {"id": "s1", "email": EMAIL, "year": 2025, "remaining_balance": 320.0, "max_amount": 500.0}
+CLAIMS = [{"id": f"c{i}", "email": EMAIL, "record_key": f"R{i}", "state": "Paid"} for i in range(3)]
+
+
+class CountingRest:
+    """Answers claim_summary and claim_analysis reads and counts them."""
+
+    def __init__(self, service):
+        self.service = service
+        self.calls = []
+        self.error = None
+
+    def fetch(self, table, params, timeout, count=None):
+        self.calls.append(table)
+        if self.error is not None:
+            raise self.error
+        if table == self.service.summary_table:
+            return [SUMMARY], None
+        return CLAIMS[: params.get("limit", len(CLAIMS))], (len(CLAIMS) if count else None)
+
+
+@pytest.fixture
+def rest(monkeypatch):
+    service = tools.supabase_service
+    assert ai_agent.supabase_service is service
+    fake = CountingRest(service)
+    monkeypatch.setattr(service, "_fetch", fake.fetch)
+    monkeypatch.setattr(service, "replica", None)
+    monkeypatch.setattr(service, "breaker", CircuitBreaker("test-supabase", min_calls=1000))
+    monkeypatch.setattr(service, "_context_rpc_available", False)
+    monkeypatch.setattr(service, "context_ttl", 60.0)
+    # No stale results from other tests to fall back on
+    monkeypatch.setattr(service, "_stale", OrderedDict())
+    service.invalidate_user_context(EMAIL)
+    yield fake
+    service.invalidate_user_context(EMAIL)
+    # The staleness marker is a context variable; don't leak it into the next test
+    service.pop_freshness_note()
+
+
+def make_agent():
+    """ClaimAIAgent with just the state warm_session uses (no OpenAI client)."""
+    agent = ai_agent.ClaimAIAgent.__new__(ai_agent.ClaimAIAgent)
+    agent.logger = logging.getLogger("test_session_warmup")
+    agent.memory = {}
+    # The embedding model is not part of these tests
+    agent._embedder_warm = True
+    return agent
+
+
+def test_first_tool_call_is_served_from_the_prefetched_context(rest):
+    warmed = make_agent().warm_session(EMAIL, thread_id="t1")
+    assert warmed["context"] is True
+    prefetch_calls = len(rest.calls)
+    assert prefetch_calls == 3
+
+    balance = json.loads(tools.calculate_balance.invoke({"user_email": EMAIL}))
+    count = json.loads(tools.get_claim_count.invoke({"user_email": EMAIL}))
+    assert balance["remaining_balance"] == 320.0
+    assert count["claim_count"] == 3
+    assert len(rest.calls) == prefetch_calls
+
+    # Other users are not covered by this user's warm-up
+    tools.supabase_service.get_user_context("other@deriv.com")
+    assert len(rest.calls) == prefetch_calls + 3
+    tools.supabase_service.invalidate_user_context("other@deriv.com")
+
+
+def test_prefetched_context_expires_after_the_ttl(rest, monkeypatch):
+    monkeypatch.setattr(tools.supabase_service, "context_ttl", 0.05)
+    assert tools.supabase_service.prefetch_user_context(EMAIL)
+    tools.supabase_service.get_user_context(EMAIL)
+    assert len(rest.calls) == 3
+
+    time.sleep(0.1)
+    tools.supabase_service.get_user_context(EMAIL)
+    assert len(rest.calls) == 6
+
+
+def test_failed_prefetch_is_retried_by_the_first_tool_call(rest):
+    rest.error = SupabaseServiceError("Supabase request failed: 503", status_code=503)
+    assert make_agent().warm_session(EMAIL)["context"] is False
+
+    rest.error = None
+    count = json.loads(tools.get_claim_count.invoke({"user_email": EMAIL}))
+    assert count["claim_count"] == 3
+    # ...and that fetch is cached for the next one
+    calls = len(rest.calls)
+    tools.get_claim_count.invoke({"user_email": EMAIL})
+    assert len(rest.calls) == calls
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Tests for knowledge base duplicate detection (content hash + SimHash) and
+MMR result diversification.
+"""
+import sys
+from pathlib import Path
+
+# Add knowledge_base directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "knowledge_base"))
+
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from langchain_core.documents import Document
+
+from similarity import ChunkDeduplicator, content_hash, hamming_distance, mmr_select, simhash
+
+DENTAL = (
+    "Employees may claim dental treatment up to RM 500 per calendar year. Claims must be submitted "
+    "within 30 days of the treatment date together with the original receipt and a completed claim form. "
+    "Cosmetic procedures such as teeth whitening and veneers are not covered under the dental benefit. "
+    "Contact the HR helpdesk at hr@example.com for any questions about your dental entitlement."
+)
+OPTICAL = (
+    "Optical claims cover one pair of spectacles or contact lenses every two years, capped at RM 300. "
+    "Attach the optometrist prescription and the itemised invoice when you submit the claim online."
+)
+
+
+def test_formatting_differences_are_exact_duplicates():
+    reformatted = DENTAL.replace("dental treatment", "**Dental** treatment").replace(". ", ".\n\n- ")
+    assert content_hash(reformatted) == content_hash(DENTAL)
+    assert simhash(reformatted) == simhash(DENTAL)
+
+
+def test_near_duplicates_are_close_and_other_text_is_not():
+    # The next overlap window: two words shifted out, a short sentence in
+    shifted = " ".join(DENTAL.split()[2:]) + " Thank you."
+    reworded = DENTAL.replace("original receipt", "original itemised receipt")
+
+    assert hamming_distance(simhash(DENTAL), simhash(shifted)) <= 6
+    assert hamming_distance(simhash(DENTAL), simhash(reworded)) <= 6
+    assert hamming_distance(simhash(DENTAL), simhash(OPTICAL)) > 20
+
+
+def test_duplicates_are_dropped_at_ingest():
+    deduplicator = ChunkDeduplicator(max_distance=6)
+    documents = [
+        Document(page_content=DENTAL, metadata={"source": "dental.md"}),
+        Document(page_content=DENTAL.upper(), metadata={"source": "copy.md"}),
+        Document(page_content=" ".join(DENTAL.split()[2:]) + " Thank you.", metadata={"source": "overlap.md"}),
+        Document(page_content=OPTICAL, metadata={"source": "optical.md"}),
+    ]
+
+    kept = deduplicator.filter_documents(documents)
+    assert [doc.metadata["source"] for doc in kept] == ["dental.md", "optical.md"]
+    assert deduplicator.stats == {"exact": 1, "near": 1, "kept": 2}
+    assert kept[0].metadata["content_hash"] == content_hash(DENTAL)
+    assert int(kept[0].metadata["simhash"], 16) == simhash(DENTAL)
+
+
+def test_seeded_fingerprints_block_reingest():
+    deduplicator = ChunkDeduplicator()
+    # As vector_store seeds it from metadata already in the collection
+    deduplicator.add(content_hash(DENTAL), simhash(DENTAL))
+
+    assert deduplicator.check(DENTAL)[0] == "exact"
+    assert deduplicator.check(DENTAL.replace("original receipt", "original itemised receipt"))[0] == "near"
+    assert deduplicator.check(OPTICAL)[0] is None
+    # check() does not register anything
+    assert deduplicator.check(OPTICAL)[0] is None
+
+
+QUERY = [1.0, 0.2, 0.0]
+CANDIDATES = [
+    [1.0, 0.0, 0.0],
+    [0.98, 0.05, 0.0],  # near copy of the first
+    [0.9, 0.0, 0.1],  # and another
+    [0.6, 0.0, 0.8],
+    [0.5, 0.85, 0.0],
+]
+
+
+def test_mmr_prefers_varied_results():
+    # Pure relevance returns the three near-identical candidates
+    assert mmr_select(QUERY, CANDIDATES, 3, lambda_mult=1.0) == [1, 0, 2]
+    # Balanced: the most relevant first, then the ones that differ from it
+    assert mmr_select(QUERY, CANDIDATES, 3, lambda_mult=0.5) == [1, 4, 3]
+
+
+def test_mmr_limits():
+    assert mmr_select(QUERY, [], 3) == []
+    assert sorted(mmr_select(QUERY, CANDIDATES, 10)) == [0, 1, 2, 3, 4]
+    assert mmr_select(QUERY, CANDIDATES, 1) == [1]
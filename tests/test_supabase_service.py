@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Tests for SupabaseService reads against a fake _fetch.
+
+FakeTable answers the PostgREST filters the service sends (email=in.(...)
+for batched summaries) from in-memory rows and can be switched to failing,
+so the stale fallback is checked without a network.
+"""
+import os
+import re
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pytest
+
+pytest.importorskip("requests")
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "test-key")
+
+from src.circuit_breaker import CircuitBreaker
+from src.supabase_service import SupabaseService, SupabaseServiceError
+
+
+def summary(email, year=2025, balance=500.0):
+    return {"id": f"{email}-{year}", "email": email, "year": year, "remaining_balance": balance}
+
+
+class FakeTable:
+    def __init__(self, rows):
+        self.rows = list(rows)
+        self.calls = []
+        self.error = None
+
+    def fetch(self, table, params, timeout, count=None):
+        self.calls.append(dict(params))
+        if self.error is not None:
+            raise self.error
+        emails = re.findall(r'"([^"]+)"', params["email"])
+        rows = [row for row in self.rows if row["email"] in emails]
+        rows.sort(key=lambda row: (row["email"], -row["year"]))
+        return rows, None
+
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setenv("SUPABASE_READ_MODE", "rest")
+    monkeypatch.setenv("SUPABASE_BATCH_WINDOW_MS", "0")
+    service = SupabaseService()
+    # A private breaker so failures here never open the shared "supabase" one
+    service.breaker = CircuitBreaker("test-supabase", min_calls=1000)
+    yield service
+    # The staleness marker is a context variable; don't leak it into the next test
+    service.pop_freshness_note()
+
+
+def with_table(service, rows):
+    table = FakeTable(rows)
+    service._fetch = table.fetch
+    return table
+
+
+def test_batch_returns_latest_row_per_email(service):
+    table = with_table(service, [summary("a@x.com", 2024, 100.0), summary("a@x.com", 2025), summary("b@x.com")])
+
+    result = service.get_claim_summaries(["A@x.com", "b@x.com", "c@x.com"])
+    assert result["a@x.com"]["year"] == 2025
+    assert result["b@x.com"]["email"] == "b@x.com"
+    assert result["c@x.com"] is None
+    assert len(table.calls) == 1
+    assert not service.serving_stale()
+
+
+def test_failed_batch_falls_back_per_email(service):
+    table = with_table(service, [summary("a@x.com"), summary("b@x.com")])
+    # Remembered from two different batches
+    service.get_claim_summary("a@x.com")
+    service.get_claim_summaries(["b@x.com", "c@x.com"])
+
+    table.error = SupabaseServiceError("Supabase request failed: 503", status_code=503)
+    result = service.get_claim_summaries(["b@x.com", "a@x.com"])
+    assert result["a@x.com"]["email"] == "a@x.com"
+    assert result["b@x.com"]["email"] == "b@x.com"
+    assert service.pop_freshness_note() is not None
+
+    # c@x.com had no summary last time: that is remembered too
+    assert service.get_claim_summary("c@x.com") is None
+
+
+def test_email_without_stale_data_gets_the_error(service):
+    table = with_table(service, [summary("a@x.com")])
+    service.get_claim_summary("a@x.com")
+    table.error = SupabaseServiceError("Supabase request failed: 503", status_code=503)
+
+    loaded = service._load_summaries(["a@x.com", "new@x.com"])
+    assert loaded["a@x.com"][0]["email"] == "a@x.com"
+    assert isinstance(loaded["new@x.com"], SupabaseServiceError)
+    with pytest.raises(SupabaseServiceError):
+        service.get_claim_summary("new@x.com")
+
+
+def test_client_errors_do_not_serve_stale_data(service):
+    table = with_table(service, [summary("a@x.com")])
+    service.get_claim_summary("a@x.com")
+    table.error = SupabaseServiceError("Supabase request failed: 400", status_code=400)
+
+    with pytest.raises(SupabaseServiceError):
+        service.get_claim_summary("a@x.com")
+
+
+def test_profile_is_one_summary_read_without_the_rpc(service):
+    table = with_table(service, [summary("a@x.com")])
+    service._context_rpc_available = False
+
+    assert service.get_profile("a@x.com")["email"] == "a@x.com"
+    # Only the claim_summary request, not the fallback context's three table reads
+    assert len(table.calls) == 1 and "email" in table.calls[0]
+
+
+def test_profile_comes_from_the_rpc_context_when_deployed(service):
+    table = with_table(service, [])
+    rpc_calls = []
+
+    def post_rpc(function, payload, timeout):
+        rpc_calls.append(function)
+        return {"profile": summary("a@x.com"), "recent_claims": [], "claim_count": 0, "totals_by_type": []}, None
+
+    service._post_rpc = post_rpc
+    assert service.get_profile("a@x.com")["email"] == "a@x.com"
+    # Later tools in the same turn reuse the cached context
+    assert service.get_profile("a@x.com")["email"] == "a@x.com"
+    assert rpc_calls == ["get_user_context"]
+    assert table.calls == []
+
+
+_AFTER = re.compile(r'\(date_paid\.lt\."(.*)",and\(date_paid\.eq\."(.*)",id\.lt\."(.*)"\),date_paid\.is\.null\)')
+
+
+class FakeClaims:
+    """claim_analysis as PostgREST would serve it for the keyset queries _claim_pages sends."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = []
+
+    def fetch(self, table, params, timeout, count=None):
+        self.calls.append((dict(params), count))
+        assert params["order"] == "date_paid.desc.nullslast,id.desc"
+        email = params["email"][len("eq."):]
+        rows = [row for row in self.rows if row["email"] == email]
+        if "state" in params:
+            # neq drops NULL states too
+            rows = [row for row in rows if row["state"] is not None and row["state"] != params["state"][len("neq."):]]
+        if "or" in params:
+            paid, tie_paid, tie_id = _AFTER.match(params["or"]).groups()
+            assert paid == tie_paid
+            rows = [
+                row for row in rows
+                if row["date_paid"] is None
+                or row["date_paid"] < paid
+                or (row["date_paid"] == paid and row["id"] < tie_id)
+            ]
+        elif params.get("date_paid") == "is.null":
+            rows = [row for row in rows if row["date_paid"] is None and row["id"] < params["id"][len("lt."):]]
+        total = len(rows) if count else None
+        # date_paid desc with NULLs last, then id desc
+        rows = sorted(rows, key=lambda row: (row["date_paid"] is not None, row["date_paid"] or "", row["id"]), reverse=True)
+        return [{name: row[name] for name in params["select"].split(",")} for row in rows[: params["limit"]]], total
+
+
+def paid_claim(row_id, date_paid, email="a@x.com", state="Paid"):
+    return {"id": row_id, "email": email, "date_paid": date_paid, "state": state, "record_key": f"R-{row_id}"}
+
+
+def stream_ids(service, rows, **options):
+    table = FakeClaims(rows)
+    service._fetch = table.fetch
+    stream = service.iter_claim_analysis("a@x.com", columns=["record_key"], **options)
+    return [row["record_key"][len("R-"):] for row in stream], stream, table
+
+
+def expected_order(rows):
+    rows = [row for row in rows if row["email"] == "a@x.com" and row["state"] not in (None, "Complete")]
+    rows.sort(key=lambda row: (row["date_paid"] is not None, row["date_paid"] or "", row["id"]), reverse=True)
+    return [row["id"] for row in rows]
+
+
+def test_keyset_pages_keep_ties_on_date_paid(service):
+    # Five claims paid the same day straddle pages of 2
+    rows = [paid_claim(f"c{i}", "2025-01-10") for i in range(5)]
+    rows += [paid_claim("d1", "2025-02-01"), paid_claim("d2", "2024-12-31")]
+    ids, stream, table = stream_ids(service, rows, page_size=2)
+
+    assert ids == ["d1", "c4", "c3", "c2", "c1", "c0", "d2"]
+    assert stream.pages_read == 4
+    assert table.calls[1][0]["or"] == '(date_paid.lt."2025-01-10",and(date_paid.eq."2025-01-10",id.lt."c4"),date_paid.is.null)'
+
+
+def test_null_date_paid_rows_across_a_page_boundary(service):
+    rows = [paid_claim("a1", "2025-03-01"), paid_claim("a2", "2025-02-01")]
+    rows += [paid_claim(f"n{i}", None) for i in range(5)]
+    rows += [paid_claim("x1", None, state="Complete"), paid_claim("x2", None, state=None), paid_claim("b1", None, email="b@x.com")]
+    ids, _, table = stream_ids(service, rows, page_size=3)
+
+    assert ids == expected_order(rows) == ["a1", "a2", "n4", "n3", "n2", "n1", "n0"]
+    # Page 1 ends on the first NULL row; from then on only NULL rows remain
+    assert table.calls[1][0]["date_paid"] == "is.null" and table.calls[1][0]["id"] == "lt.n4"
+    assert table.calls[2][0]["id"] == "lt.n1"
+    assert "or" not in table.calls[2][0]
+
+    # A page ending on the last dated row: the next one starts with the NULL rows
+    ids, _, table = stream_ids(service, rows, page_size=2)
+    assert ids == ["a1", "a2", "n4", "n3", "n2", "n1", "n0"]
+    assert table.calls[1][0]["or"].endswith(",date_paid.is.null)")
+
+
+def test_max_rows_stops_mid_page(service):
+    rows = [paid_claim(f"c{i:02d}", f"2025-01-{i + 1:02d}") for i in range(10)]
+    ids, stream, table = stream_ids(service, rows, page_size=4, max_rows=6)
+
+    assert ids == expected_order(rows)[:6]
+    assert [params["limit"] for params, _ in table.calls] == [4, 2]
+    assert stream.pages_read == 2
+
+
+def test_count_is_requested_on_the_first_page_only(service):
+    rows = [paid_claim(f"c{i}", "2025-01-10") for i in range(5)]
+    ids, stream, table = stream_ids(service, rows, page_size=2, count="exact")
+
+    assert len(ids) == 5
+    assert stream.total == 5
+    assert [count for _, count in table.calls] == ["exact", None, None]
+
+    with pytest.raises(ValueError):
+        service.iter_claim_analysis("a@x.com", count="bogus")
+
+
+def test_cursor_columns_are_dropped_when_not_selected(service):
+    table = FakeClaims([paid_claim("c1", "2025-01-10")])
+    service._fetch = table.fetch
+    rows = list(service.iter_claim_analysis("a@x.com", columns=["record_key"]))
+
+    assert rows == [{"record_key": "R-c1"}]
+    assert table.calls[0][0]["select"] == "record_key,date_paid,id"
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Tests for the compact tool-result encodings: date parsing (ISO and Sage
+exports), totals split by currency, claims without dates, and truncation.
+"""
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pytest
+
+from src import tool_encoding
+from src.tool_encoding import claim_aggregates, claim_month, encode_claims, parse_date, truncate
+
+
+def claim(record_key, amount, currency="MYR", claim_type="Optical", state="Paid", submitted=None, paid=None, **fields):
+    return {
+        "id": f"uuid-{record_key}",
+        "record_key": record_key,
+        "transaction_amount": amount,
+        "transaction_currency": currency,
+        "claim_type": claim_type,
+        "state": state,
+        "date_submitted": submitted,
+        "date_paid": paid,
+        **fields,
+    }
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("2025 Jan 06", datetime(2025, 1, 6)),
+    ("2025 Sep 1", datetime(2025, 9, 1)),
+    ("06 Jan 2025", datetime(2025, 1, 6)),
+    ("2025 Jan 06 10:15", datetime(2025, 1, 6)),
+    ("06/01/2025", datetime(2025, 1, 6)),
+    ("2025/01/06", datetime(2025, 1, 6)),
+    ("2025-01-06", datetime(2025, 1, 6)),
+    ("2025-01-06T10:15:00Z", datetime(2025, 1, 6, 10, 15, tzinfo=timezone.utc)),
+])
+def test_parse_date_formats(value, expected):
+    assert parse_date(value) == expected
+
+
+@pytest.mark.parametrize("value", [None, "", "  ", "soon", "2025 Foo 06", "31/02/2025"])
+def test_parse_date_rejects_unknown_values(value):
+    assert parse_date(value) is None
+
+
+def test_claim_month_falls_back_to_date_paid():
+    assert claim_month(claim("A", 1, submitted="2025 Feb 03", paid="2025 Mar 01")) == "2025-02"
+    assert claim_month(claim("A", 1, paid="2025 Mar 01")) == "2025-03"
+    assert claim_month(claim("A", 1)) is None
+
+
+def test_truncate():
+    assert truncate(None) is None
+    assert truncate("") == ""
+    assert truncate("  Optical \n glasses  ") == "Optical glasses"
+    assert truncate("x" * 10, limit=10) == "x" * 10
+    assert truncate("Prescription glasses and lenses", limit=14) == "Prescription…"
+    assert len(truncate("a" * 200)) == tool_encoding.DESCRIPTION_LIMIT
+
+
+def test_aggregates_split_mixed_currencies():
+    claims = [
+        claim("A", 100, "MYR", submitted="2025 Jan 06"),
+        claim("B", "50.505", "MYR", submitted="2025-01-20"),
+        claim("C", 30, "USD", submitted="2025 Jan 07"),
+        claim("D", None, "USD", claim_type="Dental", state="Complete", submitted="2025 Feb 01"),
+    ]
+    totals = claim_aggregates(claims)
+
+    assert totals["by_type"]["columns"] == ["claim_type", "currency", "count", "total"]
+    assert totals["by_type"]["rows"] == [
+        ["Dental", "USD", 1, 0.0],
+        ["Optical", "MYR", 2, 150.51],
+        ["Optical", "USD", 1, 30.0],
+    ]
+    assert totals["by_month"]["rows"] == [
+        ["2025-01", "MYR", 2, 150.51],
+        ["2025-01", "USD", 1, 30.0],
+        ["2025-02", "USD", 1, 0.0],
+    ]
+    assert totals["by_state"]["rows"] == [["Complete", "USD", 1, 0.0], ["Paid", "MYR", 2, 150.51], ["Paid", "USD", 1, 30.0]]
+
+
+def test_claims_without_dates_are_grouped_last():
+    claims = [claim("A", 10, paid="garbage"), claim("B", 20, submitted="2024 Dec 30"), claim("C", 5)]
+    assert claim_aggregates(claims)["by_month"]["rows"] == [["2024-12", "MYR", 1, 20.0], [None, "MYR", 2, 15.0]]
+
+
+def test_encode_claims_table_drops_ids_and_truncates(monkeypatch):
+    monkeypatch.setattr(tool_encoding, "COMPACT_OUTPUT", True)
+    payload = encode_claims([claim("A", "12.345", submitted="2025 Jan 06", description="d " * 100)])
+
+    assert payload["total_claims"] == 1
+    assert payload["claims"]["columns"] == list(tool_encoding.CLAIM_COLUMNS)
+    row = payload["claims"]["rows"][0]
+    assert row[0] == "A" and row[5] == 12.35
+    assert "uuid-A" not in row
+    assert row[-1].endswith("…")
+    assert "totals" in payload and "note" not in payload
+    assert "totals" not in encode_claims([claim("A", 1)], aggregates=False)
+    assert "totals" not in encode_claims([])
+
+
+def test_encode_claims_lists_max_rows_but_totals_everything(monkeypatch):
+    monkeypatch.setattr(tool_encoding, "COMPACT_OUTPUT", True)
+    claims = [claim(f"R{i}", 10) for i in range(5)]
+    payload = encode_claims(claims, max_rows=2)
+
+    assert payload["total_claims"] == 5
+    assert [row[0] for row in payload["claims"]["rows"]] == ["R0", "R1"]
+    assert payload["totals"]["by_type"]["rows"] == [["Optical", "MYR", 5, 50.0]]
+    assert "2 most recently paid of 5" in payload["note"]
+    assert "note" not in encode_claims(claims, max_rows=None)
+
+
+def test_json_format_returns_raw_rows(monkeypatch):
+    monkeypatch.setattr(tool_encoding, "COMPACT_OUTPUT", False)
+    claims = [claim(f"R{i}", 10) for i in range(3)]
+    payload = encode_claims(claims, max_rows=2)
+
+    assert payload["claims"] == claims[:2]
+    assert payload["total_claims"] == 3
+    assert "totals" not in payload and "note" in payload